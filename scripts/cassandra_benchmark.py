@@ -0,0 +1,553 @@
+#!/usr/bin/env python3
+#
+# Offline benchmark harness for the repair and backup paths.
+# It is run from a checkout of this repository, not deployed to the nodes, and
+# measures the scripts in src/puppet/cassandra_pfpt/files next to it.
+# Runs the real scripts, each in its own process, against local stand-ins so
+# their throughput can be measured and compared without a cluster or S3:
+# - repair:  cassandra_range_repair.py against a fake 'nodetool' and 'cqlsh'
+#            serving a synthetic token ring. Each range repair sleeps for a
+#            latency proportional to the range's share of the ring, with
+#            jitter, slows down with the number of repairs running at once
+#            (--repair-contention) and fails at --repair-failure-rate.
+# - backup:  cassandra_backup_engine.py over synthetic snapshot directories
+#            into a file:// object store (optionally with per-request latency).
+# - restore: cassandra_restore_engine.py from that store into a scratch directory.
+# - verify:  cassandra_backup_verify.py over the same backup.
+# Latencies and failures are derived from --seed and the range, so runs with
+# the same options repair the same ranges in the same way.
+#
+# The report gives, per suite, the median wall time, steps (range repairs or
+# tables) per second, bytes per second and peak RSS of the script's process.
+#
+# Exit codes: 0 every run succeeded, 1 a run failed, 2 the benchmark could
+# not be set up. Repair runs with injected failures are expected to fail.
+
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import shlex
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from collections import namedtuple
+
+# The scripts under test, and the modules shared with them.
+FILES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+                         'src', 'puppet', 'cassandra_pfpt', 'files')
+sys.path.insert(0, FILES_DIR)
+
+from cassandra_backup_engine import MIB, directory_size, format_bytes
+from cassandra_ring import RingEntry, TokenRing
+
+# --- Constants ---
+SUITES = ('repair', 'backup', 'restore', 'verify')
+SPEC_ENV = 'CASSANDRA_BENCHMARK_SPEC'  # Tells the fake nodetool and cqlsh which ring to serve.
+BENCH_HOST = 'bench-host'
+BENCH_TAG = '2026-01-01-00-00'  # Snapshot tag and backup set name.
+BENCH_PASSPHRASE = 'benchmark-passphrase'
+MIN_TOKEN = -2**63
+MAX_TOKEN = 2**63 - 1
+TOKEN_RING_SIZE = 2**64
+BLOCK_SIZE = 64 * 1024  # Synthetic data is written in blocks of this size.
+PARTITIONS_PER_RANGE = 100000  # size_estimates partitions of an average-sized range.
+
+# One measured run of a suite. `bytes` is None for repair; `peak_rss` is in bytes.
+BenchmarkRun = namedtuple('BenchmarkRun', ['suite', 'run', 'exit_code', 'seconds', 'steps', 'failed_steps',
+                                           'bytes', 'peak_rss', 'log'])
+
+# --- Logging Setup ---
+# Replaces the stdout handler cassandra_backup_engine sets up; stdout carries the report.
+logging.basicConfig(
+    level=logging.INFO,
+    format='[%(asctime)s] %(levelname)s: %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S',
+    stream=sys.stderr,
+    force=True
+)
+
+
+# --- Fake nodetool and cqlsh ---
+
+def load_spec():
+    with open(os.environ[SPEC_ENV]) as f:
+        spec = json.load(f)
+    return spec, TokenRing([RingEntry(*entry) for entry in spec['ring']])
+
+def range_span(start_token, end_token):
+    """Number of tokens in the (start, end] range, wrapping around the ring."""
+    return (int(end_token) - int(start_token)) % TOKEN_RING_SIZE or TOKEN_RING_SIZE
+
+def fake_nodetool(argv):
+    """Answers the nodetool calls of the cluster client from the benchmark ring."""
+    spec, ring = load_spec()
+    args = list(argv)
+    while args and args[0] in ('-u', '-pw', '-h', '-p'):
+        del args[:2]
+    command = args[0] if args else ''
+
+    if command == 'status':
+        addresses = [spec['local_address']] + [a for a in ring.addresses if a != spec['local_address']]
+        print("Datacenter: benchmark\n===================\nStatus=Up/Down\n|/ State=Normal/Leaving/Joining/Moving")
+        print("--  Address  Load  Tokens  Owns  Host ID  Rack")
+        for address in addresses:
+            _, rack = ring.location(address)
+            print(f"UN  {address}  1.00 GiB  {len(ring.tokens_for(address))}  ?  00000000-0000-0000-0000-000000000000  {rack}")
+        return 0
+
+    if command == 'ring':
+        for datacenter in sorted({entry.datacenter for entry in ring.entries}):
+            print(f"\nDatacenter: {datacenter}\n==========\nAddress  Rack  Status State   Load      Owns   Token")
+            for entry in ring.entries:
+                if entry.datacenter == datacenter:
+                    print(f"{entry.address}  {entry.rack}  Up  Normal  1.00 GiB  ?  {entry.token}")
+        return 0
+
+    if command == 'describering' and len(args) > 1:
+        for i, end in enumerate(ring.tokens):
+            replicas = ring.replicas(end, spec['replication'])
+            print(f"\tTokenRange(start_token:{ring.tokens[i - 1]}, end_token:{end}, endpoints:[{', '.join(replicas)}], "
+                  f"rpc_endpoints:[{', '.join(replicas)}], endpoint_details:[])")
+        return 0
+
+    if command == 'repair':
+        return fake_repair(spec, ring, args[1:])
+
+    print(f"nodetool: '{command}' is not supported by the benchmark stand-in.", file=sys.stderr)
+    return 1
+
+def fake_repair(spec, ring, args):
+    """Sleeps for the simulated duration of a range repair and records it."""
+    start_token = args[args.index('-st') + 1]
+    end_token = args[args.index('-et') + 1]
+    keyspace = args[args.index('--') + 1]
+    rng = random.Random(f"{spec['seed']}:{keyspace}:{start_token}:{end_token}")
+    latency = spec['repair_latency'] * range_span(start_token, end_token) / (TOKEN_RING_SIZE / len(ring))
+    latency *= 1 + spec['repair_jitter'] * rng.uniform(-1, 1)
+
+    # Concurrent repairs compete for the same disks and replicas.
+    inflight_dir = os.path.join(spec['workdir'], 'inflight')
+    marker = os.path.join(inflight_dir, str(os.getpid()))
+    open(marker, 'w').close()
+    try:
+        concurrent = len(os.listdir(inflight_dir))
+        latency *= 1 + spec['repair_contention'] * (concurrent - 1)
+        failed = rng.random() < spec['repair_failure_rate']
+        print(f"Starting repair command #1, repairing keyspace {keyspace} with repair options "
+              f"(primary range: true, ranges: 1, {concurrent} running)")
+        time.sleep(max(0.0, latency))
+    finally:
+        os.remove(marker)
+    with open(os.path.join(spec['workdir'], 'repairs.jsonl'), 'a') as f:
+        f.write(json.dumps({'keyspace': keyspace, 'start': start_token, 'end': end_token,
+                            'seconds': round(latency, 4), 'failed': failed}) + '\n')
+    if failed:
+        print("error: Repair job has failed with the error message: injected by the benchmark")
+        return 2
+    print(f"Repair session for range ({start_token},{end_token}] finished")
+    return 0
+
+def fake_cqlsh(argv):
+    """Answers the keyspace and size_estimates queries of cassandra_range_repair.py."""
+    spec, ring = load_spec()
+    query = argv[argv.index('-e') + 1] if '-e' in argv else ''
+    if query.upper().startswith('DESCRIBE KEYSPACES'):
+        print(' '.join(['system', 'system_auth', 'system_schema'] + spec['keyspaces']))
+        return 0
+    if re.search(r"system\.size_estimates WHERE keyspace_name = '[^']+'", query):
+        print(" range_start | range_end | partitions_count\n-------------+-----------+------------------")
+        average_span = TOKEN_RING_SIZE / len(ring)
+        for i, end in enumerate(ring.tokens):
+            start = ring.tokens[i - 1]
+            print(f" {start} | {end} | {int(PARTITIONS_PER_RANGE * range_span(start, end) / average_span)}")
+        return 0
+    print(f"cqlsh: query not supported by the benchmark stand-in: {query}", file=sys.stderr)
+    return 2
+
+def repair_runner(workdir, argv):
+    """Runs cassandra_range_repair.py with its state files and cqlsh moved into the work directory."""
+    import cassandra_range_repair as repair
+    repair.STATUS_DIR = os.path.join(workdir, 'repair')
+    repair.STATUS_FILE = os.path.join(repair.STATUS_DIR, 'status.txt')
+    repair.JOURNAL_FILE = os.path.join(repair.STATUS_DIR, 'checkpoints.jsonl')
+    repair.PAUSE_FILE = os.path.join(repair.STATUS_DIR, 'repair-disabled')
+    repair.RING_CACHE_FILE = os.path.join(repair.STATUS_DIR, 'ring.json')
+    cqlsh = os.path.join(workdir, 'bin', 'cqlsh')
+    repair.build_cqlsh_command = lambda cql_user, cql_pass, ssl_opts: [cqlsh]
+    sys.argv = ['cassandra_range_repair.py'] + argv
+    repair.main()
+
+
+# --- Setup ---
+
+def build_ring(nodes, vnodes, datacenters, racks, seed):
+    """Places `nodes` nodes round-robin over datacenters and racks, each with `vnodes` random tokens."""
+    rng = random.Random(seed)
+    entries = []
+    for n in range(nodes):
+        dc, index = n % datacenters, n // datacenters
+        address = f"10.{dc}.{index // 250}.{index % 250 + 1}"
+        for _ in range(vnodes):
+            entries.append(RingEntry(address, rng.randint(MIN_TOKEN, MAX_TOKEN), f"dc{dc + 1}", f"rack{index % racks + 1}"))
+    return entries
+
+def write_stand_ins(workdir, spec):
+    """Writes the ring spec and the nodetool and cqlsh wrappers put first on PATH."""
+    with open(os.path.join(workdir, 'spec.json'), 'w') as f:
+        json.dump(spec, f)
+    bin_dir = os.path.join(workdir, 'bin')
+    os.makedirs(bin_dir, exist_ok=True)
+    for name, command in (('nodetool', 'fake-nodetool'), ('cqlsh', 'fake-cqlsh')):
+        path = os.path.join(bin_dir, name)
+        with open(path, 'w') as f:
+            f.write(f"#!/bin/sh\nexec {shlex.quote(sys.executable)} {shlex.quote(os.path.realpath(__file__))} "
+                    f"{command} \"$@\"\n")
+        os.chmod(path, 0o755)
+    os.makedirs(os.path.join(workdir, 'inflight'), exist_ok=True)
+
+def write_sstable(directory, generation, size, compressibility, rng):
+    """Writes the components of one SSTable, with a Data.db of `size` bytes and its CRC32 digest."""
+    prefix = os.path.join(directory, f"nb-{generation}-big-")
+    random_size = int(BLOCK_SIZE * (1 - compressibility))
+    filler = b'cassandra-benchmark-row ' * (BLOCK_SIZE // 24 + 1)
+    crc, written = 0, 0
+    with open(prefix + 'Data.db', 'wb') as f:
+        while written < size:
+            block = (rng.randbytes(random_size) + filler[:BLOCK_SIZE - random_size])[:size - written]
+            f.write(block)
+            crc = zlib.crc32(block, crc)
+            written += len(block)
+    with open(prefix + 'Digest.crc32', 'w') as f:
+        f.write(str(crc))
+    for component, component_size in (('Index.db', size // 50), ('Filter.db', size // 200), ('Statistics.db', 4096)):
+        with open(prefix + component, 'wb') as f:
+            f.write(rng.randbytes(component_size))
+    with open(prefix + 'TOC.txt', 'w') as f:
+        f.write('Data.db\nDigest.crc32\nIndex.db\nFilter.db\nStatistics.db\nTOC.txt\n')
+
+def generate_snapshots(data_dir, keyspaces, tables, table_size, sstables, compressibility, seed):
+    """Creates snapshot directories for the backup suites, reusing ones made with the same options.
+
+    Returns the schema mapping of '<keyspace>.<table>' to table directory.
+    """
+    params = {'keyspaces': keyspaces, 'tables': tables, 'table_size': table_size, 'sstables': sstables,
+              'compressibility': compressibility, 'seed': seed}
+    params_file = os.path.join(data_dir, 'benchmark.json')
+    try:
+        with open(params_file) as f:
+            existing = json.load(f)
+        if existing['params'] == params:
+            return existing['schema_map']
+    except (IOError, OSError, ValueError, KeyError):
+        pass
+
+    shutil.rmtree(data_dir, ignore_errors=True)
+    rng = random.Random(seed)
+    schema_map = {}
+    for t in range(tables):
+        keyspace, table = keyspaces[t % len(keyspaces)], f"table{t + 1}"
+        table_dir = f"{table}-{rng.getrandbits(128):032x}"
+        snapshot_dir = os.path.join(data_dir, keyspace, table_dir, 'snapshots', BENCH_TAG)
+        os.makedirs(snapshot_dir)
+        # Uneven SSTable sizes, as compaction leaves them.
+        weights = [2 ** i for i in range(sstables)]
+        for generation, weight in enumerate(weights, 1):
+            write_sstable(snapshot_dir, generation, table_size * weight // sum(weights), compressibility, rng)
+        schema_map[f"{keyspace}.{table}"] = table_dir
+    with open(params_file, 'w') as f:
+        json.dump({'params': params, 'schema_map': schema_map}, f)
+    return schema_map
+
+
+# --- Runs ---
+
+def run_measured(command, log_path, env):
+    """Runs a command to completion, returning (exit code, wall seconds, peak RSS in bytes)."""
+    with open(log_path, 'wb') as log:
+        start = time.monotonic()
+        process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT, env=env)
+        # wait4() reports the peak RSS of this child alone.
+        _, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.monotonic() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return process.returncode, elapsed, usage.ru_maxrss * 1024
+
+def read_repairs(workdir):
+    try:
+        with open(os.path.join(workdir, 'repairs.jsonl')) as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except (IOError, OSError):
+        return []
+
+
+class Benchmark:
+    """Runs the suites in a work directory holding the stand-ins, data and object store."""
+
+    def __init__(self, args, workdir):
+        self.args = args
+        self.workdir = workdir
+        self.files_dir = FILES_DIR
+        self.store_dir = os.path.join(workdir, 'store')
+        self.store_url = f"file://{self.store_dir}"
+        if args.store_latency_ms:
+            self.store_url += f"?latency_ms={args.store_latency_ms:g}"
+        self.config_file = os.path.join(workdir, 'config.json')
+        self.schema_map_file = os.path.join(workdir, 'schema_mapping.json')
+        self.log_dir = os.path.join(workdir, 'logs')
+        self.env = dict(os.environ, PATH=f"{os.path.join(workdir, 'bin')}{os.pathsep}{os.environ.get('PATH', '')}")
+        self.env[SPEC_ENV] = os.path.join(workdir, 'spec.json')
+        self.keyspaces = [f"bench_ks{i + 1}" for i in range(args.keyspaces)]
+        self.tables = 0
+        self.raw_bytes = 0
+        self.backed_up = False
+
+    def setup(self, suites):
+        os.makedirs(self.log_dir, exist_ok=True)
+        ring = build_ring(self.args.nodes, self.args.vnodes, self.args.datacenters, self.args.racks, self.args.seed)
+        spec = {
+            'ring': [list(entry) for entry in ring],
+            'local_address': ring[0].address,
+            'replication': {f"dc{dc + 1}": self.args.replication_factor for dc in range(self.args.datacenters)},
+            'keyspaces': self.keyspaces,
+            'repair_latency': self.args.repair_latency,
+            'repair_jitter': self.args.repair_jitter,
+            'repair_contention': self.args.repair_contention,
+            'repair_failure_rate': self.args.repair_failure_rate,
+            'seed': self.args.seed,
+            'workdir': self.workdir,
+        }
+        write_stand_ins(self.workdir, spec)
+        self.local_address = ring[0].address
+        if 'repair' in suites:
+            logging.info("Ring: %d nodes in %d datacenter(s), %d tokens each; repairing %d ranges of %s in %d keyspace(s).",
+                         self.args.nodes, self.args.datacenters, self.args.vnodes, self.args.vnodes,
+                         self.local_address, len(self.keyspaces))
+
+        if set(suites) & {'backup', 'restore', 'verify'}:
+            data_dir = os.path.join(self.workdir, 'data')
+            start = time.time()
+            schema_map = generate_snapshots(data_dir, self.keyspaces, self.args.tables, self.args.table_size_mb * MIB,
+                                            self.args.sstables_per_table, self.args.compressibility, self.args.seed)
+            with open(self.schema_map_file, 'w') as f:
+                json.dump(schema_map, f)
+            with open(self.config_file, 'w') as f:
+                json.dump({'cassandra_data_dir': data_dir, 'encryption_key': BENCH_PASSPHRASE,
+                           's3_bucket_name': 'benchmark', 'parallelism': 4}, f)
+            self.tables = len(schema_map)
+            self.raw_bytes = directory_size(data_dir) - os.path.getsize(os.path.join(data_dir, 'benchmark.json'))
+            logging.info("Snapshot data: %d tables, %s (ready in %.1fs).", self.tables, format_bytes(self.raw_bytes),
+                         time.time() - start)
+
+    def _script(self, name):
+        return [sys.executable, os.path.join(self.files_dir, name)]
+
+    def _extra(self, suite):
+        return shlex.split(getattr(self.args, f"{suite}_args") or '')
+
+    def _backup_command(self):
+        return self._script('cassandra_backup_engine.py') + [
+            'backup', '--tag', BENCH_TAG, '--config', self.config_file, '--store', self.store_url,
+            '--prefix', f"{BENCH_HOST}/{BENCH_TAG}", '--dedup-prefix', f"_sstables/{BENCH_HOST}",
+        ] + self._extra('backup')
+
+    def _write_manifest(self):
+        # full-backup-to-s3.sh writes the manifest after the engine; the restore chain needs it.
+        path = os.path.join(self.store_dir, BENCH_HOST, BENCH_TAG, 'backup_manifest.json')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({'backup_type': 'full', 'timestamp_utc': BENCH_TAG, 'tables_backed_up_count': self.tables}, f)
+
+    def ensure_backup(self):
+        """Makes the backup the restore and verify suites read, if no backup run has."""
+        if self.backed_up:
+            return True
+        shutil.rmtree(self.store_dir, ignore_errors=True)
+        exit_code, _, _ = run_measured(self._backup_command(), os.path.join(self.log_dir, 'backup-setup.log'), self.env)
+        if exit_code != 0:
+            logging.error("The backup for the restore and verify suites failed; see %s.",
+                          os.path.join(self.log_dir, 'backup-setup.log'))
+            return False
+        self._write_manifest()
+        self.backed_up = True
+        return True
+
+    def run(self, suite, number):
+        log_path = os.path.join(self.log_dir, f"{suite}-{number}.log")
+        steps, failed_steps, size = self.tables, 0, None
+
+        if suite == 'repair':
+            shutil.rmtree(os.path.join(self.workdir, 'repair'), ignore_errors=True)
+            if os.path.exists(os.path.join(self.workdir, 'repairs.jsonl')):
+                os.remove(os.path.join(self.workdir, 'repairs.jsonl'))
+            command = [sys.executable, os.path.realpath(__file__), 'repair-runner', self.workdir, '--local-ip', self.local_address]
+            if len(self.keyspaces) == 1:
+                command.append(self.keyspaces[0])
+            exit_code, seconds, peak_rss = run_measured(command + self._extra('repair'), log_path, self.env)
+            repairs = read_repairs(self.workdir)
+            steps, failed_steps = len(repairs), sum(1 for r in repairs if r['failed'])
+        elif suite == 'backup':
+            shutil.rmtree(self.store_dir, ignore_errors=True)
+            exit_code, seconds, peak_rss = run_measured(self._backup_command(), log_path, self.env)
+            size = self.raw_bytes
+            if exit_code == 0:
+                self._write_manifest()
+                self.backed_up = True
+        elif suite == 'restore':
+            output_dir = os.path.join(self.workdir, 'restore')
+            shutil.rmtree(output_dir, ignore_errors=True)
+            command = self._script('cassandra_restore_engine.py') + [
+                'restore', '--source-host', BENCH_HOST, '--chain', BENCH_TAG, '--schema-map', self.schema_map_file,
+                '--output-dir', output_dir, '--config', self.config_file, '--store', self.store_url,
+            ] + self._extra('restore')
+            exit_code, seconds, peak_rss = run_measured(command, log_path, self.env)
+            size = directory_size(output_dir)
+            shutil.rmtree(output_dir, ignore_errors=True)
+        else:
+            catalog = os.path.join(self.workdir, 'catalog.db')
+            for path in (catalog, f"{catalog}-wal", f"{catalog}-shm"):
+                if os.path.exists(path):
+                    os.remove(path)
+            command = self._script('cassandra_backup_verify.py') + [
+                'verify', '--host', BENCH_HOST, '--config', self.config_file, '--store', self.store_url,
+                '--catalog-file', catalog,
+            ] + self._extra('verify')
+            exit_code, seconds, peak_rss = run_measured(command, log_path, self.env)
+            size = directory_size(os.path.join(self.store_dir, BENCH_HOST))
+
+        if exit_code != 0 and suite != 'repair':
+            # A failed run moved no meaningful amount of data.
+            steps, size = 0, None
+        return BenchmarkRun(suite, number, exit_code, seconds, steps, failed_steps, size, peak_rss, log_path)
+
+
+def summarize(suite, runs):
+    """Aggregates the runs of a suite, using the median wall time."""
+    seconds = statistics.median(r.seconds for r in runs)
+    steps = statistics.median(r.steps for r in runs)
+    sizes = [r.bytes for r in runs if r.bytes is not None]
+    return {
+        'suite': suite,
+        'runs': len(runs),
+        'seconds': round(seconds, 3),
+        'steps': steps,
+        'failed_steps': max(r.failed_steps for r in runs),
+        'steps_per_second': round(steps / max(seconds, 0.001), 2),
+        'bytes': int(statistics.median(sizes)) if sizes else None,
+        'mib_per_second': round(statistics.median(sizes) / MIB / max(seconds, 0.001), 1) if sizes else None,
+        'peak_rss_bytes': max(r.peak_rss for r in runs),
+        'exit_codes': [r.exit_code for r in runs],
+    }
+
+def print_report(summaries):
+    header = ('SUITE', 'RUNS', 'WALL(s)', 'STEPS', 'STEPS/s', 'MiB', 'MiB/s', 'PEAK_RSS(MiB)', 'FAILED', 'EXIT')
+    rows = [header]
+    for s in summaries:
+        rows.append((s['suite'], str(s['runs']), f"{s['seconds']:.2f}", f"{s['steps']:g}", f"{s['steps_per_second']:.2f}",
+                     '-' if s['bytes'] is None else f"{s['bytes'] / MIB:.1f}",
+                     '-' if s['mib_per_second'] is None else f"{s['mib_per_second']:.1f}",
+                     f"{s['peak_rss_bytes'] / MIB:.1f}", str(s['failed_steps']),
+                     ','.join(str(code) for code in s['exit_codes'])))
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    for row in rows:
+        print('  '.join(value.ljust(width) for value, width in zip(row, widths)).rstrip())
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] in ('fake-nodetool', 'fake-cqlsh', 'repair-runner'):
+        # Internal entry points of the stand-ins; see write_stand_ins() and Benchmark.run().
+        if sys.argv[1] == 'fake-nodetool':
+            sys.exit(fake_nodetool(sys.argv[2:]))
+        if sys.argv[1] == 'fake-cqlsh':
+            sys.exit(fake_cqlsh(sys.argv[2:]))
+        repair_runner(sys.argv[2], sys.argv[3:])
+
+    parser = argparse.ArgumentParser(description='Benchmarks the repair, backup, restore and verification scripts against a simulated nodetool and object store.')
+    parser.add_argument('suites', nargs='*', default=['all'], help="Suites to run: 'repair', 'backup', 'restore', 'verify' or 'all' (default).")
+    parser.add_argument('--repeat', type=int, default=1, help='Optional: Runs of each suite; the median is reported. Default: 1.')
+    parser.add_argument('--workdir', help='Optional: Directory for the stand-ins, snapshot data and object store. It is kept, and its snapshot data reused by later runs with the same options. Default: a temporary directory, removed afterwards.')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+    parser.add_argument('--seed', type=int, default=1, help='Optional: Seed for tokens, data and simulated latencies and failures. Default: 1.')
+    ring = parser.add_argument_group('simulated cluster (repair)')
+    ring.add_argument('--nodes', type=int, default=6, help='Optional: Nodes in the ring. Default: 6.')
+    ring.add_argument('--vnodes', type=int, default=16, help='Optional: Tokens per node. Default: 16.')
+    ring.add_argument('--datacenters', type=int, default=1, help='Optional: Datacenters the nodes are spread over. Default: 1.')
+    ring.add_argument('--racks', type=int, default=3, help='Optional: Racks per datacenter. Default: 3.')
+    ring.add_argument('--replication-factor', type=int, default=3, help='Optional: Replicas per datacenter. Default: 3.')
+    ring.add_argument('--keyspaces', type=int, default=2, help='Optional: Keyspaces to repair, and to spread the backup tables over. Default: 2.')
+    ring.add_argument('--repair-latency', type=float, default=0.2, help='Optional: Seconds a range repair of average size takes; ranges take time in proportion to their size. Default: 0.2.')
+    ring.add_argument('--repair-jitter', type=float, default=0.2, help='Optional: Random variation of repair durations, as a fraction. Default: 0.2.')
+    ring.add_argument('--repair-contention', type=float, default=0.0, help='Optional: Slowdown of a repair per other repair running at the same time, as a fraction. Default: 0.')
+    ring.add_argument('--repair-failure-rate', type=float, default=0.0, help='Optional: Fraction of range repairs that fail. Default: 0.')
+    ring.add_argument('--repair-args', help="Optional: Extra cassandra_range_repair.py options, e.g. --repair-args='--parallel 4 --segment-seconds 1'.")
+    data = parser.add_argument_group('synthetic data (backup, restore, verify)')
+    data.add_argument('--tables', type=int, default=8, help='Optional: Tables in the snapshot. Default: 8.')
+    data.add_argument('--table-size-mb', type=int, default=8, help='Optional: Data.db bytes per table, in MiB. Default: 8.')
+    data.add_argument('--sstables-per-table', type=int, default=4, help='Optional: SSTables per table, of doubling sizes. Default: 4.')
+    data.add_argument('--compressibility', type=float, default=0.5, help='Optional: Fraction of the data that compresses away (0-1). Default: 0.5.')
+    data.add_argument('--store-latency-ms', type=float, default=0, help='Optional: Milliseconds added to every object store request. Default: 0.')
+    data.add_argument('--backup-args', help="Optional: Extra cassandra_backup_engine.py options, e.g. --backup-args='--upload-threads 16 --dedup'.")
+    data.add_argument('--restore-args', help="Optional: Extra cassandra_restore_engine.py options, e.g. --restore-args='--download-threads 16'.")
+    data.add_argument('--verify-args', help="Optional: Extra cassandra_backup_verify.py options, e.g. --verify-args='--parallelism 8'.")
+    args = parser.parse_args()
+
+    unknown = [s for s in args.suites if s not in SUITES + ('all',)]
+    if unknown:
+        parser.error(f"Unknown suite(s) {', '.join(unknown)}. Choose from {', '.join(SUITES)} or all.")
+    suites = list(SUITES) if 'all' in args.suites else [s for s in SUITES if s in args.suites]
+    if args.repeat < 1 or args.nodes < 1 or args.vnodes < 1 or args.keyspaces < 1 or args.tables < 1:
+        parser.error('--repeat, --nodes, --vnodes, --keyspaces and --tables must be at least 1.')
+    if not 0 <= args.compressibility < 1:
+        parser.error('--compressibility must be at least 0 and below 1.')
+    if args.datacenters < 1 or args.nodes < args.datacenters:
+        parser.error('--datacenters must be at least 1 and at most --nodes.')
+
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix='cassandra-benchmark-')
+    try:
+        os.makedirs(workdir, exist_ok=True)
+        benchmark = Benchmark(args, workdir)
+        benchmark.setup(suites)
+    except (IOError, OSError) as e:
+        logging.error("Could not set up the benchmark in %s: %s", workdir, e)
+        sys.exit(2)
+
+    summaries, failed = [], False
+    try:
+        for suite in suites:
+            if suite in ('restore', 'verify') and not benchmark.ensure_backup():
+                sys.exit(2)
+            runs = []
+            for number in range(1, args.repeat + 1):
+                run = benchmark.run(suite, number)
+                runs.append(run)
+                logging.info("%s run %d: exit %d in %.2fs, %d steps (%d failed), peak RSS %s.", suite, number,
+                             run.exit_code, run.seconds, run.steps, run.failed_steps, format_bytes(run.peak_rss))
+                # A repair run is expected to fail if failures were injected.
+                if run.exit_code != 0 and not (suite == 'repair' and run.failed_steps):
+                    logging.error("%s run %d failed; see %s.", suite, number, run.log)
+                    failed = True
+            summaries.append(summarize(suite, runs))
+    finally:
+        if args.workdir:
+            pass
+        elif failed:
+            logging.info("Keeping %s for its logs.", workdir)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps({'options': {k: v for k, v in vars(args).items() if k not in ('json', 'suites')},
+                          'suites': summaries}, indent=2))
+    else:
+        print_report(summaries)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
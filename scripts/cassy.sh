@@ -26,6 +26,14 @@ ROLLING_OP=""
 INTER_NODE_HEALTH_CHECK=false
 CONTINUE_ON_ERROR=false
 INTERACTIVE_MODE=false
+WAVE_BY=""
+WAVE_SIZE=1
+TOPOLOGY_FILE=""
+STREAM_OUTPUT=false
+# The asyncio executor next to this script runs the nodes when python3 is available;
+# otherwise the bash fan-out below is used.
+EXECUTOR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)/cassy_exec.py"
+USE_EXECUTOR=false
 
 # --- Color Codes ---
 RED=$'\033[0;31m'
@@ -99,6 +107,7 @@ usage() {
     printf "$fmt_long" "${BLUE}--retries ${CYAN}<N>${NC}" "Number of times to retry a failed command. Default: 0."
     printf "$fmt_long" "${BLUE}--timeout ${CYAN}<seconds>${NC}" "Set a timeout for the command on each node. Default: 0 (none)."
     printf "$fmt_short" "${BLUE}--continue-on-error${NC}" "In sequential mode, do not abort if a node fails."
+    printf "$fmt_short" "${BLUE}--stream${NC}" "Print output lines as they arrive, prefixed with the node."
     echo
     
     echo -e "${BOLD}Safety & Rolling Operations:${NC}"
@@ -107,6 +116,9 @@ usage() {
     printf "$fmt_long" "${BLUE}--rolling-op ${CYAN}<type>${NC}" "Perform a predefined Cassandra rolling operation: 'restart', 'reboot', or 'puppet'."
     printf "$fmt_short" "" "${YELLOW}This enforces sequential execution with a built-in health check.${NC}"
     printf "$fmt_long" "${BLUE}--inter-node-check ${CYAN}<path>${NC}" "For generic rolling ops, run a local check script after each node."
+    printf "$fmt_long" "${BLUE}--wave-by ${CYAN}<node|rack>${NC}" "Rolling waves: one node at a time (default), or one rack per DC at a time."
+    printf "$fmt_long" "${BLUE}--wave-size ${CYAN}<N>${NC}" "With --wave-by rack: nodes of the rack in each wave. Default: 1."
+    printf "$fmt_long" "${BLUE}--topology-file ${CYAN}<path>${NC}" "With --wave-by rack: 'node dc rack' lines, instead of asking each node."
     printf "$fmt_long" "${BLUE}--pre-exec-check ${CYAN}<path>${NC}" "Run a local script before any node is touched."
     printf "$fmt_long" "${BLUE}--post-exec-check ${CYAN}<path>${NC}" "Run a local script after all nodes have been touched."
     echo
@@ -126,6 +138,10 @@ usage() {
     echo -e "   # Uses the --rolling-op shortcut with a built-in, Cassandra-specific health check."
     echo -e "   $0 --rolling-op restart --qv-query \"-r role_cassandra_pfpt -d AWSLAB\""
     echo
+    echo -e "${BOLD}1b. Rack-Aware Rolling Restart${NC}"
+    echo -e "   # Restarts two nodes of one rack per datacenter at a time; quorum holds since replicas are on distinct racks."
+    echo -e "   $0 --rolling-op restart --wave-by rack --wave-size 2 --qv-query \"-r role_cassandra_pfpt\""
+    echo
     echo -e "${BOLD}2. Safe Rolling Operation for a Custom Command (Generic)${NC}"
     echo -e "   # First, create your health check script (e.g., my_check.sh):"
     echo -e "   #   #!/bin/bash"
@@ -187,6 +203,10 @@ while [[ "$#" -gt 0 ]]; do
         --post-exec-check) POST_EXEC_CHECK="$2"; shift ;;
         --inter-node-check) INTER_NODE_CHECK_SCRIPT="$2"; shift ;;
         --continue-on-error) CONTINUE_ON_ERROR=true ;;
+        --wave-by) WAVE_BY="$2"; shift ;;
+        --wave-size) WAVE_SIZE="$2"; shift ;;
+        --topology-file) TOPOLOGY_FILE="$2"; shift ;;
+        --stream) STREAM_OUTPUT=true ;;
         -h|--help) usage ;;
         *) log_error "Unknown parameter passed: $1"; usage; exit 1 ;;
     esac
@@ -244,6 +264,22 @@ if [ "$CONTINUE_ON_ERROR" = true ] && [ "$PARALLEL" = true ]; then
     log_error "--continue-on-error can only be used in sequential mode (without --parallel)."
     usage; exit 1;
 fi
+if [ -n "$WAVE_BY" ]; then
+    if [[ "$WAVE_BY" != "node" && "$WAVE_BY" != "rack" ]]; then log_error "--wave-by must be 'node' or 'rack'."; exit 1; fi
+    if [ "$PARALLEL" = true ]; then
+        log_error "--wave-by can only be used in sequential mode (without --parallel)."
+        usage; exit 1;
+    fi
+fi
+if [[ ! "$WAVE_SIZE" =~ ^[1-9][0-9]*$ ]]; then log_error "Wave size must be a positive integer."; exit 1; fi
+if [ -n "$TOPOLOGY_FILE" ] && [ ! -f "$TOPOLOGY_FILE" ]; then log_error "Topology file not found: $TOPOLOGY_FILE"; exit 1; fi
+
+if [ -f "$EXECUTOR" ] && command -v python3 &> /dev/null; then
+    USE_EXECUTOR=true
+elif [ -n "$WAVE_BY" ] || [ "$STREAM_OUTPUT" = true ]; then
+    log_error "--wave-by and --stream need python3 and ${EXECUTOR}."
+    exit 1
+fi
 
 
 if [ -n "$OUTPUT_DIR" ]; then
@@ -349,8 +385,8 @@ if [ -n "$PRE_EXEC_CHECK" ]; then
     log_success "Pre-execution check passed."
 fi
 
-# Pre-flight health check for rolling operations
-if [ "$INTER_NODE_HEALTH_CHECK" = true ] && [ "$DRY_RUN" = false ]; then
+# Pre-flight health check for rolling operations (the executor runs its own)
+if [ "$INTER_NODE_HEALTH_CHECK" = true ] && [ "$DRY_RUN" = false ] && [ "$USE_EXECUTOR" = false ]; then
     log_info "--- Running Pre-Rolling Operation Master Health Check ---"
     if ! _run_health_check "${NODES[0]}"; then
         log_error "Initial health check on node ${NODES[0]} failed. Aborting rolling operation before it starts."
@@ -369,9 +405,53 @@ if [ "$DRY_RUN" = true ]; then
     elif [ -n "$SCRIPT_PATH" ]; then
         log_info "Script: $SCRIPT_PATH"
     fi
+    if [ "$WAVE_BY" = "rack" ]; then
+        # Reads each node's rack (or the topology file) and prints the planned waves.
+        python3 "$EXECUTOR" --dry-run --nodes "$(IFS=,; echo "${NODES[*]}")" --command "$COMMAND" --wave-by rack \
+            --wave-size "$WAVE_SIZE" ${SSH_USER:+--user "$SSH_USER"} "--ssh-options=$SSH_OPTIONS" \
+            ${TOPOLOGY_FILE:+--topology-file "$TOPOLOGY_FILE"}
+    fi
     exit 0
 fi
 
+# --- Post-Execution Hook ---
+run_post_exec_check() {
+    if [ -n "$POST_EXEC_CHECK" ]; then
+        log_info "--- Running Post-Execution Check ---"
+        if ! "$POST_EXEC_CHECK"; then
+            # This is a warning, not a fatal error for the whole script run.
+            log_warn "Post-execution check failed."
+        else
+            log_success "Post-execution check passed."
+        fi
+    fi
+}
+
+# --- Asyncio Executor ---
+# Runs the nodes in a sliding window over one multiplexed SSH connection per node,
+# and prints the output, JSON and summary itself.
+if [ "$USE_EXECUTOR" = true ]; then
+    EXEC_ARGS=(--nodes "$(IFS=,; echo "${NODES[*]}")" --timeout "$TIMEOUT" --retries "$RETRIES" "--ssh-options=$SSH_OPTIONS")
+    if [ -n "$COMMAND" ]; then EXEC_ARGS+=(--command "$COMMAND"); else EXEC_ARGS+=(--script "$SCRIPT_PATH"); fi
+    if [ -n "$SSH_USER" ]; then EXEC_ARGS+=(--user "$SSH_USER"); fi
+    if [ "$PARALLEL" = true ]; then EXEC_ARGS+=(--parallel "$PARALLEL_BATCH_SIZE"); fi
+    if [ "$CONTINUE_ON_ERROR" = true ]; then EXEC_ARGS+=(--continue-on-error); fi
+    if [ "$INTER_NODE_HEALTH_CHECK" = true ]; then EXEC_ARGS+=(--health-check); fi
+    if [ -n "$INTER_NODE_CHECK_SCRIPT" ]; then EXEC_ARGS+=(--inter-node-check "$INTER_NODE_CHECK_SCRIPT"); fi
+    if [ -n "$WAVE_BY" ]; then EXEC_ARGS+=(--wave-by "$WAVE_BY" --wave-size "$WAVE_SIZE"); fi
+    if [ -n "$TOPOLOGY_FILE" ]; then EXEC_ARGS+=(--topology-file "$TOPOLOGY_FILE"); fi
+    if [ "$STREAM_OUTPUT" = true ]; then EXEC_ARGS+=(--stream); fi
+    if [ "$JSON_OUTPUT" = true ]; then EXEC_ARGS+=(--json); fi
+    if [ -n "$OUTPUT_DIR" ]; then EXEC_ARGS+=(--output-dir "$OUTPUT_DIR"); fi
+
+    log_info "Target nodes: ${NODES[*]}"
+    log_info "SSH user: ${SSH_USER:-$(whoami)}"
+    executor_rc=0
+    python3 "$EXECUTOR" "${EXEC_ARGS[@]}" || executor_rc=$?
+    run_post_exec_check
+    exit $executor_rc
+fi
+
 # --- JSON/Output Setup ---
 JSON_TEMP_DIR=""
 if [ "$JSON_OUTPUT" = true ]; then
@@ -579,16 +659,7 @@ if [ "$PARALLEL" = true ]; then
     fi
 fi
 
-# --- Post-Execution Hook ---
-if [ -n "$POST_EXEC_CHECK" ]; then
-    log_info "--- Running Post-Execution Check ---"
-    if ! "$POST_EXEC_CHECK"; then
-        # This is a warning, not a fatal error for the whole script run.
-        log_warn "Post-execution check failed."
-    else
-        log_success "Post-execution check passed."
-    fi
-fi
+run_post_exec_check
 
 # --- Final Output ---
 if [ "$JSON_OUTPUT" = true ]; then
@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+#
+# Fleet executor behind cassy.sh.
+# cassy.sh parses its options, discovers the nodes and runs the pre-execution
+# hooks, then hands the execution itself to this script:
+# - Parallel runs use a sliding window: as soon as one node finishes, the next
+#   one starts, instead of waiting for a whole batch to finish.
+# - Every node gets one SSH master connection (OpenSSH ControlMaster) that all
+#   of its commands, retries and health checks are multiplexed over, instead
+#   of a new SSH handshake each time. The masters are closed on exit.
+# - Output is read as it arrives. With --stream each line is printed at once,
+#   prefixed with its node; otherwise each node's output is printed as one
+#   block when the node finishes. Either way it is kept for --json and
+#   --output-dir.
+# - Sequential and rolling runs go in waves. By default a wave is one node.
+#   With --wave-by rack, a wave takes up to --wave-size nodes from a single
+#   rack of each datacenter. NetworkTopologyStrategy places the replicas of a
+#   range on distinct racks, so a wave never takes down more than one replica
+#   of any range in a datacenter and QUORUM/LOCAL_QUORUM stay available.
+#   Datacenters with fewer than 3 racks are done one node at a time.
+#   After each wave, every node in it is health checked before the next wave
+#   starts.
+#
+# --transport local runs every command on this machine through bash, with
+# CASSY_NODE set to the node name, instead of over SSH. It is meant for
+# testing cassy.sh; use --health-command and --topology-file with it.
+#
+# Exit codes: 0 all nodes succeeded, 1 nodes failed, 4 the initial health
+# check of a rolling operation failed.
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shlex
+import shutil
+import sys
+import tempfile
+import time
+from collections import namedtuple, OrderedDict
+from itertools import zip_longest
+
+# --- Constants ---
+HEALTH_COMMAND = 'sudo /usr/local/bin/cass-ops cluster-health --silent'
+HEALTH_RETRIES = 12
+HEALTH_RETRY_DELAY = 15
+RACKDC_FILE = '/etc/cassandra/conf/cassandra-rackdc.properties'
+SSH_CHECK_TIMEOUT = 60  # Seconds allowed for short, non-task SSH commands.
+CONTROL_PERSIST = 600  # Seconds an idle master connection is kept.
+RETRY_DELAY = 3
+MIN_RACKS_FOR_RACK_WAVES = 3
+LINE_LIMIT = 16 * 1024 * 1024  # Longest output line read in one piece.
+
+# --- Color Codes ---
+RED = '\033[0;31m'
+GREEN = '\033[0;32m'
+BOLD = '\033[1m'
+NC = '\033[0m'
+
+# The outcome of a task on one node. `output` is stdout and stderr of the last attempt.
+NodeResult = namedtuple('NodeResult', ['node', 'exit_code', 'output', 'attempts', 'seconds'])
+
+# --- Logging Setup (always to stderr, like cassy.sh) ---
+logging.basicConfig(
+    level=logging.INFO,
+    format='[%(levelname)s] %(message)s',
+    stream=sys.stderr
+)
+
+
+class SSHTransport:
+    """Runs commands on nodes over one multiplexed SSH connection per node."""
+
+    def __init__(self, user=None, ssh_options=''):
+        self.user = user
+        self.ssh_options = shlex.split(ssh_options or '')
+        self.control_dir = tempfile.mkdtemp(prefix='cassy.')
+        self.locks = {}
+        self.opened = set()
+
+    def _ssh(self, node, *extra):
+        target = f"{self.user}@{node}" if self.user else node
+        return (['ssh'] + self.ssh_options +
+                ['-o', f"ControlPath={self.control_dir}/%C"] + list(extra) + [target])
+
+    async def _quiet(self, argv, timeout=SSH_CHECK_TIMEOUT):
+        process = await asyncio.create_subprocess_exec(*argv, stdin=asyncio.subprocess.DEVNULL,
+                                                       stdout=asyncio.subprocess.DEVNULL,
+                                                       stderr=asyncio.subprocess.DEVNULL)
+        try:
+            return await asyncio.wait_for(process.wait(), timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            return 124
+
+    async def connect(self, node):
+        """Makes sure the node has a live master connection, opening one if needed.
+
+        The master is started on its own, detached from any output pipe, since
+        a master started by a command's ssh keeps that command's output open
+        until the master exits. If it cannot be opened (e.g. the node is
+        rebooting), commands fall back to connecting directly.
+        """
+        lock = self.locks.setdefault(node, asyncio.Lock())
+        async with lock:
+            if node in self.opened and await self._quiet(self._ssh(node, '-O', 'check')) == 0:
+                return
+            self.opened.discard(node)
+            code = await self._quiet(self._ssh(node, '-M', '-N', '-f', '-o', 'ControlMaster=yes',
+                                               '-o', f"ControlPersist={CONTROL_PERSIST}",
+                                               '-o', 'ServerAliveInterval=10', '-o', 'ServerAliveCountMax=3'))
+            if code == 0:
+                self.opened.add(node)
+
+    async def start(self, node, command, stdin=False):
+        """Starts a command on a node. Its stdout and stderr are merged into one pipe."""
+        await self.connect(node)
+        return await asyncio.create_subprocess_exec(
+            *self._ssh(node, '-o', 'ControlMaster=no'), command,
+            stdin=asyncio.subprocess.PIPE if stdin else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT, limit=LINE_LIMIT)
+
+    async def close(self):
+        await asyncio.gather(*(self._quiet(self._ssh(node, '-O', 'exit')) for node in self.opened))
+        shutil.rmtree(self.control_dir, ignore_errors=True)
+
+
+class LocalTransport:
+    """Runs 'remote' commands on this machine, with CASSY_NODE set to the node name. For testing."""
+
+    async def start(self, node, command, stdin=False):
+        return await asyncio.create_subprocess_exec(
+            'bash', '-c', command, env=dict(os.environ, CASSY_NODE=node),
+            stdin=asyncio.subprocess.PIPE if stdin else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT, limit=LINE_LIMIT)
+
+    async def close(self):
+        pass
+
+
+class FleetExecutor:
+    """Runs the command or script on nodes and collects each node's output."""
+
+    def __init__(self, transport, command=None, script=None, timeout=0, retries=0, stream=False,
+                 quiet=False, output_dir=None):
+        self.transport = transport
+        self.command = command
+        self.script = None
+        if script:
+            with open(script, 'rb') as f:
+                self.script = f.read()
+        self.timeout = timeout
+        self.retries = retries
+        self.stream = stream
+        self.quiet = quiet  # JSON mode: nothing but the final document on stdout.
+        self.output_dir = output_dir
+
+    async def _run(self, node, command, stdin_data=None, timeout=0, stream=False):
+        """Runs one command, returning (exit_code, output). Exit code 124 means it timed out."""
+        process = await self.transport.start(node, command, stdin=stdin_data is not None)
+        if stdin_data is not None:
+            process.stdin.write(stdin_data)
+            await process.stdin.drain()
+            process.stdin.close()
+        lines = []
+
+        async def read():
+            while True:
+                line = await process.stdout.readline()
+                if not line:
+                    break
+                text = line.decode(errors='replace')
+                lines.append(text)
+                if stream:
+                    sys.stdout.write(f"[{BOLD}{node}{NC}] {text}" + ('' if text.endswith('\n') else '\n'))
+                    sys.stdout.flush()
+            return await process.wait()
+
+        try:
+            code = await asyncio.wait_for(read(), timeout) if timeout > 0 else await read()
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            code = 124
+        return code, ''.join(lines)
+
+    async def _attempt(self, node, attempt):
+        stream = self.stream and not self.quiet
+        if self.command is not None:
+            return await self._run(node, self.command, timeout=self.timeout, stream=stream)
+        remote_path = f"/tmp/cassy_remote_script_{os.getpid()}_{attempt}"
+        code, output = await self._run(node, f"cat > {remote_path} && chmod +x {remote_path}",
+                                       stdin_data=self.script, timeout=SSH_CHECK_TIMEOUT)
+        if code != 0:
+            return code, output
+        return await self._run(node, f"{remote_path}; rc=$?; rm -f {remote_path}; exit $rc", timeout=self.timeout,
+                               stream=stream)
+
+    async def run_task(self, node):
+        """Runs the task on a node, with retries, and prints or saves its output."""
+        start = time.time()
+        for attempt in range(1, self.retries + 2):
+            if attempt > 1:
+                logging.warning("--- [%s] Retrying... (Attempt %d of %d) ---", node, attempt, self.retries + 1)
+                await asyncio.sleep(RETRY_DELAY)
+            code, output = await self._attempt(node, attempt)
+            if code == 0:
+                break
+        result = NodeResult(node, code, output, attempt, round(time.time() - start, 1))
+
+        if self.output_dir:
+            with open(os.path.join(self.output_dir, f"{node}.log"), 'w') as f:
+                f.write(output)
+        if not self.quiet:
+            lines = [] if self.stream else [f"--- [{BOLD}{node}{NC}] START ---", output.rstrip('\n')]
+            if code != 0:
+                lines.append(f"--- [{BOLD}{node}{NC}] {RED}FAILED (Exit Code: {code}){NC} ---")
+            else:
+                lines.append(f"--- [{BOLD}{node}{NC}] {GREEN}OK{NC} ---")
+            print('\n'.join(lines), flush=True)
+        return result
+
+    async def run_window(self, nodes, limit=0):
+        """Runs the task on all nodes, at most `limit` at once (0 for all), starting each as a slot frees up."""
+        semaphore = asyncio.Semaphore(limit or len(nodes) or 1)
+
+        async def run(node):
+            async with semaphore:
+                return await self.run_task(node)
+
+        return await asyncio.gather(*(run(node) for node in nodes))
+
+    async def check(self, node, command):
+        """Runs a short command on a node and returns (exit_code, output)."""
+        try:
+            return await self._run(node, command, timeout=SSH_CHECK_TIMEOUT)
+        except OSError as e:
+            return 255, str(e)
+
+    async def health_check(self, node, command=HEALTH_COMMAND, retries=HEALTH_RETRIES, delay=HEALTH_RETRY_DELAY):
+        """Waits until the node is reachable and reports a healthy cluster, like cassy.sh's health check."""
+        logging.info("--- [Health Check] Verifying stability of %s ---", node)
+        for cycle in range(1, retries + 1):
+            logging.info("  [Health Check] Cycle %d/%d for %s...", cycle, retries, node)
+            code, _ = await self.check(node, "echo 'SSH OK'")
+            if code != 0:
+                logging.warning("    - FAIL: SSH connection to %s failed. Retrying in %ds.", node, delay)
+            else:
+                code, _ = await self.check(node, command)
+                if code == 0:
+                    logging.info("--- [Health Check] SUCCESS: Node %s is healthy and cluster is stable. ---", node)
+                    return True
+                logging.warning("    - FAIL: Health check failed on %s. Retrying in %ds.", node, delay)
+            if cycle < retries:
+                await asyncio.sleep(delay)
+        logging.error("--- [Health Check] CRITICAL: Node %s did not pass health check after %d attempts. ---", node, retries)
+        return False
+
+
+# --- Topology and Waves ---
+
+def parse_rackdc(text):
+    """Reads (dc, rack) from the contents of cassandra-rackdc.properties."""
+    values = {}
+    for line in text.splitlines():
+        key, sep, value = line.partition('=')
+        if sep and not key.strip().startswith('#'):
+            values[key.strip()] = value.strip()
+    return values.get('dc'), values.get('rack')
+
+def read_topology_file(path):
+    """Reads 'node dc rack' lines (whitespace or comma separated) into {node: (dc, rack)}."""
+    topology = {}
+    with open(path) as f:
+        for line in f:
+            fields = line.replace(',', ' ').split()
+            if len(fields) >= 3 and not fields[0].startswith('#'):
+                topology[fields[0]] = (fields[1], fields[2])
+    return topology
+
+async def discover_topology(executor, nodes, limit=0):
+    """Reads each node's datacenter and rack from its cassandra-rackdc.properties."""
+    semaphore = asyncio.Semaphore(limit or len(nodes) or 1)
+
+    async def read(node):
+        async with semaphore:
+            code, output = await executor.check(node, f"cat {RACKDC_FILE}")
+        dc, rack = parse_rackdc(output) if code == 0 else (None, None)
+        return node, (dc, rack) if dc and rack else None
+
+    return dict(await asyncio.gather(*(read(node) for node in nodes)))
+
+def plan_waves(nodes, topology=None, wave_size=1):
+    """Groups nodes into rolling waves.
+
+    Without a topology every node is its own wave. With one, each wave holds
+    up to `wave_size` nodes of a single rack per datacenter, datacenters
+    progressing side by side. Datacenters with too few racks for that to keep
+    quorum go one node at a time.
+    """
+    if topology is None:
+        return [[node] for node in nodes]
+    datacenters = OrderedDict()
+    for node in nodes:
+        dc, rack = topology[node]
+        datacenters.setdefault(dc, OrderedDict()).setdefault(rack, []).append(node)
+    sequences = []
+    for dc, racks in datacenters.items():
+        chunks = []
+        if len(racks) < MIN_RACKS_FOR_RACK_WAVES:
+            logging.warning("Datacenter %s has only %d rack(s); its nodes go one at a time.", dc, len(racks))
+            chunks = [[node] for rack_nodes in racks.values() for node in rack_nodes]
+        else:
+            for rack_nodes in racks.values():
+                chunks.extend(rack_nodes[i:i + wave_size] for i in range(0, len(rack_nodes), wave_size))
+        sequences.append(chunks)
+    return [[node for chunk in wave if chunk for node in chunk] for wave in zip_longest(*sequences)]
+
+
+async def run_local_check(script, node):
+    """Runs a local inter-node check script with the node as its argument."""
+    process = await asyncio.create_subprocess_exec(script, node)
+    return await process.wait() == 0
+
+
+async def execute(args, executor):
+    """Runs the task as requested and returns (results, exit_code)."""
+    nodes = [n.strip() for n in args.nodes.split(',') if n.strip()]
+
+    if args.parallel is not None:
+        logging.info("--- Executing on %d node(s), at most %s at once ---", len(nodes), args.parallel or 'all')
+        results = await executor.run_window(nodes, args.parallel)
+        return results, 0 if all(r.exit_code == 0 for r in results) else 1
+
+    topology = None
+    if args.wave_by == 'rack':
+        if args.topology_file:
+            topology = read_topology_file(args.topology_file)
+        else:
+            logging.info("Reading datacenter and rack of %d node(s)...", len(nodes))
+            topology = await discover_topology(executor, nodes)
+        unknown = [node for node in nodes if not topology.get(node)]
+        if unknown:
+            logging.error("Could not determine the datacenter and rack of: %s. Aborting.", ', '.join(unknown))
+            return [], 1
+    waves = plan_waves(nodes, topology, args.wave_size)
+    if args.wave_by == 'rack' or args.dry_run:
+        logging.info("Planned %d wave(s) for %d node(s):", len(waves), len(nodes))
+        for i, wave in enumerate(waves, 1):
+            logging.info("  Wave %d: %s", i, ', '.join(
+                f"{node} ({'/'.join(topology[node])})" if topology else node for node in wave))
+    if args.dry_run:
+        return [], 0
+
+    if args.health_check:
+        logging.info("--- Running Pre-Rolling Operation Master Health Check ---")
+        if not await executor.health_check(nodes[0], args.health_command):
+            logging.error("Initial health check on node %s failed. Aborting rolling operation before it starts.", nodes[0])
+            return [], 4
+        logging.info("Initial health check passed. Starting rolling operation.")
+
+    results = []
+    for i, wave in enumerate(waves, 1):
+        logging.info("--- Executing wave %d/%d on [%s] ---", i, len(waves), ', '.join(wave))
+        wave_results = await executor.run_window(wave)
+        results.extend(wave_results)
+        failed = [r.node for r in wave_results if r.exit_code != 0]
+        if failed:
+            if not args.continue_on_error:
+                logging.error("Task failed on node(s) %s. Aborting rolling execution.", ', '.join(failed))
+                break
+            logging.warning("Task failed on node(s) %s, but --continue-on-error is set. Proceeding.", ', '.join(failed))
+
+        if args.health_check:
+            healthy = await asyncio.gather(*(executor.health_check(node, args.health_command) for node in wave))
+            unhealthy = [node for node, ok in zip(wave, healthy) if not ok]
+            if unhealthy:
+                logging.error("Internal health check failed after operating on %s. Aborting rolling execution.",
+                              ', '.join(unhealthy))
+                results.extend(NodeResult(node, 1, '', 0, 0) for node in unhealthy if node not in failed)
+                break
+
+        if args.inter_node_check:
+            check_failed = None
+            for node in wave:
+                logging.info("--- Running Custom Inter-Node Check from: %s ---", args.inter_node_check)
+                if not await run_local_check(args.inter_node_check, node):
+                    check_failed = node
+                    break
+            if check_failed:
+                logging.error("Custom inter-node check failed after operating on node %s. Aborting.", check_failed)
+                if check_failed not in failed:
+                    results.append(NodeResult(check_failed, 1, '', 0, 0))
+                break
+            logging.info("Custom inter-node check passed.")
+    return results, 0 if all(r.exit_code == 0 for r in results) else 1
+
+
+async def main_async(args):
+    transport = LocalTransport() if args.transport == 'local' else SSHTransport(args.user, args.ssh_options)
+    try:
+        executor = FleetExecutor(transport, args.command, args.script, args.timeout, args.retries,
+                                 args.stream, args.json, args.output_dir)
+        return await execute(args, executor)
+    finally:
+        await transport.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs a command or script on many nodes. Called by cassy.sh.')
+    parser.add_argument('--nodes', required=True, help='A comma-separated list of target nodes.')
+    parser.add_argument('-c', '--command', help='The shell command to execute on each node.')
+    parser.add_argument('-s', '--script', help='A local script to copy and execute on each node.')
+    parser.add_argument('-l', '--user', help='The SSH user to connect as. Defaults to the current user.')
+    parser.add_argument('--ssh-options', default='', help='Quoted string of additional SSH options.')
+    parser.add_argument('--parallel', type=int, help='Run on all nodes at once, at most N at a time (0 for no limit).')
+    parser.add_argument('--timeout', type=int, default=0, help='Timeout in seconds for the task on each node. Default: 0 (none).')
+    parser.add_argument('--retries', type=int, default=0, help='Number of times to retry a failed task. Default: 0.')
+    parser.add_argument('--continue-on-error', action='store_true', help='In waves, do not abort if a node fails.')
+    parser.add_argument('--health-check', action='store_true', help='Health check each node after its wave, and the first node before starting.')
+    parser.add_argument('--health-command', default=HEALTH_COMMAND, help=f"Command run on a node for the health check. Default: '{HEALTH_COMMAND}'.")
+    parser.add_argument('--inter-node-check', help='A local script run with each node as its argument after its wave.')
+    parser.add_argument('--wave-by', choices=['node', 'rack'], default='node', help="Rolling wave layout: one 'node' at a time, or per 'rack'. Default: node.")
+    parser.add_argument('--wave-size', type=int, default=1, help='With --wave-by rack: nodes per rack in a wave. Default: 1.')
+    parser.add_argument('--topology-file', help="With --wave-by rack: 'node dc rack' lines, instead of reading each node's rackdc properties.")
+    parser.add_argument('--stream', action='store_true', help='Print output lines as they arrive, prefixed with the node.')
+    parser.add_argument('--json', action='store_true', help='Print the results as a JSON array.')
+    parser.add_argument('--output-dir', help="Save each node's output to <dir>/<node>.log.")
+    parser.add_argument('--dry-run', action='store_true', help='Only print the planned waves.')
+    parser.add_argument('--transport', choices=['ssh', 'local'], default=os.environ.get('CASSY_TRANSPORT', 'ssh'),
+                        help='ssh, or local to run commands on this machine for testing. Default: $CASSY_TRANSPORT or ssh.')
+    args = parser.parse_args()
+
+    if (args.command is None) == (args.script is None):
+        parser.error('Specify exactly one of --command or --script.')
+    if args.parallel is not None and (args.health_check or args.inter_node_check or args.wave_by != 'node'):
+        parser.error('Health checks and rolling waves can only be used without --parallel.')
+    if args.wave_size < 1:
+        parser.error('--wave-size must be at least 1.')
+
+    start = time.time()
+    results, exit_code = asyncio.run(main_async(args))
+    if args.dry_run:
+        sys.exit(exit_code)
+
+    # A node appears twice if its task succeeded but a check after its wave failed; the failure counts.
+    by_node = OrderedDict()
+    for result in results:
+        if result.node not in by_node or result.exit_code != 0:
+            by_node[result.node] = result
+    if args.json:
+        print(json.dumps([{'node': r.node, 'status': 'SUCCESS' if r.exit_code == 0 else 'FAILED',
+                           'exit_code': r.exit_code, 'output': r.output.rstrip('\n'), 'attempts': r.attempts,
+                           'duration_seconds': r.seconds} for r in by_node.values()], indent=2))
+        sys.exit(exit_code)
+
+    failed = [r.node for r in by_node.values() if r.exit_code != 0]
+    logging.info("--- Execution Summary (%d node(s) in %.1fs) ---", len(by_node), time.time() - start)
+    if exit_code == 0:
+        logging.info("All nodes completed successfully.")
+    elif failed:
+        logging.error("Execution failed on the following nodes:")
+        for node in failed:
+            print(f"  - {RED}{node}{NC}", file=sys.stderr)
+    sys.exit(exit_code)
+
+
+if __name__ == '__main__':
+    main()
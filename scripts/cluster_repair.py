@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+#
+# Cluster-wide repair coordinator.
+# This script is intended to be run from an external management server (e.g., Jenkins),
+# like cassy.sh. It repairs several nodes at once while making sure that no two
+# concurrent node repairs share a replica.
+#
+# How it works:
+# 1. The replica set of every node (all nodes holding a replica of any of its
+#    primary ranges) is computed on a seed node with 'cassandra_ring.py replica-sets',
+#    from each keyspace's replication in system_schema.keyspaces. Replica sets are
+#    combined over all keyspaces being repaired.
+# 2. Nodes are dispatched as soon as their replica set does not overlap the replica
+#    sets of the nodes currently repairing. Each node runs its own range-repair.sh.
+# 3. Progress is read from each node's /var/lib/repair/status.txt, which is written
+#    by the node-side checkpointing repair tool.
+#
+# With single-token or low-vnode clusters, the total repair time grows with the
+# number of independent replica groups rather than the number of nodes. With 16 or
+# more vnodes, every pair of nodes usually shares a replica, so node-level
+# coordination degrades to one node at a time; the coordinator refuses to run such
+# a plan unless --allow-serial is given.
+
+import argparse
+import json
+import logging
+import os
+import shlex
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+# --- Constants ---
+REMOTE_RING_TOOL = '/usr/local/bin/cassandra_ring.py'
+REMOTE_REPAIR_TOOL = '/usr/local/bin/range-repair.sh'
+REMOTE_STATUS_FILE = '/var/lib/repair/status.txt'
+SSH_CHECK_TIMEOUT = 60  # Seconds allowed for short, non-repair SSH commands.
+
+# --- Logging Setup ---
+logging.basicConfig(
+    level=logging.INFO,
+    format='[%(asctime)s] %(levelname)s: %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S',
+    stream=sys.stderr
+)
+
+# --- Helper Functions ---
+
+def ssh_command(args, node, remote_command):
+    """Builds the ssh command line for running remote_command on a node."""
+    command = ['ssh'] + shlex.split(args.ssh_options or '')
+    target = f"{args.user}@{node}" if args.user else node
+    return command + [target, remote_command]
+
+def run_ssh(args, node, remote_command, timeout=SSH_CHECK_TIMEOUT):
+    """Runs a short command on a node and returns (exit_code, output)."""
+    try:
+        result = subprocess.run(ssh_command(args, node, remote_command), capture_output=True, text=True, timeout=timeout)
+        return result.returncode, result.stdout.strip()
+    except subprocess.TimeoutExpired:
+        return 124, ''
+
+def read_nodes(args):
+    """Collects target nodes from --nodes and --nodes-file, preserving order."""
+    nodes = []
+    if args.nodes:
+        nodes.extend(n.strip() for n in args.nodes.split(',') if n.strip())
+    if args.nodes_file:
+        with open(args.nodes_file) as f:
+            nodes.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+    return list(dict.fromkeys(nodes))
+
+def fetch_replica_sets(args, seed):
+    """Asks the seed node for the replica set of every node in the ring."""
+    remote_command = f"sudo {REMOTE_RING_TOOL} replica-sets --replication {shlex.quote(args.replication)} --max-age 0"
+    if args.keyspace and args.replication == 'schema':
+        remote_command += f" --keyspace {shlex.quote(args.keyspace)}"
+    exit_code, output = run_ssh(args, seed, remote_command)
+    if exit_code != 0:
+        logging.error("Failed to compute replica sets on seed node %s (exit code %d).", seed, exit_code)
+        return None
+    try:
+        return {address: set(members) for address, members in json.loads(output).items()}
+    except (ValueError, AttributeError):
+        logging.error("Seed node %s returned invalid replica set data.", seed)
+        return None
+
+def resolve_address(node, replica_sets):
+    """Maps a node name to its address in the ring, or None if it is not a ring member."""
+    if node in replica_sets:
+        return node
+    try:
+        address = socket.gethostbyname(node)
+    except socket.gaierror:
+        return None
+    return address if address in replica_sets else None
+
+def build_repair_command(args):
+    """Builds the range-repair.sh invocation run on each node."""
+    parts = ['sudo', REMOTE_REPAIR_TOOL]
+    if args.hours > 0:
+        parts += ['--hours', str(args.hours)]
+    if args.node_parallel > 1:
+        parts += ['--parallel', str(args.node_parallel)]
+    if args.segment_seconds > 0:
+        parts += ['--segment-seconds', str(args.segment_seconds)]
+    if args.keyspace:
+        parts.append(args.keyspace)
+    return ' '.join(shlex.quote(p) for p in parts)
+
+
+class ClusterRepairCoordinator:
+    """Dispatches node repairs so that concurrent repairs never overload a replica.
+
+    `nodes` is a list of (name, address) pairs and `replica_sets` maps each
+    address to the set of addresses its repair touches. A node may start only
+    if every member of its replica set takes part in fewer than
+    `max_repairs_per_node` running repairs, and at most `max_concurrent` nodes
+    repair at once.
+    """
+
+    def __init__(self, nodes, replica_sets, max_concurrent=0, max_repairs_per_node=1):
+        self.nodes = list(nodes)
+        self.replica_sets = replica_sets
+        self.max_concurrent = max_concurrent or len(self.nodes)
+        self.max_repairs_per_node = max(1, max_repairs_per_node)
+
+    def _conflicts(self, node, running):
+        """Checks whether a node may not start alongside the running nodes."""
+        load = {}
+        for _, address in running:
+            for member in self.replica_sets[address]:
+                load[member] = load.get(member, 0) + 1
+        return any(load.get(member, 0) >= self.max_repairs_per_node for member in self.replica_sets[node[1]])
+
+    def _next_runnable(self, pending, running):
+        for node in pending:
+            if not self._conflicts(node, running):
+                return node
+        return None
+
+    def plan(self):
+        """Groups the nodes into waves, assuming every node repair takes equally long."""
+        pending = list(self.nodes)
+        waves = []
+        while pending:
+            wave = []
+            while len(wave) < self.max_concurrent:
+                node = self._next_runnable(pending, wave)
+                if node is None:
+                    break
+                wave.append(node)
+                pending.remove(node)
+            waves.append(wave)
+        return waves
+
+    def is_serial(self, waves):
+        """Checks whether a plan repairs one node at a time although concurrency was allowed."""
+        return len(self.nodes) > 1 and self.max_concurrent > 1 and all(len(wave) == 1 for wave in waves)
+
+    def run(self, start_repair, poll_progress, poll_interval):
+        """Runs all node repairs and returns a dict of node name -> exit code.
+
+        `start_repair(node)` runs one node's repair to completion and returns
+        its exit code; it is called on a worker thread. `poll_progress(node)`
+        returns a progress string for a running node.
+        """
+        pending = list(self.nodes)
+        running = {}
+        results = {}
+        finished = threading.Condition()
+
+        def worker(node):
+            exit_code = start_repair(node)
+            with finished:
+                results[node[0]] = exit_code
+                finished.notify()
+
+        last_poll = time.time()
+        while pending or running:
+            to_poll, counts = [], None
+            with finished:
+                while pending and len(running) < self.max_concurrent:
+                    node = self._next_runnable(pending, running.values())
+                    if node is None:
+                        break
+                    pending.remove(node)
+                    logging.info("Starting repair on %s (%s). Replica set: %s", node[0], node[1],
+                                 ', '.join(sorted(self.replica_sets[node[1]])))
+                    thread = threading.Thread(target=worker, args=(node,), daemon=True)
+                    running[node[0]] = node
+                    thread.start()
+
+                # A worker may have finished while progress was being polled.
+                if not any(name in results for name in running):
+                    finished.wait(timeout=max(1, poll_interval - (time.time() - last_poll)))
+
+                for name in [n for n in running if n in results]:
+                    node = running.pop(name)
+                    if results[name] == 0:
+                        logging.info("Repair finished on %s.", name)
+                    else:
+                        logging.error("Repair failed on %s with exit code %d.", name, results[name])
+
+                if time.time() - last_poll >= poll_interval:
+                    last_poll = time.time()
+                    to_poll = list(running.values())
+                    counts = (len(running), len(pending), len(results))
+
+            # Progress polls are SSH round trips; keep them outside the lock so
+            # finishing workers are not held up behind them.
+            if counts:
+                for node in to_poll:
+                    logging.info("[%s] %s", node[0], poll_progress(node) or 'No progress reported yet.')
+                logging.info("Progress: %d running, %d pending, %d finished.", *counts)
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="""Repairs a whole cluster by running the node-side range repair on several nodes at once.
+                       Nodes whose replica sets overlap are never repaired at the same time."""
+    )
+    parser.add_argument('-n', '--nodes', help='A comma-separated list of target node hostnames or IPs.')
+    parser.add_argument('-f', '--nodes-file', help='A file containing a list of target nodes, one per line.')
+    parser.add_argument('-l', '--user', help='The SSH user to connect as. Defaults to the current user.')
+    parser.add_argument('--ssh-options', help='Quoted string of additional options for the SSH command (e.g., "-i /path/key.pem").')
+    parser.add_argument('--seed', help='Node used to read the token ring. Defaults to the first target node.')
+    parser.add_argument('--replication', default='schema',
+                        help="Replication used to compute replica sets: 'schema' (each keyspace's replication from "
+                             "system_schema.keyspaces), or an override applied to every keyspace: an RF, or 'dc1:3,dc2:3'. Default: schema.")
+    parser.add_argument('--max-concurrent', type=int, default=0, help='Maximum number of nodes repairing at once. Default: 0 (limited only by replica sets).')
+    parser.add_argument('--max-repairs-per-node', type=int, default=1, help='Maximum concurrent node repairs any replica may take part in. Default: 1.')
+    parser.add_argument('--keyspace', help='Repair only this keyspace. Default: all non-system keyspaces.')
+    parser.add_argument('--hours', type=float, default=0, help='Passed to range-repair.sh: spread each node repair over this many hours.')
+    parser.add_argument('--node-parallel', type=int, default=1, help='Passed to range-repair.sh as --parallel: concurrent range repairs per node. Default: 1.')
+    parser.add_argument('--segment-seconds', type=float, default=0, help='Passed to range-repair.sh: target duration of each repair segment. Default: 0 (whole ranges).')
+    parser.add_argument('--poll-interval', type=int, default=60, help='Seconds between progress polls of running nodes. Default: 60.')
+    parser.add_argument('--log-dir', help='Directory for per-node repair output. Default: ./cluster-repair-<timestamp>.')
+    parser.add_argument('--allow-serial', action='store_true', help='Run even if every pair of nodes shares a replica, so nodes are repaired one at a time.')
+    parser.add_argument('--dry-run', action='store_true', help='Show the replica sets and planned waves without repairing.')
+    args = parser.parse_args()
+
+    nodes = read_nodes(args)
+    if not nodes:
+        parser.error('No target nodes given. Use --nodes or --nodes-file.')
+
+    seed = args.seed or nodes[0]
+    logging.info("Computing replica sets on seed node %s (replication: %s)...", seed, args.replication)
+    replica_sets = fetch_replica_sets(args, seed)
+    if not replica_sets:
+        sys.exit(1)
+
+    targets = []
+    for node in nodes:
+        address = resolve_address(node, replica_sets)
+        if not address:
+            logging.error("Node %s is not part of the token ring seen by %s. Aborting.", node, seed)
+            sys.exit(1)
+        targets.append((node, address))
+
+    coordinator = ClusterRepairCoordinator(targets, replica_sets, args.max_concurrent, args.max_repairs_per_node)
+    waves = coordinator.plan()
+    logging.info("Planned %d wave(s) for %d node(s):", len(waves), len(targets))
+    for i, wave in enumerate(waves, 1):
+        logging.info("  Wave %d: %s", i, ', '.join(name for name, _ in wave))
+
+    serial = coordinator.is_serial(waves)
+    if serial:
+        largest = max(len(replica_sets[address]) for _, address in targets)
+        logging.warning("=" * 78)
+        logging.warning("Every pair of target nodes shares a replica (largest replica set: %d of %d ring nodes).",
+                        largest, len(replica_sets))
+        logging.warning("Node-level coordination can only repair ONE node at a time. This is expected with vnodes.")
+        logging.warning("Raise --max-repairs-per-node to let replicas take part in more repairs, or use")
+        logging.warning("--allow-serial to accept a serial repair of %d nodes.", len(targets))
+        logging.warning("=" * 78)
+
+    repair_command = build_repair_command(args)
+    if args.dry_run:
+        for name, address in targets:
+            logging.info("  %s (%s) replica set: %s", name, address, ', '.join(sorted(replica_sets[address])))
+        logging.info("Dry run: would execute '%s' on each node.", repair_command)
+        sys.exit(0)
+
+    if serial and not args.allow_serial:
+        logging.error("Refusing to run a fully serial cluster repair without --allow-serial.")
+        sys.exit(1)
+
+    log_dir = args.log_dir or f"cluster-repair-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    os.makedirs(log_dir, exist_ok=True)
+    logging.info("Per-node repair output is written to %s/.", log_dir)
+
+    def start_repair(node):
+        with open(os.path.join(log_dir, f"{node[0]}.log"), 'w') as log_file:
+            process = subprocess.Popen(ssh_command(args, node[0], repair_command), stdout=log_file, stderr=subprocess.STDOUT)
+            return process.wait()
+
+    def poll_progress(node):
+        exit_code, output = run_ssh(args, node[0], f"cat {REMOTE_STATUS_FILE}")
+        return output if exit_code == 0 else None
+
+    start_time = time.time()
+    results = coordinator.run(start_repair, poll_progress, args.poll_interval)
+    elapsed_hours = (time.time() - start_time) / 3600
+
+    failed = sorted(name for name, code in results.items() if code != 0)
+    if failed:
+        logging.error("Cluster repair finished in %.2f hours with %d failed node(s): %s", elapsed_hours, len(failed), ', '.join(failed))
+        sys.exit(1)
+    logging.info("Cluster repair finished successfully on all %d nodes in %.2f hours.", len(results), elapsed_hours)
+
+
+if __name__ == '__main__':
+    main()
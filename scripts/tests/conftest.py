@@ -0,0 +1,7 @@
+# Tests for the Python operator scripts in scripts/. They run offline, with
+# the local transport in place of SSH.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,61 @@
+import asyncio
+
+from cassy_exec import FleetExecutor, LocalTransport, parse_rackdc, plan_waves
+
+
+def test_parse_rackdc():
+    assert parse_rackdc("# dc=commented\ndc = dc1\nrack=r2\nprefer_local=true\n") == ('dc1', 'r2')
+    assert parse_rackdc('') == (None, None)
+
+
+def test_plan_waves_without_a_topology_goes_one_node_at_a_time():
+    assert plan_waves(['a', 'b', 'c']) == [['a'], ['b'], ['c']]
+
+
+def test_plan_waves_takes_one_rack_per_datacenter_at_a_time():
+    topology = {
+        'a1': ('dc1', 'r1'), 'a2': ('dc1', 'r1'), 'a3': ('dc1', 'r1'),
+        'b1': ('dc1', 'r2'), 'c1': ('dc1', 'r3'),
+        'x1': ('dc2', 'r1'), 'y1': ('dc2', 'r2'), 'y2': ('dc2', 'r2'),
+    }
+    waves = plan_waves(list(topology), topology, wave_size=2)
+
+    # dc1 has three racks and goes rack by rack; dc2 has two and goes node by node.
+    assert waves == [['a1', 'a2', 'x1'], ['a3', 'y1'], ['b1', 'y2'], ['c1']]
+    for wave in waves:
+        racks = [topology[node] for node in wave if topology[node][0] == 'dc1']
+        assert len(set(racks)) <= 1
+
+
+def run_fleet(nodes, limit=0, **kwargs):
+    executor = FleetExecutor(LocalTransport(), quiet=True, **kwargs)
+    return asyncio.run(executor.run_window(nodes, limit))
+
+
+def test_local_transport_runs_the_command_per_node():
+    results = run_fleet(['n1', 'n2'], command='echo "on $CASSY_NODE"; [ "$CASSY_NODE" = n1 ]')
+
+    assert [(r.node, r.exit_code, r.output) for r in results] == [('n1', 0, 'on n1\n'), ('n2', 1, 'on n2\n')]
+
+
+def test_script_is_copied_over_stdin_and_removed(tmp_path):
+    script = tmp_path / 'task.sh'
+    script.write_text('#!/bin/sh\necho "script on $CASSY_NODE"\n')
+    results = run_fleet(['n1'], script=str(script))
+
+    assert (results[0].exit_code, results[0].output) == (0, 'script on n1\n')
+
+
+def test_timeout_kills_the_command_and_reports_124():
+    results = run_fleet(['n1'], command='sleep 5', timeout=0.2)
+
+    assert results[0].exit_code == 124
+
+
+def test_window_limits_how_many_nodes_run_at_once(tmp_path):
+    # Each node records the peak number of running nodes it saw.
+    command = f"""cd {tmp_path}; touch running.$CASSY_NODE; sleep 0.3
+ls running.* | wc -l > peak.$CASSY_NODE; rm running.$CASSY_NODE"""
+    run_fleet([f"n{i}" for i in range(5)], limit=2, command=command)
+
+    assert max(int(p.read_text()) for p in tmp_path.glob('peak.*')) == 2
@@ -1,6 +1,7 @@
 #!/bin/bash
 # This file is managed by Puppet.
-# Checks the status of the last successful backup by reading its manifest from S3.
+# Checks the status of the last successful backup by reading its manifest from the
+# local backup catalog, or from S3 if the catalog cannot be used.
 
 set -euo pipefail
 
@@ -81,9 +82,18 @@ if [ "$BACKUP_BACKEND" != "s3" ]; then
     exit 0
 fi
 
-# Find the latest backup directory from S3
-log_message "Searching for the latest backup set in s3://${S3_BUCKET_NAME}/${EFFECTIVE_SOURCE_HOST}/..."
-LATEST_BACKUP_TS=$(aws s3 ls "s3://${S3_BUCKET_NAME}/${EFFECTIVE_SOURCE_HOST}/" | grep 'PRE' | awk '{print $2}' | sed 's/\///' | sort -r | head -n 1)
+# Find the latest backup set, from the local backup catalog when it is usable
+LATEST_BACKUP_TS=""
+MANIFEST_JSON=""
+CATALOG_STATUS=0
+LATEST_JSON=$(/usr/local/bin/cassandra_backup_catalog.py latest --host "$EFFECTIVE_SOURCE_HOST" 2>>"$LOG_FILE") || CATALOG_STATUS=$?
+if [ "$CATALOG_STATUS" -eq 0 ]; then
+    LATEST_BACKUP_TS=$(echo "$LATEST_JSON" | jq -r '.backup_id')
+    MANIFEST_JSON=$(echo "$LATEST_JSON" | jq -c '.manifest // empty')
+elif [ "$CATALOG_STATUS" -ne 1 ]; then
+    log_message "Searching for the latest backup set in s3://${S3_BUCKET_NAME}/${EFFECTIVE_SOURCE_HOST}/..."
+    LATEST_BACKUP_TS=$(aws s3 ls "s3://${S3_BUCKET_NAME}/${EFFECTIVE_SOURCE_HOST}/" | grep 'PRE' | awk '{print $2}' | sed 's/\///' | grep -E '^[0-9]{4}-[0-9]{2}-[0-9]{2}-[0-9]{2}-[0-9]{2}$' | sort -r | head -n 1)
+fi
 
 if [ -z "$LATEST_BACKUP_TS" ]; then
     if [ "$JSON_OUTPUT" = true ]; then
@@ -99,10 +109,12 @@ fi
 
 log_message "Found latest backup set: ${LATEST_BACKUP_TS}"
 
-# Download the manifest
-MANIFEST_S3_PATH="s3://${S3_BUCKET_NAME}/${EFFECTIVE_SOURCE_HOST}/${LATEST_BACKUP_TS}/backup_manifest.json"
-log_message "Downloading manifest: ${MANIFEST_S3_PATH}"
-MANIFEST_JSON=$(aws s3 cp "$MANIFEST_S3_PATH" - 2>/dev/null)
+# Download the manifest unless the catalog already had it
+if [ "$CATALOG_STATUS" -ne 0 ]; then
+    MANIFEST_S3_PATH="s3://${S3_BUCKET_NAME}/${EFFECTIVE_SOURCE_HOST}/${LATEST_BACKUP_TS}/backup_manifest.json"
+    log_message "Downloading manifest: ${MANIFEST_S3_PATH}"
+    MANIFEST_JSON=$(aws s3 cp "$MANIFEST_S3_PATH" - 2>/dev/null)
+fi
 
 if ! echo "$MANIFEST_JSON" | jq -e . > /dev/null 2>&1; then
     if [ "$JSON_OUTPUT" = true ]; then
@@ -9,6 +9,11 @@ import os
 import argparse
 import subprocess
 
+try:
+    from cassandra_telemetry import TelemetryError, run_operation
+except ImportError:
+    run_operation = None
+
 # --- Color Codes for Help Text ---
 class Colors:
     BLUE = '\033[94m'
@@ -26,7 +31,7 @@ class Colors:
 # Safety levels: readonly, modify, destructive, info
 COMMAND_CATEGORIES = {
     "Health & Status (Read-Only)": {
-        'health': ('Run a comprehensive health check on the local node.', 'node_health_check.sh', 'readonly'),
+        'health': ('Run a comprehensive health check on the local node.', 'cassandra_health.py', 'readonly'),
         'cluster-health': ('Quickly check cluster connectivity and nodetool status.', 'cluster-health.sh', 'readonly'),
         'disk-health': ('Check disk usage against warning/critical thresholds.', 'disk-health-check.sh', 'readonly'),
         'version': ('Audit and print versions of key software (OS, Java, Cassandra).', 'version-check.sh', 'readonly'),
@@ -35,6 +40,7 @@ COMMAND_CATEGORIES = {
         'upgrade-check': ('Run pre-flight checks before a major version upgrade.', 'cassandra-upgrade-precheck.sh', 'readonly'),
         'tombstone-scan': ('Scan tables for high tombstone counts. Can perform a deep-dive on a specific table.', 'tombstone-scan.sh', 'readonly'),
         'sstabledump': ('Inspect the content of SSTables for a given table.', 'sstabledump.sh', 'readonly'),
+        'ops-history': ('List recent cass-ops operations with their duration, exit code and resource usage.', 'cassandra_telemetry.py', 'readonly'),
     },
     "Node Lifecycle (High-Impact / Destructive)": {
         'stop': ('Safely drain and stop the Cassandra service.', 'stop-node.sh', 'destructive'),
@@ -48,6 +54,7 @@ COMMAND_CATEGORIES = {
     "Data & Maintenance (Modify State)": {
         'drain': ('Drain the node, flushing memtables and stopping client traffic.', 'drain-node.sh', 'modify'),
         'repair': ('Run a safe, manual full repair on the node. Can target a specific keyspace/table.', 'full-repair.sh', 'modify'),
+        'range-repair': ('Run the paced, token-range repair used by the scheduled repair service.', 'range-repair.sh', 'modify'),
         'cleanup': ('Run \'nodetool cleanup\' with safety checks.', 'cleanup-node.sh', 'modify'),
         'compact': ('Run \'nodetool compact\' with safety checks and advanced options.', 'compaction-manager.sh', 'modify'),
         'garbage-collect': ('Run \'nodetool garbagecollect\' with safety checks.', 'garbage-collect.sh', 'modify'),
@@ -158,6 +165,17 @@ def main():
 
     args_to_pass = sys.argv[2:]
 
+    # Run the script as a child to record its duration, exit code and resource usage.
+    # Without telemetry (disabled, or not writable by this user) the script replaces this process.
+    if run_operation and script_name != 'cassandra_telemetry.py':
+        try:
+            sys.exit(run_operation(command, script_path, args_to_pass))
+        except TelemetryError:
+            pass
+        except OSError as e:
+            print(f"{Colors.RED}Error executing script '{script_path}': {e}{Colors.END}")
+            sys.exit(1)
+
     try:
         os.execv(script_path, [script_path] + args_to_pass)
     except Exception as e:
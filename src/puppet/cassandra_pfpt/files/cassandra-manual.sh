@@ -249,7 +249,7 @@ echo -e ""
 echo -e "${BOLD}#### How it Works${NC}"
 echo -e "1.  ${BOLD}Configuration:${NC} Enable via \`profile_cassandra_pfpt::manage_scheduled_repair: true\`."
 echo -e "2.  ${BOLD}Scheduling:${NC} Puppet creates a \`systemd\` timer (\`cassandra-repair.timer\`) that, by default, runs every 5 days to align with a 10-day \`gc_grace_seconds\`."
-echo -e "3.  ${BOLD}Execution:${NC} The timer runs \`range-repair.sh\`, which executes the intelligent Python script to repair the node in small, manageable chunks, minimizing performance impact."
+echo -e "3.  ${BOLD}Execution:${NC} The timer runs \`cass-ops range-repair\` (\`range-repair.sh\`), which executes the intelligent Python script to repair the node in small, manageable chunks, minimizing performance impact."
 echo -e "4.  ${BOLD}Safety:${NC} The repair script checks for the flag file at \`/var/lib/repair-disabled\` (created by \`cass-ops disable-automation\`) and will pause if it exists."
 echo -e "5.  ${BOLD}Control:${NC} You can manually stop, start, or check the status of a repair using \`systemd\` commands:"
 echo -e "    *   \`sudo systemctl stop cassandra-repair.service\` (To kill a running repair)"
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+# This file is managed by Puppet.
+#
+# Local catalog of the backups in the object store.
+# Keeps hosts, backup sets, their types, manifests and per-table archive sizes
+# in a SQLite database, so that finding a restore chain, listing backups and
+# checking the last backup no longer need one S3 request per backup set:
+# - The backup scripts record each backup set as soon as it is uploaded.
+# - When a host's entries are older than --max-age, its backup prefixes are
+#   listed once; sets that disappeared (e.g. expired by a lifecycle rule) are
+#   dropped and only the manifests of new or still incomplete sets are read.
+# - 'rebuild' recreates the catalog from the object store.
+# - The last verification of every object by cassandra_backup_verify.py is
+#   kept too, so sampled verification runs can rotate through all of them.
+#
+# Commands (data goes to stdout, logs to stderr):
+#   cassandra_backup_catalog.py record --host <host> --backup-id <id> --manifest <file>
+#   cassandra_backup_catalog.py chain --host <host> --date YYYY-MM-DD-HH-MM
+#                                     Restore chain, oldest (the base full backup) first.
+#   cassandra_backup_catalog.py list --host <host>
+#                                     One '<id> <type> <tables> <bytes>' line per backup set.
+#   cassandra_backup_catalog.py latest --host <host>
+#                                     JSON of the newest backup set and its manifest.
+#   cassandra_backup_catalog.py hosts
+#   cassandra_backup_catalog.py rebuild [--host <host>]
+#
+# Exit codes: 0 on success, 1 if nothing matches, 2 if the catalog cannot be
+# used, in which case callers fall back to listing S3 themselves.
+
+import argparse
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import time
+
+from cassandra_object_store import ObjectStoreError, open_store
+
+# --- Constants ---
+CONFIG_FILE = '/etc/backup/config.json'
+CATALOG_FILE = '/var/cache/cassandra_pfpt/backup_catalog.db'
+DEFAULT_MAX_AGE = 300  # Seconds before a host's entries are checked against the store again.
+MANIFEST_FILE = 'backup_manifest.json'
+ARCHIVE_SUFFIX = '.tar.gz.enc'
+BACKUP_ID_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}-\d{2}-\d{2}$')
+HOSTS_SCOPE = ''  # Sync scope of the host list itself.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS backups (
+    store TEXT NOT NULL,
+    host TEXT NOT NULL,
+    backup_id TEXT NOT NULL,
+    backup_type TEXT,  -- NULL while the set has no readable manifest.
+    timestamp_utc TEXT,
+    tables_count INTEGER,
+    object_count INTEGER NOT NULL,
+    total_bytes INTEGER NOT NULL,
+    manifest TEXT,
+    indexed_at REAL NOT NULL,
+    PRIMARY KEY (store, host, backup_id)
+);
+CREATE TABLE IF NOT EXISTS backup_tables (
+    store TEXT NOT NULL,
+    host TEXT NOT NULL,
+    backup_id TEXT NOT NULL,
+    keyspace TEXT NOT NULL,
+    table_name TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    PRIMARY KEY (store, host, backup_id, keyspace, table_name)
+);
+CREATE TABLE IF NOT EXISTS hosts (
+    store TEXT NOT NULL,
+    host TEXT NOT NULL,
+    PRIMARY KEY (store, host)
+);
+CREATE TABLE IF NOT EXISTS verifications (
+    store TEXT NOT NULL,
+    object_key TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,  -- Size of the object when it was verified.
+    verified_at REAL NOT NULL,
+    ok INTEGER NOT NULL,
+    detail TEXT,  -- What was checked, or why it failed.
+    PRIMARY KEY (store, object_key)
+);
+CREATE TABLE IF NOT EXISTS synced (
+    store TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    synced_at REAL NOT NULL,
+    PRIMARY KEY (store, scope)
+);
+"""
+
+# --- Logging Setup ---
+logging.basicConfig(
+    level=logging.INFO,
+    format='[%(asctime)s] %(levelname)s: %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S',
+    stream=sys.stderr
+)
+
+
+class CatalogError(Exception):
+    """Raised when the catalog cannot answer a question."""
+
+
+def parse_manifest(data):
+    """Parses manifest JSON, returning None if it is empty or invalid."""
+    try:
+        manifest = json.loads(data)
+    except (TypeError, ValueError):
+        return None
+    return manifest if isinstance(manifest, dict) and manifest.get('backup_type') else None
+
+
+class BackupCatalog:
+    """SQLite index of the backup sets of every host in one object store.
+
+    `store_url` identifies the store in the database, so one catalog file can
+    index several buckets.
+    """
+
+    def __init__(self, path, store, store_url):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=30)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.executescript(SCHEMA)
+        self.store = store
+        self.store_url = store_url
+
+    def _synced_at(self, scope):
+        row = self.db.execute('SELECT synced_at FROM synced WHERE store = ? AND scope = ?',
+                              (self.store_url, scope)).fetchone()
+        return row[0] if row else 0
+
+    def _mark_synced(self, scope):
+        self.db.execute('INSERT OR REPLACE INTO synced (store, scope, synced_at) VALUES (?, ?, ?)',
+                        (self.store_url, scope, time.time()))
+
+    def _scan_backup(self, host, backup_id):
+        """Lists one backup set, returning ({(keyspace, table): size}, object count, total bytes, has manifest)."""
+        prefix = f"{host}/{backup_id}/"
+        tables = {}
+        count = total = 0
+        has_manifest = False
+        for key, size, _ in self.store.list(prefix):
+            count += 1
+            total += size
+            relative = key[len(prefix):]
+            if relative == MANIFEST_FILE:
+                has_manifest = True
+            elif relative.endswith(ARCHIVE_SUFFIX):
+                parts = relative[:-len(ARCHIVE_SUFFIX)].split('/')
+                if len(parts) == 2:
+                    tables[tuple(parts)] = size
+        return tables, count, total, has_manifest
+
+    def _save(self, host, backup_id, manifest, tables, count, total):
+        with self.db:
+            self.db.execute('DELETE FROM backup_tables WHERE store = ? AND host = ? AND backup_id = ?',
+                            (self.store_url, host, backup_id))
+            tables_count = None
+            if manifest:
+                tables_count = manifest.get('tables_backed_up_count', len(manifest.get('tables_backed_up') or []))
+            self.db.execute('INSERT OR REPLACE INTO backups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                            (self.store_url, host, backup_id, manifest.get('backup_type') if manifest else None,
+                             manifest.get('timestamp_utc') if manifest else None, tables_count, count, total,
+                             json.dumps(manifest) if manifest else None, time.time()))
+            self.db.executemany('INSERT INTO backup_tables VALUES (?, ?, ?, ?, ?, ?)',
+                                [(self.store_url, host, backup_id, keyspace, table, size)
+                                 for (keyspace, table), size in tables.items()])
+            self.db.execute('INSERT OR IGNORE INTO hosts VALUES (?, ?)', (self.store_url, host))
+
+    def record(self, host, backup_id, manifest):
+        """Adds a just-uploaded backup set, whose manifest the caller already has."""
+        tables, count, total, _ = self._scan_backup(host, backup_id)
+        self._save(host, backup_id, manifest, tables, count, total)
+
+    def sync_host(self, host):
+        """Brings a host's entries in line with the store, reading only manifests not seen before."""
+        present = {backup_id for backup_id in self.store.list_prefixes(f"{host}/") if BACKUP_ID_PATTERN.match(backup_id)}
+        known = dict(self.db.execute('SELECT backup_id, backup_type FROM backups WHERE store = ? AND host = ?',
+                                     (self.store_url, host)))
+        with self.db:
+            for backup_id in set(known) - present:
+                for table in ('backups', 'backup_tables'):
+                    self.db.execute(f'DELETE FROM {table} WHERE store = ? AND host = ? AND backup_id = ?',
+                                    (self.store_url, host, backup_id))
+        gone = len(set(known) - present)
+        new = sorted(backup_id for backup_id in present if known.get(backup_id) is None)
+        for backup_id in new:
+            tables, count, total, has_manifest = self._scan_backup(host, backup_id)
+            manifest = None
+            if has_manifest:
+                manifest = parse_manifest(self.store.get(f"{host}/{backup_id}/{MANIFEST_FILE}"))
+            self._save(host, backup_id, manifest, tables, count, total)
+        with self.db:
+            self._mark_synced(host)
+        if new or gone:
+            logging.info("Catalog of %s updated: %d backup sets read, %d removed.", host, len(new), gone)
+
+    def sync_hosts(self):
+        # Top-level prefixes starting with '_' (such as the deduplicated SSTables) are not hosts.
+        hosts = [host for host in self.store.list_prefixes('') if not host.startswith('_')]
+        with self.db:
+            self.db.execute('DELETE FROM hosts WHERE store = ?', (self.store_url,))
+            self.db.executemany('INSERT INTO hosts VALUES (?, ?)', [(self.store_url, host) for host in hosts])
+            self._mark_synced(HOSTS_SCOPE)
+
+    def refresh(self, host, max_age):
+        """Syncs a host (or, with host None, the host list) if it was last synced over max_age seconds ago."""
+        scope = HOSTS_SCOPE if host is None else host
+        if time.time() - self._synced_at(scope) <= max_age:
+            return
+        if host is None:
+            self.sync_hosts()
+        else:
+            self.sync_host(host)
+
+    def rebuild(self, host=None):
+        """Drops the entries of one host, or of the whole store, and reads them again."""
+        with self.db:
+            for table in ('backups', 'backup_tables', 'hosts', 'synced'):
+                column = 'scope' if table == 'synced' else 'host'
+                if host is None:
+                    self.db.execute(f'DELETE FROM {table} WHERE store = ?', (self.store_url,))
+                else:
+                    self.db.execute(f'DELETE FROM {table} WHERE store = ? AND {column} = ?', (self.store_url, host))
+        if host is None:
+            self.sync_hosts()
+        for name in [host] if host else self.hosts():
+            self.sync_host(name)
+
+    def record_verification(self, key, size, ok, detail):
+        """Stores the outcome of verifying an object, replacing any earlier one."""
+        with self.db:
+            self.db.execute('INSERT OR REPLACE INTO verifications VALUES (?, ?, ?, ?, ?, ?)',
+                            (self.store_url, key, size, time.time(), 1 if ok else 0, detail))
+
+    def verifications(self, prefix=''):
+        """Returns {key: (size, verified_at, ok)} of the last verification of each object under a prefix."""
+        rows = self.db.execute('SELECT object_key, size_bytes, verified_at, ok FROM verifications '
+                               'WHERE store = ? AND substr(object_key, 1, ?) = ?',
+                               (self.store_url, len(prefix), prefix))
+        return {key: (size, verified_at, bool(ok)) for key, size, verified_at, ok in rows}
+
+    def hosts(self):
+        return [row[0] for row in self.db.execute('SELECT host FROM hosts WHERE store = ? ORDER BY host',
+                                                  (self.store_url,))]
+
+    def backups(self, host):
+        """Returns (backup_id, backup_type, tables_count, total_bytes) rows of a host, oldest first."""
+        return self.db.execute('SELECT backup_id, backup_type, tables_count, total_bytes FROM backups '
+                               'WHERE store = ? AND host = ? ORDER BY backup_id', (self.store_url, host)).fetchall()
+
+    def chain(self, host, target):
+        """Returns the restore chain for a point in time, base full backup first.
+
+        Walks back from the newest backup set at or before `target` until a
+        full backup is found, skipping sets without a readable manifest.
+        """
+        chain = []
+        for backup_id, backup_type, _, _ in reversed(self.backups(host)):
+            if backup_id > target:
+                continue
+            if backup_type is None:
+                logging.warning("Skipping backup '%s' as its manifest is missing or invalid.", backup_id)
+                continue
+            chain.append(backup_id)
+            if backup_type == 'full':
+                return list(reversed(chain))
+        raise CatalogError(f"No full backup found for host '{host}' at or before {target}.")
+
+    def latest(self, host):
+        """Returns the newest backup set of a host with its manifest, or None if there is none."""
+        row = self.db.execute('SELECT backup_id, backup_type, manifest FROM backups WHERE store = ? AND host = ? '
+                              'ORDER BY backup_id DESC LIMIT 1', (self.store_url, host)).fetchone()
+        if not row:
+            return None
+        tables = self.db.execute('SELECT keyspace, table_name, size_bytes FROM backup_tables '
+                                 'WHERE store = ? AND host = ? AND backup_id = ? ORDER BY keyspace, table_name',
+                                 (self.store_url, host, row[0])).fetchall()
+        return {
+            'backup_id': row[0],
+            'backup_type': row[1],
+            'manifest': json.loads(row[2]) if row[2] else None,
+            'tables': [{'keyspace': k, 'table': t, 'size_bytes': s} for k, t, s in tables],
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local catalog of the backups in the object store.')
+    parser.add_argument('command', choices=['record', 'chain', 'list', 'latest', 'hosts', 'rebuild'], help='What to do.')
+    parser.add_argument('--host', help='Source host of the backups. Required by all commands but hosts and rebuild.')
+    parser.add_argument('--backup-id', help='Backup set to record (required for record).')
+    parser.add_argument('--manifest', help='Local copy of the manifest of the recorded backup set (required for record).')
+    parser.add_argument('--date', help="Point in time 'YYYY-MM-DD-HH-MM' to build the chain for (required for chain).")
+    parser.add_argument('--max-age', type=int, default=DEFAULT_MAX_AGE, help=f'Optional: Seconds after which a host is checked against the store again. 0 always checks. Default: {DEFAULT_MAX_AGE}.')
+    parser.add_argument('--config', default=CONFIG_FILE, help=f'Backup configuration file. Default: {CONFIG_FILE}.')
+    parser.add_argument('--store', help="Optional: Object store URL, 's3://<bucket>' or 'file:///<directory>'. Default: the configured S3 bucket.")
+    parser.add_argument('--endpoint-url', help="Optional: S3-compatible endpoint URL. Default: 's3_endpoint_url' from the configuration, else AWS.")
+    parser.add_argument('--catalog-file', default=CATALOG_FILE, help=f'Optional: Catalog database location. Default: {CATALOG_FILE}.')
+    args = parser.parse_args()
+
+    if args.command not in ('hosts', 'rebuild') and not args.host:
+        parser.error(f"'{args.command}' requires --host.")
+    if args.command == 'record' and not (args.backup_id and args.manifest):
+        parser.error("'record' requires --backup-id and --manifest.")
+    if args.command == 'chain' and not (args.date and BACKUP_ID_PATTERN.match(args.date)):
+        parser.error("'chain' requires --date in the format 'YYYY-MM-DD-HH-MM'.")
+
+    try:
+        with open(args.config) as f:
+            config = json.load(f)
+        store_url = args.store or f"s3://{config.get('s3_bucket_name', '')}"
+        store = open_store(store_url, endpoint_url=args.endpoint_url or config.get('s3_endpoint_url') or None)
+        catalog = BackupCatalog(args.catalog_file, store, store_url)
+
+        if args.command == 'record':
+            with open(args.manifest) as f:
+                manifest = parse_manifest(f.read())
+            if manifest is None:
+                logging.error("Manifest %s is empty or invalid.", args.manifest)
+                sys.exit(2)
+            catalog.record(args.host, args.backup_id, manifest)
+            logging.info("Recorded %s backup %s of %s in the catalog.", manifest['backup_type'], args.backup_id, args.host)
+        elif args.command == 'rebuild':
+            catalog.rebuild(args.host)
+            for host in [args.host] if args.host else catalog.hosts():
+                logging.info("Catalog of %s rebuilt: %d backup sets.", host, len(catalog.backups(host)))
+        elif args.command == 'hosts':
+            catalog.refresh(None, args.max_age)
+            for host in catalog.hosts():
+                print(host)
+        else:
+            catalog.refresh(args.host, args.max_age)
+            if args.command == 'chain':
+                print('\n'.join(catalog.chain(args.host, args.date)))
+            elif args.command == 'list':
+                backups = catalog.backups(args.host)
+                if not backups:
+                    sys.exit(1)
+                for backup_id, backup_type, tables_count, total_bytes in backups:
+                    print(f"{backup_id} {backup_type or 'unknown'} {tables_count if tables_count is not None else '-'} {total_bytes}")
+            else:
+                latest = catalog.latest(args.host)
+                if latest is None:
+                    sys.exit(1)
+                print(json.dumps(latest, indent=2))
+    except CatalogError as e:
+        logging.error("%s", e)
+        sys.exit(1)
+    except (IOError, OSError, ValueError, sqlite3.Error, ObjectStoreError) as e:
+        logging.error("Backup catalog is not usable: %s", e)
+        sys.exit(2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# This file is managed by Puppet.
+#
+# Streaming encryption compatible with the backup archive format produced by
+#   openssl enc -aes-256-cbc -salt -pbkdf2 -md sha256 -pass file:<key>
+# i.e. 'Salted__' + 8-byte salt, followed by AES-256-CBC with PKCS#7 padding,
+# where key and IV come from PBKDF2-HMAC-SHA256 (10000 iterations) over the
+# passphrase and salt. Archives written here can be read by 'openssl enc -d'
+# and vice versa.
+#
+# The 'cryptography' package is used when it is installed. Otherwise a single
+# long-lived 'openssl enc' process per stream does the cipher work, which is
+# still one process per table instead of a full shell pipeline.
+
+import hashlib
+import os
+import subprocess
+import threading
+
+try:
+    from cryptography.hazmat.primitives import padding
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+except ImportError:
+    Cipher = None
+
+SALT_HEADER = b'Salted__'
+SALT_LENGTH = 8
+HEADER_LENGTH = len(SALT_HEADER) + SALT_LENGTH
+PBKDF2_ITERATIONS = 10000  # The 'openssl enc -pbkdf2' default.
+OPENSSL_CIPHER_ARGS = ['-aes-256-cbc', '-pbkdf2', '-md', 'sha256']
+
+
+class CipherError(Exception):
+    """Raised when a stream cannot be encrypted or decrypted."""
+
+
+def derive_key_iv(passphrase, salt):
+    """Derives the AES-256 key and CBC IV the way 'openssl enc -pbkdf2 -md sha256' does."""
+    material = hashlib.pbkdf2_hmac('sha256', passphrase, salt, PBKDF2_ITERATIONS, 48)
+    return material[:32], material[32:]
+
+
+def cipher_backend():
+    """Returns the name of the cipher implementation in use."""
+    return 'cryptography' if Cipher is not None else 'openssl'
+
+
+class _LibraryCipher:
+    """AES-256-CBC through the 'cryptography' package."""
+
+    def __init__(self, key, iv, decrypt):
+        cipher = Cipher(algorithms.AES(key), modes.CBC(iv))
+        if decrypt:
+            self.context = cipher.decryptor()
+            self.padding = padding.PKCS7(128).unpadder()
+        else:
+            self.context = cipher.encryptor()
+            self.padding = padding.PKCS7(128).padder()
+        self.decrypt = decrypt
+
+    def update(self, data):
+        if self.decrypt:
+            return self.padding.update(self.context.update(data))
+        return self.context.update(self.padding.update(data))
+
+    def finalize(self):
+        try:
+            if self.decrypt:
+                return self.padding.update(self.context.finalize()) + self.padding.finalize()
+            return self.context.update(self.padding.finalize()) + self.context.finalize()
+        except ValueError as e:
+            raise CipherError(f"Bad decrypt: {e}")
+
+
+class _ProcessCipher:
+    """AES-256-CBC through one 'openssl enc' child process.
+
+    Data is written to the child's stdin by the caller while a reader thread
+    drains its stdout, so neither pipe can fill up and block the other. The
+    passphrase is handed over on an inherited pipe, never on the command line.
+    """
+
+    def __init__(self, passphrase, decrypt):
+        pass_read, pass_write = os.pipe()
+        command = ['openssl', 'enc', '-d' if decrypt else '-e'] + OPENSSL_CIPHER_ARGS + ['-pass', f"fd:{pass_read}"]
+        if not decrypt:
+            command.append('-salt')
+        try:
+            self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                            stderr=subprocess.PIPE, pass_fds=(pass_read,))
+        except FileNotFoundError:
+            os.close(pass_write)
+            raise CipherError("Neither the 'cryptography' package nor the 'openssl' binary is available.")
+        finally:
+            os.close(pass_read)
+        with os.fdopen(pass_write, 'wb') as f:
+            f.write(passphrase + b'\n')
+
+        self.output = []
+        self.lock = threading.Lock()
+        self.reader = threading.Thread(target=self._drain, daemon=True)
+        self.reader.start()
+
+    def _drain(self):
+        for chunk in iter(lambda: self.process.stdout.read1(1024 * 1024), b''):
+            with self.lock:
+                self.output.append(chunk)
+
+    def _take(self):
+        with self.lock:
+            data = b''.join(self.output)
+            self.output.clear()
+        return data
+
+    def update(self, data):
+        try:
+            self.process.stdin.write(data)
+        except BrokenPipeError:
+            raise CipherError(f"openssl exited early: {self.process.stderr.read().decode(errors='replace').strip()}")
+        return self._take()
+
+    def finalize(self):
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        self.reader.join()
+        error = self.process.stderr.read().decode(errors='replace').strip()
+        if self.process.wait() != 0:
+            raise CipherError(f"openssl failed with exit code {self.process.returncode}: {error}")
+        return self._take()
+
+    def abort(self):
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+
+
+class StreamEncryptor:
+    """Encrypts a stream chunk by chunk into the 'openssl enc' salted format.
+
+    update() returns ciphertext for the data given so far (possibly empty) and
+    finalize() returns the rest, including the final padded block.
+    """
+
+    def __init__(self, passphrase):
+        if isinstance(passphrase, str):
+            passphrase = passphrase.encode()
+        if Cipher is not None:
+            salt = os.urandom(SALT_LENGTH)
+            self.header = SALT_HEADER + salt
+            self.cipher = _LibraryCipher(*derive_key_iv(passphrase, salt), decrypt=False)
+        else:
+            # The openssl child writes its own salt header.
+            self.header = b''
+            self.cipher = _ProcessCipher(passphrase, decrypt=False)
+
+    def update(self, data):
+        header, self.header = self.header, b''
+        return header + self.cipher.update(data)
+
+    def finalize(self):
+        header, self.header = self.header, b''
+        return header + self.cipher.finalize()
+
+    def abort(self):
+        if isinstance(self.cipher, _ProcessCipher):
+            self.cipher.abort()
+
+
+class StreamDecryptor:
+    """Decrypts a stream in the 'openssl enc' salted format chunk by chunk."""
+
+    def __init__(self, passphrase):
+        if isinstance(passphrase, str):
+            passphrase = passphrase.encode()
+        self.passphrase = passphrase
+        self.pending = b''
+        self.cipher = None if Cipher is not None else _ProcessCipher(passphrase, decrypt=True)
+
+    def update(self, data):
+        if self.cipher is None:
+            # The key can only be derived once the whole salt header has arrived.
+            self.pending += data
+            if len(self.pending) < HEADER_LENGTH:
+                return b''
+            if not self.pending.startswith(SALT_HEADER):
+                raise CipherError("Stream does not start with an OpenSSL salt header.")
+            salt = self.pending[len(SALT_HEADER):HEADER_LENGTH]
+            data, self.pending = self.pending[HEADER_LENGTH:], b''
+            self.cipher = _LibraryCipher(*derive_key_iv(self.passphrase, salt), decrypt=True)
+        return self.cipher.update(data)
+
+    def finalize(self):
+        if self.cipher is None:
+            raise CipherError("Stream is shorter than the OpenSSL salt header.")
+        return self.cipher.finalize()
+
+    def abort(self):
+        if isinstance(self.cipher, _ProcessCipher):
+            self.cipher.abort()
@@ -0,0 +1,606 @@
+#!/usr/bin/env python3
+# This file is managed by Puppet.
+#
+# Streaming backup engine used by full-backup-to-s3.sh.
+# Replaces the per-table 'tar | gzip | openssl | aws s3 cp' pipeline with an
+# in-process one:
+# - Each snapshot directory is read once and streamed through tar, gzip and
+#   AES-256-CBC in 1 MiB chunks. Nothing is written to local disk.
+# - The encrypted stream is cut into multipart upload parts, which are uploaded
+#   concurrently by a shared pool of upload threads.
+# - Part buffers come from a bounded pool shared by all tables, so memory use is
+#   capped at roughly (buffers + parallelism) * part size however many tables
+#   are in flight; a table whose parts cannot be uploaded fast enough waits.
+# - Throughput (read and stored bytes per second) is reported per table.
+# - Optionally (--dedup), SSTable components are stored once each under
+#   '_sstables/<host>/' and later backups only reference the unchanged ones.
+#   The table archive then carries a 'backup_refs.json' listing them, which
+#   restore-from-s3.sh resolves after extracting the archive. Each backup set
+#   also gets an 'sstable_refs.json' index of every object it references.
+#   The bucket's age-based expiry rules only cover '<host>/', so these
+#   objects are deleted here instead, once no remaining backup set's index
+#   references them.
+#
+# Archives keep the existing format, '<ks>/<table>.tar.gz.enc' holding a gzipped
+# tar of the snapshot directory encrypted as by 'openssl enc -aes-256-cbc -salt
+# -pbkdf2 -md sha256', so restore-from-s3.sh reads them unchanged.
+
+import argparse
+import io
+import json
+import logging
+import math
+import os
+import re
+import socket
+import sys
+import tarfile
+import threading
+import time
+import zlib
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from stat import S_ISREG
+
+from cassandra_backup_crypto import CipherError, StreamEncryptor, cipher_backend
+from cassandra_object_store import (MAX_PARTS, MIN_PART_SIZE, ObjectStoreError, RateLimiter,
+                                    open_store, parse_rate)
+from cassandra_telemetry import emit_event
+
+# --- Constants ---
+CONFIG_FILE = '/etc/backup/config.json'
+CHUNK_SIZE = 1024 * 1024  # Read and compression chunk size.
+DEFAULT_PART_SIZE_MB = 16
+DEFAULT_UPLOAD_THREADS = 8
+DEFAULT_COMPRESSION_LEVEL = 6  # Same as gzip's default.
+DEDUP_PREFIX = '_sstables'  # Top-level prefix of deduplicated SSTable components, one directory per host.
+DEDUP_INDEX_FILE = 'sstable_refs.json'  # Per backup set: every deduplicated object the set references.
+DEFAULT_DEDUP_MIN_SIZE_MB = 1  # Smaller files go into the table archive.
+REFS_FILE = 'backup_refs.json'
+MANIFEST_FILE = 'backup_manifest.json'
+BACKUP_ID_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}-\d{2}-\d{2}$')
+INCLUDED_SYSTEM_KEYSPACES = ('system_schema', 'system_auth', 'system_distributed')
+SKIPPED_KEYSPACE_PREFIXES = ('system', 'dse', 'solr')
+MIB = 1024 * 1024
+
+# A table snapshot to back up, and the object key it is stored under. `files`
+# optionally limits the archive to those paths, relative to snapshot_dir.
+TableBackup = namedtuple('TableBackup', ['keyspace', 'table', 'table_dir', 'snapshot_dir', 'key', 'files'],
+                         defaults=(None,))
+# The outcome of one table backup. `error` is None on success.
+TableResult = namedtuple('TableResult', ['keyspace', 'table', 'files', 'raw_bytes', 'stored_bytes',
+                                         'reused_files', 'reused_bytes', 'seconds', 'error'])
+
+# --- Logging Setup ---
+logging.basicConfig(
+    level=logging.INFO,
+    format='[%(asctime)s] %(levelname)s: %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S',
+    stream=sys.stdout
+)
+
+# --- Helper Functions ---
+
+def load_config(path):
+    """Reads the backup configuration JSON written by Puppet."""
+    with open(path) as f:
+        return json.load(f)
+
+def format_bytes(size):
+    """Formats a byte count for log messages."""
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TiB"
+
+def table_name_from_dir(table_dir_name):
+    """Strips the '-<table id>' suffix from a table directory name."""
+    return table_dir_name.rsplit('-', 1)[0]
+
+def is_skipped_system_keyspace(keyspace):
+    """Checks whether a keyspace is a non-essential system keyspace that is never backed up."""
+    return keyspace.startswith(SKIPPED_KEYSPACE_PREFIXES) and keyspace not in INCLUDED_SYSTEM_KEYSPACES
+
+def is_table_selected(keyspace, table, config):
+    """Applies the include/exclude lists from the backup configuration to a table."""
+    full_name = f"{keyspace}.{table}"
+    include_keyspaces = config.get('backup_include_only_keyspaces') or []
+    include_tables = config.get('backup_include_only_tables') or []
+    if include_keyspaces or include_tables:
+        return keyspace in include_keyspaces or full_name in include_tables
+    return (keyspace not in (config.get('backup_exclude_keyspaces') or [])
+            and full_name not in (config.get('backup_exclude_tables') or []))
+
+def discover_tables(data_dir, tag, config, prefix):
+    """Finds the non-empty snapshot directories of a tag that should be backed up."""
+    tables = []
+    for keyspace in sorted(os.listdir(data_dir)):
+        keyspace_dir = os.path.join(data_dir, keyspace)
+        if not os.path.isdir(keyspace_dir) or is_skipped_system_keyspace(keyspace):
+            continue
+        for table_dir_name in sorted(os.listdir(keyspace_dir)):
+            snapshot_dir = os.path.join(keyspace_dir, table_dir_name, 'snapshots', tag)
+            if not os.path.isdir(snapshot_dir) or not os.listdir(snapshot_dir):
+                continue
+            table = table_name_from_dir(table_dir_name)
+            if not is_table_selected(keyspace, table, config):
+                continue
+            tables.append(TableBackup(keyspace, table, table_dir_name, snapshot_dir, f"{prefix}/{keyspace}/{table}.tar.gz.enc"))
+    return tables
+
+def directory_size(path):
+    """Returns the total size of the regular files under a directory."""
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, filename)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class BufferPool:
+    """Bounds the number of part buffers that are queued for or in transfer.
+
+    acquire() blocks while all buffers are taken, which throttles the tables
+    producing data to the speed of the uploads (or, on restore, the downloads
+    to the speed of extraction).
+    """
+
+    def __init__(self, count):
+        self.semaphore = threading.BoundedSemaphore(max(1, count))
+
+    def acquire(self):
+        self.semaphore.acquire()
+
+    def try_acquire(self):
+        """Takes a buffer only if one is free right now."""
+        return self.semaphore.acquire(blocking=False)
+
+    def release(self):
+        self.semaphore.release()
+
+
+class MultipartWriter:
+    """Collects a stream into parts and uploads them concurrently.
+
+    A stream that ends before the first part fills is stored with a single
+    PUT. Otherwise every full part is handed to the shared upload executor as
+    soon as it is complete; close() waits for the remaining parts and completes
+    the multipart upload, and abort() discards it.
+    """
+
+    def __init__(self, store, key, executor, pool, part_size, limiter=None, lock=None):
+        self.store = store
+        self.key = key
+        self.executor = executor
+        self.pool = pool
+        self.part_size = part_size
+        self.limiter = limiter
+        self.lock = lock
+        self.chunks = []
+        self.buffered = 0
+        self.upload = None
+        self.futures = []
+        self.bytes_written = 0
+
+    def write(self, data):
+        if not data:
+            return
+        self.chunks.append(data)
+        self.buffered += len(data)
+        self.bytes_written += len(data)
+        if self.buffered >= self.part_size:
+            self._submit_part()
+
+    def _take_buffer(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        self.buffered = 0
+        return data
+
+    def _upload_part(self, part_number, data):
+        try:
+            if self.limiter:
+                self.limiter.acquire(len(data))
+            return part_number, self.store.upload_part(self.upload, part_number, data)
+        finally:
+            self.pool.release()
+
+    def _raise_failed_part(self):
+        for future in self.futures:
+            if future.done() and future.exception():
+                raise future.exception()
+
+    def _submit_part(self):
+        self._raise_failed_part()
+        if self.upload is None:
+            self.upload = self.store.create_multipart(self.key, lock=self.lock)
+        data = self._take_buffer()
+        self.pool.acquire()
+        try:
+            self.futures.append(self.executor.submit(self._upload_part, len(self.futures) + 1, data))
+        except RuntimeError:
+            self.pool.release()
+            raise
+
+    def close(self):
+        if self.upload is None:
+            data = self._take_buffer()
+            if self.limiter:
+                self.limiter.acquire(len(data))
+            self.store.put(self.key, data, lock=self.lock)
+            return
+        if self.buffered:
+            self._submit_part()
+        parts = [future.result() for future in self.futures]
+        self.store.complete_multipart(self.upload, parts)
+
+    def abort(self):
+        for future in self.futures:
+            future.cancel()
+        for future in self.futures:
+            if not future.cancelled():
+                future.exception()
+        if self.upload is not None:
+            try:
+                self.store.abort_multipart(self.upload)
+            except ObjectStoreError as e:
+                logging.warning("Could not abort multipart upload of %s: %s", self.key, e)
+
+
+class ArchiveStream:
+    """File-like sink for tarfile that gzips and encrypts what it is given."""
+
+    def __init__(self, writer, encryptor, compression_level=DEFAULT_COMPRESSION_LEVEL):
+        self.writer = writer
+        self.encryptor = encryptor
+        # wbits=31 writes a gzip header and trailer, matching the 'gzip' command.
+        self.compressor = zlib.compressobj(compression_level, zlib.DEFLATED, 31)
+
+    def write(self, data):
+        compressed = self.compressor.compress(data)
+        if compressed:
+            self.writer.write(self.encryptor.update(compressed))
+        return len(data)
+
+    def finish(self):
+        """Flushes the compressor and cipher and completes the upload."""
+        self.writer.write(self.encryptor.update(self.compressor.flush()))
+        self.writer.write(self.encryptor.finalize())
+        self.writer.close()
+
+
+class BackupEngine:
+    """Backs up table snapshots to an object store, several tables at a time.
+
+    Up to `parallelism` tables are archived at once. Their parts are uploaded
+    by `upload_threads` shared upload threads, with at most `buffers` parts
+    waiting for or in upload at any time.
+
+    With a `dedup_prefix`, every SSTable component of at least
+    `dedup_min_size` bytes is stored once, as its own object under that
+    prefix, keyed by its path, size and mtime. Later backups reference the
+    existing object instead of uploading the file again. The table archive
+    then holds only the small files plus a 'backup_refs.json' listing the
+    referenced objects. Every referenced key is collected in `referenced`
+    for the backup set's index. With a `lock`, the retention of reused
+    objects is extended to that of the new backup.
+    """
+
+    def __init__(self, store, passphrase, parallelism=4, upload_threads=DEFAULT_UPLOAD_THREADS,
+                 part_size=DEFAULT_PART_SIZE_MB * MIB, buffers=None, limiter=None, lock=None,
+                 compression_level=DEFAULT_COMPRESSION_LEVEL, dedup_prefix=None,
+                 dedup_min_size=DEFAULT_DEDUP_MIN_SIZE_MB * MIB):
+        self.store = store
+        self.passphrase = passphrase
+        self.parallelism = max(1, parallelism)
+        self.upload_threads = max(1, upload_threads)
+        self.part_size = max(MIN_PART_SIZE, part_size)
+        self.pool = BufferPool(buffers or 2 * self.upload_threads)
+        self.limiter = limiter
+        self.lock = lock
+        self.compression_level = compression_level
+        self.dedup_prefix = dedup_prefix
+        self.dedup_min_size = dedup_min_size
+        self.referenced = set()
+        self.referenced_lock = threading.Lock()
+        self.executor = None
+
+    def _part_size_for(self, size):
+        """Grows the part size for streams that would otherwise exceed the S3 part limit."""
+        # Compressed streams are rarely larger than their input, and half the
+        # part limit leaves room for incompressible data.
+        needed = math.ceil(size / (MAX_PARTS // 2))
+        return max(self.part_size, math.ceil(needed / MIB) * MIB)
+
+    def _stream_object(self, key, size_hint, produce):
+        """Stores everything `produce(stream)` writes, gzipped and encrypted, as one object.
+
+        Returns the number of bytes stored.
+        """
+        writer = MultipartWriter(self.store, key, self.executor, self.pool,
+                                 self._part_size_for(size_hint), self.limiter, self.lock)
+        encryptor = None
+        try:
+            encryptor = StreamEncryptor(self.passphrase)
+            stream = ArchiveStream(writer, encryptor, self.compression_level)
+            produce(stream)
+            stream.finish()
+        except BaseException:
+            if encryptor is not None:
+                encryptor.abort()
+            writer.abort()
+            raise
+        return writer.bytes_written
+
+    def _dedup_components(self, table, counts):
+        """Stores or reuses the table's large files and returns references to them."""
+        prefix = f"{self.dedup_prefix}/{table.keyspace}/{table.table_dir}/"
+        existing = {key for key, _, _ in self.store.list(prefix)}
+        refs = []
+        for dirpath, dirnames, filenames in os.walk(table.snapshot_dir):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                path = os.path.join(dirpath, filename)
+                stat = os.lstat(path)
+                if not S_ISREG(stat.st_mode) or stat.st_size < self.dedup_min_size:
+                    continue
+                relpath = os.path.relpath(path, table.snapshot_dir)
+                key = f"{prefix}{relpath}.{stat.st_size}.{int(stat.st_mtime)}.gz.enc"
+                if key in existing:
+                    if self.lock:
+                        self.store.extend_lock(key, self.lock)
+                    counts['reused_files'] += 1
+                    counts['reused_bytes'] += stat.st_size
+                else:
+                    def copy_file(stream, path=path):
+                        with open(path, 'rb') as f:
+                            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                                stream.write(chunk)
+                    counts['stored'] += self._stream_object(key, stat.st_size, copy_file)
+                    counts['files'] += 1
+                    counts['bytes'] += stat.st_size
+                refs.append({'file': relpath, 'key': key, 'size': stat.st_size})
+                with self.referenced_lock:
+                    self.referenced.add(key)
+        return refs
+
+    def backup_table(self, table):
+        """Streams one table snapshot to the store and returns its TableResult."""
+        start = time.time()
+        counts = {'files': 0, 'bytes': 0, 'stored': 0, 'reused_files': 0, 'reused_bytes': 0}
+        error = None
+        try:
+            refs = self._dedup_components(table, counts) if self.dedup_prefix else []
+            referenced = {ref['file'] for ref in refs}
+
+            def add_member(tarinfo):
+                if tarinfo.isfile():
+                    name = os.path.normpath(tarinfo.name)
+                    if name in referenced or (table.files is not None and name not in table.files):
+                        return None
+                    counts['files'] += 1
+                    counts['bytes'] += tarinfo.size
+                return tarinfo
+
+            def write_archive(stream):
+                with tarfile.open(fileobj=stream, mode='w|', bufsize=CHUNK_SIZE, format=tarfile.GNU_FORMAT) as tar:
+                    tar.copybufsize = CHUNK_SIZE
+                    # Entries are named './<file>', exactly like 'tar -C <dir> -c .'.
+                    tar.add(table.snapshot_dir, arcname='.', filter=add_member)
+                    if refs:
+                        data = json.dumps({'version': 1, 'objects': refs}, indent=1).encode()
+                        info = tarfile.TarInfo(f"./{REFS_FILE}")
+                        info.size = len(data)
+                        info.mtime = int(time.time())
+                        tar.addfile(info, io.BytesIO(data))
+
+            counts['stored'] += self._stream_object(table.key, directory_size(table.snapshot_dir), write_archive)
+        except (OSError, tarfile.TarError, CipherError, ObjectStoreError) as e:
+            error = str(e) or e.__class__.__name__
+        return TableResult(table.keyspace, table.table, counts['files'], counts['bytes'], counts['stored'],
+                           counts['reused_files'], counts['reused_bytes'], time.time() - start, error)
+
+    def run(self, tables, error_dir=None):
+        """Backs up all tables and returns their TableResults in completion order.
+
+        A marker file named '<keyspace>.<table>' is created in `error_dir` for
+        every table that fails, as the shell pipeline did.
+        """
+        results = []
+        with ThreadPoolExecutor(max_workers=self.upload_threads, thread_name_prefix='upload') as uploads, \
+                ThreadPoolExecutor(max_workers=self.parallelism, thread_name_prefix='table') as workers:
+            self.executor = uploads
+            futures = [workers.submit(self.backup_table, table) for table in tables]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                emit_event('progress', done=len(results), total=len(tables), unit='tables')
+                name = f"{result.keyspace}.{result.table}"
+                if result.error:
+                    logging.error("Streaming backup failed for %s: %s", name, result.error)
+                    if error_dir:
+                        open(os.path.join(error_dir, name), 'a').close()
+                    continue
+                seconds = max(result.seconds, 0.001)
+                reused = ''
+                if result.reused_files:
+                    reused = f", {result.reused_files} unchanged files ({format_bytes(result.reused_bytes)}) referenced"
+                logging.info("Successfully streamed backup for %s: %d files, %s read, %s stored%s in %.1fs "
+                             "(%.1f MiB/s read, %.1f MiB/s stored).", name, result.files,
+                             format_bytes(result.raw_bytes), format_bytes(result.stored_bytes), reused, result.seconds,
+                             result.raw_bytes / MIB / seconds, result.stored_bytes / MIB / seconds)
+        return results
+
+
+def summarize(results, elapsed):
+    """Logs the overall throughput of a backup run."""
+    succeeded = [r for r in results if not r.error]
+    raw_bytes = sum(r.raw_bytes for r in succeeded)
+    stored_bytes = sum(r.stored_bytes for r in succeeded)
+    elapsed = max(elapsed, 0.001)
+    logging.info("Backed up %d of %d tables: %s read, %s stored in %.1fs (%.1f MiB/s read, %.1f MiB/s stored).",
+                 len(succeeded), len(results), format_bytes(raw_bytes), format_bytes(stored_bytes), elapsed,
+                 raw_bytes / MIB / elapsed, stored_bytes / MIB / elapsed)
+    reused_files = sum(r.reused_files for r in succeeded)
+    emit_event('result', tables=len(succeeded), tables_failed=len(results) - len(succeeded), bytes_read=raw_bytes,
+               bytes_stored=stored_bytes, files_reused=reused_files)
+    if reused_files:
+        logging.info("Deduplication: %d unchanged files (%s) referenced instead of uploaded.",
+                     reused_files, format_bytes(sum(r.reused_bytes for r in succeeded)))
+
+
+def write_dedup_index(store, prefix, keys, lock=None):
+    """Stores the index of the deduplicated objects a backup set references."""
+    data = json.dumps({'version': 1, 'objects': sorted(keys)}, indent=1).encode()
+    store.put(f"{prefix}/{DEDUP_INDEX_FILE}", data, lock=lock)
+
+def prune_dedup_objects(store, host_prefix, dedup_prefix):
+    """Deletes the deduplicated objects that no backup set under host_prefix references.
+
+    The references are read from the 'sstable_refs.json' index of every backup
+    set. A set without an index may still reference objects if its manifest
+    is missing (a backup in progress or one that was interrupted) or records
+    "sstable_dedup": true (written before indexes existed); nothing is deleted
+    until such sets have expired. Returns (objects, bytes) deleted, or None if
+    pruning was deferred.
+    """
+    referenced = set()
+    for backup_id in store.list_prefixes(f"{host_prefix}/"):
+        if not BACKUP_ID_PATTERN.match(backup_id):
+            continue
+        set_prefix = f"{host_prefix}/{backup_id}"
+        if store.size(f"{set_prefix}/{DEDUP_INDEX_FILE}") is not None:
+            referenced.update(json.loads(store.get(f"{set_prefix}/{DEDUP_INDEX_FILE}"))['objects'])
+            continue
+        if store.size(f"{set_prefix}/{MANIFEST_FILE}") is None or \
+                json.loads(store.get(f"{set_prefix}/{MANIFEST_FILE}")).get('sstable_dedup') is True:
+            logging.info("Backup set %s may reference deduplicated objects but has no %s. "
+                         "Unreferenced objects are kept until it expires.", set_prefix, DEDUP_INDEX_FILE)
+            return None
+    deleted = deleted_bytes = 0
+    for key, size, _ in list(store.list(f"{dedup_prefix}/")):
+        if key not in referenced:
+            store.delete(key)
+            deleted += 1
+            deleted_bytes += size
+    return deleted, deleted_bytes
+
+def open_configured_store(args, config):
+    """Opens the object store given on the command line or in the configuration."""
+    store_url = args.store or f"s3://{config.get('s3_bucket_name', '')}"
+    endpoint_url = args.endpoint_url or config.get('s3_endpoint_url') or None
+    return open_store(store_url, endpoint_url=endpoint_url, max_connections=args.upload_threads + 4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Streaming, multipart backup engine for Cassandra snapshots.')
+    parser.add_argument('command', choices=['backup', 'check'], help="'backup' uploads a snapshot tag; 'check' verifies the engine can run here.")
+    parser.add_argument('--tag', help='Snapshot tag to back up (required for backup).')
+    parser.add_argument('--config', default=CONFIG_FILE, help=f'Backup configuration file. Default: {CONFIG_FILE}.')
+    parser.add_argument('--store', help="Optional: Object store URL, 's3://<bucket>' or 'file:///<directory>'. Default: the configured S3 bucket.")
+    parser.add_argument('--endpoint-url', help="Optional: S3-compatible endpoint URL. Default: 's3_endpoint_url' from the configuration, else AWS.")
+    parser.add_argument('--prefix', help='Optional: Object key prefix. Default: <short hostname>/<tag>.')
+    parser.add_argument('--key-file', help="Optional: File holding the encryption passphrase. Default: 'encryption_key' from the configuration.")
+    parser.add_argument('--parallelism', type=int, help="Optional: Tables archived concurrently. Default: 'parallelism' from the configuration.")
+    parser.add_argument('--upload-threads', type=int, default=DEFAULT_UPLOAD_THREADS, help=f'Optional: Concurrent part uploads shared by all tables. Default: {DEFAULT_UPLOAD_THREADS}.')
+    parser.add_argument('--part-size-mb', type=int, default=DEFAULT_PART_SIZE_MB, help=f'Optional: Multipart part size in MiB (minimum 5). Default: {DEFAULT_PART_SIZE_MB}.')
+    parser.add_argument('--buffers', type=int, help='Optional: Part buffers queued for or in upload at once. Default: twice --upload-threads.')
+    parser.add_argument('--throttle', help="Optional: Total upload bandwidth limit, e.g. '50M/s'. Default: 'throttle_rate' from the configuration.")
+    parser.add_argument('--compression-level', type=int, default=DEFAULT_COMPRESSION_LEVEL, help=f'Optional: gzip compression level (1-9). Default: {DEFAULT_COMPRESSION_LEVEL}.')
+    parser.add_argument('--object-lock-mode', choices=['GOVERNANCE', 'COMPLIANCE'], help='Optional: S3 Object Lock mode applied to every object.')
+    parser.add_argument('--object-lock-days', type=int, default=0, help='Optional: S3 Object Lock retention in days. Default: 0 (no lock).')
+    parser.add_argument('--dedup', action='store_true', help="Optional: Store SSTable components once and reference unchanged ones. Default: 'backup_dedup' from the configuration.")
+    parser.add_argument('--no-dedup', action='store_true', help="Optional: Upload complete table archives even if 'backup_dedup' is set in the configuration.")
+    parser.add_argument('--dedup-prefix', help=f'Optional: Key prefix of deduplicated components. Default: {DEDUP_PREFIX}/<short hostname>.')
+    parser.add_argument('--dedup-min-size-mb', type=int, default=DEFAULT_DEDUP_MIN_SIZE_MB, help=f'Optional: Smallest file, in MiB, stored as its own object. Default: {DEFAULT_DEDUP_MIN_SIZE_MB}.')
+    parser.add_argument('--error-dir', help="Optional: Directory in which a '<keyspace>.<table>' file is created for each failed table.")
+    args = parser.parse_args()
+
+    try:
+        config = load_config(args.config)
+    except (IOError, OSError, ValueError) as e:
+        logging.error("Could not read backup configuration %s: %s", args.config, e)
+        sys.exit(2)
+
+    try:
+        store = open_configured_store(args, config)
+    except ObjectStoreError as e:
+        logging.error("%s", e)
+        sys.exit(2)
+
+    if args.command == 'check':
+        logging.info("Backup engine is usable: object store '%s', cipher '%s'.", store.name, cipher_backend())
+        sys.exit(0)
+
+    if not args.tag:
+        parser.error("'backup' requires --tag.")
+
+    if args.key_file:
+        with open(args.key_file, 'rb') as f:
+            passphrase = f.read().rstrip(b'\n')
+    else:
+        passphrase = (config.get('encryption_key') or '').encode()
+    if not passphrase or passphrase == b'null':
+        logging.error("No encryption passphrase configured.")
+        sys.exit(2)
+
+    try:
+        limiter = RateLimiter(parse_rate(args.throttle or config.get('throttle_rate')))
+    except ValueError as e:
+        logging.error("%s", e)
+        sys.exit(2)
+
+    lock = None
+    if args.object_lock_mode and args.object_lock_days > 0:
+        lock = (args.object_lock_mode, datetime.now(timezone.utc) + timedelta(days=args.object_lock_days))
+
+    short_hostname = socket.gethostname().split('.')[0]
+    prefix = args.prefix or f"{short_hostname}/{args.tag}"
+    dedup_prefix = None
+    if not args.no_dedup and (args.dedup or config.get('backup_dedup') is True):
+        dedup_prefix = args.dedup_prefix or f"{DEDUP_PREFIX}/{short_hostname}"
+    tables = discover_tables(config['cassandra_data_dir'], args.tag, config, prefix)
+    if not tables:
+        logging.warning("No snapshot directories found for tag '%s'. Nothing to back up.", args.tag)
+        sys.exit(0)
+
+    engine = BackupEngine(store, passphrase,
+                          parallelism=args.parallelism or int(config.get('parallelism') or 4),
+                          upload_threads=args.upload_threads,
+                          part_size=args.part_size_mb * MIB,
+                          buffers=args.buffers,
+                          limiter=limiter,
+                          lock=lock,
+                          compression_level=args.compression_level,
+                          dedup_prefix=dedup_prefix,
+                          dedup_min_size=args.dedup_min_size_mb * MIB)
+    logging.info("Streaming %d tables to %s/%s (%d tables at once, %d upload threads, %d MiB parts, cipher: %s).",
+                 len(tables), store.name, prefix, engine.parallelism, engine.upload_threads,
+                 engine.part_size // MIB, cipher_backend())
+    if dedup_prefix:
+        logging.info("Deduplicating SSTable components of %d MiB or more under %s/.", args.dedup_min_size_mb, dedup_prefix)
+
+    start = time.time()
+    results = engine.run(tables, error_dir=args.error_dir)
+    summarize(results, time.time() - start)
+    if dedup_prefix and '/' in prefix:
+        try:
+            write_dedup_index(store, prefix, engine.referenced, lock=lock)
+            pruned = prune_dedup_objects(store, prefix.rsplit('/', 1)[0], dedup_prefix)
+        except (ObjectStoreError, ValueError, KeyError, TypeError) as e:
+            logging.warning("Could not prune deduplicated objects under %s/: %s. Unreferenced objects are kept.",
+                            dedup_prefix, e)
+        else:
+            if pruned and pruned[0]:
+                logging.info("Deleted %d deduplicated objects (%s) no longer referenced by any backup set.",
+                             pruned[0], format_bytes(pruned[1]))
+    sys.exit(1 if any(r.error for r in results) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+# This file is managed by Puppet.
+#
+# Streaming backup verification engine behind verify-backup.sh.
+# Every table archive of a backup set (by default the newest) is read back
+# through the restore engine's pipeline, i.e. concurrent ranged GETs,
+# decryption and gunzip, and walked as a tar stream. With --full-chain, so is
+# every other set in its restore chain. Nothing is written to local disk.
+# An archive passes when:
+# - it decrypts and decompresses to the end, so the padding and the gzip
+#   CRC and length trailer are good;
+# - it is a well-formed tar whose members all stay inside the table directory;
+# - the CRC32 of every SSTable's Data.db matches its Digest.crc32 component;
+# - every deduplicated component listed in its backup_refs.json exists and
+#   decrypts to the size recorded there (and to its digest, for Data.db).
+# Manifests are checked to be valid JSON.
+#
+# With --sample, that percentage of the tables across the whole restore chain
+# is verified per run instead, those verified longest ago first, plus any
+# table with an object that has gone --cycle-days without a successful
+# verification. Daily runs with --sample 15 --cycle-days 7 thus cover the
+# whole chain at least weekly.
+# The outcome for each object is kept in the backup catalog.
+#
+# Exit codes: 0 everything verified is intact, 1 objects failed
+# verification, 2 the verification could not run.
+
+import argparse
+import json
+import logging
+import math
+import os
+import socket
+import sqlite3
+import sys
+import tarfile
+import time
+import zlib
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from cassandra_backup_catalog import CATALOG_FILE, MANIFEST_FILE, BackupCatalog, CatalogError, parse_manifest
+from cassandra_backup_crypto import CipherError, cipher_backend
+from cassandra_backup_engine import CHUNK_SIZE, CONFIG_FILE, MIB, REFS_FILE, BufferPool, format_bytes, load_config
+from cassandra_object_store import ObjectStoreError, RateLimiter, open_store, parse_rate
+from cassandra_restore_engine import (ARCHIVE_SUFFIX, DEFAULT_DOWNLOAD_THREADS, DEFAULT_RANGE_SIZE_MB,
+                                      PlaintextReader, RangedObjectReader, RestoreError)
+from cassandra_telemetry import emit_event
+
+# --- Constants ---
+DEFAULT_PARALLELISM = 4
+DEFAULT_CYCLE_DAYS = 7
+DAY = 86400
+DATA_SUFFIX = '-Data.db'
+DIGEST_SUFFIX = '-Digest.crc32'
+
+# An object to verify. `table` is (keyspace, table) for archives and None for manifests.
+VerifyObject = namedtuple('VerifyObject', ['key', 'size', 'last_modified', 'table'])
+# The outcome of verifying an object. `detail` says what was checked, or why it failed.
+VerifyResult = namedtuple('VerifyResult', ['key', 'size', 'ok', 'detail', 'read_bytes', 'seconds'])
+
+# --- Logging Setup ---
+logging.basicConfig(
+    level=logging.INFO,
+    format='[%(asctime)s] %(levelname)s: %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S',
+    stream=sys.stderr
+)
+
+
+class VerificationError(Exception):
+    """Raised when an object is readable but its contents are not intact."""
+
+
+# --- Helper Functions ---
+
+def table_path(name):
+    """Normalizes a path inside a table directory, refusing paths that leave it."""
+    normalized = os.path.normpath(name)
+    if os.path.isabs(normalized) or normalized == '..' or normalized.startswith('../'):
+        raise VerificationError(f"'{name}' leaves the table directory.")
+    return normalized
+
+def list_chain_objects(store, host, chain):
+    """Lists the manifests and table archives of every backup set in the chain."""
+    objects = []
+    for backup_id in chain:
+        prefix = f"{host}/{backup_id}/"
+        for key, size, last_modified in store.list(prefix):
+            relative = key[len(prefix):]
+            if relative == MANIFEST_FILE:
+                objects.append(VerifyObject(key, size, last_modified, None))
+            elif relative.endswith(ARCHIVE_SUFFIX):
+                parts = relative[:-len(ARCHIVE_SUFFIX)].split('/')
+                if len(parts) == 2:
+                    objects.append(VerifyObject(key, size, last_modified, tuple(parts)))
+    return objects
+
+def last_good(obj, history):
+    """Returns when an object was last verified successfully, or when it was written if never."""
+    size, verified_at, ok = history.get(obj.key, (None, 0, False))
+    return verified_at if ok and size == obj.size else obj.last_modified
+
+def select_sample(objects, history, percent, cycle_days, now=None):
+    """Picks the objects of this run: `percent` of the tables, those verified longest ago first,
+    plus every table with an object that went `cycle_days` without a successful verification.
+
+    Manifests are always included; they are tiny.
+    """
+    now = now or time.time()
+    tables = {}
+    for obj in objects:
+        if obj.table is not None:
+            tables.setdefault(obj.table, []).append(obj)
+    # A table is as stale as its least recently verified object.
+    staleness = {table: min(last_good(obj, history) for obj in table_objects)
+                 for table, table_objects in tables.items()}
+    ordered = sorted(tables, key=lambda table: (staleness[table], table))
+    chosen = set(ordered[:math.ceil(len(ordered) * percent / 100)])
+    chosen.update(table for table in ordered if staleness[table] <= now - cycle_days * DAY)
+    return [obj for obj in objects if obj.table is None or obj.table in chosen]
+
+def coverage(objects, history, cycle_days, now=None):
+    """Returns the (objects, bytes) of the chain successfully verified within the last `cycle_days`."""
+    now = now or time.time()
+    covered = [obj for obj in objects if obj.key in history and history[obj.key][2]
+               and history[obj.key][0] == obj.size and history[obj.key][1] > now - cycle_days * DAY]
+    return len(covered), sum(obj.size for obj in covered)
+
+
+class VerifyEngine:
+    """Verifies objects by streaming them, `parallelism` at a time, with nothing written to disk.
+
+    Downloads share `download_threads` threads for ranged GETs of
+    `range_size` bytes, and at most `buffers` ranges are in memory at once.
+    Deduplicated components already verified within `refs_fresh_seconds`
+    are not read again; they never change once written.
+    """
+
+    def __init__(self, store, passphrase, parallelism=DEFAULT_PARALLELISM, download_threads=DEFAULT_DOWNLOAD_THREADS,
+                 range_size=DEFAULT_RANGE_SIZE_MB * MIB, buffers=None, limiter=None, ref_history=None,
+                 refs_fresh_seconds=DEFAULT_CYCLE_DAYS * DAY):
+        self.store = store
+        self.passphrase = passphrase
+        self.parallelism = max(1, parallelism)
+        self.download_threads = max(1, download_threads)
+        self.range_size = range_size
+        self.pool = BufferPool(buffers or self.download_threads * 2)
+        self.limiter = limiter
+        self.ref_history = ref_history or {}
+        self.refs_fresh_seconds = refs_fresh_seconds
+        self.executor = None
+
+    def _open(self, key, size):
+        return PlaintextReader(RangedObjectReader(self.store, key, size, self.executor, self.pool,
+                                                  self.range_size, limiter=self.limiter), self.passphrase)
+
+    def _read_plaintext(self, key, size, consume):
+        """Streams an object's plaintext to `consume(chunk)` and returns the bytes downloaded."""
+        reader = self._open(key, size)
+        try:
+            for chunk in iter(lambda: reader.read(CHUNK_SIZE), b''):
+                consume(chunk)
+        finally:
+            reader.close()
+        return reader.source.bytes_read
+
+    def _verify_archive(self, obj, refs_checked):
+        """Walks a table archive, returning (detail, bytes downloaded). Raises VerificationError."""
+        crcs, digests, refs = {}, {}, []
+        files = plain_bytes = 0
+        reader = self._open(obj.key, obj.size)
+        try:
+            with tarfile.open(fileobj=reader, mode='r|', bufsize=CHUNK_SIZE) as tar:
+                for member in tar:
+                    name = table_path(member.name)
+                    if member.issym() or member.islnk():
+                        raise VerificationError(f"Archive member '{member.name}' is a link.")
+                    if not member.isfile():
+                        continue
+                    f = tar.extractfile(member)
+                    crc, length, content = 0, 0, b''
+                    for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                        length += len(chunk)
+                        if name.endswith(DATA_SUFFIX):
+                            crc = zlib.crc32(chunk, crc)
+                        elif name.endswith(DIGEST_SUFFIX) or name == REFS_FILE:
+                            content += chunk
+                    if length != member.size:
+                        raise VerificationError(f"Archive member '{name}' is truncated.")
+                    files += 1
+                    plain_bytes += length
+                    if name.endswith(DATA_SUFFIX):
+                        crcs[name[:-len(DATA_SUFFIX)]] = crc
+                    elif name.endswith(DIGEST_SUFFIX):
+                        try:
+                            digests[name[:-len(DIGEST_SUFFIX)]] = int(content.strip())
+                        except ValueError:
+                            raise VerificationError(f"Digest '{name}' does not hold a CRC32 value.")
+                    elif name == REFS_FILE:
+                        try:
+                            refs = json.loads(content)['objects']
+                        except (ValueError, KeyError, TypeError):
+                            raise VerificationError(f"Archive has an unreadable {REFS_FILE}.")
+            reader.drain()
+        finally:
+            reader.close()
+        downloaded = reader.source.bytes_read
+
+        reused = 0
+        for ref in refs:
+            size, read = self._verify_ref(ref, crcs)
+            if read is None:
+                reused += 1
+            else:
+                downloaded += read
+                refs_checked.append((ref['key'], size))
+
+        checked = 0
+        for prefix, digest in digests.items():
+            if prefix not in crcs:
+                continue  # Its Data.db is a component verified by an earlier run.
+            if crcs[prefix] != digest:
+                raise VerificationError(f"Checksum mismatch for {prefix}{DATA_SUFFIX}: CRC32 {crcs[prefix]}, "
+                                        f"digest {digest}.")
+            checked += 1
+        detail = f"{files} files, {format_bytes(plain_bytes)}, {checked} SSTable checksums"
+        if refs:
+            detail += f", {len(refs) - reused} of {len(refs)} referenced components read"
+        return detail, downloaded
+
+    def _verify_ref(self, ref, crcs):
+        """Verifies a deduplicated component.
+
+        Returns its object size and the bytes downloaded, which are None if it was verified recently.
+        """
+        name = table_path(ref['file'])
+        size = self.store.size(ref['key'])
+        if size is None:
+            raise VerificationError(f"Referenced object {ref['key']} for {ref['file']} does not exist.")
+        stored_size, verified_at, ok = self.ref_history.get(ref['key'], (None, 0, False))
+        if ok and stored_size == size and verified_at > time.time() - self.refs_fresh_seconds:
+            return size, None
+        state = {'length': 0, 'crc': 0}
+
+        def consume(chunk):
+            state['length'] += len(chunk)
+            if name.endswith(DATA_SUFFIX):
+                state['crc'] = zlib.crc32(chunk, state['crc'])
+
+        downloaded = self._read_plaintext(ref['key'], size, consume)
+        if state['length'] != ref['size']:
+            raise VerificationError(f"Referenced object {ref['key']} holds {state['length']} bytes, "
+                                    f"expected {ref['size']}.")
+        if name.endswith(DATA_SUFFIX):
+            crcs[name[:-len(DATA_SUFFIX)]] = state['crc']
+        return size, downloaded
+
+    def verify(self, obj):
+        """Verifies one object. Returns its VerifyResult and the (key, size) of the referenced components read."""
+        start = time.time()
+        refs_checked = []
+        try:
+            if obj.table is None:
+                manifest = parse_manifest(self.store.get(obj.key))
+                if manifest is None:
+                    raise VerificationError("Manifest is empty or invalid.")
+                detail, downloaded = f"{manifest['backup_type']} backup manifest", obj.size
+            else:
+                detail, downloaded = self._verify_archive(obj, refs_checked)
+            return VerifyResult(obj.key, obj.size, True, detail, downloaded, time.time() - start), refs_checked
+        except (VerificationError, RestoreError, CipherError, ObjectStoreError, tarfile.TarError, OSError) as e:
+            error = str(e) or e.__class__.__name__
+            return VerifyResult(obj.key, obj.size, False, error, 0, time.time() - start), refs_checked
+
+    def run(self, objects, on_result):
+        """Verifies all objects, calling `on_result(result, refs_checked)` on this thread as each finishes."""
+        with ThreadPoolExecutor(max_workers=self.download_threads, thread_name_prefix='download') as downloads, \
+                ThreadPoolExecutor(max_workers=self.parallelism, thread_name_prefix='verify') as workers:
+            self.executor = downloads
+            futures = [workers.submit(self.verify, obj) for obj in objects]
+            for future in as_completed(futures):
+                on_result(*future.result())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Verifies backup archives by streaming them, without writing to disk.')
+    parser.add_argument('command', nargs='?', choices=['verify', 'check'], default='verify', help="'verify' (default) verifies a backup chain; 'check' verifies the engine can run here.")
+    parser.add_argument('--host', default=socket.gethostname().split('.')[0], help='Optional: Host whose backups are verified. Default: this host.')
+    parser.add_argument('--backup-id', help="Optional: Backup set 'YYYY-MM-DD-HH-MM' whose restore chain is verified. Default: the newest.")
+    scope = parser.add_mutually_exclusive_group()
+    scope.add_argument('--full-chain', action='store_true', help='Optional: Verify every backup set in the restore chain, not just the backup set itself. Streams the whole chain.')
+    scope.add_argument('--sample', type=float, help='Optional: Percentage of the tables in the restore chain verified in this run, least recently verified first. Default: only the backup set itself is verified.')
+    parser.add_argument('--cycle-days', type=float, default=DEFAULT_CYCLE_DAYS, help=f'Optional: With --sample, tables with an object not verified for this many days are always included. Default: {DEFAULT_CYCLE_DAYS}.')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+    parser.add_argument('--config', default=CONFIG_FILE, help=f'Backup configuration file. Default: {CONFIG_FILE}.')
+    parser.add_argument('--store', help="Optional: Object store URL, 's3://<bucket>' or 'file:///<directory>'. Default: the configured S3 bucket.")
+    parser.add_argument('--endpoint-url', help="Optional: S3-compatible endpoint URL. Default: 's3_endpoint_url' from the configuration, else AWS.")
+    parser.add_argument('--catalog-file', default=CATALOG_FILE, help=f'Optional: Backup catalog database, where results are kept. Default: {CATALOG_FILE}.')
+    parser.add_argument('--key-file', help="Optional: File holding the encryption passphrase. Default: 'encryption_key' from the configuration.")
+    parser.add_argument('--parallelism', type=int, default=DEFAULT_PARALLELISM, help=f'Optional: Objects verified concurrently. Default: {DEFAULT_PARALLELISM}.')
+    parser.add_argument('--download-threads', type=int, default=DEFAULT_DOWNLOAD_THREADS, help=f'Optional: Concurrent ranged GETs shared by all objects. Default: {DEFAULT_DOWNLOAD_THREADS}.')
+    parser.add_argument('--range-size-mb', type=int, default=DEFAULT_RANGE_SIZE_MB, help=f'Optional: Size of each ranged GET in MiB. Default: {DEFAULT_RANGE_SIZE_MB}.')
+    parser.add_argument('--throttle', help="Optional: Total download bandwidth limit, e.g. '50M/s'. Default: 'throttle_rate' from the configuration.")
+    args = parser.parse_args()
+
+    if args.sample is not None and not 0 < args.sample <= 100:
+        parser.error('--sample must be a percentage above 0 and at most 100.')
+
+    try:
+        config = load_config(args.config)
+    except (IOError, OSError, ValueError) as e:
+        logging.error("Could not read backup configuration %s: %s", args.config, e)
+        sys.exit(2)
+
+    download_threads = max(1, args.download_threads)
+    store_url = args.store or f"s3://{config.get('s3_bucket_name', '')}"
+    try:
+        store = open_store(store_url, endpoint_url=args.endpoint_url or config.get('s3_endpoint_url') or None,
+                           max_connections=download_threads + 4)
+    except ObjectStoreError as e:
+        logging.error("%s", e)
+        sys.exit(2)
+
+    if args.command == 'check':
+        logging.info("Verification engine is usable: object store '%s', cipher '%s'.", store.name, cipher_backend())
+        sys.exit(0)
+
+    if args.key_file:
+        with open(args.key_file, 'rb') as f:
+            passphrase = f.read().rstrip(b'\n')
+    else:
+        passphrase = (config.get('encryption_key') or '').encode()
+    if not passphrase or passphrase == b'null':
+        logging.error("No encryption passphrase configured.")
+        sys.exit(2)
+
+    try:
+        limiter = RateLimiter(parse_rate(args.throttle or config.get('throttle_rate')))
+        catalog = BackupCatalog(args.catalog_file, store, store_url)
+        catalog.refresh(args.host, 0)
+        target = args.backup_id
+        if not target:
+            latest = catalog.latest(args.host)
+            if latest is None:
+                logging.error("No backups found for host '%s' in %s.", args.host, store.name)
+                sys.exit(1)
+            target = latest['backup_id']
+        chain = catalog.chain(args.host, target)
+        objects = list_chain_objects(store, args.host, chain)
+        history = catalog.verifications(f"{args.host}/")
+    except CatalogError as e:
+        logging.error("%s", e)
+        sys.exit(1)
+    except (IOError, OSError, ValueError, sqlite3.Error, ObjectStoreError) as e:
+        logging.error("Could not list the backups to verify: %s", e)
+        sys.exit(2)
+
+    if args.sample is not None:
+        selected = select_sample(objects, history, args.sample, args.cycle_days)
+    elif args.full_chain:
+        selected = objects
+    else:
+        # The rest of the chain is still listed, for the coverage report.
+        selected = [obj for obj in objects if obj.key.startswith(f"{args.host}/{chain[-1]}/")]
+    tables = {obj.table for obj in objects if obj.table}
+    logging.info("Verifying %d of %d objects (%s of %s, %d of %d tables) in the chain %s of %s "
+                 "(%d objects at once, %d download threads, cipher: %s).", len(selected), len(objects),
+                 format_bytes(sum(obj.size for obj in selected)), format_bytes(sum(obj.size for obj in objects)),
+                 len({obj.table for obj in selected if obj.table}), len(tables), ' -> '.join(chain), args.host,
+                 args.parallelism, download_threads, cipher_backend())
+
+    engine = VerifyEngine(store, passphrase, parallelism=args.parallelism, download_threads=download_threads,
+                          range_size=max(1, args.range_size_mb) * MIB, limiter=limiter,
+                          ref_history=catalog.verifications(f"{args.host}/"),
+                          refs_fresh_seconds=args.cycle_days * DAY)
+    results = []
+
+    def record(result, refs_checked):
+        results.append(result)
+        emit_event('progress', done=len(results), total=len(selected), unit='objects')
+        # The catalog connection belongs to this thread, so results are stored here.
+        try:
+            catalog.record_verification(result.key, result.size, result.ok, result.detail)
+            for key, size in refs_checked:
+                catalog.record_verification(key, size, True, f"referenced by {result.key}")
+        except sqlite3.Error as e:
+            logging.warning("Could not record the verification of %s: %s", result.key, e)
+        if result.ok:
+            logging.info("OK %s: %s (%.1fs).", result.key, result.detail, result.seconds)
+        else:
+            logging.error("FAILED %s: %s", result.key, result.detail)
+
+    start = time.time()
+    engine.run(selected, record)
+    elapsed = max(time.time() - start, 0.001)
+
+    history = catalog.verifications(f"{args.host}/")
+    covered, covered_bytes = coverage(objects, history, args.cycle_days)
+    failed = [r for r in results if not r.ok]
+    downloaded = sum(r.read_bytes for r in results)
+    emit_event('result', objects=len(results), objects_failed=len(failed), bytes_downloaded=downloaded)
+    logging.info("Verified %d objects, %d failed: %s downloaded in %.1fs (%.1f MiB/s).", len(results), len(failed),
+                 format_bytes(downloaded), elapsed, downloaded / MIB / elapsed)
+    logging.info("Coverage: %d of %d objects (%s of %s) of the chain verified in the last %g days.", covered,
+                 len(objects), format_bytes(covered_bytes), format_bytes(sum(obj.size for obj in objects)),
+                 args.cycle_days)
+
+    if args.json:
+        print(json.dumps({
+            'host': args.host,
+            'chain': chain,
+            'objects': len(objects),
+            'verified': len(results),
+            'failed': len(failed),
+            'downloaded_bytes': downloaded,
+            'seconds': round(elapsed, 1),
+            'coverage': {'objects': covered, 'bytes': covered_bytes, 'cycle_days': args.cycle_days},
+            'results': [{'key': r.key, 'size_bytes': r.size, 'status': 'OK' if r.ok else 'FAILED',
+                         'detail': r.detail} for r in sorted(results, key=lambda r: r.key)],
+        }, indent=2))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# This file is managed by Puppet.
+#
+# Cluster client layer for the Python operational scripts.
+# Provides a single interface for the ring, status and repair calls the scripts
+# need, with interchangeable backends:
+# - NodetoolClient: runs one 'nodetool' subprocess per call (the original behaviour).
+# - JolokiaClient: talks to the Jolokia JMX-over-HTTP agent over one long-lived
+#   HTTP connection, avoiding a JVM start-up per call.
+# - FakeClusterClient: an in-memory ring for exercising the scripts without a cluster.
+
+import http.client
+import json
+import logging
+import re
+import subprocess
+import threading
+import time
+from base64 import b64encode
+from urllib.parse import urlparse
+
+from cassandra_ring import RingEntry, parse_nodetool_ring
+
+STORAGE_SERVICE_MBEAN = 'org.apache.cassandra.db:type=StorageService'
+SNITCH_INFO_MBEAN = 'org.apache.cassandra.db:type=EndpointSnitchInfo'
+DEFAULT_JOLOKIA_URL = 'http://127.0.0.1:8778/jolokia'
+REPAIR_POLL_INTERVAL = 2  # Seconds between repair status polls over Jolokia.
+# A repair whose status stays unknown for this many polls in a row is given up,
+# e.g. after Cassandra restarted and forgot the command.
+REPAIR_MAX_UNKNOWN_POLLS = 30
+DEFAULT_REPAIR_TIMEOUT = 6 * 3600  # Seconds a single range repair may run over Jolokia.
+
+DESCRIBERING_PATTERN = re.compile(r'start_token:(-?\d+), end_token:(-?\d+), endpoints:\[([^\]]*)\]')
+
+
+class ClusterClientError(Exception):
+    """Raised when a cluster client cannot complete a call."""
+
+
+def parse_describering(lines):
+    """Parses TokenRange(...) lines into a dict of (start, end) -> frozenset of endpoints."""
+    endpoints = {}
+    for match in DESCRIBERING_PATTERN.finditer('\n'.join(lines)):
+        start_token, end_token, hosts = match.groups()
+        endpoints[(start_token, end_token)] = frozenset(h.strip() for h in hosts.split(',') if h.strip())
+    return endpoints
+
+
+class ClusterClient:
+    """Interface shared by all cluster client backends.
+
+    ring() returns a list of RingEntry, one per token in the ring.
+    describe_ring() returns a dict of (start, end) -> frozenset of replica
+    addresses. repair_range() returns 0 on success and non-zero on failure,
+    like the nodetool exit code it replaces.
+    """
+
+    name = 'abstract'
+
+    def local_address(self):
+        raise NotImplementedError
+
+    def ring(self):
+        raise NotImplementedError
+
+    def describe_ring(self, keyspace):
+        raise NotImplementedError
+
+    def repair_range(self, keyspace, start_token, end_token, log_prefix=''):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class NodetoolClient(ClusterClient):
+    """Backend that runs a 'nodetool' subprocess for every call."""
+
+    name = 'nodetool'
+
+    def __init__(self, jmx_user=None, jmx_pass=None):
+        self.base_command = ['nodetool']
+        if jmx_user and jmx_pass:
+            self.base_command.extend(['-u', jmx_user, '-pw', jmx_pass])
+
+    def _run(self, args):
+        try:
+            return subprocess.check_output(self.base_command + args, text=True)
+        except (subprocess.CalledProcessError, FileNotFoundError) as e:
+            raise ClusterClientError(f"'nodetool {' '.join(args)}' failed: {e}")
+
+    def local_address(self):
+        for line in self._run(['status']).splitlines():
+            if line.startswith('UN') or line.startswith('DN'):
+                parts = line.strip().split()
+                if len(parts) > 1:
+                    return parts[1]
+        raise ClusterClientError("Could not parse local IP from 'nodetool status'.")
+
+    def ring(self):
+        return parse_nodetool_ring(self._run(['ring']))
+
+    def describe_ring(self, keyspace):
+        return parse_describering(self._run(['describering', keyspace]).splitlines())
+
+    def repair_range(self, keyspace, start_token, end_token, log_prefix=''):
+        # The '-pr' (primary range) flag is essential for this strategy
+        command = self.base_command + [
+            'repair', '-pr',
+            '-st', str(start_token),
+            '-et', str(end_token),
+            '--', keyspace
+        ]
+
+        logging.info("%sExecuting command: %s", log_prefix, ' '.join(command))
+
+        try:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1)
+            for line in iter(process.stdout.readline, ''):
+                logging.info("%s%s", log_prefix, line.strip())
+            process.stdout.close()
+            return_code = process.wait()
+
+            if return_code != 0:
+                logging.error("%sRepair for range (%s, %s] failed with exit code %s.", log_prefix, start_token, end_token, return_code)
+
+            return return_code
+        except (FileNotFoundError, Exception) as e:
+            logging.error("%sAn unexpected error occurred during repair: %s", log_prefix, e)
+            return 1
+
+
+class JolokiaClient(ClusterClient):
+    """Backend that calls the StorageService MBean through a Jolokia agent.
+
+    A single keep-alive HTTP connection is shared by all threads; requests are
+    serialised with a lock since each one is short. Repairs are started with
+    repairAsync() and followed with getParentRepairStatus(), so a running
+    repair holds no connection or process while it waits.
+    """
+
+    name = 'jolokia'
+
+    def __init__(self, url=DEFAULT_JOLOKIA_URL, user=None, password=None, timeout=30,
+                 repair_timeout=DEFAULT_REPAIR_TIMEOUT):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or '127.0.0.1'
+        self.port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        self.path = parsed.path or '/jolokia'
+        self.https = parsed.scheme == 'https'
+        self.timeout = timeout
+        self.repair_timeout = repair_timeout
+        self.headers = {'Content-Type': 'application/json'}
+        if user and password:
+            token = b64encode(f"{user}:{password}".encode()).decode()
+            self.headers['Authorization'] = f"Basic {token}"
+        self.lock = threading.Lock()
+        self.connection = None
+
+    def _connect(self):
+        connection_class = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        return connection_class(self.host, self.port, timeout=self.timeout)
+
+    def _request(self, payload):
+        body = json.dumps(payload)
+        with self.lock:
+            # Retry once on a fresh connection if the kept-alive one was closed by the agent.
+            for attempt in range(2):
+                if self.connection is None:
+                    self.connection = self._connect()
+                try:
+                    self.connection.request('POST', self.path, body=body, headers=self.headers)
+                    response = self.connection.getresponse()
+                    data = response.read()
+                    break
+                except (http.client.HTTPException, OSError) as e:
+                    self.connection.close()
+                    self.connection = None
+                    if attempt == 1:
+                        raise ClusterClientError(f"Jolokia request to {self.host}:{self.port} failed: {e}")
+
+        try:
+            result = json.loads(data)
+        except ValueError:
+            raise ClusterClientError(f"Invalid response from Jolokia (HTTP {response.status}).")
+        if result.get('status') != 200:
+            raise ClusterClientError(f"Jolokia error: {result.get('error', 'unknown error')}")
+        return result.get('value')
+
+    def _read(self, attribute):
+        return self._request({'type': 'read', 'mbean': STORAGE_SERVICE_MBEAN, 'attribute': attribute})
+
+    def _exec(self, operation, *arguments, mbean=STORAGE_SERVICE_MBEAN):
+        return self._request({'type': 'exec', 'mbean': mbean, 'operation': operation, 'arguments': list(arguments)})
+
+    def local_address(self):
+        host_id = self._read('LocalHostId')
+        try:
+            endpoints = self._read('HostIdToEndpoint')
+        except ClusterClientError:
+            # Cassandra 3.x only exposes the endpoint -> host ID direction.
+            endpoints = {v: k for k, v in self._read('HostIdMap').items()}
+        address = endpoints.get(host_id)
+        if not address:
+            raise ClusterClientError(f"Local host ID {host_id} not found in the ring.")
+        return address.lstrip('/').split(':')[0]
+
+    def ring(self):
+        token_map = {int(token): address.lstrip('/').split(':')[0]
+                     for token, address in self._read('TokenToEndpointMap').items()}
+        locations = {}
+        for address in set(token_map.values()):
+            locations[address] = (
+                self._exec('getDatacenter(java.lang.String)', address, mbean=SNITCH_INFO_MBEAN),
+                self._exec('getRack(java.lang.String)', address, mbean=SNITCH_INFO_MBEAN),
+            )
+        return [RingEntry(address, token, *locations[address]) for token, address in token_map.items()]
+
+    def describe_ring(self, keyspace):
+        return parse_describering(self._exec('describeRingJMX(java.lang.String)', keyspace))
+
+    def repair_range(self, keyspace, start_token, end_token, log_prefix=''):
+        # Mirrors the options 'nodetool repair -pr -st <start> -et <end>' sends.
+        options = {
+            'primaryRange': 'true',
+            'incremental': 'true',
+            'ranges': f"{start_token}:{end_token}",
+        }
+        logging.info("%sStarting repair of (%s, %s] for keyspace '%s' via Jolokia.", log_prefix, start_token, end_token, keyspace)
+        try:
+            command = self._exec('repairAsync(java.lang.String,java.util.Map)', keyspace, options)
+            if not command:
+                logging.info("%sNothing to repair for keyspace '%s'.", log_prefix, keyspace)
+                return 0
+
+            messages_seen = 0
+            unknown_polls = 0
+            deadline = time.monotonic() + self.repair_timeout
+            while True:
+                status = self._exec('getParentRepairStatus(int)', command)
+                if not status:
+                    unknown_polls += 1
+                    if unknown_polls >= REPAIR_MAX_UNKNOWN_POLLS:
+                        logging.error("%sRepair #%s for range (%s, %s] is unknown to Cassandra after %d polls; "
+                                      "it may have restarted. Giving up.", log_prefix, command, start_token, end_token,
+                                      unknown_polls)
+                        return 1
+                else:
+                    unknown_polls = 0
+                    for message in status[1 + messages_seen:]:
+                        logging.info("%s%s", log_prefix, message)
+                    messages_seen = len(status) - 1
+                    if status[0] == 'COMPLETED':
+                        return 0
+                    if status[0] == 'FAILED':
+                        logging.error("%sRepair for range (%s, %s] failed.", log_prefix, start_token, end_token)
+                        return 1
+                if time.monotonic() >= deadline:
+                    logging.error("%sRepair #%s for range (%s, %s] did not finish within %d seconds. Giving up.",
+                                  log_prefix, command, start_token, end_token, self.repair_timeout)
+                    return 1
+                time.sleep(REPAIR_POLL_INTERVAL)
+        except ClusterClientError as e:
+            logging.error("%sAn unexpected error occurred during repair: %s", log_prefix, e)
+            return 1
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+
+class FakeClusterClient(ClusterClient):
+    """In-memory backend for tests and benchmarks.
+
+    `ring` is a list of RingEntry or (address, token) pairs. Replicas are the next
+    `replication_factor` distinct addresses clockwise (SimpleStrategy).
+    `repair_latency` is either a number of seconds or a callable taking
+    (keyspace, start, end) and returning seconds; `failures` is a set of
+    (keyspace, start, end) tuples whose repair returns exit code 1. Every
+    repair call is recorded in `self.repairs`.
+    """
+
+    name = 'fake'
+
+    def __init__(self, ring, local_address, replication_factor=3, repair_latency=0, failures=()):
+        self._ring = sorted((entry if isinstance(entry, RingEntry) else RingEntry(entry[0], int(entry[1]), 'dc1', 'rack1')
+                             for entry in ring), key=lambda entry: entry.token)
+        self._local_address = local_address
+        self.replication_factor = replication_factor
+        self.repair_latency = repair_latency
+        self.failures = set(failures)
+        self.repairs = []
+        self.lock = threading.Lock()
+
+    def local_address(self):
+        return self._local_address
+
+    def ring(self):
+        return list(self._ring)
+
+    def describe_ring(self, keyspace):
+        endpoints = {}
+        distinct_hosts = len({entry.address for entry in self._ring})
+        for i, entry in enumerate(self._ring):
+            replicas = []
+            j = i
+            while len(replicas) < min(self.replication_factor, distinct_hosts):
+                address = self._ring[j % len(self._ring)].address
+                if address not in replicas:
+                    replicas.append(address)
+                j += 1
+            endpoints[(str(self._ring[i - 1].token), str(entry.token))] = frozenset(replicas)
+        return endpoints
+
+    def repair_range(self, keyspace, start_token, end_token, log_prefix=''):
+        key = (keyspace, str(start_token), str(end_token))
+        latency = self.repair_latency(*key) if callable(self.repair_latency) else self.repair_latency
+        if latency:
+            time.sleep(latency)
+        with self.lock:
+            self.repairs.append(key)
+        return 1 if key in self.failures else 0
+
+
+def create_client(backend='nodetool', jmx_user=None, jmx_pass=None, jolokia_url=DEFAULT_JOLOKIA_URL,
+                  jolokia_user=None, jolokia_pass=None):
+    """Creates a cluster client, falling back to nodetool if Jolokia is unreachable."""
+    if backend == 'jolokia':
+        client = JolokiaClient(jolokia_url, jolokia_user, jolokia_pass)
+        try:
+            client.local_address()
+            return client
+        except ClusterClientError as e:
+            logging.warning("Jolokia agent at %s is not usable (%s). Falling back to nodetool.", jolokia_url, e)
+            client.close()
+    return NodetoolClient(jmx_user, jmx_pass)
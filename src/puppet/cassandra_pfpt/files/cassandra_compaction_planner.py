@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+# This file is managed by Puppet.
+#
+# Space-aware compaction planner behind 'compaction-manager.sh --plan'.
+# Instead of starting one 'nodetool compact' and stopping it once the disk is
+# nearly full, the compaction is planned per table before anything starts:
+# - A major compaction writes a new copy of a table before the old SSTables
+#   are removed, so each table needs about its live on-disk size (times
+#   --space-factor) of free space while it runs.
+# - The disk budget is the space that can be used before the disk reaches the
+#   critical threshold, measured the way 'df' (and disk-health-check.sh) does.
+# - Tables are started largest first, up to --concurrency at a time, as long
+#   as the space reserved by every running compaction stays within the budget.
+#   A table that does not fit now is started once a running one has finished;
+#   one that does not fit even on an otherwise idle disk is skipped.
+#
+# With --plan-only the schedule is printed with predicted start and end times,
+# assuming the current compaction throughput is shared by the running
+# compactions, and nothing is compacted. Disk usage is still checked while
+# compactions run, and they are all stopped if it passes the critical threshold.
+#
+# Exit codes: 0 every table compacted (or planned), 1 tables failed or were
+# skipped, 2 compactions stopped at the critical threshold.
+
+import argparse
+import logging
+import os
+import re
+import shlex
+import subprocess
+import sys
+import time
+from collections import namedtuple
+
+# --- Constants ---
+DATA_DIR = '/var/lib/cassandra/data'
+DEFAULT_CRITICAL_THRESHOLD = 85
+DEFAULT_CONCURRENCY = 2
+DEFAULT_SPACE_FACTOR = 1.1  # Headroom over the table size for temporary files and flushes meanwhile.
+DEFAULT_ASSUMED_RATE_MB = 64  # Used for predictions when compaction throughput is unthrottled.
+DEFAULT_CHECK_INTERVAL = 30
+POLL_SECONDS = 1
+EXCLUDED_DIRS = ('snapshots', 'backups')
+MIB = 1024 * 1024
+
+THROUGHPUT_PATTERN = re.compile(r'throughput:\s*([0-9.]+)\s*(\w+)/s', re.IGNORECASE)
+
+# One table to compact. `size` is its live on-disk size, `need` the free space its compaction reserves.
+CompactionJob = namedtuple('CompactionJob', ['keyspace', 'table', 'sstables', 'size', 'need'])
+# A job's place in the predicted schedule, in seconds from the start.
+PlannedJob = namedtuple('PlannedJob', ['job', 'start', 'end'])
+
+# --- Logging Setup ---
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    stream=sys.stderr
+)
+
+
+# --- Helper Functions ---
+
+def disk_budget(path, critical_threshold):
+    """Returns (budget, used, capacity) in bytes, where budget is the space left below the critical threshold.
+
+    Like 'df', capacity is the used space plus the space available to
+    unprivileged users, so blocks reserved for root do not count.
+    """
+    stats = os.statvfs(path)
+    used = (stats.f_blocks - stats.f_bfree) * stats.f_frsize
+    capacity = used + stats.f_bavail * stats.f_frsize
+    return max(0, int(capacity * critical_threshold / 100) - used), used, capacity
+
+def disk_usage_percent(path):
+    """Returns the disk usage of `path` in percent, rounded up like 'df'."""
+    _, used, capacity = disk_budget(path, 100)
+    return -(-used * 100 // capacity) if capacity else 100
+
+def table_size(table_dir):
+    """Returns (number of SSTables, bytes) of a table's live files, including secondary indexes."""
+    sstables, size = 0, 0
+    for dirpath, dirnames, filenames in os.walk(table_dir):
+        dirnames[:] = [d for d in dirnames if d not in EXCLUDED_DIRS]
+        for name in filenames:
+            try:
+                size += os.stat(os.path.join(dirpath, name)).st_size
+            except OSError:
+                continue  # Compacted away since it was listed.
+            if name.endswith('-Data.db'):
+                sstables += 1
+    return sstables, size
+
+def find_jobs(data_dir, keyspace=None, tables=(), space_factor=DEFAULT_SPACE_FACTOR):
+    """Lists a CompactionJob for every table with SSTables, in the given keyspace or all of them."""
+    keyspaces = [keyspace] if keyspace else sorted(
+        name for name in os.listdir(data_dir) if os.path.isdir(os.path.join(data_dir, name)))
+    jobs = []
+    for ks in keyspaces:
+        try:
+            names = sorted(os.listdir(os.path.join(data_dir, ks)))
+        except OSError:
+            logging.warning("Could not list keyspace directory %s.", os.path.join(data_dir, ks))
+            continue
+        # A table that was dropped and recreated has more than one directory.
+        totals = {}
+        for name in names:
+            table_dir = os.path.join(data_dir, ks, name)
+            table = name.rsplit('-', 1)[0]
+            if not os.path.isdir(table_dir) or (tables and table not in tables):
+                continue
+            sstables, size = table_size(table_dir)
+            previous = totals.get(table, (0, 0))
+            totals[table] = (previous[0] + sstables, previous[1] + size)
+        for table in tables:
+            if table not in totals:
+                logging.warning("Could not find data directory for table '%s' in keyspace '%s'.", table, ks)
+        jobs.extend(CompactionJob(ks, table, sstables, size, int(size * space_factor))
+                    for table, (sstables, size) in totals.items() if sstables)
+    return jobs
+
+def compaction_throughput():
+    """Returns the compaction throughput limit in bytes per second, 0 if unthrottled, or None if unknown."""
+    try:
+        output = subprocess.run(['nodetool', 'getcompactionthroughput'], capture_output=True, text=True,
+                                timeout=60).stdout
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    match = THROUGHPUT_PATTERN.search(output)
+    if match is None:
+        return None
+    unit = match.group(2).lower()
+    scale = {'kib': 1024, 'kb': 1024, 'mib': MIB, 'mb': MIB, 'gib': 1024 * MIB, 'gb': 1024 * MIB}.get(unit, MIB)
+    return int(float(match.group(1)) * scale)
+
+def format_duration(seconds):
+    seconds = int(round(seconds))
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+class CompactionPlanner:
+    """Decides which tables to compact when, within `budget` bytes and `concurrency` compactions at a time."""
+
+    def __init__(self, jobs, budget, concurrency=DEFAULT_CONCURRENCY):
+        self.budget = budget
+        self.concurrency = max(1, concurrency)
+        # Largest first: the biggest compactions only fit while nothing else holds space.
+        ordered = sorted(jobs, key=lambda job: job.need, reverse=True)
+        self.skipped = [job for job in ordered if job.need > budget]
+        self.pending = [job for job in ordered if job.need <= budget]
+
+    def next_job(self, running):
+        """Removes and returns the largest pending job that fits next to `running`, or None."""
+        if len(running) >= self.concurrency:
+            return None
+        free = self.budget - sum(job.need for job in running)
+        for i, job in enumerate(self.pending):
+            if job.need <= free:
+                return self.pending.pop(i)
+        return None
+
+    def predict(self, rate):
+        """Simulates the plan with `rate` bytes per second shared by the running compactions.
+
+        Returns the PlannedJob list in start order. The planner is used up.
+        """
+        schedule, running, now = [], {}, 0.0  # running: job -> bytes left to write.
+        while self.pending or running:
+            job = self.next_job(list(running))
+            while job is not None:
+                schedule.append([job, now, None])
+                running[job] = job.size
+                job = self.next_job(list(running))
+            # Cassandra throttles all compactions together, so each runs at an equal share of the rate.
+            share = rate / len(running)
+            finished = min(running, key=running.get)
+            elapsed = running[finished] / share
+            now += elapsed
+            for other in running:
+                running[other] -= elapsed * share
+            del running[finished]
+            next(entry for entry in schedule if entry[0] is finished)[2] = now
+        return [PlannedJob(*entry) for entry in schedule]
+
+
+def print_plan(schedule, skipped, budget, rate, concurrency):
+    print(f"Disk budget: {budget // MIB} MB below the critical threshold, up to {concurrency} compaction(s) at once, "
+          f"assuming {rate // MIB} MB/s compaction throughput.")
+    rows = [['KEYSPACE.TABLE', 'SSTABLES', 'SIZE(MB)', 'NEEDS(MB)', 'START', 'END']]
+    rows += [[f"{p.job.keyspace}.{p.job.table}", p.job.sstables, p.job.size // MIB, p.job.need // MIB,
+              format_duration(p.start), format_duration(p.end)] for p in schedule]
+    rows += [[f"{job.keyspace}.{job.table}", job.sstables, job.size // MIB, job.need // MIB, 'SKIPPED', '-']
+             for job in skipped]
+    widths = [max(len(str(row[i])) for row in rows) for i in range(len(rows[0]))]
+    for row in rows:
+        print('  '.join(str(value).ljust(width) for value, width in zip(row, widths)).rstrip())
+    if schedule:
+        print(f"Predicted duration: {format_duration(max(p.end for p in schedule))}")
+
+
+def stop_all(processes):
+    """Stops every running compaction after the disk passed the critical threshold."""
+    subprocess.run(['nodetool', 'stop', 'COMPACTION'], capture_output=True)
+    time.sleep(10)
+    for process in processes:
+        if process.poll() is None:
+            logging.warning("nodetool did not stop; killing PID %d.", process.pid)
+            process.kill()
+
+def run_plan(planner, disk_path, critical_threshold, nodetool_options, check_interval):
+    """Runs the compactions as planned. Returns the list of jobs that failed, or None if they were stopped."""
+    running, failed = {}, []  # running: Popen -> job.
+    last_check = 0.0
+    while planner.pending or running:
+        job = planner.next_job(list(running.values()))
+        while job is not None:
+            cmd = ['nodetool', 'compact'] + nodetool_options + ['--', job.keyspace, job.table]
+            logging.info("Compacting %s.%s (%d SSTables, %d MB, reserving %d MB): %s", job.keyspace, job.table,
+                         job.sstables, job.size // MIB, job.need // MIB, ' '.join(cmd))
+            running[subprocess.Popen(cmd)] = job
+            job = planner.next_job(list(running.values()))
+
+        time.sleep(POLL_SECONDS)
+        for process in [p for p in running if p.poll() is not None]:
+            job = running.pop(process)
+            if process.returncode == 0:
+                logging.info("Compaction of %s.%s finished.", job.keyspace, job.table)
+            else:
+                logging.error("Compaction of %s.%s exited with code %d.", job.keyspace, job.table, process.returncode)
+                failed.append(job)
+
+        if running and time.time() - last_check >= check_interval:
+            last_check = time.time()
+            usage = disk_usage_percent(disk_path)
+            if usage > critical_threshold:
+                logging.error("CRITICAL: Disk usage is %d%%, above %d%%. Stopping all compactions.",
+                              usage, critical_threshold)
+                stop_all(running)
+                return None
+            logging.info("%d compaction(s) running, %d pending. Disk usage %d%%.", len(running),
+                         len(planner.pending), usage)
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Plans and runs per-table compactions within the free disk space.')
+    parser.add_argument('--keyspace', '-k', help='Optional: Keyspace to compact. Default: all keyspaces.')
+    parser.add_argument('--table', '-t', action='append', default=[], help='Optional: Table to compact. Can be used multiple times.')
+    parser.add_argument('--plan-only', action='store_true', help='Print the predicted schedule without compacting.')
+    parser.add_argument('--data-dir', default=DATA_DIR, help=f'Optional: Cassandra data directory, also checked for disk usage. Default: {DATA_DIR}.')
+    parser.add_argument('--critical', type=int, default=DEFAULT_CRITICAL_THRESHOLD, help=f'Optional: Disk usage (%%) compactions must stay below. Default: {DEFAULT_CRITICAL_THRESHOLD}.')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help=f'Optional: Table compactions at once. Default: {DEFAULT_CONCURRENCY}.')
+    parser.add_argument('--space-factor', type=float, default=DEFAULT_SPACE_FACTOR, help=f'Optional: Free space reserved per compaction, as a multiple of the table size. Default: {DEFAULT_SPACE_FACTOR}.')
+    parser.add_argument('--assumed-rate', type=int, default=DEFAULT_ASSUMED_RATE_MB, help=f'Optional: MB/s used for predictions when compaction is unthrottled. Default: {DEFAULT_ASSUMED_RATE_MB}.')
+    parser.add_argument('--interval', type=int, default=DEFAULT_CHECK_INTERVAL, help=f'Optional: Seconds between disk usage checks. Default: {DEFAULT_CHECK_INTERVAL}.')
+    parser.add_argument('--nodetool-options', default='', help="Optional: Extra options for each 'nodetool compact' (e.g., '--split-output').")
+    args = parser.parse_args()
+
+    if args.table and not args.keyspace:
+        parser.error('--table requires --keyspace.')
+
+    try:
+        jobs = find_jobs(args.data_dir, args.keyspace, args.table, args.space_factor)
+        budget, used, capacity = disk_budget(args.data_dir, args.critical)
+    except OSError as e:
+        logging.error("Could not read %s: %s", args.data_dir, e)
+        sys.exit(1)
+    if not jobs:
+        logging.warning("No tables with SSTables to compact.")
+        sys.exit(0)
+    logging.info("%d table(s), %d MB in total. Disk %d%% used; %d MB can be used below %d%%.", len(jobs),
+                 sum(job.size for job in jobs) // MIB, -(-used * 100 // capacity) if capacity else 100,
+                 budget // MIB, args.critical)
+
+    planner = CompactionPlanner(jobs, budget, args.concurrency)
+    for job in planner.skipped:
+        logging.warning("Skipping %s.%s: its compaction needs %d MB, but only %d MB can be used.",
+                        job.keyspace, job.table, job.need // MIB, budget // MIB)
+
+    if args.plan_only:
+        rate = compaction_throughput()
+        if not rate:
+            rate = args.assumed_rate * MIB
+        print_plan(CompactionPlanner(jobs, budget, args.concurrency).predict(rate), planner.skipped,
+                   budget, rate, planner.concurrency)
+        sys.exit(1 if planner.skipped else 0)
+
+    failed = run_plan(planner, args.data_dir, args.critical, shlex.split(args.nodetool_options), args.interval)
+    if failed is None:
+        sys.exit(2)
+    if failed or planner.skipped:
+        logging.error("%d table(s) failed and %d were skipped: %s", len(failed), len(planner.skipped),
+                      ', '.join(f"{job.keyspace}.{job.table}" for job in failed + planner.skipped))
+        sys.exit(1)
+    logging.info("All %d table(s) compacted.", len(jobs))
+
+
+if __name__ == '__main__':
+    main()
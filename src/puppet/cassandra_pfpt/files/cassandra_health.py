@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+# This file is managed by Puppet.
+#
+# Node health check engine behind 'cass-ops health'.
+# Runs the same checks as node_health_check.sh and prints the same report (or,
+# with --json, the same JSON), but:
+# - Runs independent checks concurrently instead of one nodetool JVM after another.
+# - Reads nodetool output through a short-lived snapshot shared by all checks
+#   and, through /var/cache/cassandra_pfpt/nodetool/, by every concurrent or
+#   repeated caller. Only one caller at a time refreshes a command; the others
+#   wait for it and reuse its output. Failed commands are never cached, and a
+#   snapshot taken before Cassandra was (re)started is never used.
+#
+#   cassandra_health.py [--json]                 Full health check.
+#   cassandra_health.py --nodetool status        Cached 'nodetool status', as used by cluster-health.sh.
+#
+# Exit codes: 0 healthy, 1 errors found, 2 warnings only. With --nodetool,
+# the exit code of nodetool.
+
+import argparse
+import fcntl
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Constants ---
+CACHE_DIR = '/var/cache/cassandra_pfpt/nodetool'
+DEFAULT_MAX_AGE = 10  # Seconds a nodetool snapshot is shared for.
+NODETOOL_TIMEOUT = 120
+PENDING_COMPACTIONS_WARNING = 50
+LOG_WINDOW = '10 minutes ago'
+SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))
+SCHEMA_VERSION_PATTERN = re.compile(r'^\s*(\S+):\s*\[')
+
+# The output of one nodetool command. `instance` identifies the Cassandra process it came from.
+NodetoolResult = namedtuple('NodetoolResult', ['returncode', 'stdout', 'stderr', 'fetched_at', 'instance'])
+# The outcome of one check. `details` is None or extra text for the JSON report.
+CheckResult = namedtuple('CheckResult', ['name', 'status', 'message', 'details'])
+
+
+# --- Color Codes ---
+class Colors:
+    RED = '\033[0;31m'
+    GREEN = '\033[0;32m'
+    YELLOW = '\033[1;33m'
+    BLUE = '\033[0;34m'
+    END = '\033[0m'
+
+
+def cassandra_instance():
+    """Identifies the running Cassandra process, so snapshots from before a restart are not reused."""
+    try:
+        return subprocess.run(['systemctl', 'show', '--property=MainPID', '--value', 'cassandra'],
+                              capture_output=True, text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ''
+
+
+class NodetoolSnapshot:
+    """Short-lived cache of nodetool output shared by threads and processes.
+
+    get() returns the output of a nodetool command no older than `max_age`
+    seconds. Threads asking for the same command wait for one another, and
+    processes do the same through a lock file, so the command runs once per
+    `max_age` however many callers poll it. Without a writable `cache_dir`
+    the snapshot is only shared within this process.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_age=DEFAULT_MAX_AGE, nodetool=('nodetool',)):
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+        self.nodetool = list(nodetool)
+        self.instance = cassandra_instance() if max_age > 0 else ''
+        self.results = {}
+        self.locks = {}
+        self.locks_lock = threading.Lock()
+
+    def _lock_for(self, key):
+        with self.locks_lock:
+            return self.locks.setdefault(key, threading.Lock())
+
+    def _fresh(self, result):
+        return (result is not None and result.returncode == 0 and result.instance == self.instance
+                and 0 <= time.time() - result.fetched_at <= self.max_age)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _load(self, key):
+        try:
+            with open(self._path(key)) as f:
+                return NodetoolResult(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def _save(self, key, result):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(result._asdict(), f)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    def _run(self, args):
+        try:
+            process = subprocess.run(self.nodetool + args, capture_output=True, text=True, timeout=NODETOOL_TIMEOUT)
+            returncode, stdout, stderr = process.returncode, process.stdout, process.stderr
+        except FileNotFoundError:
+            returncode, stdout, stderr = 127, '', "nodetool: command not found\n"
+        except subprocess.TimeoutExpired:
+            returncode, stdout, stderr = 124, '', f"nodetool {' '.join(args)} timed out after {NODETOOL_TIMEOUT}s\n"
+        return NodetoolResult(returncode, stdout, stderr, time.time(), self.instance)
+
+    def get(self, *args):
+        args = list(args)
+        if self.max_age <= 0:
+            return self._run(args)
+        key = '-'.join(args)
+        with self._lock_for(key):
+            result = self.results.get(key)
+            if self._fresh(result):
+                return result
+            result = self._load(key)
+            if not self._fresh(result):
+                result = self._refresh(key, args)
+            self.results[key] = result
+            return result
+
+    def _refresh(self, key, args):
+        lock_file = None
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            lock_file = open(os.path.join(self.cache_dir, f"{key}.lock"), 'a')
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # Another process may have refreshed it while we waited for the lock.
+            result = self._load(key)
+            if self._fresh(result):
+                return result
+        except OSError:
+            pass
+        try:
+            result = self._run(args)
+            if result.returncode == 0 and lock_file is not None:
+                self._save(key, result)
+            return result
+        finally:
+            if lock_file is not None:
+                lock_file.close()
+
+
+def local_addresses():
+    """Returns the addresses 'hostname -i' resolves this host to."""
+    try:
+        return subprocess.run(['hostname', '-i'], capture_output=True, text=True, timeout=10).stdout.split()
+    except (OSError, subprocess.SubprocessError):
+        return []
+
+
+# --- Checks ---
+# Each check takes the snapshot and returns a CheckResult.
+
+def check_disk_space(snapshot):
+    try:
+        process = subprocess.run([os.path.join(SCRIPT_DIR, 'disk-health-check.sh')], stdout=subprocess.PIPE,
+                                 stderr=subprocess.STDOUT, text=True)
+    except OSError as e:
+        return CheckResult('disk_space', 'ERROR', f"Disk health check script could not be run: {e}", None)
+    output = process.stdout.strip()
+    if process.returncode == 0:
+        return CheckResult('disk_space', 'OK', output, None)
+    if process.returncode == 1:
+        return CheckResult('disk_space', 'WARNING', output, None)
+    if process.returncode == 2:
+        return CheckResult('disk_space', 'ERROR', output, None)
+    return CheckResult('disk_space', 'ERROR',
+                       f"Disk health check script failed with unexpected exit code: {process.returncode}", output)
+
+def check_node_status(snapshot):
+    addresses = local_addresses()
+    status = None
+    for line in snapshot.get('status').stdout.splitlines():
+        parts = line.split()
+        if len(parts) > 1 and parts[1] in addresses:
+            status = parts[0]
+            break
+    if status == 'UN':
+        return CheckResult('node_status', 'OK', "Node status is UN (Up/Normal).", None)
+    if status is None:
+        return CheckResult('node_status', 'ERROR',
+                           f"Could not find local node IP ({' '.join(addresses)}) in nodetool status output.", None)
+    return CheckResult('node_status', 'ERROR', f"Node status is '{status}', not UN.", None)
+
+def check_schema_agreement(snapshot):
+    output = snapshot.get('describecluster').stdout
+    versions = None
+    for line in output.splitlines():
+        if 'Schema versions:' in line:
+            versions = set()
+        elif versions is not None:
+            match = SCHEMA_VERSION_PATTERN.match(line)
+            if not match:
+                break
+            # Unreachable nodes have no schema version to disagree with.
+            if match.group(1) != 'UNREACHABLE':
+                versions.add(match.group(1))
+    if versions and len(versions) == 1:
+        return CheckResult('schema_agreement', 'OK', "Schema is in agreement across the cluster.", None)
+    if versions:
+        return CheckResult('schema_agreement', 'ERROR',
+                           f"Schema disagreement detected! Found {len(versions)} different schema versions.", output)
+    return CheckResult('schema_agreement', 'WARNING',
+                       "Could not determine schema agreement from 'nodetool describecluster'.", output)
+
+def check_gossip(snapshot):
+    addresses = local_addresses()
+    status = None
+    in_local_block = False
+    for line in snapshot.get('gossipinfo').stdout.splitlines():
+        if line.strip().startswith('/') or (line and not line[0].isspace()):
+            # Endpoint headers are '/<ip>' or '<hostname>/<ip>'.
+            in_local_block = line.strip().rsplit('/', 1)[-1] in addresses
+        elif in_local_block and line.strip().startswith('STATUS:'):
+            fields = line.strip().split(':')
+            # 'STATUS:<version>:NORMAL,<token>' since 3.0, 'STATUS:NORMAL,<token>' before.
+            status = (fields[2] if len(fields) > 2 else fields[1]).split(',')[0].strip()
+            break
+    if status == 'NORMAL':
+        return CheckResult('gossip_status', 'OK', "Gossip state is NORMAL.", None)
+    if status:
+        return CheckResult('gossip_status', 'WARNING',
+                           f"Gossip state is '{status}', not NORMAL. This might be temporary.", None)
+    return CheckResult('gossip_status', 'WARNING', "Could not determine gossip status for local node.", None)
+
+def check_network_streams(snapshot):
+    output = snapshot.get('netstats').stdout
+    if 'Mode: NORMAL' in output:
+        return CheckResult('network_streams', 'OK', "Network mode is NORMAL.", None)
+    return CheckResult('network_streams', 'WARNING',
+                       "Node is not in NORMAL mode. It might be streaming, joining, or leaving.", output)
+
+def check_pending_compactions(snapshot):
+    pending = None
+    for line in snapshot.get('compactionstats').stdout.splitlines():
+        if 'pending tasks' in line:
+            parts = line.split()
+            pending = int(parts[2]) if len(parts) > 2 and parts[2].isdigit() else None
+            break
+    if pending is None:
+        return CheckResult('pending_compactions', 'WARNING', "Could not parse pending compaction tasks.", None)
+    if pending > PENDING_COMPACTIONS_WARNING:
+        return CheckResult('pending_compactions', 'WARNING', f"High number of pending compaction tasks: {pending}.", None)
+    return CheckResult('pending_compactions', 'OK',
+                       f"Pending compaction tasks are within a reasonable range ({pending}).", None)
+
+def check_dropped_messages(snapshot):
+    dropped = None
+    dropping = []
+    for line in snapshot.get('tpstats').stdout.splitlines():
+        parts = line.split()
+        if line.startswith('Message type'):
+            dropped = 0
+        elif dropped is not None and len(parts) > 1 and parts[1].isdigit():
+            dropped += int(parts[1])
+            if int(parts[1]):
+                dropping.append(line)
+        elif dropped is not None and parts:
+            break
+    if dropped is None:
+        return CheckResult('dropped_messages', 'WARNING', "Could not parse dropped message count from tpstats.", None)
+    if dropped > 0:
+        return CheckResult('dropped_messages', 'WARNING',
+                           f"Found {dropped} dropped messages across all thread pools. This may indicate an overloaded node.",
+                           '\n'.join(dropping))
+    return CheckResult('dropped_messages', 'OK', "No dropped messages detected.", None)
+
+def check_log_exceptions(snapshot):
+    try:
+        output = subprocess.run(['journalctl', '-u', 'cassandra', '-S', LOG_WINDOW],
+                                capture_output=True, text=True).stdout
+    except OSError:
+        output = ''
+    exceptions = [line for line in output.splitlines() if 'Exception' in line]
+    if exceptions:
+        return CheckResult('log_exceptions', 'WARNING',
+                           "Found 'Exception' in Cassandra logs from the last 10 minutes. Please review logs manually.",
+                           '\n'.join(exceptions[-10:]))
+    return CheckResult('log_exceptions', 'OK', "No recent exceptions found in logs.", None)
+
+# (report header, check), in report order.
+CHECKS = [
+    ('1. Checking Disk Space', check_disk_space),
+    ('2. Checking Node Status', check_node_status),
+    ('3. Checking Schema Agreement', check_schema_agreement),
+    ('4. Checking Gossip Status', check_gossip),
+    ('5. Checking for Network Streams', check_network_streams),
+    ('6. Checking for Pending Compactions', check_pending_compactions),
+    ('7. Checking for Dropped Messages', check_dropped_messages),
+    ('8. Scanning System Log for Recent Exceptions', check_log_exceptions),
+]
+
+
+def run_checks(snapshot, parallelism=len(CHECKS)):
+    """Runs every check concurrently and returns their results in report order."""
+    with ThreadPoolExecutor(max_workers=max(1, parallelism), thread_name_prefix='check') as executor:
+        futures = [executor.submit(check, snapshot) for _, check in CHECKS]
+    results = []
+    for (_, check), future in zip(CHECKS, futures):
+        try:
+            results.append(future.result())
+        except Exception as e:
+            name = check.__name__[len('check_'):]
+            results.append(CheckResult(name, 'ERROR', f"Check failed unexpectedly: {e}", None))
+    return results
+
+
+def log_message(message):
+    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {message}")
+
+
+def print_report(results):
+    log_message(f"{Colors.BLUE}========= Starting Node Health Check ========={Colors.END}")
+    for (header, _), result in zip(CHECKS, results):
+        print(f"\n{Colors.BLUE}--- {header} ---{Colors.END}")
+        color = {'OK': Colors.GREEN, 'WARNING': Colors.YELLOW}.get(result.status, Colors.RED)
+        log_message(f"{color}{result.status}: {result.message}{Colors.END}")
+    failures = sum(1 for r in results if r.status == 'ERROR')
+    warnings = sum(1 for r in results if r.status == 'WARNING')
+    print(f"\n{Colors.BLUE}--- Health Check Summary ---{Colors.END}")
+    if failures:
+        log_message(f"{Colors.RED}Result: FAILED. Found {failures} critical error(s) and {warnings} warning(s).{Colors.END}")
+        log_message(f"{Colors.RED}Do NOT proceed with maintenance until errors are resolved.{Colors.END}")
+    elif warnings:
+        log_message(f"{Colors.YELLOW}Result: PASSED with {warnings} warning(s). Proceed with caution.{Colors.END}")
+    else:
+        log_message(f"{Colors.GREEN}Result: PASSED. Node appears healthy.{Colors.END}")
+
+
+def report_json(results):
+    failures = sum(1 for r in results if r.status == 'ERROR')
+    warnings = sum(1 for r in results if r.status == 'WARNING')
+    checks = []
+    for result in results:
+        check = {'name': result.name, 'status': result.status, 'message': result.message}
+        if result.details and result.status != 'OK':
+            check['details'] = result.details
+        checks.append(check)
+    return {
+        'overall_status': 'ERROR' if failures else 'WARNING' if warnings else 'OK',
+        'failures': failures,
+        'warnings': warnings,
+        'checks': checks,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent, cached health check of the local Cassandra node.')
+    parser.add_argument('--json', action='store_true', help='Print the result as JSON.')
+    parser.add_argument('--nodetool', metavar='COMMAND', help="Print the shared snapshot of one nodetool command (e.g. 'status') instead of running the checks.")
+    parser.add_argument('--max-age', type=int, default=DEFAULT_MAX_AGE, help=f'Optional: Seconds nodetool output is shared for. 0 always runs nodetool. Default: {DEFAULT_MAX_AGE}.')
+    parser.add_argument('--parallelism', type=int, default=len(CHECKS), help=f'Optional: Checks run at once. Default: {len(CHECKS)} (all).')
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help=f'Optional: Shared snapshot location. Default: {CACHE_DIR}.')
+    args = parser.parse_args()
+
+    snapshot = NodetoolSnapshot(args.cache_dir, args.max_age)
+
+    if args.nodetool:
+        result = snapshot.get(*args.nodetool.split())
+        sys.stdout.write(result.stdout)
+        sys.stderr.write(result.stderr)
+        sys.exit(result.returncode)
+
+    results = run_checks(snapshot, args.parallelism)
+    if args.json:
+        print(json.dumps(report_json(results), indent=2))
+    else:
+        print_report(results)
+
+    if any(r.status == 'ERROR' for r in results):
+        sys.exit(1)
+    if any(r.status == 'WARNING' for r in results):
+        sys.exit(2)
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,646 @@
+#!/usr/bin/env python3
+# This file is managed by Puppet.
+#
+# Continuous incremental backup shipper.
+# Runs as the cassandra-incremental-shipper service instead of the scheduled
+# incremental-backup-to-s3.sh job:
+# - Watches the tables' 'backups/' directories for the SSTables Cassandra links
+#   there on every flush and compaction, through inotify where the kernel
+#   offers it, otherwise by polling them every --poll-seconds.
+# - Collects new files into a batch, which is cut when it holds --batch-size-mb
+#   or its oldest file has waited --batch-seconds. An SSTable is only taken
+#   once all its components have been linked for --settle-seconds.
+# - Batches go through a bounded queue to an upload thread, which streams them
+#   with the backup engine (one archive per table, concurrent multipart
+#   uploads). When the queue is full, batches grow until it drains.
+# - Each batch is a regular incremental backup set, '<host>/<tag>/<ks>/<table>.tar.gz.enc'
+#   plus 'backup_manifest.json', so restore-from-s3.sh and the backup catalog
+#   read it unchanged. The manifest is written last, only listing the tables
+#   whose archives were stored, and then the shipped files are removed.
+# - Files that stay on disk after shipping (cleanup disabled, or their removal
+#   failed) are remembered in a state file, written atomically, so they are
+#   never uploaded twice.
+#
+# - full-backup-to-s3.sh uses the same minute-resolution tags and keys. No
+#   batch is cut while it holds the backup lock, and a batch whose tag is
+#   already in use in the store moves on to the next free minute.
+#
+# The /var/lib/backup-disabled and /var/lib/upload-disabled flags pause
+# shipping; /var/lib/cleanup-disabled keeps the shipped files on disk.
+
+import argparse
+import ctypes
+import ctypes.util
+import json
+import logging
+import os
+import queue
+import select
+import signal
+import socket
+import sqlite3
+import struct
+import sys
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+from cassandra_backup_catalog import CATALOG_FILE, BackupCatalog
+from cassandra_backup_crypto import cipher_backend
+from cassandra_backup_engine import (DEFAULT_UPLOAD_THREADS, MIB, BackupEngine, TableBackup, format_bytes,
+                                     is_skipped_system_keyspace, load_config, summarize, table_name_from_dir)
+from cassandra_object_store import ObjectStoreError, RateLimiter, open_store, parse_rate
+
+# --- Constants ---
+CONFIG_FILE = '/etc/backup/config.json'
+STATE_FILE = '/var/lib/cassandra/incremental_shipper_state.json'
+MANIFEST_FILE = 'backup_manifest.json'
+BACKUP_DISABLED_FLAG = '/var/lib/backup-disabled'
+UPLOAD_DISABLED_FLAG = '/var/lib/upload-disabled'
+CLEANUP_DISABLED_FLAG = '/var/lib/cleanup-disabled'
+BACKUP_LOCK_FILE = '/tmp/cassandra_backup.lock'  # PID file of a running full-backup-to-s3.sh.
+TAG_FORMAT = '%Y-%m-%d-%H-%M'
+DEFAULT_BATCH_SECONDS = 300
+DEFAULT_BATCH_SIZE_MB = 256
+DEFAULT_SETTLE_SECONDS = 10
+DEFAULT_POLL_SECONDS = 10
+DEFAULT_RESCAN_SECONDS = 60  # How often new tables are looked for.
+DEFAULT_MAX_QUEUED_BATCHES = 2
+
+# inotify(7) constants.
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct('iIII')
+
+# A table's incremental backup directory.
+BackupDir = namedtuple('BackupDir', ['keyspace', 'table', 'table_dir', 'path'])
+# A file waiting to be shipped. `first_seen` starts the batch window.
+PendingFile = namedtuple('PendingFile', ['backup_dir', 'relpath', 'inode', 'size', 'ctime', 'first_seen'])
+# A batch cut for upload: its backup tag and the files to ship, by backup directory.
+Batch = namedtuple('Batch', ['tag', 'files'])
+
+# --- Logging Setup ---
+logging.basicConfig(
+    level=logging.INFO,
+    format='[%(asctime)s] %(levelname)s: %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S',
+    stream=sys.stdout
+)
+
+# --- Helper Functions ---
+
+def discover_backup_dirs(data_dir):
+    """Finds the 'backups/' directory of every table that is backed up."""
+    dirs = []
+    for keyspace in sorted(os.listdir(data_dir)):
+        keyspace_dir = os.path.join(data_dir, keyspace)
+        if not os.path.isdir(keyspace_dir) or is_skipped_system_keyspace(keyspace):
+            continue
+        for table_dir_name in sorted(os.listdir(keyspace_dir)):
+            path = os.path.join(keyspace_dir, table_dir_name, 'backups')
+            if os.path.isdir(path):
+                dirs.append(BackupDir(keyspace, table_name_from_dir(table_dir_name), table_dir_name, path))
+    return dirs
+
+def sstable_of(relpath):
+    """Returns the SSTable a component belongs to, e.g. 'nb-12-big' for 'nb-12-big-Data.db'."""
+    directory, filename = os.path.split(relpath)
+    return os.path.join(directory, filename.rsplit('-', 1)[0])
+
+def read_rackdc(conf_dir):
+    """Reads this node's datacenter and rack from cassandra-rackdc.properties."""
+    values = {'dc': 'Unknown', 'rack': 'Unknown'}
+    try:
+        with open(os.path.join(conf_dir, 'cassandra-rackdc.properties')) as f:
+            for line in f:
+                key, _, value = line.partition('=')
+                if key.strip() in values and value.strip():
+                    values[key.strip()] = value.strip()
+    except OSError:
+        pass
+    return values['dc'], values['rack']
+
+def backup_lock_holder():
+    """Returns the PID of the running backup script holding BACKUP_LOCK_FILE, or None."""
+    try:
+        with open(BACKUP_LOCK_FILE) as f:
+            pid = int(f.read().strip())
+        os.kill(pid, 0)
+    except (OSError, ValueError):
+        # No lock, a stale one, or (PermissionError) one we can't check, which never happens as root.
+        return None
+    return pid
+
+
+def write_json_atomic(path, data):
+    """Writes JSON next to `path` and renames it into place, so readers never see a partial file."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class InotifyWatcher:
+    """Wakes up when files appear in the watched directories, using inotify through libc."""
+
+    MASK = IN_CREATE | IN_MOVED_TO | IN_CLOSE_WRITE | IN_ONLYDIR
+
+    def __init__(self):
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.paths = {}  # watch descriptor -> directory
+        self.watched = set()
+
+    def watch(self, path):
+        if path in self.watched:
+            return
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), self.MASK)
+        if wd < 0:
+            logging.warning("Could not watch %s: %s", path, os.strerror(ctypes.get_errno()))
+            return
+        self.paths[wd] = path
+        self.watched.add(path)
+
+    def wait(self, timeout):
+        """Returns the directories that changed within `timeout` seconds."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        changed = set()
+        if not readable:
+            return changed
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, name_length = INOTIFY_EVENT.unpack_from(data, offset)
+                offset += INOTIFY_EVENT.size + name_length
+                path = self.paths.get(wd)
+                if path is None:
+                    continue
+                if mask & IN_IGNORED:
+                    # The directory is gone, e.g. its table was dropped.
+                    del self.paths[wd]
+                    self.watched.discard(path)
+                changed.add(path)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Fallback for systems without inotify: every wait reports all directories as changed."""
+
+    def watch(self, path):
+        pass
+
+    def wait(self, timeout):
+        time.sleep(timeout)
+        return None
+
+    def close(self):
+        pass
+
+
+class IncrementalShipper:
+    """Ships the files appearing in the tables' 'backups/' directories as incremental backup sets.
+
+    The main thread watches for files and cuts batches; one upload thread
+    ships them in order, each with the shared `engine`, and records them in
+    the backup catalog at `catalog_file` (None to skip). `lock_days` is the
+    S3 Object Lock retention, counted from the upload of each batch.
+    """
+
+    def __init__(self, engine, store, store_url, catalog_file, host, data_dir, node, state_file,
+                 batch_seconds=DEFAULT_BATCH_SECONDS, batch_size=DEFAULT_BATCH_SIZE_MB * MIB,
+                 settle_seconds=DEFAULT_SETTLE_SECONDS, poll_seconds=DEFAULT_POLL_SECONDS,
+                 rescan_seconds=DEFAULT_RESCAN_SECONDS, max_queued_batches=DEFAULT_MAX_QUEUED_BATCHES,
+                 lock_mode=None, lock_days=0, use_inotify=True):
+        self.engine = engine
+        self.store = store
+        self.store_url = store_url
+        self.catalog_file = catalog_file
+        self.catalog = None
+        self.host = host
+        self.data_dir = data_dir
+        self.node = node
+        self.state_file = state_file
+        self.batch_seconds = batch_seconds
+        self.batch_size = batch_size
+        self.settle_seconds = settle_seconds
+        self.poll_seconds = poll_seconds
+        self.rescan_seconds = rescan_seconds
+        self.lock_mode = lock_mode
+        self.lock_days = lock_days
+        self.watcher = PollingWatcher()
+        if use_inotify:
+            try:
+                self.watcher = InotifyWatcher()
+            except (OSError, AttributeError, TypeError) as e:
+                logging.warning("inotify is not available (%s). Polling every %ds instead.", e, poll_seconds)
+        self.batches = queue.Queue(maxsize=max(1, max_queued_batches))
+        self.stopping = threading.Event()
+        self.state_lock = threading.Lock()
+        self.backup_dirs = {}
+        self.pending = {}  # absolute path -> PendingFile
+        self.in_flight = set()  # absolute paths of files in queued or uploading batches
+        self.shipped = set()  # (path, inode, size) of shipped files still on disk
+        self.last_tag = None
+        self.paused_reason = None
+        self._load_state()
+
+    # --- State ---
+
+    def _load_state(self):
+        try:
+            with open(self.state_file) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logging.warning("Ignoring unreadable shipper state %s: %s", self.state_file, e)
+            return
+        self.last_tag = state.get('last_tag')
+        self.shipped = {tuple(entry) for entry in state.get('shipped', [])}
+
+    def _save_state(self):
+        """Persists the last tag and the shipped files still on disk. Called with state_lock held."""
+        self.shipped = {entry for entry in self.shipped if self._is_same_file(*entry)}
+        write_json_atomic(self.state_file, {'version': 1, 'last_tag': self.last_tag,
+                                            'shipped': sorted(self.shipped)})
+
+    @staticmethod
+    def _is_same_file(path, inode, size):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        return stat.st_ino == inode and stat.st_size == size
+
+    # --- Watching ---
+
+    def _rescan_dirs(self):
+        try:
+            dirs = discover_backup_dirs(self.data_dir)
+        except OSError as e:
+            logging.error("Could not list %s: %s", self.data_dir, e)
+            return
+        self.backup_dirs = {backup_dir.path: backup_dir for backup_dir in dirs}
+        for path in self.backup_dirs:
+            self.watcher.watch(path)
+
+    def _backup_dir_of(self, path):
+        """Maps a watched directory, possibly a secondary index directory inside 'backups/', to its table's."""
+        while path not in self.backup_dirs:
+            parent = os.path.dirname(path)
+            if parent == path:
+                return None
+            path = parent
+        return path
+
+    def _scan(self, path, now):
+        """Adds the new files of one backup directory to the pending set and drops vanished ones."""
+        backup_dir = self.backup_dirs.get(path)
+        if backup_dir is None:
+            return
+        present = set()
+        with self.state_lock:
+            skip = self.in_flight | {entry[0] for entry in self.shipped}
+        for dirpath, dirnames, filenames in os.walk(path):
+            for dirname in dirnames:
+                self.watcher.watch(os.path.join(dirpath, dirname))
+            for filename in filenames:
+                file_path = os.path.join(dirpath, filename)
+                present.add(file_path)
+                if file_path in skip:
+                    continue
+                try:
+                    stat = os.lstat(file_path)
+                except OSError:
+                    continue
+                known = self.pending.get(file_path)
+                if known and known.inode == stat.st_ino and known.size == stat.st_size:
+                    if known.ctime != stat.st_ctime:
+                        self.pending[file_path] = known._replace(ctime=stat.st_ctime)
+                    continue
+                self.pending[file_path] = PendingFile(backup_dir, os.path.relpath(file_path, path),
+                                                      stat.st_ino, stat.st_size, stat.st_ctime, now)
+        for file_path in [p for p, f in self.pending.items() if f.backup_dir.path == path and p not in present]:
+            del self.pending[file_path]
+
+    def _settled_files(self, now):
+        """Returns the pending files whose SSTable has had no component added for settle_seconds."""
+        newest = {}
+        for pending in self.pending.values():
+            sstable = (pending.backup_dir.path, sstable_of(pending.relpath))
+            newest[sstable] = max(newest.get(sstable, 0), pending.ctime)
+        return {path: pending for path, pending in self.pending.items()
+                if now - newest[(pending.backup_dir.path, sstable_of(pending.relpath))] >= self.settle_seconds}
+
+    def _check_paused(self):
+        for flag, reason in ((BACKUP_DISABLED_FLAG, 'backups are disabled'),
+                             (UPLOAD_DISABLED_FLAG, 'uploads are disabled')):
+            if os.path.exists(flag):
+                if self.paused_reason != reason:
+                    logging.warning("Shipping paused: %s via %s.", reason, flag)
+                    self.paused_reason = reason
+                return True
+        pid = backup_lock_holder()
+        if pid is not None:
+            reason = f"a full backup (PID {pid}) is running"
+            if self.paused_reason != reason:
+                logging.info("Shipping paused: %s, holding %s.", reason, BACKUP_LOCK_FILE)
+                self.paused_reason = reason
+            return True
+        if self.paused_reason:
+            logging.info("Shipping resumed.")
+            self.paused_reason = None
+        return False
+
+    def _cut_batch(self, now, force=False):
+        """Takes the settled pending files as a batch if the size or time window is reached."""
+        settled = self._settled_files(now)
+        if not settled or self._check_paused():
+            return None
+        total = sum(pending.size for pending in settled.values())
+        oldest = min(pending.first_seen for pending in settled.values())
+        if not force and total < self.batch_size and now - oldest < self.batch_seconds:
+            return None
+        # Backup tags have minute resolution; two sets must never share one.
+        tag = datetime.now().strftime(TAG_FORMAT)
+        if self.last_tag is not None and tag <= self.last_tag:
+            return None
+        files = {}
+        for path, pending in settled.items():
+            files.setdefault(pending.backup_dir, []).append(pending)
+            del self.pending[path]
+        with self.state_lock:
+            self.in_flight.update(settled)
+            self.last_tag = tag
+        logging.info("Cut batch %s: %d files (%s) from %d tables, oldest waiting %.0fs.",
+                     tag, len(settled), format_bytes(total), len(files), now - oldest)
+        return Batch(tag, files)
+
+    def _enqueue(self, batch):
+        while True:
+            try:
+                self.batches.put(batch, timeout=1)
+                return True
+            except queue.Full:
+                if self.stopping.is_set():
+                    self._release(batch, [])
+                    return False
+
+    # --- Shipping ---
+
+    def _release(self, batch, shipped):
+        """Ends a batch: removes the shipped files and returns the others to be picked up again."""
+        cleanup = not os.path.exists(CLEANUP_DISABLED_FLAG)
+        kept = []
+        for pending in shipped:
+            path = os.path.join(pending.backup_dir.path, pending.relpath)
+            if cleanup:
+                try:
+                    os.remove(path)
+                    continue
+                except FileNotFoundError:
+                    continue
+                except OSError as e:
+                    logging.warning("Could not remove shipped file %s: %s", path, e)
+            kept.append((path, pending.inode, pending.size))
+        with self.state_lock:
+            for pending_files in batch.files.values():
+                for pending in pending_files:
+                    self.in_flight.discard(os.path.join(pending.backup_dir.path, pending.relpath))
+            self.shipped.update(kept)
+            try:
+                self._save_state()
+            except OSError as e:
+                logging.error("Could not save shipper state %s: %s", self.state_file, e)
+
+    def _claim_tag(self, batch):
+        """Returns the batch with a tag not yet used in the store, moving on a minute at a time.
+
+        A full backup started in the same minute as the batch writes the same keys.
+        """
+        tag = batch.tag
+        while next(iter(self.store.list(f"{self.host}/{tag}/")), None) is not None:
+            next_tag = (datetime.strptime(tag, TAG_FORMAT) + timedelta(minutes=1)).strftime(TAG_FORMAT)
+            logging.warning("Backup set %s/%s already exists; shipping batch %s as %s instead.",
+                            self.host, tag, batch.tag, next_tag)
+            tag = next_tag
+        if tag == batch.tag:
+            return batch
+        with self.state_lock:
+            self.last_tag = max(self.last_tag or tag, tag)
+        return batch._replace(tag=tag)
+
+    def ship(self, batch):
+        """Uploads one batch as an incremental backup set and returns the number of tables stored."""
+        batch = self._claim_tag(batch)
+        prefix = f"{self.host}/{batch.tag}"
+        tables = [TableBackup(backup_dir.keyspace, backup_dir.table, backup_dir.table_dir, backup_dir.path,
+                              f"{prefix}/{backup_dir.keyspace}/{backup_dir.table}.tar.gz.enc",
+                              frozenset(pending.relpath for pending in pending_files))
+                  for backup_dir, pending_files in batch.files.items()]
+        self.engine.lock = None
+        if self.lock_mode and self.lock_days > 0:
+            self.engine.lock = (self.lock_mode, datetime.now(timezone.utc) + timedelta(days=self.lock_days))
+        start = time.time()
+        results = self.engine.run(tables)
+        summarize(results, time.time() - start)
+        stored = {(r.keyspace, r.table) for r in results if not r.error}
+        shipped = []
+        if stored:
+            manifest = {
+                'backup_id': batch.tag,
+                'backup_type': 'incremental',
+                'timestamp_utc': datetime.now().astimezone().isoformat(timespec='seconds'),
+                'source_node': self.node,
+                'tables_backed_up': sorted(f"{keyspace}/{table}" for keyspace, table in stored),
+            }
+            try:
+                self.store.put(f"{prefix}/{MANIFEST_FILE}", json.dumps(manifest, indent=2).encode())
+            except ObjectStoreError as e:
+                logging.error("Could not store the manifest of %s: %s. Its files will be shipped again.", batch.tag, e)
+                stored = set()
+            else:
+                shipped = [pending for backup_dir, pending_files in batch.files.items()
+                           if (backup_dir.keyspace, backup_dir.table) in stored for pending in pending_files]
+                self._record(batch.tag, manifest)
+        self._release(batch, shipped)
+        if len(stored) < len(tables):
+            logging.warning("%d of %d tables of %s were not shipped and stay pending.",
+                            len(tables) - len(stored), len(tables), batch.tag)
+        return len(stored)
+
+    def _record(self, tag, manifest):
+        if not self.catalog_file:
+            return
+        try:
+            # Opened here, as SQLite connections belong to the thread that opens them.
+            if self.catalog is None:
+                self.catalog = BackupCatalog(self.catalog_file, self.store, self.store_url)
+            self.catalog.record(self.host, tag, manifest)
+        except (sqlite3.Error, OSError, ObjectStoreError) as e:
+            logging.warning("Could not record %s in the backup catalog: %s. It will be picked up by the next catalog sync.",
+                            tag, e)
+
+    def _upload_loop(self):
+        while True:
+            batch = self.batches.get()
+            if batch is None:
+                return
+            try:
+                self.ship(batch)
+            except Exception:
+                logging.exception("Shipping batch %s failed. Its files will be shipped again.", batch.tag)
+                self._release(batch, [])
+
+    # --- Main loop ---
+
+    def stop(self, *_):
+        self.stopping.set()
+
+    def run(self):
+        """Watches and ships until stop() is called, then ships what has settled and returns."""
+        uploader = threading.Thread(target=self._upload_loop, name='shipper', daemon=True)
+        uploader.start()
+        next_rescan = 0
+        changed = None
+        try:
+            while not self.stopping.is_set():
+                now = time.time()
+                if now >= next_rescan:
+                    self._rescan_dirs()
+                    next_rescan = now + self.rescan_seconds
+                    changed = None
+                if changed is None:
+                    changed = set(self.backup_dirs)
+                for path in {self._backup_dir_of(path) for path in changed} - {None}:
+                    self._scan(path, now)
+                batch = self._cut_batch(now)
+                if batch is not None:
+                    self._enqueue(batch)
+                changed = self.watcher.wait(self.poll_seconds)
+            logging.info("Stopping: shipping the files that have settled.")
+            for path in self.backup_dirs:
+                self._scan(path, time.time())
+            batch = self._cut_batch(time.time(), force=True)
+            if batch is not None:
+                self.batches.put(batch)
+        finally:
+            self.batches.put(None)
+            uploader.join()
+            self.watcher.close()
+        if self.pending:
+            logging.info("%d files left for the next start.", len(self.pending))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Continuously ships Cassandra incremental backups to the object store.')
+    parser.add_argument('command', choices=['run', 'check'], help="'run' watches and ships until stopped; 'check' verifies the shipper can run here.")
+    parser.add_argument('--config', default=CONFIG_FILE, help=f'Backup configuration file. Default: {CONFIG_FILE}.')
+    parser.add_argument('--store', help="Optional: Object store URL, 's3://<bucket>' or 'file:///<directory>'. Default: the configured S3 bucket.")
+    parser.add_argument('--endpoint-url', help="Optional: S3-compatible endpoint URL. Default: 's3_endpoint_url' from the configuration, else AWS.")
+    parser.add_argument('--key-file', help="Optional: File holding the encryption passphrase. Default: 'encryption_key' from the configuration.")
+    parser.add_argument('--batch-seconds', type=int, help=f"Optional: Longest time a file waits for its batch. Default: 'incremental_batch_seconds' from the configuration, else {DEFAULT_BATCH_SECONDS}.")
+    parser.add_argument('--batch-size-mb', type=int, help=f"Optional: Batch size, in MiB, that is shipped without waiting. Default: 'incremental_batch_size_mb' from the configuration, else {DEFAULT_BATCH_SIZE_MB}.")
+    parser.add_argument('--settle-seconds', type=int, default=DEFAULT_SETTLE_SECONDS, help=f'Optional: Seconds an SSTable must be complete before it is shipped. Default: {DEFAULT_SETTLE_SECONDS}.')
+    parser.add_argument('--poll-seconds', type=int, default=DEFAULT_POLL_SECONDS, help=f'Optional: Longest wait between checks. Default: {DEFAULT_POLL_SECONDS}.')
+    parser.add_argument('--rescan-seconds', type=int, default=DEFAULT_RESCAN_SECONDS, help=f'Optional: How often new tables are looked for. Default: {DEFAULT_RESCAN_SECONDS}.')
+    parser.add_argument('--max-queued-batches', type=int, default=DEFAULT_MAX_QUEUED_BATCHES, help=f'Optional: Batches waiting for upload before new ones are held back. Default: {DEFAULT_MAX_QUEUED_BATCHES}.')
+    parser.add_argument('--parallelism', type=int, help="Optional: Tables archived concurrently. Default: 'parallelism' from the configuration.")
+    parser.add_argument('--upload-threads', type=int, default=DEFAULT_UPLOAD_THREADS, help=f'Optional: Concurrent part uploads shared by all tables. Default: {DEFAULT_UPLOAD_THREADS}.')
+    parser.add_argument('--throttle', help="Optional: Total upload bandwidth limit, e.g. '50M/s'. Default: 'throttle_rate' from the configuration.")
+    parser.add_argument('--state-file', default=STATE_FILE, help=f'Optional: Shipper state location. Default: {STATE_FILE}.')
+    parser.add_argument('--catalog-file', default=CATALOG_FILE, help=f'Optional: Backup catalog database location. Default: {CATALOG_FILE}.')
+    parser.add_argument('--no-inotify', action='store_true', help='Optional: Poll the backup directories even where inotify is available.')
+    args = parser.parse_args()
+
+    try:
+        config = load_config(args.config)
+    except (IOError, OSError, ValueError) as e:
+        logging.error("Could not read backup configuration %s: %s", args.config, e)
+        sys.exit(2)
+
+    if not args.store and config.get('backup_backend', 's3') != 's3':
+        logging.error("Backup backend is '%s', not 's3'. Nothing to ship to.", config.get('backup_backend'))
+        sys.exit(2)
+    store_url = args.store or f"s3://{config.get('s3_bucket_name', '')}"
+    try:
+        store = open_store(store_url, endpoint_url=args.endpoint_url or config.get('s3_endpoint_url') or None,
+                           max_connections=args.upload_threads + 4)
+    except ObjectStoreError as e:
+        logging.error("%s", e)
+        sys.exit(2)
+
+    if args.command == 'check':
+        logging.info("Incremental shipper is usable: object store '%s', cipher '%s', inotify %s.", store.name,
+                     cipher_backend(), 'available' if ctypes.util.find_library('c') else 'unavailable')
+        sys.exit(0)
+
+    if args.key_file:
+        with open(args.key_file, 'rb') as f:
+            passphrase = f.read().rstrip(b'\n')
+    else:
+        passphrase = (config.get('encryption_key') or '').encode()
+    if not passphrase or passphrase == b'null':
+        logging.error("No encryption passphrase configured.")
+        sys.exit(2)
+
+    try:
+        limiter = RateLimiter(parse_rate(args.throttle or config.get('throttle_rate')))
+    except ValueError as e:
+        logging.error("%s", e)
+        sys.exit(2)
+
+    lock_mode, lock_days = None, 0
+    if config.get('s3_object_lock_enabled') is True and store.name == 's3':
+        lock_mode = config.get('s3_object_lock_mode') or 'GOVERNANCE'
+        lock_days = int(config.get('s3_object_lock_retention') or 0)
+
+    dc, rack = read_rackdc(config.get('cassandra_conf_dir') or '/etc/cassandra/conf')
+    engine = BackupEngine(store, passphrase,
+                          parallelism=args.parallelism or int(config.get('parallelism') or 4),
+                          upload_threads=args.upload_threads,
+                          limiter=limiter)
+    shipper = IncrementalShipper(
+        engine, store, store_url, args.catalog_file,
+        host=socket.gethostname().split('.')[0],
+        data_dir=config['cassandra_data_dir'],
+        node={'ip_address': config.get('listen_address'), 'datacenter': dc, 'rack': rack},
+        state_file=args.state_file,
+        batch_seconds=args.batch_seconds or int(config.get('incremental_batch_seconds') or DEFAULT_BATCH_SECONDS),
+        batch_size=(args.batch_size_mb or int(config.get('incremental_batch_size_mb') or DEFAULT_BATCH_SIZE_MB)) * MIB,
+        settle_seconds=args.settle_seconds,
+        poll_seconds=args.poll_seconds,
+        rescan_seconds=args.rescan_seconds,
+        max_queued_batches=args.max_queued_batches,
+        lock_mode=lock_mode,
+        lock_days=lock_days,
+        use_inotify=not args.no_inotify)
+    signal.signal(signal.SIGTERM, shipper.stop)
+    signal.signal(signal.SIGINT, shipper.stop)
+
+    logging.info("Shipping incremental backups from %s to %s (batches of %s or %ds, %s watcher, %d tables at once).",
+                 shipper.data_dir, store_url, format_bytes(shipper.batch_size), shipper.batch_seconds,
+                 'inotify' if isinstance(shipper.watcher, InotifyWatcher) else 'polling', engine.parallelism)
+    shipper.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+# This file is managed by Puppet.
+#
+# Object store layer for the Python backup tools.
+# Provides a single interface for the object calls the backup and restore
+# engines need, with interchangeable backends:
+# - S3ObjectStore: Amazon S3 or any S3-compatible endpoint (MinIO, Ceph RGW, ...)
+#   through boto3, sharing one connection pool between all upload threads.
+# - LocalObjectStore: a plain directory laid out like a bucket, used as a local
+#   stand-in for S3 when testing or benchmarking without network access.
+#
+# Stores are opened from a URL: 's3://<bucket>' or 'file:///<directory>'.
+# 'file:///<directory>?latency_ms=<n>' adds n ms to every request, so the
+# local stand-in pays a round trip per call like S3 does.
+
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from urllib.parse import parse_qs, urlparse
+
+try:
+    import boto3
+    from botocore.config import Config as BotoConfig
+    from botocore.exceptions import BotoCoreError, ClientError
+except ImportError:
+    boto3 = None
+else:
+    # botocore logs every credential lookup at INFO; keep the backup logs readable.
+    logging.getLogger('botocore').setLevel(logging.WARNING)
+
+MIN_PART_SIZE = 5 * 1024 * 1024  # S3 minimum size of every part but the last.
+MAX_PARTS = 10000  # S3 maximum number of parts per multipart upload.
+
+RATE_PATTERN = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([KMG]?)(?:i?B)?(?:/s)?\s*$', re.IGNORECASE)
+RATE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+class ObjectStoreError(Exception):
+    """Raised when an object store call fails."""
+
+
+def parse_rate(value):
+    """Parses a throttle rate such as '50M/s' or '1G/s' into bytes per second (0 = unlimited)."""
+    if not value or value == 'null':
+        return 0
+    match = RATE_PATTERN.match(str(value))
+    if not match:
+        raise ValueError(f"Invalid throttle rate '{value}'. Expected e.g. '50M/s' or '1G/s'.")
+    return int(float(match.group(1)) * RATE_UNITS[match.group(2).upper()])
+
+
+class RateLimiter:
+    """A token bucket shared by all transfer threads to cap total bandwidth."""
+
+    def __init__(self, bytes_per_second):
+        self.rate = bytes_per_second
+        self.allowance = float(bytes_per_second)
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, size):
+        """Blocks until `size` bytes may be sent."""
+        if self.rate <= 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.allowance = min(self.rate, self.allowance + (now - self.last) * self.rate)
+            self.last = now
+            self.allowance -= size
+            wait = -self.allowance / self.rate if self.allowance < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class ObjectStore:
+    """Interface shared by all object store backends.
+
+    `lock` arguments are None or a (mode, retain_until_datetime) pair for S3
+    Object Lock. create_multipart() returns an opaque upload handle that is
+    passed to upload_part(), complete_multipart() and abort_multipart().
+    """
+
+    name = 'abstract'
+
+    def put(self, key, data, lock=None):
+        raise NotImplementedError
+
+    def create_multipart(self, key, lock=None):
+        raise NotImplementedError
+
+    def upload_part(self, upload, part_number, data):
+        """Uploads one part and returns its ETag."""
+        raise NotImplementedError
+
+    def complete_multipart(self, upload, parts):
+        """Completes an upload from a list of (part_number, etag) pairs."""
+        raise NotImplementedError
+
+    def abort_multipart(self, upload):
+        raise NotImplementedError
+
+    def get(self, key, start=None, end=None):
+        """Returns an object, or the inclusive byte range [start, end] of it."""
+        raise NotImplementedError
+
+    def size(self, key):
+        """Returns the size of an object, or None if it does not exist."""
+        raise NotImplementedError
+
+    def list(self, prefix):
+        """Yields (key, size, last_modified) for every object under a prefix.
+
+        `last_modified` is a Unix timestamp.
+        """
+        raise NotImplementedError
+
+    def list_prefixes(self, prefix):
+        """Yields the names of the 'directories' directly under a prefix ending in '/'."""
+        raise NotImplementedError
+
+    def delete(self, key):
+        """Deletes an object. On a versioned bucket this only adds a delete marker."""
+        raise NotImplementedError
+
+    def extend_lock(self, key, lock):
+        """Extends the Object Lock retention of an existing object to `lock`, in place."""
+        raise NotImplementedError
+
+
+class S3ObjectStore(ObjectStore):
+    """Backend for S3 and S3-compatible endpoints through boto3."""
+
+    name = 's3'
+
+    def __init__(self, bucket, endpoint_url=None, max_connections=32):
+        if boto3 is None:
+            raise ObjectStoreError("The S3 backend requires the 'boto3' Python package.")
+        self.bucket = bucket
+        config = BotoConfig(max_pool_connections=max_connections, retries={'max_attempts': 5, 'mode': 'standard'})
+        self.client = boto3.session.Session().client('s3', endpoint_url=endpoint_url or None, config=config)
+
+    def _call(self, method, **kwargs):
+        try:
+            return getattr(self.client, method)(Bucket=self.bucket, **kwargs)
+        except (BotoCoreError, ClientError) as e:
+            raise ObjectStoreError(f"S3 {method} failed for s3://{self.bucket}/{kwargs.get('Key', '')}: {e}")
+
+    @staticmethod
+    def _lock_args(lock):
+        if not lock:
+            return {}
+        mode, retain_until = lock
+        return {'ObjectLockMode': mode, 'ObjectLockRetainUntilDate': retain_until}
+
+    def put(self, key, data, lock=None):
+        self._call('put_object', Key=key, Body=data, **self._lock_args(lock))
+
+    def create_multipart(self, key, lock=None):
+        response = self._call('create_multipart_upload', Key=key, **self._lock_args(lock))
+        return key, response['UploadId']
+
+    def upload_part(self, upload, part_number, data):
+        key, upload_id = upload
+        return self._call('upload_part', Key=key, UploadId=upload_id, PartNumber=part_number, Body=data)['ETag']
+
+    def complete_multipart(self, upload, parts):
+        key, upload_id = upload
+        self._call('complete_multipart_upload', Key=key, UploadId=upload_id,
+                   MultipartUpload={'Parts': [{'PartNumber': n, 'ETag': etag} for n, etag in sorted(parts)]})
+
+    def abort_multipart(self, upload):
+        key, upload_id = upload
+        self._call('abort_multipart_upload', Key=key, UploadId=upload_id)
+
+    def get(self, key, start=None, end=None):
+        kwargs = {}
+        if start is not None:
+            kwargs['Range'] = f"bytes={start}-{'' if end is None else end}"
+        response = self._call('get_object', Key=key, **kwargs)
+        try:
+            return response['Body'].read()
+        except (BotoCoreError, OSError) as e:
+            raise ObjectStoreError(f"S3 read failed for s3://{self.bucket}/{key}: {e}")
+
+    def size(self, key):
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=key)['ContentLength']
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise ObjectStoreError(f"S3 head_object failed for s3://{self.bucket}/{key}: {e}")
+        except BotoCoreError as e:
+            raise ObjectStoreError(f"S3 head_object failed for s3://{self.bucket}/{key}: {e}")
+
+    def list(self, prefix):
+        try:
+            for page in self.client.get_paginator('list_objects_v2').paginate(Bucket=self.bucket, Prefix=prefix):
+                for item in page.get('Contents', []):
+                    yield item['Key'], item['Size'], item['LastModified'].timestamp()
+        except (BotoCoreError, ClientError) as e:
+            raise ObjectStoreError(f"S3 list failed for s3://{self.bucket}/{prefix}: {e}")
+
+    def list_prefixes(self, prefix):
+        try:
+            for page in self.client.get_paginator('list_objects_v2').paginate(Bucket=self.bucket, Prefix=prefix,
+                                                                                Delimiter='/'):
+                for item in page.get('CommonPrefixes', []):
+                    yield item['Prefix'][len(prefix):].rstrip('/')
+        except (BotoCoreError, ClientError) as e:
+            raise ObjectStoreError(f"S3 list failed for s3://{self.bucket}/{prefix}: {e}")
+
+    def delete(self, key):
+        self._call('delete_object', Key=key)
+
+    def extend_lock(self, key, lock):
+        # Changes the retention of the current version only; no new version is written.
+        mode, retain_until = lock
+        self._call('put_object_retention', Key=key, Retention={'Mode': mode, 'RetainUntilDate': retain_until})
+
+
+class LocalObjectStore(ObjectStore):
+    """Backend that keeps objects as files under a root directory.
+
+    Multipart parts are staged in a hidden directory and concatenated on
+    completion, then moved into place atomically, so a reader never sees a
+    partially written object. Object Lock settings are accepted and ignored.
+    `latency` seconds are added to every request, to simulate a remote store.
+    """
+
+    name = 'local'
+    STAGING_DIR = '.multipart'
+
+    def __init__(self, root, latency=0):
+        self.root = os.path.abspath(root)
+        self.latency = latency
+        os.makedirs(os.path.join(self.root, self.STAGING_DIR), exist_ok=True)
+
+    def _round_trip(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _path(self, key):
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ObjectStoreError(f"Invalid object key '{key}'.")
+        return path
+
+    def _write_atomic(self, path, chunks):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                for chunk in chunks:
+                    if hasattr(chunk, 'read'):
+                        shutil.copyfileobj(chunk, f, 1024 * 1024)
+                    else:
+                        f.write(chunk)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise ObjectStoreError(f"Could not write {path}: {e}")
+
+    def put(self, key, data, lock=None):
+        self._round_trip()
+        self._write_atomic(self._path(key), [data])
+
+    def create_multipart(self, key, lock=None):
+        upload_dir = os.path.join(self.root, self.STAGING_DIR, uuid.uuid4().hex)
+        os.makedirs(upload_dir)
+        return self._path(key), upload_dir
+
+    def upload_part(self, upload, part_number, data):
+        _, upload_dir = upload
+        self._round_trip()
+        try:
+            with open(os.path.join(upload_dir, f"{part_number:05d}"), 'wb') as f:
+                f.write(data)
+        except OSError as e:
+            raise ObjectStoreError(f"Could not write part {part_number} to {upload_dir}: {e}")
+        return str(part_number)
+
+    def complete_multipart(self, upload, parts):
+        path, upload_dir = upload
+        self._round_trip()
+        handles = [open(os.path.join(upload_dir, f"{n:05d}"), 'rb') for n, _ in sorted(parts)]
+        try:
+            self._write_atomic(path, handles)
+        finally:
+            for handle in handles:
+                handle.close()
+        shutil.rmtree(upload_dir, ignore_errors=True)
+
+    def abort_multipart(self, upload):
+        shutil.rmtree(upload[1], ignore_errors=True)
+
+    def get(self, key, start=None, end=None):
+        self._round_trip()
+        try:
+            with open(self._path(key), 'rb') as f:
+                if start is None:
+                    return f.read()
+                f.seek(start)
+                return f.read() if end is None else f.read(end - start + 1)
+        except OSError as e:
+            raise ObjectStoreError(f"Could not read object '{key}': {e}")
+
+    def size(self, key):
+        self._round_trip()
+        try:
+            return os.path.getsize(self._path(key))
+        except OSError:
+            return None
+
+    def list(self, prefix):
+        self._round_trip()
+        base = self._path(prefix) if prefix.strip('/') else self.root
+        search_root = base if os.path.isdir(base) else os.path.dirname(base)
+        for dirpath, dirnames, filenames in os.walk(search_root):
+            dirnames[:] = [d for d in dirnames if d != self.STAGING_DIR]
+            for filename in filenames:
+                if filename.endswith('.tmp'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                key = os.path.relpath(path, self.root).replace(os.sep, '/')
+                if key.startswith(prefix):
+                    stat = os.stat(path)
+                    yield key, stat.st_size, stat.st_mtime
+
+    def list_prefixes(self, prefix):
+        base = self._path(prefix) if prefix.strip('/') else self.root
+        if not os.path.isdir(base):
+            return
+        for name in sorted(os.listdir(base)):
+            if name != self.STAGING_DIR and os.path.isdir(os.path.join(base, name)):
+                yield name
+
+    def delete(self, key):
+        self._round_trip()
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            raise ObjectStoreError(f"Could not delete object '{key}': {e}")
+
+    def extend_lock(self, key, lock):
+        self._round_trip()
+
+
+def open_store(url, endpoint_url=None, max_connections=32):
+    """Opens an object store from an 's3://bucket' or 'file:///path[?latency_ms=n]' URL."""
+    parsed = urlparse(url)
+    if parsed.scheme == 's3':
+        return S3ObjectStore(parsed.netloc, endpoint_url=endpoint_url, max_connections=max_connections)
+    if parsed.scheme == 'file':
+        try:
+            latency_ms = float(parse_qs(parsed.query).get('latency_ms', ['0'])[0])
+        except ValueError:
+            raise ObjectStoreError(f"Invalid latency_ms in object store URL '{url}'.")
+        return LocalObjectStore(parsed.path, latency=latency_ms / 1000)
+    raise ObjectStoreError(f"Unsupported object store URL '{url}'. Use s3://<bucket> or file:///<directory>.")
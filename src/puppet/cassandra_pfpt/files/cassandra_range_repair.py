@@ -8,24 +8,76 @@
 # - A status file for external monitoring.
 # - JMX authentication support.
 # - Use of cqlsh for keyspace discovery for robustness.
+# - A concurrent scheduler that runs several range repairs at once while
+#   keeping conflicting ranges/replica sets apart and backing off when
+#   repairs slow down.
+# - An append-only checkpoint journal so an interrupted run resumes where it
+#   left off instead of starting over.
+# - Sub-range splitting with segment sizes derived from partition estimates
+#   and adjusted to the measured duration of earlier segments.
+# - A pluggable cluster client (nodetool or a persistent Jolokia connection)
+#   for ring, status and repair calls.
+# - A shared, cached token ring model for range computation.
 
 import subprocess
 import sys
 import argparse
+import json
+import calendar
 import logging
 import socket
 import os
+import math
 import time
+import statistics
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
 
+from cassandra_client import ClusterClientError, create_client, DEFAULT_JOLOKIA_URL
+from cassandra_ring import get_ring, RING_CACHE_FILE, DEFAULT_CACHE_MAX_AGE
+from cassandra_telemetry import emit_event
+
 # --- Constants ---
 PAUSE_FILE = '/var/lib/repair-disabled'
 STATUS_DIR = '/var/lib/repair'
 STATUS_FILE = os.path.join(STATUS_DIR, 'status.txt')
-
-# --- Global Nodetool Command ---
+JOURNAL_FILE = os.path.join(STATUS_DIR, 'checkpoints.jsonl')
+
+# The journal is rewritten with only the latest entry per range once it holds
+# this many lines and at least twice as many lines as distinct ranges.
+JOURNAL_COMPACT_MIN_LINES = 10000
+JOURNAL_TIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+# Murmur3Partitioner token bounds, used to split wrapping ranges.
+MIN_TOKEN = -2**63
+MAX_TOKEN = 2**63 - 1
+TOKEN_RING_SIZE = 2**64
+
+# Adaptive concurrency tuning for the parallel scheduler.
+ADAPTIVE_WARMUP_JOBS = 5       # Completed jobs used to establish the baseline duration.
+ADAPTIVE_EWMA_ALPHA = 0.3      # Weight of the latest job duration in the moving average.
+ADAPTIVE_RECOVERY_FACTOR = 1.2 # Moving average must fall below baseline * this to scale back up.
+
+# Segment sizing for sub-range splitting.
+SEGMENT_EWMA_ALPHA = 0.3       # Weight of the latest segment in the duration fit.
+SEGMENT_MIN_SPREAD = 0.1       # Segment sizes must vary by this fraction of their mean to fit the overhead.
+DEFAULT_SEGMENT_PARTITIONS = 100000 # Initial segment size before any durations are measured.
+DEFAULT_MIN_SEGMENT_PARTITIONS = 1000 # Smallest segment, in estimated partitions.
+DEFAULT_MAX_SEGMENTS = 64      # Upper bound on the number of segments per primary range.
+
+# A primary token range of one keyspace that still has work left. `gaps` are
+# the (low, high] offsets from `start` that are not yet repaired, `units` the
+# estimated work for the whole range (partitions, or tokens if no estimates
+# exist) and `weight` its share of the --hours schedule.
+RangeWork = namedtuple('RangeWork', ['keyspace', 'start', 'end', 'endpoints', 'index', 'range_count', 'weight', 'units', 'gaps'])
+
+# A single unit of repair work: one (sub-)range of one keyspace.
+RepairJob = namedtuple('RepairJob', ['keyspace', 'start', 'end', 'endpoints', 'index', 'range_count', 'weight', 'units'])
+
+# --- Global Cluster Client ---
 # This will be populated by command-line args
-nodetool_base_command = ['nodetool']
+cluster_client = None
 
 # --- Logging Setup ---
 logging.basicConfig(
@@ -57,6 +109,91 @@ def update_status_file(message):
     except IOError as e:
         logging.warning("Could not write to status file %s: %s", STATUS_FILE, e)
 
+class RepairJournal:
+    """Append-only JSON-lines journal of completed range repairs.
+
+    Each line records one repair attempt of a (keyspace, start_token, end_token)
+    range with its completion time, duration and exit code. Only the latest
+    entry per range matters; older entries are dropped when the journal is
+    compacted on load.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.latest = {}
+
+    def load(self):
+        """Reads the journal, keeping the latest entry for each range."""
+        if not os.path.exists(self.path):
+            return
+        line_count = 0
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    line_count += 1
+                    try:
+                        entry = json.loads(line)
+                        key = (entry['keyspace'], str(entry['start_token']), str(entry['end_token']))
+                    except (ValueError, KeyError, TypeError):
+                        # A partial last line is expected if the process was killed mid-write.
+                        continue
+                    self.latest[key] = entry
+        except IOError as e:
+            logging.warning("Could not read checkpoint journal %s: %s", self.path, e)
+            return
+
+        logging.info("Loaded %d range checkpoints from %s.", len(self.latest), self.path)
+        if line_count >= JOURNAL_COMPACT_MIN_LINES and line_count >= 2 * len(self.latest):
+            self.compact()
+
+    def compact(self):
+        """Atomically rewrites the journal with only the latest entry per range."""
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                for entry in self.latest.values():
+                    f.write(json.dumps(entry, sort_keys=True) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            logging.info("Compacted checkpoint journal to %d entries.", len(self.latest))
+        except (IOError, OSError) as e:
+            logging.warning("Could not compact checkpoint journal %s: %s", self.path, e)
+
+    def record(self, keyspace, start_token, end_token, exit_code, duration):
+        """Appends the outcome of one range repair to the journal."""
+        entry = {
+            'keyspace': keyspace,
+            'start_token': str(start_token),
+            'end_token': str(end_token),
+            'completed_at': datetime.utcnow().strftime(JOURNAL_TIME_FORMAT),
+            'duration_seconds': round(duration, 3),
+            'exit_code': exit_code,
+        }
+        self.latest[(keyspace, str(start_token), str(end_token))] = entry
+        try:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(entry, sort_keys=True) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+        except IOError as e:
+            logging.warning("Could not write to checkpoint journal %s: %s", self.path, e)
+
+    def repaired_ranges(self, keyspace, window_seconds, now=None):
+        """Returns the (start, end) ranges of a keyspace repaired successfully within the last window_seconds."""
+        now = now or time.time()
+        ranges = []
+        for (ks, start_token, end_token), entry in self.latest.items():
+            if ks != keyspace or entry.get('exit_code') != 0:
+                continue
+            try:
+                completed = calendar.timegm(time.strptime(entry['completed_at'], JOURNAL_TIME_FORMAT))
+            except (KeyError, ValueError):
+                continue
+            if now - completed <= window_seconds:
+                ranges.append((start_token, end_token))
+        return ranges
+
 def check_for_pause():
     """Checks for the existence of the pause file and waits if it's found."""
     if not os.path.exists(PAUSE_FILE):
@@ -69,95 +206,97 @@ def check_for_pause():
     logging.info("Pause file removed. Resuming repair.")
 
 def get_local_ip():
-    """Gets the primary IP address of the local node from nodetool."""
+    """Gets the primary IP address of the local node from the cluster client."""
     try:
-        status_output = subprocess.check_output(nodetool_base_command + ['status'], text=True)
-        for line in status_output.splitlines():
-            if len(line) > 0 and (line.startswith('UN') or line.startswith('DN')):
-                 parts = line.strip().split()
-                 if len(parts) > 1:
-                     return parts[1]
-        logging.error("Could not parse local IP from 'nodetool status'.")
-        return None
-    except (subprocess.CalledProcessError, FileNotFoundError, IndexError) as e:
-        logging.error("Could not determine local IP address from 'nodetool status'. Error: %s", e)
+        return cluster_client.local_address()
+    except ClusterClientError as e:
+        logging.error("Could not determine local IP address. Error: %s", e)
         return None
 
-def get_token_ranges(local_ip):
+def get_token_ranges(local_ip, cache_max_age=DEFAULT_CACHE_MAX_AGE):
     """Gets the token ranges owned by the local node."""
     logging.info("Fetching token ranges for local node: %s", local_ip)
     try:
-        ring_output = subprocess.check_output(nodetool_base_command + ['ring'], text=True)
-    except (subprocess.CalledProcessError, FileNotFoundError) as e:
-        logging.error("Failed to run 'nodetool ring'. Is Cassandra running? Error: %s", e)
+        ring = get_ring(cluster_client, RING_CACHE_FILE, cache_max_age)
+    except ClusterClientError as e:
+        logging.error("Failed to read the token ring. Is Cassandra running? Error: %s", e)
         return None
 
-    node_tokens = []
-    all_tokens = []
-    
-    for line in ring_output.splitlines():
-        parts = line.strip().split()
-        if len(parts) < 8:
-            continue
-        
-        token = parts[-1]
-        address = parts[0]
-        
-        try:
-            all_tokens.append(int(token))
-            if address == local_ip:
-                node_tokens.append(int(token))
-        except ValueError:
-            continue
-    
-    if not node_tokens:
-        logging.warning("Could not find any tokens for IP %s in 'nodetool ring' output.", local_ip)
+    ranges = ring.primary_ranges(local_ip)
+    if not ranges:
+        logging.warning("Could not find any tokens for IP %s in the token ring.", local_ip)
         return None
 
-    all_tokens = sorted(list(set(all_tokens)))
-    node_tokens.sort()
-    
-    ranges = []
-    for token in node_tokens:
-        idx = all_tokens.index(token)
-        start_token = all_tokens[idx - 1]
-        end_token = token
-        ranges.append((str(start_token), str(end_token)))
-
     logging.info("Found %d token ranges for this node.", len(ranges))
     return ranges
 
-def run_repair_for_range(keyspace, start_token, end_token):
-    """Runs nodetool repair for a specific keyspace and token range."""
-    # The '-pr' (primary range) flag is essential for this strategy
-    command = nodetool_base_command + [
-        'repair', '-pr',
-        '-st', str(start_token),
-        '-et', str(end_token),
-        '--', keyspace
-    ]
-    
-    logging.info("Executing command: %s", ' '.join(command))
-    
+def get_range_endpoints(keyspace):
+    """Gets the replica endpoints of every token range of a keyspace."""
     try:
-        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1)
-        for line in iter(process.stdout.readline, ''):
-            logging.info(line.strip())
-        process.stdout.close()
-        return_code = process.wait()
-
-        if return_code != 0:
-            logging.error("Repair for range (%s, %s] failed with exit code %s.", start_token, end_token, return_code)
-        
-        return return_code
-    except (FileNotFoundError, Exception) as e:
-        logging.error("An unexpected error occurred during repair: %s", e)
-        return 1
-
-def get_keyspaces(cql_user, cql_pass, ssl_opts):
-    """Gets a list of all non-system keyspaces using cqlsh."""
-    logging.info("Fetching all non-system keyspaces via cqlsh...")
-    
+        return cluster_client.describe_ring(keyspace)
+    except ClusterClientError as e:
+        logging.warning("Failed to describe the ring for keyspace '%s'. Replica-aware scheduling disabled for it. Error: %s", keyspace, e)
+        return {}
+
+def split_wrapping_range(start_token, end_token):
+    """Returns a (start, end] range as a list of non-wrapping integer intervals."""
+    start, end = int(start_token), int(end_token)
+    if start < end:
+        return [(start, end)]
+    if start == end:
+        # A range that starts and ends on the same token covers the whole ring.
+        return [(MIN_TOKEN - 1, MAX_TOKEN)]
+    return [(start, MAX_TOKEN), (MIN_TOKEN - 1, end)]
+
+def token_offset(token, origin):
+    """Returns the clockwise distance on the ring from origin to token."""
+    return (int(token) - int(origin)) % TOKEN_RING_SIZE
+
+def offset_token(origin, offset):
+    """Returns the token `offset` positions clockwise from origin, as a string."""
+    return str((int(origin) + offset - MIN_TOKEN) % TOKEN_RING_SIZE + MIN_TOKEN)
+
+def range_span(start_token, end_token):
+    """Returns the number of tokens in a (start, end] range; equal bounds cover the whole ring."""
+    return token_offset(end_token, start_token) or TOKEN_RING_SIZE
+
+def sub_range_offsets(start_token, end_token, sub_start, sub_end):
+    """Maps a (sub_start, sub_end] range to (low, high] offsets within (start, end], or None if it is not contained."""
+    span = range_span(start_token, end_token)
+    low = token_offset(sub_start, start_token)
+    high = token_offset(sub_end, start_token) or TOKEN_RING_SIZE
+    if low < high <= span:
+        return low, high
+    return None
+
+def uncovered_offsets(start_token, end_token, covered_ranges):
+    """Returns the (low, high] offsets of (start, end] not covered by any of covered_ranges."""
+    covered = sorted(filter(None, (sub_range_offsets(start_token, end_token, a, b) for a, b in covered_ranges)))
+    gaps = []
+    position = 0
+    for low, high in covered:
+        if low > position:
+            gaps.append((position, low))
+        position = max(position, high)
+    span = range_span(start_token, end_token)
+    if position < span:
+        gaps.append((position, span))
+    return gaps
+
+def ranges_overlap(range_a, range_b):
+    """Checks whether two (start, end] token ranges share any tokens."""
+    for a_start, a_end in split_wrapping_range(*range_a):
+        for b_start, b_end in split_wrapping_range(*range_b):
+            if a_start < b_end and b_start < a_end:
+                return True
+    return False
+
+def run_repair_for_range(keyspace, start_token, end_token, log_prefix=''):
+    """Runs a primary-range repair for a specific keyspace and token range."""
+    return cluster_client.repair_range(keyspace, start_token, end_token, log_prefix)
+
+def build_cqlsh_command(cql_user, cql_pass, ssl_opts):
+    """Builds the base cqlsh command line with authentication and SSL options."""
     # Use /usr/bin/cqlsh if it exists, otherwise fall back to PATH
     cqlsh_path = '/usr/bin/cqlsh'
     if not os.path.exists(cqlsh_path):
@@ -168,6 +307,14 @@ def get_keyspaces(cql_user, cql_pass, ssl_opts):
         cqlsh_command.extend(['-u', cql_user, '-p', cql_pass])
     
     cqlsh_command.extend(ssl_opts)
+    return cqlsh_command
+
+def get_keyspaces(cql_user, cql_pass, ssl_opts):
+    """Gets a list of all non-system keyspaces using cqlsh."""
+    logging.info("Fetching all non-system keyspaces via cqlsh...")
+    
+    cqlsh_command = build_cqlsh_command(cql_user, cql_pass, ssl_opts)
+    cqlsh_path = cqlsh_command[0]
     cqlsh_command.extend(['-e', 'DESCRIBE KEYSPACES'])
 
     try:
@@ -193,8 +340,299 @@ def get_keyspaces(cql_user, cql_pass, ssl_opts):
         logging.error("Failed to get keyspaces from cqlsh: command '%s' not found.", cqlsh_path)
         return None
 
+def get_size_estimates(keyspace, cql_user, cql_pass, ssl_opts):
+    """Gets estimated partition counts per token range of a keyspace from system.size_estimates.
+
+    Returns a list of (range_start, range_end, partitions) summed over all tables.
+    """
+    cqlsh_command = build_cqlsh_command(cql_user, cql_pass, ssl_opts)
+    query = ("SELECT range_start, range_end, partitions_count FROM system.size_estimates "
+             f"WHERE keyspace_name = '{keyspace}';")
+    cqlsh_command.extend(['-e', query])
+
+    try:
+        estimates_output = subprocess.check_output(cqlsh_command, text=True, stderr=subprocess.PIPE)
+    except (subprocess.CalledProcessError, FileNotFoundError) as e:
+        logging.warning("Could not read size estimates for keyspace '%s'. Segments will be sized by token span. Error: %s", keyspace, e)
+        return []
+
+    totals = {}
+    for line in estimates_output.splitlines():
+        parts = [p.strip() for p in line.split('|')]
+        if len(parts) != 3:
+            continue
+        try:
+            key = (str(int(parts[0])), str(int(parts[1])))
+            totals[key] = totals.get(key, 0) + int(parts[2])
+        except ValueError:
+            # Header and separator lines
+            continue
+    return [(start, end, partitions) for (start, end), partitions in totals.items()]
+
+class SegmentPlanner:
+    """Splits primary token ranges into repair segments.
+
+    Segment size is expressed in work units: estimated partitions when size
+    estimates exist for the keyspace, otherwise tokens. Before any segment of
+    a keyspace has finished, segments hold `initial_partitions` partitions
+    (ranges without estimates are not split). Afterwards segment durations are
+    fitted to `overhead + rate * units` and the segment size is chosen so that
+    a segment takes about `target_seconds`. When the target is below twice
+    the fixed per-repair overhead, segments are sized so the overhead is at
+    most half of their duration instead of shrinking further, and segments
+    never hold fewer than `min_partitions` estimated partitions. With
+    `target_seconds=0` ranges are never split.
+    """
+
+    def __init__(self, target_seconds=0, initial_partitions=DEFAULT_SEGMENT_PARTITIONS, max_segments=DEFAULT_MAX_SEGMENTS,
+                 min_partitions=DEFAULT_MIN_SEGMENT_PARTITIONS):
+        self.target_seconds = target_seconds
+        self.initial_partitions = initial_partitions
+        self.max_segments = max(1, max_segments)
+        self.min_partitions = max(1, min_partitions)
+        self.partition_keyspaces = set()
+        # Per keyspace: exponentially weighted sums of (1, units, seconds, units^2, units*seconds).
+        self.samples = {}
+        # Per keyspace: the last fixed per-segment overhead in seconds that could be fitted.
+        self.overhead = {}
+
+    def _fit(self, keyspace):
+        """Returns (overhead_seconds, seconds_per_unit) for a keyspace, or None before any segment has finished."""
+        sums = self.samples.get(keyspace)
+        if not sums:
+            return None
+        weight, sum_units, sum_seconds, sum_units_sq, sum_product = sums
+        mean_units = sum_units / weight
+        mean_seconds = sum_seconds / weight
+        variance = sum_units_sq / weight - mean_units ** 2
+        if variance > (SEGMENT_MIN_SPREAD * mean_units) ** 2:
+            rate = (sum_product / weight - mean_units * mean_seconds) / variance
+            if rate <= 0:
+                # Larger segments did not take longer: all of the time is overhead.
+                self.overhead[keyspace] = mean_seconds
+                return mean_seconds, 0.0
+            self.overhead[keyspace] = min(max(0.0, mean_seconds - rate * mean_units), mean_seconds)
+        # Recent segments were all about the same size, so the overhead cannot be
+        # told apart from the rate; keep the last fitted overhead (none at first).
+        overhead = self.overhead.get(keyspace, 0.0)
+        return overhead, max(0.0, mean_seconds - overhead) / mean_units
+
+    def _segment_units(self, keyspace):
+        """Returns the desired work units per segment, or None to leave ranges whole."""
+        if self.target_seconds <= 0:
+            return None
+        fit = self._fit(keyspace)
+        if fit:
+            overhead, rate = fit
+            if rate <= 0:
+                return None
+            units = max(self.target_seconds - overhead, overhead) / rate
+        elif keyspace in self.partition_keyspaces:
+            units = self.initial_partitions
+        else:
+            return None
+        if keyspace in self.partition_keyspaces:
+            units = max(units, self.min_partitions)
+        return units
+
+    def split(self, work):
+        """Splits the unrepaired gaps of a RangeWork into RepairJobs."""
+        span = range_span(work.start, work.end)
+        segment_units = self._segment_units(work.keyspace)
+        jobs = []
+        for low, high in work.gaps:
+            fraction = (high - low) / span
+            units = work.units * fraction
+            count = 1
+            if segment_units:
+                count = min(self.max_segments, max(1, math.ceil(units / segment_units)))
+            # Never create segments narrower than a single token.
+            count = min(count, high - low)
+            for i in range(count):
+                seg_low = low + (high - low) * i // count
+                seg_high = low + (high - low) * (i + 1) // count
+                jobs.append(RepairJob(
+                    work.keyspace, offset_token(work.start, seg_low), offset_token(work.start, seg_high),
+                    work.endpoints, work.index, work.range_count,
+                    work.weight * fraction / count, units / count,
+                ))
+        return jobs
+
+    def record(self, job, duration, exit_code):
+        """Folds the size and duration of a finished segment into the keyspace's fit."""
+        if exit_code != 0 or job.units <= 0:
+            return
+        sample = (1.0, job.units, duration, job.units ** 2, job.units * duration)
+        previous = self.samples.get(job.keyspace)
+        self.samples[job.keyspace] = list(sample) if previous is None else [
+            SEGMENT_EWMA_ALPHA * new + (1 - SEGMENT_EWMA_ALPHA) * old for new, old in zip(sample, previous)]
+
+class RepairScheduler:
+    """Runs repair work with bounded, adaptive concurrency.
+
+    Pending RangeWork items are split into segments by the SegmentPlanner only
+    when they are about to start, so later ranges use segment sizes learnt from
+    earlier ones. Each job is given a start slot proportional to its weight so
+    that the whole run spreads over --hours.
+
+    Two jobs never run at the same time if their token ranges overlap within
+    a keyspace, or if running both would put more than `max_jobs_per_replica`
+    concurrent repairs on any remote replica. The concurrency limit starts at
+    `max_parallel` and is lowered when the moving average of job durations
+    grows past `slowdown_factor` times the baseline, then raised again once
+    repairs recover. With `max_parallel=1` jobs run strictly in order.
+    """
+
+    def __init__(self, work, local_ip, max_parallel=1, max_jobs_per_replica=1,
+                 time_per_step_seconds=0, adaptive=True, slowdown_factor=2.0, journal=None, planner=None):
+        self.work = list(work)
+        self.planner = planner or SegmentPlanner()
+        self.journal = journal
+        self.local_ip = local_ip
+        self.max_parallel = max(1, max_parallel)
+        self.max_jobs_per_replica = max(1, max_jobs_per_replica)
+        self.time_per_step_seconds = time_per_step_seconds
+        self.adaptive = adaptive and self.max_parallel > 1
+        self.slowdown_factor = slowdown_factor
+
+        self.limit = self.max_parallel
+        self.durations = []
+        self.baseline = None
+        self.ewma = None
+        self.completions_since_change = 0
+        self.failures = {}
+        self.steps = 0  # Repair steps (sub-ranges) run so far.
+
+    def _conflicts(self, job, running_jobs):
+        """Checks whether a job may not start alongside the currently running jobs."""
+        replica_load = {}
+        for other in running_jobs:
+            if other.keyspace == job.keyspace and ranges_overlap((other.start, other.end), (job.start, job.end)):
+                return True
+            for host in other.endpoints:
+                replica_load[host] = replica_load.get(host, 0) + 1
+        for host in job.endpoints:
+            if host != self.local_ip and replica_load.get(host, 0) >= self.max_jobs_per_replica:
+                return True
+        return False
+
+    def _next_runnable(self, pending, running_jobs):
+        """Returns the first pending job that does not conflict with running ones, splitting ranges as needed."""
+        for position, item in enumerate(pending):
+            if self._conflicts(item, running_jobs):
+                continue
+            if isinstance(item, RangeWork):
+                segments = self.planner.split(item)
+                pending[position:position + 1] = segments
+                if len(segments) > 1:
+                    logging.info("Split range (%s, %s] of keyspace '%s' into %d segments.",
+                                 item.start, item.end, item.keyspace, len(segments))
+                return segments[0]
+            return item
+        return None
+
+    def _adjust_concurrency(self, duration, exit_code):
+        """Updates the duration statistics and lowers or raises the concurrency limit."""
+        self.durations.append(duration)
+        if not self.adaptive:
+            return
+
+        if self.baseline is None:
+            if len(self.durations) >= ADAPTIVE_WARMUP_JOBS:
+                self.baseline = statistics.median(self.durations)
+                self.ewma = self.baseline
+                logging.info("Baseline repair step duration established at %.1f seconds.", self.baseline)
+            return
+
+        self.ewma = ADAPTIVE_EWMA_ALPHA * duration + (1 - ADAPTIVE_EWMA_ALPHA) * self.ewma
+        self.completions_since_change += 1
+        # Let roughly one full window of jobs finish before reacting again.
+        if self.completions_since_change < self.limit:
+            return
+
+        slowed_down = self.ewma > self.baseline * self.slowdown_factor
+        if (slowed_down or exit_code != 0) and self.limit > 1:
+            self.limit -= 1
+            self.completions_since_change = 0
+            logging.warning("Repairs are slowing down (avg %.1fs vs baseline %.1fs) or failing. Lowering concurrency to %d.",
+                            self.ewma, self.baseline, self.limit)
+        elif self.ewma <= self.baseline * ADAPTIVE_RECOVERY_FACTOR and exit_code == 0 and self.limit < self.max_parallel:
+            self.limit += 1
+            self.completions_since_change = 0
+            logging.info("Repair durations recovered (avg %.1fs). Raising concurrency to %d.", self.ewma, self.limit)
+
+    def _run_job(self, job):
+        """Worker entry point: repairs one job and returns its exit code and duration."""
+        start_time = time.time()
+        log_prefix = f"[{job.keyspace} ({job.start}, {job.end}]] " if self.max_parallel > 1 else ''
+        exit_code = run_repair_for_range(job.keyspace, job.start, job.end, log_prefix)
+        return exit_code, time.time() - start_time
+
+    def run(self):
+        """Runs all work and returns a dict of keyspace -> number of failed repair steps."""
+        total_weight = sum(w.weight for w in self.work) or 1
+        pending = list(self.work)
+        running = {}
+        dispatched_weight = 0
+        completed_weight = 0
+        started_keyspaces = set()
+        schedule_start = time.time()
+
+        with ThreadPoolExecutor(max_workers=self.max_parallel) as executor:
+            while pending or running:
+                next_slot = None
+                while pending and len(running) < self.limit:
+                    if self.time_per_step_seconds > 0:
+                        # Each step gets its own start slot so the whole job spreads over --hours.
+                        slot = schedule_start + dispatched_weight * self.time_per_step_seconds
+                        if time.time() < slot:
+                            next_slot = slot
+                            break
+                    job = self._next_runnable(pending, running.values())
+                    if job is None:
+                        break
+
+                    check_for_pause()
+                    if job.keyspace not in started_keyspaces:
+                        started_keyspaces.add(job.keyspace)
+                        logging.info("--- Preparing to repair keyspace: %s ---", job.keyspace)
+                    logging.info("--- Repairing keyspace '%s', range %d of %d: (%s, %s] ---",
+                                 job.keyspace, job.index + 1, job.range_count, job.start, job.end)
+                    pending.remove(job)
+                    running[executor.submit(self._run_job, job)] = job
+                    dispatched_weight += job.weight
+
+                if not running:
+                    wait_time = next_slot - time.time() if next_slot else 0
+                    if wait_time > 0:
+                        logging.info("Waiting for %d seconds to maintain scheduled pace.", int(wait_time))
+                        time.sleep(wait_time)
+                    continue
+
+                timeout = max(0, next_slot - time.time()) if next_slot else None
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = running.pop(future)
+                    exit_code, duration = future.result()
+                    if self.journal:
+                        self.journal.record(job.keyspace, job.start, job.end, exit_code, duration)
+
+                    self.steps += 1
+                    completed_weight += job.weight
+                    update_status_file(f"{self.steps} steps complete for node ({completed_weight / total_weight:.1%} of planned work).")
+                    emit_event('progress', done=round(completed_weight, 3), total=round(total_weight, 3), unit='ranges')
+
+                    if exit_code != 0:
+                        self.failures[job.keyspace] = self.failures.get(job.keyspace, 0) + 1
+                        logging.warning("Failed to repair range (%s, %s] for keyspace '%s'. Continuing with next range...",
+                                        job.start, job.end, job.keyspace)
+                    self.planner.record(job, duration, exit_code)
+                    self._adjust_concurrency(duration, exit_code)
+
+        return self.failures
+
 def main():
-    global nodetool_base_command
+    global cluster_client
 
     parser = argparse.ArgumentParser(
         description="""A script to perform Cassandra repair on a node by iterating through its primary token ranges.
@@ -205,15 +643,35 @@ def main():
     parser.add_argument('--local-ip', help='The listen_address of this Cassandra node. If not provided, it will be auto-detected.')
     parser.add_argument('--jmx-user', help='JMX username for nodetool authentication.')
     parser.add_argument('--jmx-pass', help='JMX password for nodetool authentication.')
+    parser.add_argument('--client', choices=['nodetool', 'jolokia'], default='nodetool', help='Optional: How to talk to Cassandra. "jolokia" keeps one HTTP connection to a Jolokia agent open instead of starting nodetool for every call, and falls back to nodetool if the agent is unreachable. Default: nodetool.')
+    parser.add_argument('--jolokia-url', default=DEFAULT_JOLOKIA_URL, help=f'Optional: Jolokia agent URL for --client jolokia. Default: {DEFAULT_JOLOKIA_URL}.')
+    parser.add_argument('--jolokia-user', help='Optional: Jolokia username.')
+    parser.add_argument('--jolokia-pass', help='Optional: Jolokia password.')
+    parser.add_argument('--ring-cache-seconds', type=int, default=DEFAULT_CACHE_MAX_AGE, help=f'Optional: Reuse the cached token ring if it is younger than this. 0 always reads the ring from Cassandra. Default: {DEFAULT_CACHE_MAX_AGE}.')
     parser.add_argument('--cql-user', help='CQL username for cqlsh authentication.')
     parser.add_argument('--cql-pass', help='CQL password for cqlsh authentication.')
     parser.add_argument('--ssl', action='store_true', help='Enable SSL for cqlsh.')
+    parser.add_argument('--parallel', type=int, default=1, help='Optional: Maximum number of range repairs to run concurrently. Default: 1 (sequential).')
+    parser.add_argument('--max-jobs-per-replica', type=int, default=1, help='Optional: Maximum concurrent repairs any remote replica may take part in. Default: 1.')
+    parser.add_argument('--slowdown-factor', type=float, default=2.0, help='Optional: Lower concurrency when average repair step duration exceeds this multiple of the baseline. Default: 2.0.')
+    parser.add_argument('--resume-window-hours', type=float, default=None, help='Optional: Skip ranges the checkpoint journal shows were repaired successfully within this many hours. 0 disables resuming. Default: 24, or --hours if larger.')
+    parser.add_argument('--segment-seconds', type=float, default=0, help='Optional: Split each range into segments sized to take about this many seconds each. 0 repairs whole ranges. Default: 0.')
+    parser.add_argument('--segment-partitions', type=int, default=DEFAULT_SEGMENT_PARTITIONS, help=f'Optional: Estimated partitions per segment until segment durations have been measured. Default: {DEFAULT_SEGMENT_PARTITIONS}.')
+    parser.add_argument('--min-segment-partitions', type=int, default=DEFAULT_MIN_SEGMENT_PARTITIONS, help=f'Optional: Never split ranges into segments of fewer estimated partitions than this. Default: {DEFAULT_MIN_SEGMENT_PARTITIONS}.')
+    parser.add_argument('--max-segments', type=int, default=DEFAULT_MAX_SEGMENTS, help=f'Optional: Maximum number of segments per range. Default: {DEFAULT_MAX_SEGMENTS}.')
+    parser.add_argument('--no-adaptive', action='store_true', help='Optional: Keep concurrency fixed at --parallel instead of adapting to repair durations.')
 
     args = parser.parse_args()
-
-    # Build the base nodetool command with auth if provided
-    if args.jmx_user and args.jmx_pass:
-        nodetool_base_command.extend(['-u', args.jmx_user, '-pw', args.jmx_pass])
+    if args.parallel < 1:
+        parser.error('--parallel must be at least 1.')
+
+    # Connect to the cluster, passing nodetool auth if provided
+    cluster_client = create_client(
+        args.client,
+        jmx_user=args.jmx_user, jmx_pass=args.jmx_pass,
+        jolokia_url=args.jolokia_url, jolokia_user=args.jolokia_user, jolokia_pass=args.jolokia_pass,
+    )
+    logging.info("Using the '%s' cluster client.", cluster_client.name)
 
     # Build cqlsh options
     cqlsh_opts = []
@@ -229,7 +687,7 @@ def main():
         update_status_file("Failed: Could not determine local IP.")
         sys.exit(1)
         
-    token_ranges = get_token_ranges(local_ip)
+    token_ranges = get_token_ranges(local_ip, args.ring_cache_seconds)
     if not token_ranges:
         logging.error("No token ranges found for node %s. Aborting repair.", local_ip)
         update_status_file("Failed: No token ranges found.")
@@ -243,44 +701,80 @@ def main():
 
     logging.info("--- Starting Granular Repair on node %s ---", local_ip)
 
-    total_steps = len(token_ranges) * len(keyspaces_to_repair)
-    time_per_step_seconds = (args.hours * 3600 / total_steps) if args.hours > 0 and total_steps > 0 else 0
+    journal = RepairJournal(JOURNAL_FILE)
+    journal.load()
+    if args.resume_window_hours is None:
+        # A paced run may legitimately take longer than a day; don't redo its early ranges.
+        args.resume_window_hours = max(24, args.hours)
+    window_seconds = args.resume_window_hours * 3600
+
+    planner = SegmentPlanner(args.segment_seconds, args.segment_partitions, args.max_segments, args.min_segment_partitions)
+    work = []
+    skipped = 0
+    for ks in keyspaces_to_repair:
+        # Replica sets are only needed to keep concurrent jobs apart.
+        range_endpoints = get_range_endpoints(ks) if args.parallel > 1 else {}
+        estimates = get_size_estimates(ks, args.cql_user, args.cql_pass, cqlsh_opts) if args.segment_seconds > 0 else []
+
+        range_units = []
+        for start, end in token_ranges:
+            partitions = 0
+            for est_start, est_end, est_partitions in estimates:
+                if sub_range_offsets(start, end, est_start, est_end):
+                    partitions += est_partitions
+            range_units.append(partitions)
+        if sum(range_units) > 0:
+            planner.partition_keyspaces.add(ks)
+        else:
+            range_units = [range_span(start, end) for start, end in token_ranges]
+        # Every keyspace gets one step of --hours per range, shared out by estimated work.
+        total_units = sum(range_units)
+
+        repaired = journal.repaired_ranges(ks, window_seconds) if window_seconds > 0 else []
+        for i, (start, end) in enumerate(token_ranges):
+            gaps = uncovered_offsets(start, end, repaired)
+            if not gaps:
+                skipped += 1
+                continue
+            remaining_fraction = sum(high - low for low, high in gaps) / range_span(start, end)
+            weight = len(token_ranges) * range_units[i] / total_units
+            work.append(RangeWork(ks, start, end, range_endpoints.get((start, end), frozenset()), i, len(token_ranges),
+                                  weight * remaining_fraction, range_units[i], gaps))
+
+    if skipped:
+        logging.info("Skipping %d of %d ranges already repaired within the last %.1f hours.",
+                     skipped, len(token_ranges) * len(keyspaces_to_repair), args.resume_window_hours)
+
+    total_weight = sum(w.weight for w in work)
+    time_per_step_seconds = (args.hours * 3600 / total_weight) if args.hours > 0 and total_weight > 0 else 0
     
     if time_per_step_seconds > 0:
-        logging.info("Repair job timed to complete in %.2f hours. Time per step: ~%d seconds.", args.hours, int(time_per_step_seconds))
+        logging.info("Repair job timed to complete in %.2f hours. Time per range: ~%d seconds.", args.hours, int(time_per_step_seconds))
+    if args.segment_seconds > 0:
+        logging.info("Splitting ranges into segments targeting ~%g seconds each (max %d per range).", args.segment_seconds, args.max_segments)
+    if args.parallel > 1:
+        logging.info("Running up to %d range repairs concurrently (max %d per replica, adaptive: %s).",
+                     args.parallel, args.max_jobs_per_replica, 'off' if args.no_adaptive else 'on')
+
+    scheduler = RepairScheduler(
+        work, local_ip,
+        max_parallel=args.parallel,
+        max_jobs_per_replica=args.max_jobs_per_replica,
+        time_per_step_seconds=time_per_step_seconds,
+        adaptive=not args.no_adaptive,
+        slowdown_factor=args.slowdown_factor,
+        journal=journal,
+        planner=planner,
+    )
+    failures = scheduler.run()
+    emit_event('result', steps=scheduler.steps, steps_failed=sum(failures.values()), ranges_skipped=skipped)
 
-    step_counter = 0
     overall_failures = 0
-    
     for ks in keyspaces_to_repair:
-        logging.info("--- Preparing to repair keyspace: %s ---", ks)
-        failures_in_ks = 0
-        for i, (start, end) in enumerate(token_ranges):
-            check_for_pause()
-            
-            step_start_time = time.time()
-            
-            logging.info("--- Repairing keyspace '%s', range %d of %d: (%s, %s] ---", ks, i + 1, len(token_ranges), start, end)
-            exit_code = run_repair_for_range(ks, start, end)
-            
-            step_counter += 1
-            progress_message = f"{step_counter}/{total_steps} steps complete for node."
-            update_status_file(progress_message)
-
-            if exit_code != 0:
-                failures_in_ks += 1
-                logging.warning("Failed to repair a range for keyspace '%s'. Continuing with next range...", ks)
-            
-            if time_per_step_seconds > 0:
-                elapsed_time = time.time() - step_start_time
-                wait_time = time_per_step_seconds - elapsed_time
-                if wait_time > 0:
-                    logging.info("Waiting for %d seconds to maintain scheduled pace.", int(wait_time))
-                    time.sleep(wait_time)
-        
+        failures_in_ks = failures.get(ks, 0)
         if failures_in_ks > 0:
             overall_failures += 1
-            logging.error("%d of %d ranges failed to repair for keyspace '%s'.", failures_in_ks, len(token_ranges), ks)
+            logging.error("%d repair steps failed across %d ranges for keyspace '%s'.", failures_in_ks, len(token_ranges), ks)
         else:
             logging.info("All %d ranges repaired successfully for keyspace '%s'.", len(token_ranges), ks)
 
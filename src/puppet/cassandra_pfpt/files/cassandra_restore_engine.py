@@ -0,0 +1,540 @@
+#!/usr/bin/env python3
+# This file is managed by Puppet.
+#
+# Streaming restore engine used by restore-from-s3.sh.
+# Replaces the per-archive 'aws s3 cp' to disk, 'openssl enc -d' to a second
+# file and 'tar -xzf' with one in-process pipeline:
+# - Each archive is downloaded as concurrent ranged GETs, decrypted, gunzipped
+#   and extracted as the bytes arrive. Nothing but the restored files is
+#   written to local disk.
+# - Range buffers come from a bounded pool shared by all tables, so memory use
+#   is capped at roughly buffers * range size however many tables are in flight.
+# - Tables are restored concurrently. The archives of one table are applied in
+#   chain order (full backup first, then each incremental), while independent
+#   tables progress in parallel through the whole chain.
+# - Bandwidth is capped by one limiter shared by all downloads, and disk space
+#   by a budget: a table only starts while the target filesystem has room for
+#   it, and restores abort once the filesystem passes the critical threshold.
+#   This replaces the disk-health-check.sh run before every archive.
+# - Deduplicated SSTable components listed in a 'backup_refs.json' are fetched
+#   the same way and the refs file is removed, as restore-from-s3.sh does.
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tarfile
+import threading
+import time
+import zlib
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from cassandra_backup_crypto import CipherError, StreamDecryptor, cipher_backend
+from cassandra_backup_engine import CHUNK_SIZE, CONFIG_FILE, MIB, REFS_FILE, BufferPool, format_bytes, load_config
+from cassandra_object_store import ObjectStoreError, RateLimiter, open_store, parse_rate
+from cassandra_telemetry import emit_event
+
+# --- Constants ---
+ARCHIVE_SUFFIX = '.tar.gz.enc'
+DEFAULT_RANGE_SIZE_MB = 16
+DEFAULT_DOWNLOAD_THREADS = 8
+DEFAULT_READ_AHEAD = 4  # Ranges fetched ahead of the reader, per object.
+DEFAULT_MAX_DISK_PERCENT = 90  # Same thresholds as the per-archive disk-health-check.sh.
+DEFAULT_ABORT_DISK_PERCENT = 95
+# Extracted bytes assumed per archive byte when reserving disk space, since
+# archives hold gzip-compressed data and their extracted size is not recorded.
+DEFAULT_EXPANSION_FACTOR = 2.0
+BUDGET_POLL_SECONDS = 5
+# Extraction filter that refuses absolute paths and links leaving the table directory.
+# Pythons without it (PEP 706) get the same checks from checked_members().
+EXTRACT_ARGS = {'filter': 'data'} if hasattr(tarfile, 'data_filter') else {}
+
+# One archive of a table in the chain: the backup it belongs to, its key and size.
+RestoreArchive = namedtuple('RestoreArchive', ['backup_id', 'key', 'size'])
+# A table to restore, with its archives in chain order.
+TableRestore = namedtuple('TableRestore', ['keyspace', 'table', 'output_dir', 'archives'])
+# The outcome of one table restore. `error` is None on success.
+RestoreResult = namedtuple('RestoreResult', ['keyspace', 'table', 'archives', 'references', 'downloaded_bytes',
+                                             'written_bytes', 'seconds', 'error'])
+
+
+class RestoreError(Exception):
+    """Raised when a table cannot be restored."""
+
+
+# --- Helper Functions ---
+
+def list_chain_archives(store, source_host, chain, keyspace=None, table=None):
+    """Lists the table archives of every backup in the chain, grouped by table.
+
+    Returns a dict of (keyspace, table) -> [RestoreArchive] in chain order.
+    """
+    archives = {}
+    for backup_id in chain:
+        prefix = f"{source_host}/{backup_id}/"
+        for key, size, _ in store.list(prefix):
+            if not key.endswith(ARCHIVE_SUFFIX):
+                continue
+            parts = key[len(prefix):-len(ARCHIVE_SUFFIX)].split('/')
+            if len(parts) != 2:
+                continue
+            if keyspace and parts[0] != keyspace or table and parts[1] != table:
+                continue
+            archives.setdefault(tuple(parts), []).append(RestoreArchive(backup_id, key, size))
+    return archives
+
+def plan_restore(archives, schema_map, output_dir):
+    """Maps each table to its directory under output_dir, largest tables first.
+
+    Tables missing from the schema mapping are skipped with a warning.
+    """
+    jobs = []
+    for (keyspace, table), table_archives in archives.items():
+        table_dir = schema_map.get(f"{keyspace}.{table}")
+        if not table_dir:
+            for archive in table_archives:
+                logging.warning("Could not find mapping for %s.%s. Skipping archive %s", keyspace, table, archive.key)
+            continue
+        jobs.append(TableRestore(keyspace, table, os.path.join(output_dir, keyspace, table_dir), table_archives))
+    # Starting the big tables first keeps one large table from finishing alone at the end.
+    jobs.sort(key=lambda job: sum(a.size for a in job.archives), reverse=True)
+    return jobs
+
+def safe_join(directory, relative_path):
+    """Joins a path from a refs file to the table directory, refusing paths that leave it."""
+    normalized = os.path.normpath(relative_path)
+    if os.path.isabs(normalized) or normalized == '..' or normalized.startswith('../'):
+        raise RestoreError(f"Refusing to restore '{relative_path}' outside of {directory}.")
+    return os.path.join(directory, normalized)
+
+def checked_members(tar, directory):
+    """Yields the members of a tar stream, refusing paths outside the directory and anything but files and directories.
+
+    Stands in for the 'data' extraction filter where tarfile does not have it.
+    """
+    for member in tar:
+        safe_join(directory, member.name)
+        if not (member.isreg() or member.isdir()):
+            raise RestoreError(f"Refusing to restore '{member.name}': only regular files and directories are restored.")
+        # Like the 'data' filter: no setuid, setgid or sticky bits, and no group or world write.
+        member.mode &= 0o755
+        yield member
+
+
+class DiskBudget:
+    """Admits restore work only while the target filesystem has room for it.
+
+    Every table reserves its expected size before it starts and waits while
+    the used space plus all outstanding reservations would pass `max_percent`
+    of the filesystem. A table that does not fit even with nothing else in
+    flight fails instead of waiting forever. check() is called as data is
+    written and fails once usage passes `abort_percent`.
+    """
+
+    def __init__(self, path, max_percent=DEFAULT_MAX_DISK_PERCENT, abort_percent=DEFAULT_ABORT_DISK_PERCENT):
+        self.path = path
+        self.max_percent = max_percent
+        self.abort_percent = abort_percent
+        self.reserved = 0
+        self.condition = threading.Condition()
+
+    def _usage(self):
+        stat = os.statvfs(self.path)
+        total = stat.f_blocks * stat.f_frsize
+        return total - stat.f_bavail * stat.f_frsize, total
+
+    def reserve(self, size):
+        """Blocks until `size` bytes fit under the budget, then reserves them."""
+        with self.condition:
+            while True:
+                used, total = self._usage()
+                if used + self.reserved + size <= total * self.max_percent / 100:
+                    self.reserved += size
+                    return size
+                if self.reserved == 0:
+                    raise RestoreError(f"Not enough space on {self.path}: {format_bytes(size)} needed with "
+                                       f"{format_bytes(used)} of {format_bytes(total)} used "
+                                       f"(limit {self.max_percent}%).")
+                self.condition.wait(timeout=BUDGET_POLL_SECONDS)
+
+    def grow(self, size):
+        """Adds to a running table's reservation without waiting, so it cannot deadlock."""
+        with self.condition:
+            self.reserved += size
+        return size
+
+    def release(self, size):
+        with self.condition:
+            self.reserved -= size
+            self.condition.notify_all()
+
+    def check(self):
+        used, total = self._usage()
+        if total and used * 100 / total > self.abort_percent:
+            raise RestoreError(f"Disk usage on {self.path} is above {self.abort_percent}%. Aborting.")
+
+
+class RangedObjectReader:
+    """Reads an object front to back while its byte ranges download concurrently.
+
+    Up to `read_ahead` ranges are fetched ahead of the reader by the shared
+    download executor. Each range in flight holds a buffer from the shared pool.
+    The reader only blocks on the pool when it has nothing in flight at all, so
+    every table can always make progress.
+    """
+
+    def __init__(self, store, key, size, executor, pool, range_size, read_ahead=DEFAULT_READ_AHEAD, limiter=None):
+        self.store = store
+        self.key = key
+        self.executor = executor
+        self.pool = pool
+        self.read_ahead = max(1, read_ahead)
+        self.limiter = limiter
+        self.ranges = deque((start, min(start + range_size, size) - 1) for start in range(0, size, range_size))
+        self.pending = deque()
+        self.bytes_read = 0
+
+    def _fetch(self, start, end):
+        if self.limiter:
+            self.limiter.acquire(end - start + 1)
+        data = self.store.get(self.key, start, end)
+        if len(data) != end - start + 1:
+            raise ObjectStoreError(f"Short read of {self.key} at bytes {start}-{end}: got {len(data)} bytes.")
+        return data
+
+    def _schedule(self):
+        while self.ranges and len(self.pending) < self.read_ahead:
+            if self.pending:
+                if not self.pool.try_acquire():
+                    break
+            else:
+                self.pool.acquire()
+            start, end = self.ranges.popleft()
+            self.pending.append(self.executor.submit(self._fetch, start, end))
+
+    def read_chunk(self):
+        """Returns the next range of the object, or b'' at its end."""
+        self._schedule()
+        if not self.pending:
+            return b''
+        future = self.pending.popleft()
+        try:
+            data = future.result()
+        finally:
+            self.pool.release()
+        # Keep the download threads busy while the caller works on this range.
+        self._schedule()
+        self.bytes_read += len(data)
+        return data
+
+    def close(self):
+        """Drops the ranges still in flight and returns their buffers."""
+        self.ranges.clear()
+        while self.pending:
+            future = self.pending.popleft()
+            if not future.cancel():
+                future.exception()
+            self.pool.release()
+
+
+class PlaintextReader:
+    """A read-only file object over the decrypted, gunzipped contents of an object."""
+
+    def __init__(self, source, passphrase, budget=None):
+        self.source = source
+        self.decryptor = StreamDecryptor(passphrase)
+        self.decompressor = zlib.decompressobj(wbits=31)
+        self.budget = budget
+        self.buffer = bytearray()
+        self.tail = b''
+        self.source_done = False
+        self.eof = False
+        self.bytes_out = 0
+
+    def _pull(self):
+        if self.tail:
+            data, self.tail = self.tail, b''
+        else:
+            if self.budget:
+                self.budget.check()
+            chunk = self.source.read_chunk()
+            if chunk:
+                data = self.decryptor.update(chunk)
+            else:
+                data = self.decryptor.finalize()
+                self.source_done = True
+        # Bounded output, so a highly compressible file cannot balloon memory.
+        try:
+            output = self.decompressor.decompress(data, CHUNK_SIZE * 4)
+        except zlib.error as e:
+            raise RestoreError(f"Cannot decompress archive ({e}). Check the encryption key and archive integrity.")
+        self.tail = self.decompressor.unconsumed_tail
+        self.buffer += output
+        if self.source_done and not self.tail:
+            self.buffer += self.decompressor.flush()
+            if not self.decompressor.eof:
+                raise RestoreError("Archive is truncated: the gzip stream does not end.")
+            self.eof = True
+
+    def read(self, size=-1):
+        while not self.eof and (size < 0 or len(self.buffer) < size):
+            self._pull()
+        if size < 0 or size > len(self.buffer):
+            size = len(self.buffer)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        self.bytes_out += len(data)
+        return data
+
+    def drain(self):
+        """Reads to the end, which verifies the padding and gzip trailer."""
+        while self.read(CHUNK_SIZE):
+            pass
+
+    def close(self):
+        self.decryptor.abort()
+        self.source.close()
+
+
+class RestoreEngine:
+    """Restores tables from a backup chain with bounded memory, bandwidth and disk use.
+
+    `parallelism` tables are restored at once, sharing `download_threads`
+    threads for ranged GETs of `range_size` bytes. At most `buffers` ranges
+    are downloaded or waiting to be extracted at any time. Each table reserves
+    `expansion_factor` times the size of its archives from the disk budget.
+    """
+
+    def __init__(self, store, passphrase, parallelism=4, download_threads=DEFAULT_DOWNLOAD_THREADS,
+                 range_size=DEFAULT_RANGE_SIZE_MB * MIB, buffers=None, limiter=None, budget=None,
+                 expansion_factor=DEFAULT_EXPANSION_FACTOR):
+        self.store = store
+        self.passphrase = passphrase
+        self.parallelism = max(1, parallelism)
+        self.download_threads = max(1, download_threads)
+        self.range_size = range_size
+        self.pool = BufferPool(buffers or self.download_threads * 2)
+        self.limiter = limiter
+        self.budget = budget
+        self.expansion_factor = expansion_factor
+        self.executor = None
+
+    def _open(self, key, size):
+        return PlaintextReader(RangedObjectReader(self.store, key, size, self.executor, self.pool,
+                                                  self.range_size, limiter=self.limiter),
+                               self.passphrase, self.budget)
+
+    def _extract_archive(self, archive, output_dir, counts):
+        reader = self._open(archive.key, archive.size)
+        try:
+            with tarfile.open(fileobj=reader, mode='r|', bufsize=CHUNK_SIZE) as tar:
+                tar.copybufsize = CHUNK_SIZE
+                if EXTRACT_ARGS:
+                    tar.extractall(output_dir, **EXTRACT_ARGS)
+                else:
+                    tar.extractall(output_dir, members=checked_members(tar, output_dir))
+            reader.drain()
+        finally:
+            reader.close()
+        counts['downloaded'] += reader.source.bytes_read
+        counts['written'] += reader.bytes_out
+
+    def _resolve_refs(self, output_dir, refs, counts):
+        """Downloads the deduplicated SSTable components a table archive references."""
+        for ref in refs:
+            target = safe_join(output_dir, ref['file'])
+            size = self.store.size(ref['key'])
+            if size is None:
+                raise RestoreError(f"Referenced object {ref['key']} for {ref['file']} does not exist.")
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            reader = self._open(ref['key'], size)
+            try:
+                with open(target, 'wb') as f:
+                    for chunk in iter(lambda: reader.read(CHUNK_SIZE), b''):
+                        f.write(chunk)
+                if reader.bytes_out != ref['size']:
+                    raise RestoreError(f"{ref['file']} restored from {ref['key']} has {reader.bytes_out} bytes, "
+                                       f"expected {ref['size']}.")
+            except BaseException:
+                try:
+                    os.remove(target)
+                except OSError:
+                    pass
+                raise
+            finally:
+                reader.close()
+            counts['downloaded'] += reader.source.bytes_read
+            counts['written'] += reader.bytes_out
+            counts['references'] += 1
+
+    def restore_table(self, job):
+        """Applies every archive of one table in chain order and returns its RestoreResult."""
+        start = time.time()
+        counts = {'downloaded': 0, 'written': 0, 'references': 0}
+        reserved = 0
+        error = None
+        try:
+            if self.budget:
+                reserved += self.budget.reserve(int(sum(a.size for a in job.archives) * self.expansion_factor))
+            os.makedirs(job.output_dir, exist_ok=True)
+            for archive in job.archives:
+                self._extract_archive(archive, job.output_dir, counts)
+                refs_path = os.path.join(job.output_dir, REFS_FILE)
+                if os.path.exists(refs_path):
+                    with open(refs_path) as f:
+                        refs = json.load(f).get('objects') or []
+                    if self.budget:
+                        reserved += self.budget.grow(sum(ref['size'] for ref in refs))
+                    self._resolve_refs(job.output_dir, refs, counts)
+                    os.remove(refs_path)
+        except (OSError, ValueError, KeyError, tarfile.TarError, CipherError, ObjectStoreError,
+                RestoreError) as e:
+            error = str(e) or e.__class__.__name__
+        finally:
+            if reserved:
+                self.budget.release(reserved)
+        return RestoreResult(job.keyspace, job.table, len(job.archives), counts['references'],
+                             counts['downloaded'], counts['written'], time.time() - start, error)
+
+    def run(self, jobs):
+        """Restores all tables and returns their RestoreResults in completion order."""
+        results = []
+        with ThreadPoolExecutor(max_workers=self.download_threads, thread_name_prefix='download') as downloads, \
+                ThreadPoolExecutor(max_workers=self.parallelism, thread_name_prefix='table') as workers:
+            self.executor = downloads
+            futures = [workers.submit(self.restore_table, job) for job in jobs]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                emit_event('progress', done=len(results), total=len(jobs), unit='tables')
+                name = f"{result.keyspace}.{result.table}"
+                if result.error:
+                    logging.error("Restore failed for %s: %s", name, result.error)
+                    continue
+                seconds = max(result.seconds, 0.001)
+                references = ''
+                if result.references:
+                    references = f" and {result.references} deduplicated files"
+                logging.info("Restored %s from %d archive(s)%s: %s downloaded, %s extracted in %.1fs "
+                             "(%.1f MiB/s downloaded).", name, result.archives, references,
+                             format_bytes(result.downloaded_bytes), format_bytes(result.written_bytes),
+                             result.seconds, result.downloaded_bytes / MIB / seconds)
+        return results
+
+
+def summarize(results, elapsed):
+    """Logs the overall throughput of a restore run."""
+    succeeded = [r for r in results if not r.error]
+    downloaded = sum(r.downloaded_bytes for r in succeeded)
+    written = sum(r.written_bytes for r in succeeded)
+    elapsed = max(elapsed, 0.001)
+    emit_event('result', tables=len(succeeded), tables_failed=len(results) - len(succeeded),
+               bytes_downloaded=downloaded, bytes_written=written)
+    logging.info("Restored %d of %d tables: %s downloaded, %s extracted in %.1fs (%.1f MiB/s downloaded, "
+                 "%.1f MiB/s extracted).", len(succeeded), len(results), format_bytes(downloaded),
+                 format_bytes(written), elapsed, downloaded / MIB / elapsed, written / MIB / elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Streaming, parallel restore engine for Cassandra backup chains.')
+    parser.add_argument('command', choices=['restore', 'check'], help="'restore' restores a backup chain; 'check' verifies the engine can run here.")
+    parser.add_argument('--source-host', help='Hostname whose backups are restored (required for restore).')
+    parser.add_argument('--chain', help='Comma-separated backup timestamps in chronological order, base full backup first (required for restore).')
+    parser.add_argument('--schema-map', help="schema_mapping.json of the base full backup, mapping '<ks>.<table>' to table directories (required for restore).")
+    parser.add_argument('--output-dir', help='Directory the <keyspace>/<table directory> trees are restored into (required for restore).')
+    parser.add_argument('--keyspace', help='Optional: Restore only this keyspace. Default: all keyspaces.')
+    parser.add_argument('--table', help='Optional: Restore only this table of --keyspace. Default: all tables.')
+    parser.add_argument('--config', default=CONFIG_FILE, help=f'Backup configuration file. Default: {CONFIG_FILE}.')
+    parser.add_argument('--store', help="Optional: Object store URL, 's3://<bucket>' or 'file:///<directory>'. Default: the configured S3 bucket.")
+    parser.add_argument('--endpoint-url', help="Optional: S3-compatible endpoint URL. Default: 's3_endpoint_url' from the configuration, else AWS.")
+    parser.add_argument('--key-file', help="Optional: File holding the encryption passphrase. Default: 'encryption_key' from the configuration.")
+    parser.add_argument('--parallelism', type=int, help="Optional: Tables restored concurrently. Default: 'parallelism' from the configuration.")
+    parser.add_argument('--download-threads', type=int, default=DEFAULT_DOWNLOAD_THREADS, help=f'Optional: Concurrent ranged GETs shared by all tables. Default: {DEFAULT_DOWNLOAD_THREADS}.')
+    parser.add_argument('--range-size-mb', type=int, default=DEFAULT_RANGE_SIZE_MB, help=f'Optional: Size of each ranged GET in MiB. Default: {DEFAULT_RANGE_SIZE_MB}.')
+    parser.add_argument('--buffers', type=int, help='Optional: Ranges downloaded or waiting for extraction at once. Default: twice --download-threads.')
+    parser.add_argument('--throttle', help="Optional: Total download bandwidth limit, e.g. '50M/s'. Default: 'throttle_rate' from the configuration.")
+    parser.add_argument('--disk-path', help='Optional: Filesystem whose usage is budgeted. Default: --output-dir.')
+    parser.add_argument('--max-disk-percent', type=int, default=DEFAULT_MAX_DISK_PERCENT, help=f'Optional: Disk usage, including tables in flight, up to which new tables start. Default: {DEFAULT_MAX_DISK_PERCENT}.')
+    parser.add_argument('--abort-disk-percent', type=int, default=DEFAULT_ABORT_DISK_PERCENT, help=f'Optional: Disk usage at which running restores fail. Default: {DEFAULT_ABORT_DISK_PERCENT}.')
+    parser.add_argument('--expansion-factor', type=float, default=DEFAULT_EXPANSION_FACTOR, help=f'Optional: Extracted size assumed per byte of archive when reserving disk space for a table. Default: {DEFAULT_EXPANSION_FACTOR}.')
+    args = parser.parse_args()
+
+    try:
+        config = load_config(args.config)
+    except (IOError, OSError, ValueError) as e:
+        logging.error("Could not read backup configuration %s: %s", args.config, e)
+        sys.exit(2)
+
+    download_threads = max(1, args.download_threads)
+    try:
+        store = open_store(args.store or f"s3://{config.get('s3_bucket_name', '')}",
+                           endpoint_url=args.endpoint_url or config.get('s3_endpoint_url') or None,
+                           max_connections=download_threads + 4)
+    except ObjectStoreError as e:
+        logging.error("%s", e)
+        sys.exit(2)
+
+    if args.command == 'check':
+        logging.info("Restore engine is usable: object store '%s', cipher '%s'.", store.name, cipher_backend())
+        sys.exit(0)
+
+    for option in ('source_host', 'chain', 'schema_map', 'output_dir'):
+        if not getattr(args, option):
+            parser.error(f"'restore' requires --{option.replace('_', '-')}.")
+    if args.table and not args.keyspace:
+        parser.error('--table requires --keyspace.')
+
+    if args.key_file:
+        with open(args.key_file, 'rb') as f:
+            passphrase = f.read().rstrip(b'\n')
+    else:
+        passphrase = (config.get('encryption_key') or '').encode()
+    if not passphrase or passphrase == b'null':
+        logging.error("No encryption passphrase configured.")
+        sys.exit(2)
+
+    try:
+        limiter = RateLimiter(parse_rate(args.throttle or config.get('throttle_rate')))
+        with open(args.schema_map) as f:
+            schema_map = json.load(f)
+    except (IOError, OSError, ValueError) as e:
+        logging.error("%s", e)
+        sys.exit(2)
+
+    chain = [backup_id.strip() for backup_id in args.chain.split(',') if backup_id.strip()]
+    os.makedirs(args.output_dir, exist_ok=True)
+    try:
+        archives = list_chain_archives(store, args.source_host, chain, args.keyspace, args.table)
+    except ObjectStoreError as e:
+        logging.error("%s", e)
+        sys.exit(2)
+    jobs = plan_restore(archives, schema_map, args.output_dir)
+    if not jobs:
+        logging.warning("No table archives found in the backup chain. Nothing to restore.")
+        sys.exit(0)
+
+    budget = DiskBudget(args.disk_path or args.output_dir, args.max_disk_percent, args.abort_disk_percent)
+    engine = RestoreEngine(store, passphrase,
+                           parallelism=args.parallelism or int(config.get('parallelism') or 4),
+                           download_threads=download_threads,
+                           range_size=max(1, args.range_size_mb) * MIB,
+                           buffers=args.buffers,
+                           limiter=limiter,
+                           budget=budget,
+                           expansion_factor=max(1.0, args.expansion_factor))
+    logging.info("Restoring %d tables (%d archives, %s) from %d backup(s) into %s (%d tables at once, "
+                 "%d download threads, %d MiB ranges, cipher: %s).", len(jobs),
+                 sum(len(job.archives) for job in jobs),
+                 format_bytes(sum(a.size for job in jobs for a in job.archives)), len(chain), args.output_dir,
+                 engine.parallelism, engine.download_threads, engine.range_size // MIB, cipher_backend())
+
+    start = time.time()
+    results = engine.run(jobs)
+    summarize(results, time.time() - start)
+    sys.exit(1 if any(r.error for r in results) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+# This file is managed by Puppet.
+#
+# Token ring model shared by the Python operational scripts.
+# Parses 'nodetool ring' once into a sorted, bisect-indexed ring that answers
+# ownership, primary range and replica questions in O(log n), and caches the
+# parsed ring on disk so repeated callers don't have to ask Cassandra again.
+#
+# Can also be run directly, e.g. by the backup scripts:
+#   cassandra_ring.py tokens <address>       Comma-separated tokens of a node.
+#   cassandra_ring.py ranges <address>       Primary ranges of a node, one per line.
+#   cassandra_ring.py owner <token>          Node owning a token.
+#   cassandra_ring.py replicas <token> --replication dc1:3,dc2:3
+#   cassandra_ring.py replica-sets [--keyspace <ks>]
+#                                            JSON map of node -> every node
+#                                            holding a replica of its ranges.
+# By default, replicas are computed from each keyspace's own replication in
+# system_schema.keyspaces and combined over all non-system keyspaces.
+
+import argparse
+import bisect
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import namedtuple
+
+# --- Constants ---
+RING_CACHE_FILE = '/var/cache/cassandra_pfpt/ring.json'
+DEFAULT_CACHE_MAX_AGE = 300  # Seconds before a cached ring is considered stale.
+CQLSHRC_FILE = '/root/.cassandra/cqlshrc'
+SYSTEM_KEYSPACES = ('system', 'system_auth', 'system_distributed', 'system_schema', 'system_traces', 'system_views',
+                    'system_virtual_schema', 'dse_system', 'dse_perf', 'dse_security', 'solr_admin')
+
+# One token of one node, with the node's location.
+RingEntry = namedtuple('RingEntry', ['address', 'token', 'datacenter', 'rack'])
+
+
+def parse_nodetool_ring(ring_output):
+    """Parses 'nodetool ring' output into a list of RingEntry.
+
+    The datacenter comes from the 'Datacenter:' section headers and the rack
+    from the second column of each token line.
+    """
+    entries = []
+    datacenter = None
+    for line in ring_output.splitlines():
+        stripped = line.strip()
+        if stripped.startswith('Datacenter:'):
+            datacenter = stripped.split(':', 1)[1].strip()
+            continue
+        parts = stripped.split()
+        if len(parts) < 8:
+            continue
+        try:
+            token = int(parts[-1])
+        except ValueError:
+            continue
+        entries.append(RingEntry(parts[0], token, datacenter, parts[1]))
+    return entries
+
+
+class TokenRing:
+    """A sorted token ring with O(log n) ownership lookups.
+
+    Tokens are kept in one sorted list with a parallel list of entries, so the
+    owner of any token is found with a single bisect. A token range (start, end]
+    is owned by the node whose token is `end`.
+    """
+
+    def __init__(self, entries, fetched_at=None):
+        unique = {}
+        for entry in entries:
+            unique[entry.token] = entry
+        self.tokens = sorted(unique)
+        self.entries = [unique[token] for token in self.tokens]
+        self.fetched_at = fetched_at or time.time()
+        self._by_address = {}
+        self._dc_nodes = {}
+        self._dc_racks = {}
+        for index, entry in enumerate(self.entries):
+            self._by_address.setdefault(entry.address, []).append(index)
+            self._dc_nodes.setdefault(entry.datacenter, set()).add(entry.address)
+            self._dc_racks.setdefault(entry.datacenter, set()).add(entry.rack)
+
+    def __len__(self):
+        return len(self.tokens)
+
+    @property
+    def addresses(self):
+        return sorted(self._by_address)
+
+    def _owner_index(self, token):
+        """Index of the first ring token >= token, wrapping around to 0."""
+        index = bisect.bisect_left(self.tokens, int(token))
+        return index if index < len(self.tokens) else 0
+
+    def owner(self, token):
+        """Returns the RingEntry owning a token."""
+        return self.entries[self._owner_index(token)]
+
+    def primary_range(self, token):
+        """Returns the (start, end) primary range, as strings, containing a token."""
+        index = self._owner_index(token)
+        return str(self.tokens[index - 1]), str(self.tokens[index])
+
+    def tokens_for(self, address):
+        """Returns the sorted tokens owned by an address."""
+        return [self.tokens[i] for i in self._by_address.get(address, [])]
+
+    def primary_ranges(self, address):
+        """Returns the (start, end) primary ranges, as strings, of an address."""
+        return [(str(self.tokens[i - 1]), str(self.tokens[i])) for i in self._by_address.get(address, [])]
+
+    def location(self, address):
+        """Returns the (datacenter, rack) of an address, or (None, None) if unknown."""
+        indexes = self._by_address.get(address)
+        if not indexes:
+            return None, None
+        entry = self.entries[indexes[0]]
+        return entry.datacenter, entry.rack
+
+    def replicas(self, token, replication):
+        """Returns the replica addresses for a token, primary replica first.
+
+        `replication` is either an int (SimpleStrategy replication factor) or
+        a dict of datacenter -> replication factor (NetworkTopologyStrategy).
+        For NetworkTopologyStrategy, replicas within a datacenter are spread
+        over distinct racks first, as Cassandra does.
+        """
+        start = self._owner_index(token)
+        ring_size = len(self.tokens)
+
+        if isinstance(replication, int):
+            replicas = []
+            for step in range(ring_size):
+                address = self.entries[(start + step) % ring_size].address
+                if address not in replicas:
+                    replicas.append(address)
+                    if len(replicas) == replication:
+                        break
+            return replicas
+
+        dc_nodes = self._dc_nodes
+        dc_racks = self._dc_racks
+        wanted = {dc: min(rf, len(dc_nodes.get(dc, ()))) for dc, rf in replication.items()}
+        chosen = {dc: [] for dc in wanted}
+        seen_racks = {dc: set() for dc in wanted}
+        skipped = {dc: [] for dc in wanted}
+        replicas = []
+        for step in range(ring_size):
+            if all(len(chosen[dc]) >= wanted[dc] for dc in wanted):
+                break
+            entry = self.entries[(start + step) % ring_size]
+            dc = entry.datacenter
+            if dc not in wanted or len(chosen[dc]) >= wanted[dc] or entry.address in chosen[dc] or entry.address in skipped[dc]:
+                continue
+            if entry.rack in seen_racks[dc] and len(seen_racks[dc]) < len(dc_racks[dc]):
+                # Prefer a node on an unused rack; come back to this one if racks run out.
+                skipped[dc].append(entry.address)
+                continue
+            chosen[dc].append(entry.address)
+            replicas.append(entry.address)
+            seen_racks[dc].add(entry.rack)
+            if len(seen_racks[dc]) == len(dc_racks[dc]):
+                while skipped[dc] and len(chosen[dc]) < wanted[dc]:
+                    address = skipped[dc].pop(0)
+                    chosen[dc].append(address)
+                    replicas.append(address)
+        return replicas
+
+    def replica_set(self, address, replication):
+        """Returns every address holding a replica of any primary range of `address`."""
+        members = set()
+        for index in self._by_address.get(address, []):
+            members.update(self.replicas(self.tokens[index], replication))
+        return members
+
+    def replica_sets(self, replication):
+        """Returns a dict of address -> replica_set(address) for every node in the ring."""
+        return {address: self.replica_set(address, replication) for address in self._by_address}
+
+    def union_replica_sets(self, replications):
+        """Returns replica_sets() merged over several replications, e.g. one per keyspace."""
+        merged = {address: set() for address in self._by_address}
+        distinct = {json.dumps(r, sort_keys=True): r for r in replications}
+        for replication in distinct.values():
+            for address, members in self.replica_sets(replication).items():
+                merged[address].update(members)
+        return merged
+
+    def to_dict(self):
+        return {
+            'fetched_at': self.fetched_at,
+            'entries': [entry._asdict() for entry in self.entries],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        entries = [RingEntry(e['address'], int(e['token']), e.get('datacenter'), e.get('rack')) for e in data['entries']]
+        return cls(entries, fetched_at=data.get('fetched_at'))
+
+    def save(self, path=RING_CACHE_FILE):
+        """Atomically writes the ring snapshot to disk."""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                json.dump(self.to_dict(), f)
+            os.replace(tmp_path, path)
+        except (IOError, OSError) as e:
+            logging.warning("Could not write ring cache %s: %s", path, e)
+
+    @classmethod
+    def load(cls, path=RING_CACHE_FILE):
+        """Reads a ring snapshot from disk, or returns None if it is missing or unreadable."""
+        try:
+            with open(path) as f:
+                return cls.from_dict(json.load(f))
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def age(self):
+        return time.time() - self.fetched_at
+
+
+def get_ring(client, cache_path=RING_CACHE_FILE, max_age=DEFAULT_CACHE_MAX_AGE):
+    """Returns the token ring, from the on-disk cache if it is fresh enough.
+
+    A stale or missing cache is refreshed through the cluster client. If the
+    refresh fails, a stale cache is returned rather than nothing.
+    """
+    cached = TokenRing.load(cache_path) if cache_path and max_age > 0 else None
+    if cached is not None and len(cached) and cached.age() <= max_age:
+        logging.info("Using cached token ring from %s (%d seconds old).", cache_path, int(cached.age()))
+        return cached
+
+    # Imported here so the ring model itself stays usable without a client.
+    from cassandra_client import ClusterClientError
+    try:
+        ring = TokenRing(client.ring())
+    except ClusterClientError:
+        if cached is not None and len(cached):
+            logging.warning("Could not refresh the token ring. Using stale cache from %s (%d seconds old).",
+                            cache_path, int(cached.age()))
+            return cached
+        raise
+    if cache_path and len(ring):
+        ring.save(cache_path)
+    return ring
+
+
+def parse_replication(value):
+    """Parses '3' or 'dc1:3,dc2:3' into an int or a dict of datacenter -> RF."""
+    if ':' not in value:
+        return int(value)
+    replication = {}
+    for part in value.split(','):
+        dc, rf = part.rsplit(':', 1)
+        replication[dc.strip()] = int(rf)
+    return replication
+
+
+def _replication_factor(value):
+    # Transient replication is written as 'total/transient'.
+    return int(str(value).split('/', 1)[0])
+
+
+def parse_keyspace_replication(cqlsh_output):
+    """Parses 'SELECT keyspace_name, replication FROM system_schema.keyspaces' output.
+
+    Returns a dict of keyspace -> replication in the form taken by
+    TokenRing.replicas(). Keyspaces with a node-local strategy are skipped.
+    """
+    keyspaces = {}
+    for line in cqlsh_output.splitlines():
+        parts = line.split('|', 1)
+        if len(parts) != 2:
+            continue
+        name = parts[0].strip()
+        options = dict(re.findall(r"'([^']*)'\s*:\s*'([^']*)'", parts[1]))
+        strategy = options.pop('class', '').rsplit('.', 1)[-1]
+        try:
+            if strategy == 'SimpleStrategy':
+                keyspaces[name] = _replication_factor(options['replication_factor'])
+            elif strategy == 'NetworkTopologyStrategy':
+                keyspaces[name] = {dc: _replication_factor(rf) for dc, rf in options.items() if dc != 'replication_factor'}
+        except (KeyError, ValueError):
+            logging.warning("Ignoring keyspace '%s' with unparseable replication: %s", name, parts[1].strip())
+    return keyspaces
+
+
+def get_keyspace_replication(keyspace=None, cqlshrc=CQLSHRC_FILE):
+    """Reads the replication of every non-system keyspace (or only `keyspace`) with cqlsh.
+
+    Returns a dict of keyspace -> replication, or None if cqlsh failed.
+    """
+    cqlsh_path = '/usr/bin/cqlsh' if os.path.exists('/usr/bin/cqlsh') else 'cqlsh'
+    command = [cqlsh_path, '--request-timeout=20']
+    if os.path.exists(cqlshrc):
+        command += ['--cqlshrc', cqlshrc]
+        with open(cqlshrc) as f:
+            if '[ssl]' in f.read():
+                command.append('--ssl')
+    command += ['-e', 'SELECT keyspace_name, replication FROM system_schema.keyspaces;']
+    try:
+        output = subprocess.check_output(command, text=True, stderr=subprocess.PIPE)
+    except subprocess.CalledProcessError as e:
+        logging.error("Failed to read keyspace replication from cqlsh (exit code %s): %s", e.returncode, e.stderr.strip())
+        return None
+    except FileNotFoundError:
+        logging.error("Failed to read keyspace replication: command '%s' not found.", cqlsh_path)
+        return None
+    replication = parse_keyspace_replication(output)
+    if keyspace:
+        return {keyspace: replication[keyspace]} if keyspace in replication else {}
+    return {ks: value for ks, value in replication.items() if ks not in SYSTEM_KEYSPACES}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query the Cassandra token ring.')
+    parser.add_argument('query', choices=['tokens', 'ranges', 'owner', 'replicas', 'replica-sets'], help='What to look up.')
+    parser.add_argument('target', nargs='?', help='A node address (tokens, ranges) or a token (owner, replicas).')
+    parser.add_argument('--replication', default='schema',
+                        help="Replication for 'replicas' and 'replica-sets': 'schema' (every keyspace's own replication "
+                             "from system_schema.keyspaces, combined), an RF, or 'dc1:3,dc2:3'. Default: schema.")
+    parser.add_argument('--keyspace', help="With '--replication schema', use only this keyspace's replication.")
+    parser.add_argument('--cqlshrc', default=CQLSHRC_FILE, help=f'cqlshrc used to read the schema. Default: {CQLSHRC_FILE}.')
+    parser.add_argument('--max-age', type=int, default=DEFAULT_CACHE_MAX_AGE, help=f'Maximum age in seconds of the cached ring. 0 always refreshes. Default: {DEFAULT_CACHE_MAX_AGE}.')
+    parser.add_argument('--cache-file', default=RING_CACHE_FILE, help=f'Ring cache location. Default: {RING_CACHE_FILE}.')
+    parser.add_argument('--jmx-user', help='JMX username for nodetool authentication.')
+    parser.add_argument('--jmx-pass', help='JMX password for nodetool authentication.')
+    args = parser.parse_args()
+
+    if args.query != 'replica-sets' and not args.target:
+        parser.error(f"'{args.query}' requires a target.")
+
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s: %(message)s', stream=sys.stderr)
+
+    from cassandra_client import ClusterClientError, NodetoolClient
+    try:
+        ring = get_ring(NodetoolClient(args.jmx_user, args.jmx_pass), args.cache_file, args.max_age)
+    except ClusterClientError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.query == 'tokens':
+        tokens = ring.tokens_for(args.target)
+        if not tokens:
+            print(f"Error: No tokens found for {args.target}.", file=sys.stderr)
+            sys.exit(1)
+        print(','.join(str(t) for t in tokens))
+    elif args.query == 'ranges':
+        for start, end in ring.primary_ranges(args.target):
+            print(f"{start} {end}")
+    elif args.query == 'owner':
+        print(ring.owner(args.target).address)
+    else:
+        if args.replication == 'schema':
+            keyspaces = get_keyspace_replication(args.keyspace, args.cqlshrc)
+            if not keyspaces:
+                print(f"Error: No keyspace replication found{' for ' + args.keyspace if args.keyspace else ''}.", file=sys.stderr)
+                sys.exit(1)
+            replications = list(keyspaces.values())
+        else:
+            replications = [parse_replication(args.replication)]
+
+        if args.query == 'replicas':
+            replicas = []
+            for replication in replications:
+                replicas.extend(r for r in ring.replicas(args.target, replication) if r not in replicas)
+            print(','.join(replicas))
+            return
+        replica_sets = ring.union_replica_sets(replications)
+        print(json.dumps({address: sorted(members) for address, members in replica_sets.items()}, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
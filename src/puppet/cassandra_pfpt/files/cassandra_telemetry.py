@@ -0,0 +1,641 @@
+#!/usr/bin/env python3
+# This file is managed by Puppet.
+#
+# Operation telemetry for the cass-ops dispatcher.
+# Instead of exec'ing into the target script, cass-ops runs it as a child and
+# records, once it exits:
+# - its wall time and exit code (or the signal that killed it);
+# - CPU time, peak RSS and block I/O of the script and every process it waited
+#   for, as reported by wait4();
+# - the progress and result events the script emitted.
+# Every run is appended to a JSON-lines history. Per-command totals are kept in
+# a state file, from which a Prometheus textfile for the node_exporter textfile
+# collector is rewritten after every run, and every REFRESH_SECONDS while
+# operations are running.
+#
+# Scripts emit events with emit_event() (Python) or
+# `cassandra_telemetry.py emit <event> <field>=<value> ...` (shell), which
+# append to the file named by $CASS_OPS_EVENTS. Outside cass-ops the variable is
+# unset and both are no-ops. Events in use:
+# - progress: done, total and optionally unit; the latest one is exported as
+#   cass_ops_progress_ratio while the operation runs.
+# - result: numeric totals such as bytes or tables. Fields are summed over the
+#   events of a run and exported as cass_ops_result_total.
+#
+# Telemetry never changes the outcome of an operation: if it cannot be
+# written, cass-ops falls back to exec'ing the script as before.
+#
+# `cassandra_telemetry.py history` (cass-ops ops-history) lists recent runs.
+
+import argparse
+import fcntl
+import json
+import math
+import os
+import re
+import signal
+import socket
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+# --- Constants ---
+CONFIG_FILE = '/etc/cassandra-ops/telemetry.json'
+STATE_DIR = '/var/lib/cassandra-ops'
+DEFAULT_TEXTFILE_DIR = '/var/lib/node_exporter/textfile_collector'
+DEFAULT_HISTORY_FILE = '/var/log/cassandra/cass-ops-history.jsonl'
+TEXTFILE_NAME = 'cass_ops.prom'
+EVENTS_ENV = 'CASS_OPS_EVENTS'
+RUN_ID_ENV = 'CASS_OPS_RUN_ID'
+DISABLE_ENV = 'CASS_OPS_TELEMETRY'
+
+REFRESH_SECONDS = 15
+HISTORY_MAX_BYTES = 20 * 1024 * 1024  # The history is rotated to <file>.1 beyond this size.
+# Histogram buckets (seconds) spanning quick checks to day-long paced repairs.
+DURATION_BUCKETS = (10, 60, 300, 900, 1800, 3600, 7200, 14400, 28800, 86400)
+# Option values that are never written to the history.
+SECRET_OPTION = re.compile(r'pass|secret|credential', re.IGNORECASE)
+FIELD_NAME = re.compile(r'^[a-z][a-z0-9_]*$')
+
+_emit_lock = threading.Lock()
+
+
+# --- Event Emission ---
+
+def emit_event(event, **fields):
+    """Appends an event for the cass-ops run this process belongs to, if any."""
+    path = os.environ.get(EVENTS_ENV)
+    if not path:
+        return
+    line = json.dumps(dict(fields, ts=round(time.time(), 3), event=event), sort_keys=True) + '\n'
+    try:
+        with _emit_lock:
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line.encode())
+            finally:
+                os.close(fd)
+    except OSError:
+        pass
+
+
+def read_events(path, offset=0):
+    """Returns the events appended to `path` after `offset`, and the new offset."""
+    events = []
+    try:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+    except OSError:
+        return events, offset
+    # A line still being written is read again next time.
+    complete = data[:data.rfind(b'\n') + 1]
+    for line in complete.splitlines():
+        try:
+            event = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(event, dict) and isinstance(event.get('event'), str):
+            events.append(event)
+    return events, offset + len(complete)
+
+
+def progress_ratio(event):
+    """Returns done/total of a progress event, or None."""
+    try:
+        done, total = float(event['done']), float(event['total'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if total <= 0 or not math.isfinite(done) or not math.isfinite(total):
+        return None
+    return min(max(done / total, 0.0), 1.0)
+
+
+def merge_results(totals, event):
+    """Adds the numeric fields of a result event to `totals`."""
+    for field, value in event.items():
+        if field in ('ts', 'event') or not FIELD_NAME.match(field):
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            continue
+        totals[field] = totals.get(field, 0) + value
+
+
+def redact(args):
+    """Returns the arguments with the values of password-like options masked."""
+    redacted = []
+    mask_next = False
+    for arg in args:
+        if mask_next:
+            redacted.append('***')
+            mask_next = False
+            continue
+        option, sep, _ = arg.partition('=')
+        if option.startswith('-') and SECRET_OPTION.search(option):
+            if sep:
+                redacted.append(f"{option}=***")
+            else:
+                redacted.append(arg)
+                mask_next = True
+            continue
+        redacted.append(arg)
+    return redacted
+
+
+def utc_iso(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+# --- Configuration ---
+
+class TelemetryError(Exception):
+    """Raised when telemetry cannot be recorded."""
+
+
+class TelemetryConfig:
+    """Where telemetry is written, from CONFIG_FILE if present."""
+
+    def __init__(self, path=CONFIG_FILE):
+        settings = {}
+        try:
+            with open(path) as f:
+                settings = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            raise TelemetryError(f"Could not read telemetry configuration {path}: {e}")
+        self.enabled = settings.get('enabled', True) is not False and os.environ.get(DISABLE_ENV) != '0'
+        self.state_dir = settings.get('state_dir') or STATE_DIR
+        self.textfile_dir = settings.get('textfile_dir') or DEFAULT_TEXTFILE_DIR
+        self.history_file = settings.get('history_file') or DEFAULT_HISTORY_FILE
+
+    @property
+    def state_file(self):
+        return os.path.join(self.state_dir, 'telemetry_state.json')
+
+    @property
+    def lock_file(self):
+        return os.path.join(self.state_dir, 'telemetry.lock')
+
+    @property
+    def events_dir(self):
+        return os.path.join(self.state_dir, 'runs')
+
+    @property
+    def textfile(self):
+        return os.path.join(self.textfile_dir, TEXTFILE_NAME)
+
+
+# --- Aggregated State ---
+
+def empty_command_state():
+    return {
+        'runs': {'success': 0, 'failure': 0},
+        'duration_buckets': [0] * len(DURATION_BUCKETS),
+        'duration_sum': 0.0,
+        'duration_count': 0,
+        'cpu_user_seconds': 0.0,
+        'cpu_system_seconds': 0.0,
+        'read_bytes': 0,
+        'write_bytes': 0,
+        'results': {},
+        'last': None,
+        'last_success_ts': None,
+    }
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class TelemetryStore:
+    """Per-command totals and running operations, shared by concurrent cass-ops runs.
+
+    Every change is made under an exclusive lock, after which the Prometheus
+    textfile is rewritten atomically.
+    """
+
+    def __init__(self, config):
+        self.config = config
+
+    def prepare(self):
+        """Creates the state directories, raising TelemetryError if telemetry can't be kept here."""
+        try:
+            os.makedirs(self.config.events_dir, exist_ok=True)
+            os.makedirs(self.config.textfile_dir, exist_ok=True)
+            os.makedirs(os.path.dirname(self.config.history_file), exist_ok=True)
+        except OSError as e:
+            raise TelemetryError(f"Could not create telemetry directories: {e}")
+        for path in (self.config.state_dir, self.config.events_dir, self.config.textfile_dir,
+                     os.path.dirname(self.config.history_file)):
+            if not os.access(path, os.W_OK):
+                raise TelemetryError(f"Telemetry directory {path} is not writable.")
+
+    def update(self, change, history_record=None):
+        """Applies `change(state)` under the lock, then writes the history and the textfile."""
+        with open(self.config.lock_file, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            state = self._load()
+            change(state)
+            state['running'] = {run_id: run for run_id, run in state['running'].items() if process_alive(run['pid'])}
+            self._write_atomic(self.config.state_file, json.dumps(state, sort_keys=True))
+            if history_record is not None:
+                self._append_history(history_record)
+            self._write_atomic(self.config.textfile, render_metrics(state), mode=0o644)
+
+    def _load(self):
+        try:
+            with open(self.config.state_file) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            state = {}
+        except ValueError:
+            # A damaged state file only loses the totals; Prometheus treats it as a counter reset.
+            state = {}
+        state.setdefault('commands', {})
+        state.setdefault('running', {})
+        return state
+
+    @staticmethod
+    def _write_atomic(path, content, mode=0o600):
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            f.write(content)
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+
+    def _append_history(self, record):
+        path = self.config.history_file
+        try:
+            if os.path.getsize(path) > HISTORY_MAX_BYTES:
+                os.replace(path, f"{path}.1")
+        except FileNotFoundError:
+            pass
+        with open(path, 'a') as f:
+            f.write(json.dumps(record, sort_keys=True) + '\n')
+
+
+# --- Prometheus Export ---
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_value(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+def render_metrics(state):
+    """Renders the aggregated state in the Prometheus text exposition format."""
+    metrics = []
+
+    def metric(name, kind, help_text, samples):
+        if not samples:
+            return
+        metrics.append(f"# HELP {name} {help_text}")
+        metrics.append(f"# TYPE {name} {kind}")
+        for suffix, labels, value in samples:
+            label_text = ','.join(f'{key}="{escape_label(val)}"' for key, val in labels)
+            metrics.append(f"{name}{suffix}{{{label_text}}} {format_value(value)}")
+
+    commands = sorted(state['commands'].items())
+    metric('cass_ops_runs_total', 'counter', 'Completed cass-ops operations by result.',
+           [('', (('command', cmd), ('result', result)), count)
+            for cmd, st in commands for result, count in sorted(st['runs'].items())])
+
+    duration = []
+    for cmd, st in commands:
+        cumulative = 0
+        for bound, count in zip(DURATION_BUCKETS, st['duration_buckets']):
+            cumulative += count
+            duration.append(('_bucket', (('command', cmd), ('le', str(bound))), cumulative))
+        duration.append(('_bucket', (('command', cmd), ('le', '+Inf')), st['duration_count']))
+        duration.append(('_sum', (('command', cmd),), float(st['duration_sum'])))
+        duration.append(('_count', (('command', cmd),), st['duration_count']))
+    metric('cass_ops_duration_seconds', 'histogram', 'Wall time of completed cass-ops operations.', duration)
+
+    metric('cass_ops_cpu_seconds_total', 'counter', 'CPU time of cass-ops operations, including their child processes.',
+           [('', (('command', cmd), ('mode', mode)), float(st[f'cpu_{mode}_seconds']))
+            for cmd, st in commands for mode in ('user', 'system')])
+    metric('cass_ops_io_bytes_total', 'counter', 'Block device I/O of cass-ops operations, including their child processes.',
+           [('', (('command', cmd), ('direction', direction)), st[f'{direction}_bytes'])
+            for cmd, st in commands for direction in ('read', 'write')])
+    metric('cass_ops_result_total', 'counter', 'Totals reported by cass-ops operations in result events.',
+           [('', (('command', cmd), ('field', field)), value)
+            for cmd, st in commands for field, value in sorted(st['results'].items())])
+
+    last = [(cmd, st['last']) for cmd, st in commands if st['last']]
+    metric('cass_ops_last_duration_seconds', 'gauge', 'Wall time of the latest run of each cass-ops operation.',
+           [('', (('command', cmd),), float(run['duration_seconds'])) for cmd, run in last])
+    metric('cass_ops_last_exit_code', 'gauge', 'Exit code of the latest run of each cass-ops operation (128+N if killed by signal N).',
+           [('', (('command', cmd),), run['exit_code']) for cmd, run in last])
+    metric('cass_ops_last_max_rss_bytes', 'gauge', 'Peak resident set size of the latest run of each cass-ops operation.',
+           [('', (('command', cmd),), run['max_rss_bytes']) for cmd, run in last])
+    metric('cass_ops_last_run_timestamp_seconds', 'gauge', 'Time the latest run of each cass-ops operation finished.',
+           [('', (('command', cmd),), float(run['finished_ts'])) for cmd, run in last])
+    metric('cass_ops_last_success_timestamp_seconds', 'gauge', 'Time the latest successful run of each cass-ops operation finished.',
+           [('', (('command', cmd),), float(st['last_success_ts'])) for cmd, st in commands if st['last_success_ts']])
+
+    running = {}
+    for run in state['running'].values():
+        running.setdefault(run['command'], []).append(run)
+    running = sorted(running.items())
+    metric('cass_ops_running', 'gauge', 'cass-ops operations currently running.',
+           [('', (('command', cmd),), len(runs)) for cmd, runs in running])
+    metric('cass_ops_running_start_timestamp_seconds', 'gauge', 'Start time of the oldest running instance of each cass-ops operation.',
+           [('', (('command', cmd),), float(min(run['started_ts'] for run in runs))) for cmd, runs in running])
+    progress = []
+    for cmd, runs in running:
+        ratios = [run['progress'] for run in runs if run.get('progress') is not None]
+        if ratios:
+            progress.append(('', (('command', cmd),), float(min(ratios))))
+    metric('cass_ops_progress_ratio', 'gauge', 'Reported progress (0-1) of running cass-ops operations.', progress)
+
+    return '\n'.join(metrics) + '\n' if metrics else ''
+
+
+# --- Running Operations ---
+
+class OperationRun:
+    """Runs one cass-ops command as a child process and records its telemetry."""
+
+    def __init__(self, store, command, script_path, args):
+        self.store = store
+        self.command = command
+        self.script_path = script_path
+        self.args = args
+        self.run_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+        self.events_file = os.path.join(store.config.events_dir, f"{self.run_id}.jsonl")
+        self.events_offset = 0
+        self.event_count = 0
+        self.progress = None
+        self.results = {}
+        self.pid = None
+        self.pending_signal = None
+        self.started = None
+
+    def run(self):
+        """Runs the command to completion and returns the exit code cass-ops should exit with."""
+        env = dict(os.environ)
+        env[EVENTS_ENV] = self.events_file
+        env[RUN_ID_ENV] = self.run_id
+
+        # Like system(): keyboard signals reach the script through the terminal,
+        # and the dispatcher waits for it to handle them. The script gets the
+        # default dispositions back, as ignored signals would survive the exec;
+        # so do SIGPIPE and SIGXFSZ, which Python ignores (as subprocess does).
+        # Termination requests for the dispatcher are passed on to the script;
+        # one arriving before it has started is delivered once it has.
+        keyboard_signals = (signal.SIGINT, signal.SIGQUIT)
+        previous = {sig: signal.signal(sig, signal.SIG_IGN) for sig in keyboard_signals}
+        for sig in (signal.SIGTERM, signal.SIGHUP):
+            previous[sig] = signal.signal(sig, self._forward)
+        try:
+            self.started = time.time()
+            self.pid = os.posix_spawn(self.script_path, [self.script_path] + self.args, env,
+                                      setsigdef=keyboard_signals + (signal.SIGPIPE, signal.SIGXFSZ))
+            if self.pending_signal is not None:
+                self._forward(self.pending_signal, None)
+            self._update_running(self._record_start)
+
+            outcome = {}
+            finished = threading.Event()
+
+            def reap():
+                _, outcome['status'], outcome['rusage'] = os.wait4(self.pid, 0)
+                finished.set()
+
+            threading.Thread(target=reap, daemon=True).start()
+            while not finished.wait(REFRESH_SECONDS):
+                self._collect_events()
+                self._update_running(self._record_progress)
+            finished_ts = time.time()
+        finally:
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+
+        status, usage = outcome['status'], outcome['rusage']
+        if os.WIFSIGNALED(status):
+            exit_code = 128 + os.WTERMSIG(status)
+        else:
+            exit_code = os.WEXITSTATUS(status)
+        self._record_finish(exit_code, os.WTERMSIG(status) if os.WIFSIGNALED(status) else None,
+                            usage, finished_ts)
+        return exit_code
+
+    def _forward(self, signum, frame):
+        if self.pid is None:
+            self.pending_signal = signum
+            return
+        try:
+            os.kill(self.pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def _collect_events(self):
+        events, self.events_offset = read_events(self.events_file, self.events_offset)
+        for event in events:
+            self.event_count += 1
+            if event['event'] == 'progress':
+                ratio = progress_ratio(event)
+                if ratio is not None:
+                    self.progress = {'ratio': round(ratio, 4),
+                                     **{k: event[k] for k in ('done', 'total', 'unit') if k in event}}
+            elif event['event'] == 'result':
+                merge_results(self.results, event)
+
+    def _update_running(self, change):
+        """Updates the running operations; failures only cost the in-flight metrics."""
+        try:
+            self.store.update(change)
+        except OSError as e:
+            print(f"Warning: Could not update telemetry for '{self.command}': {e}", file=sys.stderr)
+
+    def _record_start(self, state):
+        state['running'][self.run_id] = {'command': self.command, 'pid': self.pid,
+                                         'started_ts': self.started, 'progress': None}
+
+    def _record_progress(self, state):
+        if self.run_id in state['running']:
+            state['running'][self.run_id]['progress'] = self.progress['ratio'] if self.progress else None
+
+    def _record_finish(self, exit_code, signum, usage, finished_ts):
+        self._collect_events()
+        try:
+            os.remove(self.events_file)
+        except OSError:
+            pass
+
+        duration = finished_ts - self.started
+        result = 'success' if exit_code == 0 else 'failure'
+        # ru_maxrss is in KiB and the block counts in 512-byte units on Linux.
+        record = {
+            'run_id': self.run_id,
+            'command': self.command,
+            'args': redact(self.args),
+            'host': socket.gethostname().split('.')[0],
+            'uid': os.getuid(),
+            'started_at': utc_iso(self.started),
+            'finished_at': utc_iso(finished_ts),
+            'duration_seconds': round(duration, 3),
+            'exit_code': exit_code,
+            'signal': signal.Signals(signum).name if signum else None,
+            'result': result,
+            'cpu_user_seconds': round(usage.ru_utime, 3),
+            'cpu_system_seconds': round(usage.ru_stime, 3),
+            'max_rss_bytes': usage.ru_maxrss * 1024,
+            'read_bytes': usage.ru_inblock * 512,
+            'write_bytes': usage.ru_oublock * 512,
+            'events': self.event_count,
+            'progress': self.progress,
+            'results': self.results,
+        }
+
+        def change(state):
+            state['running'].pop(self.run_id, None)
+            st = state['commands'].setdefault(self.command, empty_command_state())
+            st['runs'][result] = st['runs'].get(result, 0) + 1
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    st['duration_buckets'][i] += 1
+                    break
+            st['duration_sum'] += duration
+            st['duration_count'] += 1
+            st['cpu_user_seconds'] += usage.ru_utime
+            st['cpu_system_seconds'] += usage.ru_stime
+            st['read_bytes'] += record['read_bytes']
+            st['write_bytes'] += record['write_bytes']
+            for field, value in self.results.items():
+                st['results'][field] = st['results'].get(field, 0) + value
+            st['last'] = {'duration_seconds': duration, 'exit_code': exit_code,
+                          'max_rss_bytes': record['max_rss_bytes'], 'finished_ts': finished_ts}
+            if result == 'success':
+                st['last_success_ts'] = finished_ts
+
+        try:
+            self.store.update(change, history_record=record)
+        except (OSError, TelemetryError) as e:
+            print(f"Warning: Could not record telemetry for '{self.command}': {e}", file=sys.stderr)
+
+
+def run_operation(command, script_path, args, config_file=CONFIG_FILE):
+    """Runs a cass-ops command with telemetry and returns its exit code.
+
+    Raises TelemetryError before the command starts if telemetry is disabled,
+    can't be written here or this Python can't spawn the command (os.posix_spawn
+    is new in 3.8); the caller then runs the command without it.
+    """
+    if not hasattr(os, 'posix_spawn'):
+        raise TelemetryError("os.posix_spawn is not available.")
+    config = TelemetryConfig(config_file)
+    if not config.enabled:
+        raise TelemetryError("Telemetry is disabled.")
+    store = TelemetryStore(config)
+    store.prepare()
+    try:
+        # Take the lock once up front so an unusable state file fails before the command runs.
+        store.update(lambda state: None)
+    except OSError as e:
+        raise TelemetryError(f"Could not write telemetry state: {e}")
+    return OperationRun(store, command, script_path, args).run()
+
+
+# --- Command Line ---
+
+def parse_field(text):
+    """Parses a '<field>=<value>' argument of the emit command."""
+    field, sep, value = text.partition('=')
+    if not sep or not FIELD_NAME.match(field):
+        raise argparse.ArgumentTypeError(f"expected <field>=<value> with a lowercase field name, got '{text}'")
+    for convert in (int, float):
+        try:
+            return field, convert(value)
+        except ValueError:
+            pass
+    return field, value
+
+
+def read_history(path, command=None, limit=20):
+    """Returns the latest `limit` history records, oldest first."""
+    records = []
+    for candidate in (f"{path}.1", path):
+        try:
+            with open(candidate) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if command is None or record.get('command') == command:
+                        records.append(record)
+        except FileNotFoundError:
+            continue
+    return records[-limit:] if limit > 0 else records
+
+
+def format_duration(seconds):
+    if seconds < 60:
+        return f"{seconds:.1f}s"
+    if seconds < 3600:
+        return f"{seconds / 60:.1f}m"
+    return f"{seconds / 3600:.1f}h"
+
+
+def print_history(records):
+    print(f"{'FINISHED (UTC)':<21}{'COMMAND':<20}{'RESULT':<9}{'EXIT':>5}{'DURATION':>10}{'CPU':>9}"
+          f"{'PEAK_RSS(MiB)':>15}{'READ(MiB)':>11}{'WRITE(MiB)':>12}")
+    for r in records:
+        cpu = r.get('cpu_user_seconds', 0) + r.get('cpu_system_seconds', 0)
+        print(f"{r.get('finished_at', '-'):<21}{r.get('command', '-'):<20}{r.get('result', '-'):<9}"
+              f"{r.get('exit_code', '-'):>5}{format_duration(r.get('duration_seconds', 0)):>10}"
+              f"{format_duration(cpu):>9}{r.get('max_rss_bytes', 0) / 1048576:>15.1f}"
+              f"{r.get('read_bytes', 0) / 1048576:>11.1f}{r.get('write_bytes', 0) / 1048576:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Telemetry of cass-ops operations.')
+    parser.add_argument('action', nargs='?', default='history', choices=['history', 'emit'],
+                        help="'history' lists recent operations (the default); 'emit' records an event for the running operation.")
+    parser.add_argument('event', nargs='?', help="Event to emit, e.g. 'progress' or 'result' (required for emit).")
+    parser.add_argument('fields', nargs='*', type=parse_field, help="Event fields as <field>=<value>, e.g. done=3 total=10.")
+    parser.add_argument('--command', help='Optional: Only list runs of this cass-ops command.')
+    parser.add_argument('--limit', type=int, default=20, help='Optional: Number of runs to list, 0 for all. Default: 20.')
+    parser.add_argument('--config', default=CONFIG_FILE, help=f'Telemetry configuration file. Default: {CONFIG_FILE}.')
+    parser.add_argument('--json', action='store_true', help='Print the history as JSON lines.')
+    args = parser.parse_args()
+
+    if args.action == 'emit':
+        if not args.event:
+            parser.error("the emit action requires an event name")
+        emit_event(args.event, **dict(args.fields))
+        sys.exit(0)
+
+    if args.event or args.fields:
+        parser.error("the history action takes no positional arguments")
+    try:
+        config = TelemetryConfig(args.config)
+    except TelemetryError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+    records = read_history(config.history_file, args.command, args.limit)
+    if args.json:
+        for record in records:
+            print(json.dumps(record, sort_keys=True))
+    elif not records:
+        print(f"No operations recorded in {config.history_file}.")
+    else:
+        print_history(records)
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# This file is managed by Puppet.
+#
+# Per-SSTable tombstone analyzer behind the deep-dive mode of tombstone-scan.sh.
+# - 'sstablemetadata' is given several SSTables per run, and the runs go to a
+#   pool of workers, instead of one JVM per SSTable, one after another.
+# - Each result is cached on disk in /var/cache/cassandra_pfpt/sstable_metadata/,
+#   keyed by the SSTable's path and size. Data.db never changes once written,
+#   but the level and repair time live in Statistics.db, which Cassandra
+#   rewrites in place (sstablelevelreset, incremental repair), so an entry is
+#   also tied to the size and mtime of that file. A repeat scan only reads the
+#   SSTables written or re-levelled since the last one. Entries for SSTables
+#   that no longer exist are dropped.
+# - Besides the per-SSTable report, totals per compaction level and a
+#   histogram of droppable tombstone ratios are printed, or with --json
+#   everything is printed as one JSON document.
+#
+# Droppable tombstone estimates are as of the time an SSTable was first read;
+# --refresh reads every SSTable again.
+
+import argparse
+import json
+import logging
+import math
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# --- Constants ---
+DATA_DIR = '/var/lib/cassandra/data'
+CACHE_DIR = '/var/cache/cassandra_pfpt/sstable_metadata'
+DEFAULT_PARALLELISM = 4
+DEFAULT_BATCH_SIZE = 32  # SSTables read per sstablemetadata run.
+HISTOGRAM_BUCKETS = 10  # Buckets of 0.1 over the droppable ratio.
+EXCLUDED_DIRS = ('snapshots', 'backups')
+MIB = 1024 * 1024
+CACHE_VERSION = 2
+
+SSTABLE_PATTERN = re.compile(r'^SSTable:\s*(\S+)', re.MULTILINE)
+DROPPABLE_PATTERN = re.compile(r'Estimated droppable tombstones:\s*([0-9.Ee+-]+)', re.IGNORECASE)
+LEVEL_PATTERN = re.compile(r'SSTable level:\s*(\d+)', re.IGNORECASE)
+REPAIRED_AT_PATTERN = re.compile(r'Repaired at:\s*(\d+)', re.IGNORECASE)
+
+# The metadata of one SSTable. `path` is that of its Data.db file; `statistics` is the
+# [size, mtime_ns] of its Statistics.db when it was read.
+SSTableInfo = namedtuple('SSTableInfo', ['path', 'size', 'droppable_tombstones', 'level', 'repaired_at', 'read_at',
+                                         'statistics'], defaults=(None,))
+
+# --- Logging Setup ---
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(levelname)s: %(message)s',
+    stream=sys.stderr
+)
+
+
+class MetadataError(Exception):
+    """Raised when SSTable metadata cannot be read."""
+
+
+# --- Helper Functions ---
+
+def find_table_dirs(data_dir, keyspace, table):
+    """Returns the data directories of a table (more than one if it was dropped and recreated)."""
+    keyspace_dir = os.path.join(data_dir, keyspace)
+    try:
+        names = sorted(os.listdir(keyspace_dir))
+    except OSError:
+        return []
+    return [os.path.join(keyspace_dir, name) for name in names
+            if name.rsplit('-', 1)[0] == table and os.path.isdir(os.path.join(keyspace_dir, name))]
+
+def find_data_files(table_dir):
+    """Lists the live Data.db files of a table, including secondary indexes but not snapshots or backups."""
+    files = []
+    for dirpath, dirnames, filenames in os.walk(table_dir):
+        dirnames[:] = [d for d in dirnames if d not in EXCLUDED_DIRS]
+        files.extend(os.path.join(dirpath, f) for f in filenames if f.endswith('-Data.db'))
+    return sorted(files)
+
+def statistics_stamp(path):
+    """Returns [size, mtime_ns] of the Statistics.db next to a Data.db file, or None if it cannot be read."""
+    try:
+        stat = os.stat(f"{path[:-len('-Data.db')]}-Statistics.db")
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+def parse_metadata(text):
+    """Reads the tombstone ratio, level and repair time from one SSTable's sstablemetadata output."""
+    droppable = DROPPABLE_PATTERN.search(text)
+    level = LEVEL_PATTERN.search(text)
+    repaired_at = REPAIRED_AT_PATTERN.search(text)
+    if droppable is None:
+        raise MetadataError("No 'Estimated droppable tombstones' in sstablemetadata output.")
+    return (float(droppable.group(1)), int(level.group(1)) if level else 0,
+            int(repaired_at.group(1)) if repaired_at else 0)
+
+
+class MetadataCache:
+    """On-disk cache of one table's SSTable metadata, keyed by Data.db path and size and Statistics.db size and mtime."""
+
+    def __init__(self, cache_dir, keyspace, table):
+        self.path = os.path.join(cache_dir, f"{keyspace}.{table}.json")
+        self.entries = {}
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            # Older caches do not record Statistics.db; their entries are read again.
+            if data.get('version') == CACHE_VERSION:
+                self.entries = {e['path']: SSTableInfo(**e) for e in data.get('sstables', [])}
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, TypeError, KeyError) as e:
+            logging.warning("Ignoring unreadable metadata cache %s: %s", self.path, e)
+
+    def get(self, path, size):
+        info = self.entries.get(path)
+        if info is None or info.size != size or info.statistics is None:
+            return None
+        return info if info.statistics == statistics_stamp(path) else None
+
+    def save(self, infos):
+        """Replaces the cache with `infos`, dropping SSTables that are gone."""
+        self.entries = {info.path: info for info in infos}
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                json.dump({'version': CACHE_VERSION, 'sstables': [info._asdict() for info in infos]}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.warning("Could not write metadata cache %s: %s", self.path, e)
+
+
+class TombstoneAnalyzer:
+    """Reads SSTable metadata with `parallelism` concurrent sstablemetadata runs of `batch_size` SSTables each."""
+
+    def __init__(self, parallelism=DEFAULT_PARALLELISM, batch_size=DEFAULT_BATCH_SIZE, command=('sstablemetadata',)):
+        self.parallelism = max(1, parallelism)
+        self.batch_size = max(1, batch_size)
+        self.command = list(command)
+
+    def _run(self, paths):
+        try:
+            process = subprocess.run(self.command + paths, capture_output=True, text=True)
+        except OSError as e:
+            raise MetadataError(f"Could not run {self.command[0]}: {e}")
+        if process.returncode != 0 and not process.stdout:
+            raise MetadataError(process.stderr.strip() or f"{self.command[0]} exited with code {process.returncode}")
+        return process.stdout
+
+    def _read_batch(self, files):
+        """Reads a batch of (path, size) in one run, retrying SSTables missing from its output one at a time."""
+        now = time.time()
+        # Taken before the run, so a Statistics.db rewritten while it is read leaves a stale stamp.
+        stamps = {path: statistics_stamp(path) for path, _ in files}
+        output = self._run([path for path, _ in files])
+        # The output has one section per SSTable, each starting 'SSTable: <path without -Data.db>'.
+        sections = {}
+        matches = list(SSTABLE_PATTERN.finditer(output))
+        for i, match in enumerate(matches):
+            end = matches[i + 1].start() if i + 1 < len(matches) else len(output)
+            sections[os.path.realpath(match.group(1))] = output[match.end():end]
+        results, errors = [], []
+        for path, size in files:
+            text = sections.get(os.path.realpath(path[:-len('-Data.db')]))
+            try:
+                if text is None:
+                    text = self._run([path]) if len(files) > 1 else output
+                results.append(SSTableInfo(path, size, *parse_metadata(text), now, stamps[path]))
+            except MetadataError as e:
+                errors.append((path, str(e)))
+        return results, errors
+
+    def analyze(self, files, cache, refresh=False):
+        """Returns SSTableInfo for every (path, size) in `files`, reading only those not in the cache.
+
+        Also returns the number of cache hits and a list of (path, error) for
+        SSTables that could not be read.
+        """
+        infos, missing = [], []
+        for path, size in files:
+            cached = None if refresh else cache.get(path, size)
+            if cached is not None:
+                infos.append(cached)
+            else:
+                missing.append((path, size))
+        hits = len(infos)
+        errors = []
+        if missing:
+            logging.info("Reading metadata of %d SSTable(s) (%d cached), %d at a time per run, %d runs at once...",
+                         len(missing), hits, self.batch_size, self.parallelism)
+        # Spread small scans over all workers rather than filling a few full batches.
+        batch_size = min(self.batch_size, max(1, math.ceil(len(missing) / self.parallelism)))
+        batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+        with ThreadPoolExecutor(max_workers=self.parallelism, thread_name_prefix='sstablemetadata') as executor:
+            futures = [executor.submit(self._read_batch, batch) for batch in batches]
+            for future in as_completed(futures):
+                try:
+                    results, batch_errors = future.result()
+                except MetadataError as e:
+                    batch = batches[futures.index(future)]
+                    results, batch_errors = [], [(path, str(e)) for path, _ in batch]
+                infos.extend(results)
+                errors.extend(batch_errors)
+        return infos, hits, errors
+
+
+def aggregate(infos):
+    """Builds the droppable tombstone histogram and per-level totals."""
+    histogram = [{'min_ratio': round(i / HISTOGRAM_BUCKETS, 2), 'max_ratio': round((i + 1) / HISTOGRAM_BUCKETS, 2),
+                  'sstables': 0, 'bytes': 0} for i in range(HISTOGRAM_BUCKETS)]
+    levels = {}
+    for info in infos:
+        bucket = histogram[min(HISTOGRAM_BUCKETS - 1, max(0, int(info.droppable_tombstones * HISTOGRAM_BUCKETS)))]
+        bucket['sstables'] += 1
+        bucket['bytes'] += info.size
+        level = levels.setdefault(info.level, {'sstables': 0, 'bytes': 0, 'estimated_droppable_bytes': 0.0})
+        level['sstables'] += 1
+        level['bytes'] += info.size
+        level['estimated_droppable_bytes'] += info.size * info.droppable_tombstones
+    for level in levels.values():
+        level['estimated_droppable_bytes'] = int(level['estimated_droppable_bytes'])
+        # Size-weighted, so a few large SSTables count for more than many small ones.
+        level['droppable_ratio'] = round(level['estimated_droppable_bytes'] / level['bytes'], 4) if level['bytes'] else 0.0
+    return histogram, {str(level): levels[level] for level in sorted(levels)}
+
+
+def print_table(header, rows):
+    """Prints tab-separated columns aligned like 'column -t'."""
+    widths = [max(len(str(row[i])) for row in [header] + rows) for i in range(len(header))]
+    for row in [header] + rows:
+        print('  '.join(str(value).ljust(width) for value, width in zip(row, widths)).rstrip())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parallel, cached per-SSTable tombstone analysis of one table.')
+    parser.add_argument('--keyspace', '-k', required=True, help='Keyspace of the table.')
+    parser.add_argument('--table', '-t', required=True, help='Table to analyze.')
+    parser.add_argument('--json', action='store_true', help='Print the report and aggregates as JSON.')
+    parser.add_argument('--data-dir', default=DATA_DIR, help=f'Optional: Cassandra data directory. Default: {DATA_DIR}.')
+    parser.add_argument('--parallelism', type=int, default=DEFAULT_PARALLELISM, help=f'Optional: sstablemetadata runs at once. Default: {DEFAULT_PARALLELISM}.')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help=f'Optional: SSTables read per sstablemetadata run. Default: {DEFAULT_BATCH_SIZE}.')
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help=f'Optional: Metadata cache location. Default: {CACHE_DIR}.')
+    parser.add_argument('--refresh', action='store_true', help='Optional: Read every SSTable again instead of using cached results.')
+    args = parser.parse_args()
+
+    table_dirs = find_table_dirs(args.data_dir, args.keyspace, args.table)
+    if not table_dirs:
+        logging.error("Could not find data directory for table '%s' in keyspace '%s'.", args.table, args.keyspace)
+        sys.exit(1)
+
+    files = []
+    for path in (path for table_dir in table_dirs for path in find_data_files(table_dir)):
+        try:
+            files.append((path, os.stat(path).st_size))
+        except OSError:
+            pass  # Compacted away since it was listed.
+
+    cache = MetadataCache(args.cache_dir, args.keyspace, args.table)
+    start = time.time()
+    infos, hits, errors = TombstoneAnalyzer(args.parallelism, args.batch_size).analyze(files, cache, args.refresh)
+    if files:
+        cache.save(infos)
+    for path, error in errors:
+        logging.warning("Could not read metadata of %s: %s", path, error)
+    infos.sort(key=lambda info: info.droppable_tombstones, reverse=True)
+    histogram, levels = aggregate(infos)
+
+    if args.json:
+        print(json.dumps({
+            'keyspace': args.keyspace,
+            'table': args.table,
+            'sstables': len(infos),
+            'total_bytes': sum(info.size for info in infos),
+            'cached': hits,
+            'read': len(infos) - hits,
+            'failed': len(errors),
+            'seconds': round(time.time() - start, 1),
+            'droppable_histogram': histogram,
+            'levels': levels,
+            'sstable_details': [{'name': os.path.basename(info.path), 'path': info.path, 'size_bytes': info.size,
+                                 'droppable_tombstones': info.droppable_tombstones, 'level': info.level,
+                                 'repaired_at': info.repaired_at, 'read_at': int(info.read_at)} for info in infos],
+        }, indent=2))
+    else:
+        if not infos:
+            logging.warning("No SSTable data files (*-Data.db) found for this table.")
+        else:
+            print_table(['SSTABLE_NAME', 'SIZE(MB)', 'DROPPABLE_TOMBSTONES', 'LEVEL'],
+                        [[os.path.basename(i.path), i.size // MIB, i.droppable_tombstones, i.level] for i in infos])
+            print()
+            print_table(['LEVEL', 'SSTABLES', 'SIZE(MB)', 'DROPPABLE_RATIO', 'EST_DROPPABLE(MB)'],
+                        [[level, t['sstables'], t['bytes'] // MIB, t['droppable_ratio'], t['estimated_droppable_bytes'] // MIB]
+                         for level, t in levels.items()])
+            print()
+            print_table(['DROPPABLE_RATIO', 'SSTABLES', 'SIZE(MB)'],
+                        [[f"{b['min_ratio']:.1f}-{b['max_ratio']:.1f}", b['sstables'], b['bytes'] // MIB]
+                         for b in histogram if b['sstables']])
+            print()
+            logging.info("%d SSTable(s): %d from cache, %d read in %.1fs.", len(infos), hits, len(infos) - hits,
+                         time.time() - start)
+    sys.exit(1 if errors and not infos else 0)
+
+
+if __name__ == '__main__':
+    main()
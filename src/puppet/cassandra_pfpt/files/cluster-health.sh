@@ -67,10 +67,19 @@ run_checks() {
 
     # 1. Check nodetool status for 'UN' (Up, Normal) on ALL nodes
     log_message "${BLUE}Checking that all nodes are Up/Normal...${NC}"
-    NODETOOL_STATUS=$(nodetool status 2>&1)
-    
+    # Repeated callers (rolling operations, Puppet checks) share a short-lived
+    # snapshot of 'nodetool status' instead of each starting a nodetool JVM.
+    local NODETOOL_STATUS_RC
+    if [ -x /usr/local/bin/cassandra_health.py ]; then
+        NODETOOL_STATUS=$(/usr/local/bin/cassandra_health.py --nodetool status 2>&1)
+        NODETOOL_STATUS_RC=$?
+    else
+        NODETOOL_STATUS=$(nodetool status 2>&1)
+        NODETOOL_STATUS_RC=$?
+    fi
+
     # Check for nodetool command failure first
-    if [ $? -ne 0 ]; then
+    if [ $NODETOOL_STATUS_RC -ne 0 ]; then
         log_message "${RED}Nodetool status command failed to execute.${NC}"
         if [ "$SILENT" = false ]; then
             echo "$NODETOOL_STATUS"
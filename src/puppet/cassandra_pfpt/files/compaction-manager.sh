@@ -12,6 +12,9 @@ DISK_CHECK_PATH="/var/lib/cassandra/data"
 CRITICAL_THRESHOLD=85 # Abort if disk usage rises above 85%
 CHECK_INTERVAL=30     # Check disk space every 30 seconds
 LOG_FILE="/var/log/cassandra/compaction_manager.log"
+PLAN_MODE=""          # "run" or "only" when the space-aware planner is used
+CONCURRENCY=2
+PLANNER="/usr/local/bin/cassandra_compaction_planner.py"
 
 # --- Color Codes ---
 RED='\033[0;31m'
@@ -33,6 +36,8 @@ usage() {
     log_message "Modes:"
     log_message "  Default:      Compact a keyspace, table, or the entire node."
     log_message "  --user-defined: Compact a specific list of user-defined sstable files."
+    log_message "  --plan:       Compact table by table, largest first, as many at once as fit below the critical threshold."
+    log_message "  --plan-only:  Print the planned schedule with predicted start and end times, without compacting."
     log_message ""
     log_message "Options:"
     log_message "  -k, --keyspace <name>         Specify the keyspace to compact. (Not for --user-defined mode)"
@@ -42,6 +47,7 @@ usage() {
     log_message "  -d, --disk-path <path>        Path to monitor for disk space. Default: $DISK_CHECK_PATH"
     log_message "  -c, --critical <%>            Critical disk usage threshold (%). Aborts if above. Default: $CRITICAL_THRESHOLD"
     log_message "  -i, --interval <sec>          Interval in seconds to check disk space. Default: $CHECK_INTERVAL"
+    log_message "  -j, --concurrency <n>         Planner only: table compactions to run at once. Default: $CONCURRENCY"
     log_message "  -h, --help                    Show this help message."
     log_message ""
     log_message "Examples:"
@@ -49,6 +55,7 @@ usage() {
     log_message "  Keyspace compaction:        $0 -k my_keyspace"
     log_message "  Table compaction:           $0 -k my_keyspace -t my_table"
     log_message "  User-defined compaction:    $0 --user-defined /path/to/data.db /path/to/other.db"
+    log_message "  Planned keyspace compaction: $0 -k my_keyspace --plan -j 3"
     exit 1
 }
 
@@ -61,6 +68,9 @@ while [[ "$#" -gt 0 ]]; do
         -d|--disk-path) DISK_CHECK_PATH="$2"; shift ;;
         -c|--critical) CRITICAL_THRESHOLD="$2"; shift ;;
         -i|--interval) CHECK_INTERVAL="$2"; shift ;;
+        -j|--concurrency) CONCURRENCY="$2"; shift ;;
+        --plan) PLAN_MODE="run" ;;
+        --plan-only) PLAN_MODE="only" ;;
         --user-defined) USER_DEFINED_MODE=true; shift; USER_DEFINED_FILES=("$@"); break ;; # Capture all remaining args
         -h|--help) usage; exit 0 ;;
         *) log_message "${RED}Unknown parameter passed: $1${NC}"; usage; exit 1 ;;
@@ -91,6 +101,10 @@ if [ "$USER_DEFINED_MODE" = true ]; then
         CMD_ARRAY+=("$file")
     done
     TARGET_DESC="user-defined files"
+    if [[ -n "$PLAN_MODE" ]]; then
+        log_message "${RED}ERROR: Cannot use --plan or --plan-only with --user-defined.${NC}"
+        exit 1
+    fi
 else
     # Add nodetool options if provided
     if [[ -n "$NODETOOL_OPTIONS" ]]; then
@@ -109,11 +123,34 @@ else
     fi
 fi
 
+# The planner estimates each table's transient space up front instead of stopping a compaction
+# once the disk is nearly full.
+PLANNER_ARGS=()
+if [[ -n "$PLAN_MODE" ]]; then
+    if [ ! -x "$PLANNER" ]; then
+        log_message "${RED}ERROR: Compaction planner not found at $PLANNER.${NC}"
+        exit 1
+    fi
+    PLANNER_ARGS=(--data-dir "$DISK_CHECK_PATH" --critical "$CRITICAL_THRESHOLD" --interval "$CHECK_INTERVAL"
+                  --concurrency "$CONCURRENCY" "--nodetool-options=$NODETOOL_OPTIONS")
+    if [[ -n "$KEYSPACE" ]]; then
+        PLANNER_ARGS+=(--keyspace "$KEYSPACE")
+        for table in "${TABLE_LIST[@]}"; do
+            PLANNER_ARGS+=(--table "$table")
+        done
+    fi
+    if [[ "$PLAN_MODE" == "only" ]]; then
+        exec "$PLANNER" "${PLANNER_ARGS[@]}" --plan-only
+    fi
+fi
+
 log_message "${BLUE}Target: $TARGET_DESC${NC}"
 log_message "${BLUE}Disk path to monitor: $DISK_CHECK_PATH${NC}"
 log_message "${BLUE}Critical disk usage threshold: $CRITICAL_THRESHOLD%${NC}"
 log_message "${BLUE}Disk check interval: ${CHECK_INTERVAL}s${NC}"
-log_message "Command to be executed: ${CMD_ARRAY[*]}"
+if [[ -z "$PLAN_MODE" ]]; then
+    log_message "Command to be executed: ${CMD_ARRAY[*]}"
+fi
 
 # Pre-flight disk space check
 log_message "${BLUE}Performing pre-flight disk usage check...${NC}"
@@ -133,6 +170,19 @@ if ! nodetool netstats | grep -q "Mode: NORMAL"; then
 fi
 log_message "${GREEN}Node state is NORMAL. Proceeding.${NC}"
 
+if [[ "$PLAN_MODE" == "run" ]]; then
+    log_message "${BLUE}Running planned compaction, up to $CONCURRENCY table(s) at once...${NC}"
+    # With pipefail, the planner's exit code (1 failed/skipped, 2 stopped at the threshold) is kept.
+    if "$PLANNER" "${PLANNER_ARGS[@]}" 2>&1 | tee -a "$LOG_FILE"; then
+        log_message "${GREEN}--- Compaction Manager Finished Successfully ---${NC}"
+        exit 0
+    else
+        PLANNER_EXIT_CODE=$?
+        log_message "${RED}ERROR: Planned compaction exited with status: $PLANNER_EXIT_CODE.${NC}"
+        exit $PLANNER_EXIT_CODE
+    fi
+fi
+
 # Start compaction in the background
 log_message "${BLUE}Starting compaction process...${NC}"
 "${CMD_ARRAY[@]}" &
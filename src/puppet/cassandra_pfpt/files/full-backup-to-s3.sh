@@ -67,6 +67,8 @@ LOG_FILE=$(jq -r '.full_backup_log_file' "$CONFIG_FILE")
 LISTEN_ADDRESS=$(jq -r '.listen_address' "$CONFIG_FILE")
 KEEP_DAYS=$(jq -r '.clearsnapshot_keep_days // 0' "$CONFIG_FILE")
 UPLOAD_STREAMING=$(jq -r '.upload_streaming // "false"' "$CONFIG_FILE")
+BACKUP_ENGINE=$(jq -r '.backup_engine // "shell"' "$CONFIG_FILE")
+BACKUP_DEDUP=$(jq -r '.backup_dedup // false' "$CONFIG_FILE")
 CASSANDRA_USER=$(jq -r '.cassandra_user // "cassandra"' "$CONFIG_FILE")
 CASSANDRA_PASSWORD=$(jq -r '.cassandra_password // "null"' "$CONFIG_FILE")
 SSL_ENABLED=$(jq -r '.ssl_enabled // "false"' "$CONFIG_FILE")
@@ -112,6 +114,8 @@ BACKUP_TEMP_DIR="${CASSANDRA_DATA_DIR%/*}/backup_temp_$$"
 LOCK_FILE="/tmp/cassandra_backup.lock"
 ERROR_DIR="$BACKUP_TEMP_DIR/errors"
 S3_OBJECT_LOCK_APPLICABLE="false"
+# Deduplicated SSTable components, kept outside of the per-host backup prefix.
+DEDUP_S3_PREFIX="_sstables/$HOSTNAME"
 
 
 # --- AWS Credential Check Function ---
@@ -166,46 +170,76 @@ manage_s3_lifecycle() {
         return 0
     fi
 
+    # Backups expire by age. With deduplication, the rule only covers this host's
+    # backup sets, so the shared SSTable objects under $DEDUP_S3_PREFIX/ are not
+    # expired while newer backups still reference them; the backup engine deletes
+    # those once no backup set references them any more.
     local policy_id="auto-expire-backups"
+    local policy_prefix=""
+    local legacy_ids='[]'
+    if [ "$BACKUP_DEDUP" == "true" ]; then
+        policy_id="auto-expire-backups-$HOSTNAME"
+        policy_prefix="$HOSTNAME/"
+        legacy_ids='["auto-expire-backups"]'
+    fi
     log_info "Checking for S3 lifecycle policy '$policy_id' with retention of $S3_RETENTION_PERIOD days..."
 
-    # Check if a policy with our ID already exists
+    # On versioned buckets (always the case with Object Lock) an expired or deleted
+    # object stays behind as a noncurrent version. Remove those a day later, once
+    # any Object Lock retention allows it, along with the leftover delete markers.
+    local managed_rules
+    managed_rules=$(jq -n \
+        --arg ID "$policy_id" \
+        --arg PREFIX "$policy_prefix" \
+        --argjson DAYS "$S3_RETENTION_PERIOD" \
+        '[
+            {
+                "ID": $ID,
+                "Filter": {
+                    "Prefix": $PREFIX
+                },
+                "Status": "Enabled",
+                "Expiration": {
+                    "Days": $DAYS
+                }
+            },
+            {
+                "ID": "expire-noncurrent-versions",
+                "Filter": {
+                    "Prefix": ""
+                },
+                "Status": "Enabled",
+                "Expiration": {
+                    "ExpiredObjectDeleteMarker": true
+                },
+                "NoncurrentVersionExpiration": {
+                    "NoncurrentDays": 1
+                }
+            }
+        ]')
+
+    # Rules of other hosts and any added by hand are kept.
+    local existing_rules='[]'
     local existing_policy_json
     existing_policy_json=$(aws s3api get-bucket-lifecycle-configuration --bucket "$S3_BUCKET_NAME" 2>/dev/null || echo "")
-
-    local existing_policy_days=""
     # Check if the returned string is valid JSON before trying to parse it
     if echo "$existing_policy_json" | jq -e . > /dev/null 2>&1; then
-        existing_policy_days=$(echo "$existing_policy_json" | jq -r --arg ID "$policy_id" '.Rules[] | select(.ID == $ID) | .Expiration.Days // ""')
+        existing_rules=$(echo "$existing_policy_json" | jq '.Rules // []')
     fi
 
-    if [[ "$existing_policy_days" == "$S3_RETENTION_PERIOD" ]]; then
+    if jq -n -e --argjson EXISTING "$existing_rules" --argjson MANAGED "$managed_rules" --argjson LEGACY "$legacy_ids" \
+        '($MANAGED | all(. as $rule | $EXISTING | index([$rule]) != null))
+         and ([$EXISTING[] | select(.ID as $id | $LEGACY | index($id) != null)] | length == 0)' > /dev/null; then
         log_success "Correct lifecycle policy already in place. Nothing to do."
         return 0
-    elif [[ -n "$existing_policy_days" ]]; then
-        log_warn "A lifecycle policy with ID '$policy_id' exists but has a different retention ($existing_policy_days days). It will be updated."
-    else
-        log_info "No lifecycle policy named '$policy_id' found. A new one will be created."
     fi
+    log_info "Lifecycle policy '$policy_id' is missing or out of date. It will be updated."
 
     # Construct the lifecycle policy JSON
     local lifecycle_json
-    lifecycle_json=$(jq -n \
-        --arg ID "$policy_id" \
-        --argjson DAYS "$S3_RETENTION_PERIOD" \
+    lifecycle_json=$(jq -n --argjson EXISTING "$existing_rules" --argjson MANAGED "$managed_rules" --argjson LEGACY "$legacy_ids" \
         '{
-            "Rules": [
-                {
-                    "ID": $ID,
-                    "Filter": {
-                        "Prefix": ""
-                    },
-                    "Status": "Enabled",
-                    "Expiration": {
-                        "Days": $DAYS
-                    }
-                }
-            ]
+            "Rules": ([$EXISTING[] | select(.ID as $id | ($LEGACY + [$MANAGED[].ID]) | index($id) == null)] + $MANAGED)
         }')
 
     log_info "Applying lifecycle policy to bucket '$S3_BUCKET_NAME'..."
@@ -218,6 +252,30 @@ manage_s3_lifecycle() {
     log_success "S3 lifecycle policy applied successfully."
 }
 
+# Succeeds if an enabled lifecycle rule expires objects under $DEDUP_S3_PREFIX/ by
+# age, or if that cannot be ruled out. Such a rule would delete deduplicated
+# SSTables while newer backups still reference them.
+dedup_prefix_expires() {
+    local lifecycle_json
+    if ! lifecycle_json=$(aws s3api get-bucket-lifecycle-configuration --bucket "$S3_BUCKET_NAME" 2>&1); then
+        # A bucket without any lifecycle configuration expires nothing.
+        if echo "$lifecycle_json" | grep -q 'NoSuchLifecycleConfiguration'; then
+            return 1
+        fi
+        return 0
+    fi
+    local status=0
+    echo "$lifecycle_json" | jq -e --arg P "$DEDUP_S3_PREFIX/" '
+        [.Rules[]? | select(.Status == "Enabled" and (.Expiration.Days != null or .Expiration.Date != null))
+         | (.Filter // {"Prefix": (.Prefix // "")})
+         | select(.Tag == null and ((.And.Tags // []) | length) == 0)
+         | (.Prefix // .And.Prefix // "")
+         | select(. as $rule_prefix | $P | startswith($rule_prefix))]
+        | length > 0' > /dev/null 2>&1 || status=$?
+    # jq exits 1 only for a false result; anything else is a parse error.
+    [ "$status" -ne 1 ]
+}
+
 ensure_s3_bucket_and_lifecycle() {
     if [ "$BACKUP_BACKEND" != "s3" ]; then
         return 0
@@ -396,12 +454,24 @@ fi
 echo -n "$ENCRYPTION_KEY" > "$TMP_KEY_FILE"
 
 
+# The incremental shipper pauses while we hold the lock, but may have shipped a batch
+# under this minute's tag just before. Move on to a minute no backup set uses yet.
+if [ "$BACKUP_BACKEND" == "s3" ] && [ ! -f "/var/lib/upload-disabled" ]; then
+    while aws s3 ls "s3://$S3_BUCKET_NAME/$HOSTNAME/$BACKUP_TAG/" 2>/dev/null | grep -q .; do
+        log_warn "Backup set $HOSTNAME/$BACKUP_TAG already exists in S3. Waiting for the next minute."
+        sleep $((60 - 10#$(date +%S)))
+        BACKUP_TAG=$(date +'%Y-%m-%d-%H-%M')
+    done
+fi
+
 # Run cleanup of old snapshots BEFORE taking a new one
 cleanup_old_snapshots
 
 log_info "--- Starting Granular Cassandra Snapshot Backup Process ---"
 log_info "S3 Bucket: $S3_BUCKET_NAME"
 log_info "Backup Timestamp (Tag): $BACKUP_TAG"
+log_info "Backup Engine: $BACKUP_ENGINE"
+log_info "SSTable Deduplication: $BACKUP_DEDUP"
 log_info "Streaming Mode: $UPLOAD_STREAMING"
 log_info "Parallelism: $PARALLELISM"
 if [ -n "$THROTTLE_RATE" ]; then
@@ -606,10 +676,61 @@ find "$CASSANDRA_DATA_DIR" -mindepth 1 -maxdepth 1 -type d | while read -r ks_pa
 done
 rm -f "$SKIPPED_KEYSPACES"
 
-log_info "--- Starting Parallel Backup of Tables ---"
-find "$CASSANDRA_DATA_DIR" -type d -path "*/snapshots/$BACKUP_TAG" -not -empty -print0 | \
-    xargs -0 -P "$PARALLELISM" -I {} bash -c 'process_table_backup "$1"' _ {}
-log_info "--- Finished Parallel Backup of Tables ---"
+# The Python engine streams every table in-process with concurrent multipart
+# uploads. It is used when configured and usable here (it needs boto3 for S3);
+# otherwise the per-table shell pipeline below runs instead.
+USE_BACKUP_ENGINE=false
+if [ "$BACKUP_ENGINE" == "python" ] && [ "$BACKUP_BACKEND" == "s3" ] && [ ! -f "/var/lib/upload-disabled" ]; then
+    if /usr/local/bin/cassandra_backup_engine.py check >> "$LOG_FILE" 2>&1; then
+        USE_BACKUP_ENGINE=true
+    else
+        log_warn "The Python backup engine is not usable on this node (see $LOG_FILE). Falling back to the shell pipeline."
+    fi
+fi
+
+if [ "$USE_BACKUP_ENGINE" = true ] && [ "$BACKUP_DEDUP" == "true" ] && dedup_prefix_expires; then
+    log_warn "A bucket lifecycle rule expires objects under $DEDUP_S3_PREFIX/ by age, which would delete SSTables that newer backups still reference."
+    log_warn "Uploading complete table archives instead. Limit the rule to the '<hostname>/' prefixes to use deduplication."
+    BACKUP_DEDUP="false"
+fi
+
+if [ "$USE_BACKUP_ENGINE" = true ]; then
+    log_info "--- Starting Streaming Backup of Tables (Python engine) ---"
+    ENGINE_CMD=(nice -n 19 ionice -c 3 /usr/local/bin/cassandra_backup_engine.py backup
+        --tag "$BACKUP_TAG" --prefix "$HOSTNAME/$BACKUP_TAG" --key-file "$TMP_KEY_FILE"
+        --parallelism "$PARALLELISM" --error-dir "$ERROR_DIR")
+    if [ "$BACKUP_DEDUP" == "true" ]; then
+        # Unchanged SSTable components are referenced from earlier backups instead of re-uploaded.
+        ENGINE_CMD+=(--dedup --dedup-prefix "$DEDUP_S3_PREFIX")
+    else
+        ENGINE_CMD+=(--no-dedup)
+    fi
+    if [ -n "$THROTTLE_RATE" ]; then
+        ENGINE_CMD+=(--throttle "$THROTTLE_RATE")
+    fi
+    if [ "$S3_OBJECT_LOCK_ENABLED" == "true" ] && [ "$S3_OBJECT_LOCK_APPLICABLE" == "true" ] && [ "$S3_OBJECT_LOCK_RETENTION" -gt 0 ]; then
+        ENGINE_CMD+=(--object-lock-mode "$S3_OBJECT_LOCK_MODE" --object-lock-days "$S3_OBJECT_LOCK_RETENTION")
+    fi
+    set +e
+    "${ENGINE_CMD[@]}" 2>&1 | tee -a "$LOG_FILE"
+    ENGINE_STATUS=${PIPESTATUS[0]}
+    set -e
+    # Exit code 1 means some tables failed (recorded in $ERROR_DIR); anything else is fatal.
+    if [ "$ENGINE_STATUS" -gt 1 ]; then
+        log_error "Backup engine failed with exit code $ENGINE_STATUS. Aborting backup."
+        exit 1
+    fi
+    log_info "--- Finished Streaming Backup of Tables ---"
+else
+    if [ "$BACKUP_DEDUP" == "true" ]; then
+        log_warn "SSTable deduplication needs the Python backup engine. Uploading complete table archives instead."
+    fi
+    BACKUP_DEDUP="false"
+    log_info "--- Starting Parallel Backup of Tables ---"
+    find "$CASSANDRA_DATA_DIR" -type d -path "*/snapshots/$BACKUP_TAG" -not -empty -print0 | \
+        xargs -0 -P "$PARALLELISM" -I {} bash -c 'process_table_backup "$1"' _ {}
+    log_info "--- Finished Parallel Backup of Tables ---"
+fi
 
 TOTAL_TABLES_ATTEMPTED=$(find "$CASSANDRA_DATA_DIR" -type d -path "*/snapshots/$BACKUP_TAG" -not -empty | wc -l | tr -d ' ')
 UPLOAD_ERRORS=$(find "$ERROR_DIR" -type f 2>/dev/null | wc -l | tr -d ' ')
@@ -658,13 +779,12 @@ fi
 NODE_DC=$(run_nodetool info 2>/dev/null | grep -E '^\s*Data Center' | awk '{print $4}' || echo "Unknown")
 NODE_RACK=$(run_nodetool info 2>/dev/null | grep -E '^\s*Rack' | awk '{print $3}' || echo "Unknown")
 
-# Robust token gathering
-NODE_TOKENS_RAW=$(run_nodetool ring 2>/dev/null | grep "\b$NODE_IP\b" | awk '{print $NF}' || echo "")
-if [ -z "$NODE_TOKENS_RAW" ]; then
-    log_error "Could not get tokens for node $NODE_IP from 'nodetool ring'. Cannot create a valid manifest."
+# Token gathering via the shared ring model (cached, exact address match)
+NODE_TOKENS=$(/usr/local/bin/cassandra_ring.py tokens "$NODE_IP" 2>>"$LOG_FILE" || echo "")
+if [ -z "$NODE_TOKENS" ]; then
+    log_error "Could not get tokens for node $NODE_IP from the token ring. Cannot create a valid manifest."
     exit 1
 fi
-NODE_TOKENS=$(echo "$NODE_TOKENS_RAW" | tr '\n' ',' | sed 's/,$//')
 
 # For the manifest, we will just list the count of tables
 jq -n \
@@ -677,6 +797,7 @@ jq -n \
   --arg node_rack "$NODE_RACK" \
   --arg tokens "$NODE_TOKENS" \
   --argjson tables_count "$TABLES_BACKED_UP_SUCCESS_COUNT" \
+  --argjson sstable_dedup "$BACKUP_DEDUP" \
   '{
     "cluster_name": $cluster_name,
     "backup_id": $backup_id,
@@ -688,7 +809,8 @@ jq -n \
       "rack": $node_rack,
       "tokens": ($tokens | split(","))
     },
-    "tables_backed_up_count": $tables_count
+    "tables_backed_up_count": $tables_count,
+    "sstable_dedup": $sstable_dedup
   }' > "$MANIFEST_FILE"
 
 log_success "Manifest created successfully."
@@ -737,6 +859,10 @@ else
             fi
         fi
 
+        if ! /usr/local/bin/cassandra_backup_catalog.py record --host "$HOSTNAME" --backup-id "$BACKUP_TAG" --manifest "$MANIFEST_FILE" >> "$LOG_FILE" 2>&1; then
+            log_warn "Could not record this backup in the local backup catalog. It will be picked up by the next catalog sync."
+        fi
+
     else
         log_info "Backup backend is set to '$BACKUP_BACKEND', not 's3'. Skipping manifest and schema uploads."
         log_info "Local snapshot is available with tag: $BACKUP_TAG"
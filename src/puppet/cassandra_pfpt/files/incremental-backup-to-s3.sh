@@ -242,6 +242,10 @@ do_upload() {
         return 1
     fi
 
+    if ! /usr/local/bin/cassandra_backup_catalog.py record --host "$HOSTNAME" --backup-id "$BACKUP_TAG" --manifest "$LOCAL_BACKUP_DIR/backup_manifest.json" >> "$LOG_FILE" 2>&1; then
+        log_warn "Could not record this backup in the local backup catalog. It will be picked up by the next catalog sync."
+    fi
+
     log_success "--- S3 Upload Finished Successfully ---"
     return 0
 }
@@ -290,6 +294,12 @@ if [ -f "/var/lib/backup-disabled" ]; then
     exit 0
 fi
 
+# In continuous mode the shipper service owns the backups/ directories.
+if systemctl is-active --quiet cassandra-incremental-shipper 2>/dev/null; then
+    log_info "The cassandra-incremental-shipper service is shipping incremental backups continuously. Nothing to do."
+    exit 0
+fi
+
 if [ -f "$LOCK_FILE" ]; then
     OLD_PID=$(cat "$LOCK_FILE")
     if ps -p "$OLD_PID" > /dev/null; then log_warn "Backup process with PID $OLD_PID is still running. Exiting."; exit 1; fi
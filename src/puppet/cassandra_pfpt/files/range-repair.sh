@@ -29,6 +29,9 @@ log_message() {
 # --- Argument Parsing ---
 KEYSPACE=""
 HOURS=0
+PARALLEL=1
+SEGMENT_SECONDS=0
+CLIENT="nodetool"
 # Loop through all arguments to parse flags and positional args
 while [[ "$#" -gt 0 ]]; do
     case "$1" in
@@ -41,6 +44,33 @@ while [[ "$#" -gt 0 ]]; do
                 exit 1
             fi
             ;;
+        --parallel)
+            if [[ "$2" =~ ^[1-9][0-9]*$ ]]; then
+                PARALLEL="$2"
+                shift 2
+            else
+                log_message "${RED}ERROR: --parallel requires a positive integer value.${NC}"
+                exit 1
+            fi
+            ;;
+        --segment-seconds)
+            if [[ "$2" =~ ^[0-9]+(\.[0-9]+)?$ ]]; then
+                SEGMENT_SECONDS="$2"
+                shift 2
+            else
+                log_message "${RED}ERROR: --segment-seconds requires a numeric value.${NC}"
+                exit 1
+            fi
+            ;;
+        --client)
+            if [[ "$2" == "nodetool" || "$2" == "jolokia" ]]; then
+                CLIENT="$2"
+                shift 2
+            else
+                log_message "${RED}ERROR: --client must be 'nodetool' or 'jolokia'.${NC}"
+                exit 1
+            fi
+            ;;
         -*)
             log_message "${RED}ERROR: Unknown option '$1'.${NC}"
             exit 1
@@ -117,6 +147,7 @@ log_message "${GREEN}Disk usage OK. Proceeding with repair.${NC}"
 # Build the command to execute
 PYTHON_CMD_ARRAY=("/usr/local/sbin/cassandra_range_repair.py")
 PYTHON_CMD_ARRAY+=("--local-ip" "$LISTEN_ADDRESS")
+PYTHON_CMD_ARRAY+=("--client" "$CLIENT")
 
 # Add JMX credentials for nodetool commands
 JMX_USER=""
@@ -146,6 +177,14 @@ if [ "$HOURS" != "0" ]; then
     PYTHON_CMD_ARRAY+=("--hours" "$HOURS")
     log_message "${BLUE}Repair timed to complete in $HOURS hours.${NC}"
 fi
+if [ "$PARALLEL" != "1" ]; then
+    PYTHON_CMD_ARRAY+=("--parallel" "$PARALLEL")
+    log_message "${BLUE}Running up to $PARALLEL range repairs concurrently.${NC}"
+fi
+if [ "$SEGMENT_SECONDS" != "0" ]; then
+    PYTHON_CMD_ARRAY+=("--segment-seconds" "$SEGMENT_SECONDS")
+    log_message "${BLUE}Splitting ranges into segments of ~$SEGMENT_SECONDS seconds each.${NC}"
+fi
 if [ -n "$KEYSPACE" ]; then
     PYTHON_CMD_ARRAY+=("$KEYSPACE")
     log_message "${BLUE}Targeting keyspace: $KEYSPACE${NC}"
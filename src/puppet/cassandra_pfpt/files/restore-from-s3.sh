@@ -52,6 +52,7 @@ SSL_ENABLED=""
 SSL_TRUSTSTORE_PATH=""
 SSL_TRUSTSTORE_PASSWORD=""
 BACKUP_BACKEND=""
+BACKUP_ENGINE=""
 PARALLELISM=""
 LOADER_NODES=""
 RESTORE_BASE_PATH=""
@@ -145,7 +146,8 @@ run_interactive_mode() {
     # Step 2: List hosts and get Source Host
     log_info "Fetching available hosts from S3..."
     local hosts_raw
-    hosts_raw=$(aws s3 ls "s3://$EFFECTIVE_S3_BUCKET/" | grep ' PRE ' | awk '{print $2}' | sed 's|/||' | xargs)
+    hosts_raw=$(catalog_query hosts | xargs) || \
+        hosts_raw=$(aws s3 ls "s3://$EFFECTIVE_S3_BUCKET/" | grep ' PRE ' | awk '{print $2}' | sed 's|/||' | grep -v '^_' | xargs)
     if [ -z "$hosts_raw" ]; then
         log_error "No hosts found in S3 bucket '$EFFECTIVE_S3_BUCKET'."
         exit 1
@@ -187,7 +189,8 @@ run_interactive_mode() {
     # Step 4: Select Backup Set (Point-in-Time)
     log_info "Fetching available backup timestamps for host '$EFFECTIVE_SOURCE_HOST'..."
     local backups_raw
-    backups_raw=$(aws s3 ls "s3://$EFFECTIVE_S3_BUCKET/$EFFECTIVE_SOURCE_HOST/" | grep ' PRE ' | awk '{print $2}' | sed 's|/||' | sort -r)
+    backups_raw=$(catalog_query list --host "$EFFECTIVE_SOURCE_HOST" | awk '{print $1}' | sort -r) || \
+        backups_raw=$(aws s3 ls "s3://$EFFECTIVE_S3_BUCKET/$EFFECTIVE_SOURCE_HOST/" | grep ' PRE ' | awk '{print $2}' | sed 's|/||' | grep -E '^[0-9]{4}-[0-9]{2}-[0-9]{2}-[0-9]{2}-[0-9]{2}$' | sort -r)
     if [ -z "$backups_raw" ]; then
         log_error "No backups found for host '$EFFECTIVE_SOURCE_HOST'."
         exit 1
@@ -285,6 +288,13 @@ cleanup() {
     fi
 }
 
+# Queries the local backup catalog (cassandra_backup_catalog.py) instead of listing S3.
+# Exits 1 if nothing matches, and 2 if the catalog cannot be used, in which case the
+# caller lists S3 itself.
+catalog_query() {
+    /usr/local/bin/cassandra_backup_catalog.py "$@" --store "s3://$EFFECTIVE_S3_BUCKET" 2>>"$RESTORE_LOG_FILE"
+}
+
 find_backup_chain() {
     log_info "Searching for backup chain to restore to point-in-time: $TARGET_DATE"
     
@@ -296,6 +306,20 @@ find_backup_chain() {
         exit 1
     fi
 
+    local catalog_chain
+    local catalog_status=0
+    catalog_chain=$(catalog_query chain --host "$EFFECTIVE_SOURCE_HOST" --date "$TARGET_DATE") || catalog_status=$?
+    if [ "$catalog_status" -eq 0 ] && [ -n "$catalog_chain" ]; then
+        CHAIN_TO_RESTORE=($catalog_chain)
+        BASE_FULL_BACKUP="${CHAIN_TO_RESTORE[0]}"
+        log_info "Restore chain resolved from the local backup catalog."
+        return 0
+    elif [ "$catalog_status" -eq 1 ]; then
+        log_error "Point-in-time recovery failed. Could not find a valid 'full' backup in the history for the specified date."
+        exit 1
+    fi
+    log_warn "Backup catalog is not usable (see $RESTORE_LOG_FILE). Reading backup manifests from S3 instead."
+
     log_info "Listing available backups from s3://$EFFECTIVE_S3_BUCKET/$EFFECTIVE_SOURCE_HOST/..."
     local all_backups
     all_backups=$(aws s3 ls "s3://$EFFECTIVE_S3_BUCKET/$EFFECTIVE_SOURCE_HOST/" | awk '{print $2}' | sed 's/\///' || echo "")
@@ -362,6 +386,36 @@ find_backup_chain() {
     CHAIN_TO_RESTORE=($(printf "%s\n" "${CHAIN_TO_RESTORE[@]}" | sort))
 }
 
+# Downloads the SSTable components that a deduplicated table archive references
+# (listed in its backup_refs.json) instead of containing them.
+resolve_sstable_refs() {
+    local output_dir="$1"
+    local refs_file="$output_dir/backup_refs.json"
+
+    local THROTTLE_PREFIX=""
+    if [ -n "$THROTTLE_RATE" ]; then
+        THROTTLE_PREFIX="AWS_MAX_BANDWIDTH=$THROTTLE_RATE"
+    fi
+
+    log_info "Resolving $(jq '.objects | length' "$refs_file") deduplicated SSTable components into $output_dir"
+    while IFS=$'\t' read -r object_key relative_path; do
+        local target_file="$output_dir/$relative_path"
+        mkdir -p "$(dirname "$target_file")"
+        nice -n 19 ionice -c 3 env $THROTTLE_PREFIX aws s3 cp --quiet "s3://$EFFECTIVE_S3_BUCKET/$object_key" - | \
+            openssl enc -d -aes-256-cbc -salt -pbkdf2 -md sha256 -pass "file:$TMP_KEY_FILE" | \
+            gzip -dc > "$target_file"
+        local pipeline_status=("${PIPESTATUS[@]}")
+        if [ ${pipeline_status[0]} -ne 0 ] || [ ${pipeline_status[1]} -ne 0 ] || [ ${pipeline_status[2]} -ne 0 ]; then
+            log_error "Failed to restore $relative_path from $object_key. aws: ${pipeline_status[0]}, openssl: ${pipeline_status[1]}, gzip: ${pipeline_status[2]}"
+            rm -f "$target_file"
+            return 1
+        fi
+    done < <(jq -r '.objects[] | "\(.key)\t\(.file)"' "$refs_file")
+
+    rm -f "$refs_file"
+    return 0
+}
+
 download_and_extract_table() {
     local archive_key="$1"
     local output_dir="$2"
@@ -408,11 +462,68 @@ download_and_extract_table() {
         rm -f "$temp_enc_file" "$temp_tar_file"
         return 1
     fi
+
+    if [ -f "$output_dir/backup_refs.json" ] && ! resolve_sstable_refs "$output_dir"; then
+        log_error "Failed to download the deduplicated SSTables referenced by $archive_key."
+        rm -f "$temp_enc_file" "$temp_tar_file"
+        return 1
+    fi
     
     rm -f "$temp_enc_file" "$temp_tar_file"
     return 0
 }
 
+# Checks whether the streaming restore engine should and can be used on this host.
+restore_engine_usable() {
+    if [ "$BACKUP_ENGINE" != "python" ]; then
+        return 1
+    fi
+    if /usr/local/bin/cassandra_restore_engine.py check >> "$RESTORE_LOG_FILE" 2>&1; then
+        return 0
+    fi
+    log_warn "Restore engine is not usable on this host (see $RESTORE_LOG_FILE). Falling back to the shell restore pipeline."
+    return 1
+}
+
+# Restores the whole backup chain with the streaming restore engine. Archives are
+# streamed straight into the output directory without temporary files, tables are
+# restored concurrently and each table applies its archives in chain order.
+run_restore_engine() {
+    local output_dir="$1"
+    local check_path="$2"
+    local keyspace="${3:-}"
+    local table="${4:-}"
+
+    local chain_csv
+    chain_csv=$(IFS=,; echo "${CHAIN_TO_RESTORE[*]}")
+
+    local engine_cmd=(nice -n 19 ionice -c 3 /usr/local/bin/cassandra_restore_engine.py restore
+        --store "s3://$EFFECTIVE_S3_BUCKET"
+        --source-host "$EFFECTIVE_SOURCE_HOST"
+        --chain "$chain_csv"
+        --schema-map "$TMP_SCHEMA_MAP_FILE"
+        --output-dir "$output_dir"
+        --disk-path "$check_path"
+        --key-file "$TMP_KEY_FILE"
+        --parallelism "$PARALLELISM")
+    if [ -n "$keyspace" ]; then
+        engine_cmd+=(--keyspace "$keyspace")
+    fi
+    if [ -n "$table" ]; then
+        engine_cmd+=(--table "$table")
+    fi
+    if [ -n "$THROTTLE_RATE" ]; then
+        engine_cmd+=(--throttle "$THROTTLE_RATE")
+    fi
+
+    log_info "Streaming backup chain ${chain_csv} into $output_dir with the restore engine..."
+    if ! "${engine_cmd[@]}" 2>&1 | tee -a "$RESTORE_LOG_FILE"; then
+        log_error "Restore engine failed for one or more tables. See $RESTORE_LOG_FILE."
+        return 1
+    fi
+    return 0
+}
+
 do_full_restore() {
     log_info "--- Starting FULL DESTRUCTIVE Node Restore ---"
     log_warn "This will restore the node by wiping all data and replacing it directly from the backup files."
@@ -498,44 +609,51 @@ do_full_restore() {
     echo "$SCHEMA_MAP_JSON" > "$TMP_SCHEMA_MAP_FILE"
     log_info "Schema-to-directory mapping downloaded."
     
-    export -f download_and_extract_table log_message log_info log_success log_warn log_error
-    export RESTORE_LOG_FILE CONFIG_FILE S3_BUCKET_OVERRIDE TMP_KEY_FILE TEMP_RESTORE_DIR RESTORE_BASE_PATH TMP_SCHEMA_MAP_FILE THROTTLE_RATE
-    export RED GREEN YELLOW BLUE NC
+    if restore_engine_usable; then
+        if ! run_restore_engine "$TEMP_RESTORE_DIR" "$RESTORE_BASE_PATH"; then
+            log_error "Failed to download the backup chain. Aborting full restore."
+            exit 1
+        fi
+    else
+        export -f download_and_extract_table resolve_sstable_refs log_message log_info log_success log_warn log_error
+        export RESTORE_LOG_FILE CONFIG_FILE S3_BUCKET_OVERRIDE TMP_KEY_FILE TEMP_RESTORE_DIR RESTORE_BASE_PATH TMP_SCHEMA_MAP_FILE THROTTLE_RATE
+        export RED GREEN YELLOW BLUE NC
 
-    for backup_ts in "${CHAIN_TO_RESTORE[@]}"; do
-        log_info "Processing backup: $backup_ts"
-        local s3_path_prefix="$EFFECTIVE_SOURCE_HOST/$backup_ts/"
+        for backup_ts in "${CHAIN_TO_RESTORE[@]}"; do
+            log_info "Processing backup: $backup_ts"
+            local s3_path_prefix="$EFFECTIVE_SOURCE_HOST/$backup_ts/"
 
-        aws s3 ls --recursive "s3://$EFFECTIVE_S3_BUCKET/$s3_path_prefix" | grep '\.tar\.gz\.enc$' | awk '{print $4}' | \
-        xargs -I{} -P"$PARALLELISM" bash -c '
-            _main() {
-                local full_s3_key="$1"
+            aws s3 ls --recursive "s3://$EFFECTIVE_S3_BUCKET/$s3_path_prefix" | grep '\.tar\.gz\.enc$' | awk '{print $4}' | \
+            xargs -I{} -P"$PARALLELISM" bash -c '
+                _main() {
+                    local full_s3_key="$1"
                 
-                local path_part
-                path_part=${full_s3_key#*"'$backup_ts'"/}
-                local ks_name
-                ks_name=$(dirname "$path_part" | sed "s/^\///") # remove leading slash if present
-                local archive_filename
-                archive_filename=$(basename "$path_part")
-                local table_name
-                table_name=${archive_filename%%.tar.gz.enc}
-
-                local schema_map_json
-                schema_map_json=$(cat $TMP_SCHEMA_MAP_FILE)
-
-                local table_uuid_dir
-                table_uuid_dir=$(echo "$schema_map_json" | jq -r ".\"${ks_name}.${table_name}\"")
-                if [ -z "$table_uuid_dir" ] || [ "$table_uuid_dir" == "null" ]; then
-                    log_message "${YELLOW}WARNING: Full restore could not find mapping for ${ks_name}.${table_name}. Skipping archive $full_s3_key${NC}"
-                    exit 0
-                fi
-
-                local output_dir="$TEMP_RESTORE_DIR/$ks_name/$table_uuid_dir"
-                download_and_extract_table "$full_s3_key" "$output_dir" "$TEMP_RESTORE_DIR" "$RESTORE_BASE_PATH"
-            }
-            _main "$@"
-        ' _ {}
-    done
+                    local path_part
+                    path_part=${full_s3_key#*"'$backup_ts'"/}
+                    local ks_name
+                    ks_name=$(dirname "$path_part" | sed "s/^\///") # remove leading slash if present
+                    local archive_filename
+                    archive_filename=$(basename "$path_part")
+                    local table_name
+                    table_name=${archive_filename%%.tar.gz.enc}
+
+                    local schema_map_json
+                    schema_map_json=$(cat $TMP_SCHEMA_MAP_FILE)
+
+                    local table_uuid_dir
+                    table_uuid_dir=$(echo "$schema_map_json" | jq -r ".\"${ks_name}.${table_name}\"")
+                    if [ -z "$table_uuid_dir" ] || [ "$table_uuid_dir" == "null" ]; then
+                        log_message "${YELLOW}WARNING: Full restore could not find mapping for ${ks_name}.${table_name}. Skipping archive $full_s3_key${NC}"
+                        exit 0
+                    fi
+
+                    local output_dir="$TEMP_RESTORE_DIR/$ks_name/$table_uuid_dir"
+                    download_and_extract_table "$full_s3_key" "$output_dir" "$TEMP_RESTORE_DIR" "$RESTORE_BASE_PATH"
+                }
+                _main "$@"
+            ' _ {}
+        done
+    fi
     log_success "All data from backup chain downloaded and extracted to temporary directory."
 
     # === PHASE 3: DATA PLACEMENT AND STARTUP ===
@@ -613,53 +731,60 @@ do_granular_restore() {
     echo "$SCHEMA_MAP_JSON" > "$TMP_SCHEMA_MAP_FILE"
     log_info "Schema-to-directory mapping downloaded."
 
-    export -f download_and_extract_table log_message log_info log_success log_warn log_error
-    export RESTORE_LOG_FILE CONFIG_FILE S3_BUCKET_OVERRIDE TMP_KEY_FILE base_output_dir temp_download_dir check_path TMP_SCHEMA_MAP_FILE THROTTLE_RATE
-    export RED GREEN YELLOW BLUE NC
+    if restore_engine_usable; then
+        if ! run_restore_engine "$base_output_dir" "$check_path" "$KEYSPACE_NAME" "$TABLE_NAME"; then
+            log_error "Failed to download the backup chain for $KEYSPACE_NAME${TABLE_NAME:+.${TABLE_NAME}}. Aborting granular restore."
+            exit 1
+        fi
+    else
+        export -f download_and_extract_table resolve_sstable_refs log_message log_info log_success log_warn log_error
+        export RESTORE_LOG_FILE CONFIG_FILE S3_BUCKET_OVERRIDE TMP_KEY_FILE base_output_dir temp_download_dir check_path TMP_SCHEMA_MAP_FILE THROTTLE_RATE
+        export RED GREEN YELLOW BLUE NC
 
-    for backup_ts in "${CHAIN_TO_RESTORE[@]}"; do
-        log_info "Processing backup: $backup_ts"
-        local s3_path_prefix="$EFFECTIVE_SOURCE_HOST/$backup_ts/"
+        for backup_ts in "${CHAIN_TO_RESTORE[@]}"; do
+            log_info "Processing backup: $backup_ts"
+            local s3_path_prefix="$EFFECTIVE_SOURCE_HOST/$backup_ts/"
         
-        # Build a grep pattern for the filename
-        local filename_pattern_to_grep
-        if [ -n "$TABLE_NAME" ]; then
-            filename_pattern_to_grep="/${KEYSPACE_NAME}/${TABLE_NAME}\.tar\.gz\.enc$"
-        else
-            # Match any table in the keyspace
-            filename_pattern_to_grep="/${KEYSPACE_NAME}/.*\.tar\.gz\.enc$"
-        fi
+            # Build a grep pattern for the filename
+            local filename_pattern_to_grep
+            if [ -n "$TABLE_NAME" ]; then
+                filename_pattern_to_grep="/${KEYSPACE_NAME}/${TABLE_NAME}\.tar\.gz\.enc$"
+            else
+                # Match any table in the keyspace
+                filename_pattern_to_grep="/${KEYSPACE_NAME}/.*\.tar\.gz\.enc$"
+            fi
 
-        aws s3 ls --recursive "s3://$EFFECTIVE_S3_BUCKET/$s3_path_prefix" | grep -E "$filename_pattern_to_grep" | awk '{print $4}' | \
-        xargs -I{} -P"$PARALLELISM" bash -c '
-            _main() {
-                local full_s3_key="$1"
+            aws s3 ls --recursive "s3://$EFFECTIVE_S3_BUCKET/$s3_path_prefix" | grep -E "$filename_pattern_to_grep" | awk '{print $4}' | \
+            xargs -I{} -P"$PARALLELISM" bash -c '
+                _main() {
+                    local full_s3_key="$1"
                 
-                local path_part
-                path_part=${full_s3_key#*"'$backup_ts'"/}
-                local ks_name
-                ks_name=$(dirname "$path_part" | sed "s/^\///")
-                local archive_filename
-                archive_filename=$(basename "$path_part")
-                local table_name
-                table_name=${archive_filename%%.tar.gz.enc}
-
-                local schema_map_json
-                schema_map_json=$(cat $TMP_SCHEMA_MAP_FILE)
-
-                local table_uuid_dir
-                table_uuid_dir=$(echo "$schema_map_json" | jq -r ".\"${ks_name}.${table_name}\"")
-                if [ -z "$table_uuid_dir" ] || [ "$table_uuid_dir" == "null" ]; then
-                    log_message "${YELLOW}WARNING: Granular restore could not find mapping for ${ks_name}.${table_name}. Skipping archive $full_s3_key${NC}"
-                    exit 0
-                fi
-
-                local output_dir="$base_output_dir/$ks_name/$table_uuid_dir"
-                download_and_extract_table "$full_s3_key" "$output_dir" "$temp_download_dir" "$check_path"
-            }
-            _main "$@"
-        ' _ {}
-    done
+                    local path_part
+                    path_part=${full_s3_key#*"'$backup_ts'"/}
+                    local ks_name
+                    ks_name=$(dirname "$path_part" | sed "s/^\///")
+                    local archive_filename
+                    archive_filename=$(basename "$path_part")
+                    local table_name
+                    table_name=${archive_filename%%.tar.gz.enc}
+
+                    local schema_map_json
+                    schema_map_json=$(cat $TMP_SCHEMA_MAP_FILE)
+
+                    local table_uuid_dir
+                    table_uuid_dir=$(echo "$schema_map_json" | jq -r ".\"${ks_name}.${table_name}\"")
+                    if [ -z "$table_uuid_dir" ] || [ "$table_uuid_dir" == "null" ]; then
+                        log_message "${YELLOW}WARNING: Granular restore could not find mapping for ${ks_name}.${table_name}. Skipping archive $full_s3_key${NC}"
+                        exit 0
+                    fi
+
+                    local output_dir="$base_output_dir/$ks_name/$table_uuid_dir"
+                    download_and_extract_table "$full_s3_key" "$output_dir" "$temp_download_dir" "$check_path"
+                }
+                _main "$@"
+            ' _ {}
+        done
+    fi
     
     if [ "$MODE" == "download_only" ]; then
         log_success "--- Granular Restore (Download Only) Finished Successfully ---"
@@ -766,6 +891,30 @@ do_schema_only_restore() {
 
 do_list_backups() {
     log_info "--- Listing Available Backups for Host: $EFFECTIVE_SOURCE_HOST ---"
+
+    local catalog_backups
+    local catalog_status=0
+    catalog_backups=$(catalog_query list --host "$EFFECTIVE_SOURCE_HOST") || catalog_status=$?
+    if [ "$catalog_status" -eq 1 ]; then
+        log_warn "No backups found for host '$EFFECTIVE_SOURCE_HOST' in bucket '$EFFECTIVE_S3_BUCKET'."
+        return 0
+    elif [ "$catalog_status" -eq 0 ]; then
+        printf "\n"
+        printf "%b\n" "${BOLD}${GREEN}Host: ${EFFECTIVE_SOURCE_HOST}${NC}"
+        printf "%b\n" "${YELLOW}----------------------------${NC}"
+        while read -r backup_ts backup_type tables_count total_bytes; do
+            type_color=$NC
+            if [ "$backup_type" == "full" ]; then
+                type_color=${CYAN}
+            elif [ "$backup_type" == "incremental" ]; then
+                type_color=${BLUE}
+            fi
+            printf "%b\n" "  - ${BOLD}${backup_ts}${NC} (type: ${type_color}${backup_type}${NC}, tables: ${tables_count}, size: $(numfmt --to=iec-i --suffix=B "$total_bytes"))"
+        done <<< "$catalog_backups"
+        printf "\n"
+        return 0
+    fi
+    log_warn "Backup catalog is not usable (see $RESTORE_LOG_FILE). Reading backup manifests from S3 instead."
     
     local all_backups
     all_backups=$(aws s3 ls "s3://$EFFECTIVE_S3_BUCKET/$EFFECTIVE_SOURCE_HOST/" | awk '{print $2}' | sed 's/\///' || echo "")
@@ -872,6 +1021,7 @@ SSL_ENABLED=$(jq -r '.ssl_enabled // "false"' "$CONFIG_FILE")
 SSL_TRUSTSTORE_PATH=$(jq -r '.ssl_truststore_path // "null"' "$CONFIG_FILE")
 SSL_TRUSTSTORE_PASSWORD=$(jq -r '.ssl_truststore_password // "null"' "$CONFIG_FILE")
 BACKUP_BACKEND=$(jq -r '.backup_backend // "s3"' "$CONFIG_FILE")
+BACKUP_ENGINE=$(jq -r '.backup_engine // "shell"' "$CONFIG_FILE")
 PARALLELISM=$(jq -r '.parallelism // 4' "$CONFIG_FILE")
 THROTTLE_RATE_FROM_CONFIG=$(jq -r '.throttle_rate // "50M/s"' "$CONFIG_FILE")
 
@@ -0,0 +1,55 @@
+# Tests for the Python helpers in files/. They run offline against
+# FakeClusterClient; nothing here is deployed by Puppet.
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cassandra_range_repair as repair
+from cassandra_client import FakeClusterClient
+from cassandra_range_repair import RangeWork, range_span, uncovered_offsets
+
+# Three nodes with two tokens each; 10.0.0.1 is the local node.
+RING = [
+    ('10.0.0.1', -6000), ('10.0.0.2', -4000), ('10.0.0.3', -2000),
+    ('10.0.0.1', 0), ('10.0.0.2', 2000), ('10.0.0.3', 4000),
+]
+LOCAL_ADDRESS = '10.0.0.1'
+
+
+@pytest.fixture
+def repair_env(tmp_path, monkeypatch):
+    """Points the repair script's state files at tmp_path and installs a FakeClusterClient."""
+    monkeypatch.setattr(repair, 'STATUS_DIR', str(tmp_path))
+    monkeypatch.setattr(repair, 'STATUS_FILE', str(tmp_path / 'status.txt'))
+    monkeypatch.setattr(repair, 'JOURNAL_FILE', str(tmp_path / 'checkpoints.jsonl'))
+    monkeypatch.setattr(repair, 'PAUSE_FILE', str(tmp_path / 'repair-disabled'))
+    monkeypatch.delenv('CASS_OPS_EVENTS', raising=False)
+
+    def install(**kwargs):
+        client = FakeClusterClient(RING, LOCAL_ADDRESS, **kwargs)
+        monkeypatch.setattr(repair, 'cluster_client', client)
+        return client
+
+    return install
+
+
+def primary_work(client, keyspace, journal=None, units=None):
+    """Builds the RangeWork of the local node's primary ranges the way main() does."""
+    endpoints = client.describe_ring(keyspace)
+    ranges = []
+    ring = client.ring()
+    for i, entry in enumerate(ring):
+        if entry.address == LOCAL_ADDRESS:
+            ranges.append((ring[i - 1].token, entry.token))
+    repaired = journal.repaired_ranges(keyspace, 3600) if journal else []
+    work = []
+    for i, (start, end) in enumerate(ranges):
+        gaps = uncovered_offsets(start, end, repaired)
+        if gaps:
+            work.append(RangeWork(keyspace, start, end, endpoints[(str(start), str(end))], i, len(ranges),
+                                  1.0, units or range_span(start, end), gaps))
+    return work
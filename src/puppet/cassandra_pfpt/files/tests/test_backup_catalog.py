@@ -0,0 +1,96 @@
+import json
+import shutil
+
+import pytest
+
+from cassandra_backup_catalog import BackupCatalog, CatalogError, MANIFEST_FILE
+from cassandra_object_store import LocalObjectStore
+
+
+class CountingStore(LocalObjectStore):
+    """A local store that counts manifest reads."""
+
+    def __init__(self, root):
+        super().__init__(root)
+        self.gets = []
+
+    def get(self, key, start=None, end=None):
+        self.gets.append(key)
+        return super().get(key, start, end)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CountingStore(str(tmp_path / 'store'))
+
+
+@pytest.fixture
+def catalog(tmp_path, store):
+    return BackupCatalog(str(tmp_path / 'catalog.db'), store, 'file:///store')
+
+
+def add_backup(store, backup_id, backup_type, host='host', tables=('t',)):
+    for table in tables:
+        store.put(f"{host}/{backup_id}/ks/{table}.tar.gz.enc", b'x' * 10)
+    if backup_type:
+        manifest = {'backup_type': backup_type, 'tables_backed_up': [f"ks.{t}" for t in tables]}
+        store.put(f"{host}/{backup_id}/{MANIFEST_FILE}", json.dumps(manifest).encode())
+
+
+def test_chain_walks_back_to_the_last_full_backup(store, catalog):
+    add_backup(store, '2024-01-01-00-00', 'full')
+    add_backup(store, '2024-01-01-06-00', 'incremental')
+    add_backup(store, '2024-01-01-12-00', None)
+    add_backup(store, '2024-01-01-18-00', 'incremental')
+    add_backup(store, '2024-01-02-00-00', 'full')
+    catalog.sync_host('host')
+
+    assert catalog.chain('host', '2024-01-01-20-00') == ['2024-01-01-00-00', '2024-01-01-06-00', '2024-01-01-18-00']
+    assert catalog.chain('host', '2024-01-02-00-00') == ['2024-01-02-00-00']
+    with pytest.raises(CatalogError):
+        catalog.chain('host', '2023-12-31-00-00')
+
+
+def test_sync_host_reads_each_manifest_once_and_drops_expired_sets(tmp_path, store, catalog):
+    add_backup(store, '2024-01-01-00-00', 'full', tables=('a', 'b'))
+    add_backup(store, '2024-01-01-06-00', None)
+    catalog.sync_host('host')
+    assert [row[:3] for row in catalog.backups('host')] == [('2024-01-01-00-00', 'full', 2),
+                                                              ('2024-01-01-06-00', None, None)]
+
+    # The incomplete set gets its manifest; the full set has been read already.
+    add_backup(store, '2024-01-01-06-00', 'incremental')
+    store.gets.clear()
+    catalog.sync_host('host')
+    assert store.gets == [f"host/2024-01-01-06-00/{MANIFEST_FILE}"]
+    assert catalog.backups('host')[1][:2] == ('2024-01-01-06-00', 'incremental')
+
+    shutil.rmtree(tmp_path / 'store' / 'host' / '2024-01-01-00-00')
+    catalog.sync_host('host')
+    assert [row[0] for row in catalog.backups('host')] == ['2024-01-01-06-00']
+
+
+def test_latest_and_hosts(store, catalog):
+    add_backup(store, '2024-01-01-00-00', 'full', host='host1')
+    add_backup(store, '2024-01-02-00-00', 'full', host='host1', tables=('t', 'u'))
+    add_backup(store, '2024-01-01-00-00', 'full', host='host2')
+    store.put('_sstables/host1/ks/t/nb-1-big-Data.db.1.1.gz.enc', b'x')
+    catalog.rebuild()
+
+    assert catalog.hosts() == ['host1', 'host2']
+    latest = catalog.latest('host1')
+    assert latest['backup_id'] == '2024-01-02-00-00'
+    assert latest['manifest']['backup_type'] == 'full'
+    assert [t['table'] for t in latest['tables']] == ['t', 'u']
+    assert catalog.latest('host3') is None
+
+
+def test_refresh_only_syncs_stale_hosts(store, catalog):
+    add_backup(store, '2024-01-01-00-00', 'full')
+    catalog.refresh('host', max_age=300)
+    add_backup(store, '2024-01-02-00-00', 'full')
+
+    catalog.refresh('host', max_age=300)
+    assert len(catalog.backups('host')) == 1
+    catalog.refresh('host', max_age=0)
+    assert len(catalog.backups('host')) == 2
@@ -0,0 +1,79 @@
+import json
+import os
+import shutil
+
+from cassandra_backup_engine import (DEDUP_INDEX_FILE, MANIFEST_FILE, REFS_FILE, BackupEngine, TableBackup,
+                                     prune_dedup_objects, write_dedup_index)
+from cassandra_object_store import LocalObjectStore
+
+from test_backup_engine import PASSPHRASE, read_archive
+
+DEDUP_PREFIX = '_sstables/host'
+
+
+def backup(store, snapshot_dir, backup_id):
+    engine = BackupEngine(store, PASSPHRASE, dedup_prefix=DEDUP_PREFIX, dedup_min_size=1024)
+    table = TableBackup('ks', 't', 't-1234', str(snapshot_dir), f"host/{backup_id}/ks/t.tar.gz.enc")
+    [result] = engine.run([table])
+    assert result.error is None
+    write_dedup_index(store, f"host/{backup_id}", engine.referenced)
+    store.put(f"host/{backup_id}/{MANIFEST_FILE}", json.dumps({'sstable_dedup': True}).encode())
+    return result, engine.referenced
+
+
+def make_snapshot(path, sstables):
+    path.mkdir(parents=True, exist_ok=True)
+    for name in sstables:
+        (path / f"{name}-big-Data.db").write_bytes(name.encode() * 1000)
+    (path / 'schema.cql').write_text('CREATE TABLE ks.t (id int PRIMARY KEY);')
+    return path
+
+
+def test_unchanged_sstables_are_referenced_instead_of_uploaded(tmp_path):
+    store = LocalObjectStore(str(tmp_path / 'store'))
+    snapshot = make_snapshot(tmp_path / 'snap1', ['nb-1'])
+    first, first_refs = backup(store, snapshot, '2024-01-01-00-00')
+
+    make_snapshot(snapshot, ['nb-2'])
+    second, second_refs = backup(store, snapshot, '2024-01-02-00-00')
+
+    assert (first.reused_files, second.reused_files) == (0, 1)
+    assert first_refs < second_refs and len(second_refs) == 2
+    assert all(key.startswith(f"{DEDUP_PREFIX}/ks/t-1234/") for key in second_refs)
+
+    members = read_archive(store, 'host/2024-01-02-00-00/ks/t.tar.gz.enc')
+    assert sorted(members) == [f"./{REFS_FILE}", './schema.cql']
+    refs = json.loads(members[f"./{REFS_FILE}"])['objects']
+    assert sorted(ref['file'] for ref in refs) == ['nb-1-big-Data.db', 'nb-2-big-Data.db']
+    assert {ref['key'] for ref in refs} == second_refs
+
+
+def test_prune_deletes_only_unreferenced_objects(tmp_path):
+    store = LocalObjectStore(str(tmp_path / 'store'))
+    snapshot = make_snapshot(tmp_path / 'snap', ['nb-1', 'nb-2'])
+    _, first_refs = backup(store, snapshot, '2024-01-01-00-00')
+    os.remove(snapshot / 'nb-1-big-Data.db')
+    _, second_refs = backup(store, snapshot, '2024-01-02-00-00')
+
+    assert prune_dedup_objects(store, 'host', DEDUP_PREFIX) == (0, 0)
+
+    # The first set expires: only the object it alone referenced goes.
+    [orphan] = first_refs - second_refs
+    orphan_size = store.size(orphan)
+    shutil.rmtree(tmp_path / 'store' / 'host' / '2024-01-01-00-00')
+    assert prune_dedup_objects(store, 'host', DEDUP_PREFIX) == (1, orphan_size)
+    assert {key for key, _, _ in store.list(f"{DEDUP_PREFIX}/")} == second_refs
+
+
+def test_prune_waits_for_sets_that_may_reference_objects(tmp_path):
+    store = LocalObjectStore(str(tmp_path / 'store'))
+    _, refs = backup(store, make_snapshot(tmp_path / 'snap', ['nb-1']), '2024-01-01-00-00')
+    store.delete(f"host/2024-01-01-00-00/{DEDUP_INDEX_FILE}")
+
+    # A dedup set without an index, e.g. written before indexes existed.
+    assert prune_dedup_objects(store, 'host', DEDUP_PREFIX) is None
+
+    # A set with neither index nor manifest is a backup still in progress.
+    store.delete(f"host/2024-01-01-00-00/{MANIFEST_FILE}")
+    assert prune_dedup_objects(store, 'host', DEDUP_PREFIX) is None
+    assert {key for key, _, _ in store.list(f"{DEDUP_PREFIX}/")} == refs
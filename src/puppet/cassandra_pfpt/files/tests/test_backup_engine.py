@@ -0,0 +1,126 @@
+import io
+import os
+import shutil
+import subprocess
+import tarfile
+import zlib
+
+import pytest
+
+from cassandra_backup_crypto import StreamDecryptor, StreamEncryptor
+from cassandra_backup_engine import BackupEngine, TableBackup
+from cassandra_object_store import LocalObjectStore, ObjectStoreError, open_store, parse_rate
+
+PASSPHRASE = 'correct horse battery staple'
+
+
+def encrypt(data, chunk_size=4096):
+    encryptor = StreamEncryptor(PASSPHRASE)
+    out = [encryptor.update(data[i:i + chunk_size]) for i in range(0, len(data), chunk_size)]
+    return b''.join(out) + encryptor.finalize()
+
+
+def decrypt(data, chunk_size=4096):
+    decryptor = StreamDecryptor(PASSPHRASE)
+    out = [decryptor.update(data[i:i + chunk_size]) for i in range(0, len(data), chunk_size)]
+    return b''.join(out) + decryptor.finalize()
+
+
+def read_archive(store, key):
+    """Decrypts, gunzips and untars a stored archive into a dict of name -> bytes."""
+    tar_data = zlib.decompress(decrypt(store.get(key)), 31)
+    with tarfile.open(fileobj=io.BytesIO(tar_data)) as tar:
+        return {m.name: tar.extractfile(m).read() for m in tar.getmembers() if m.isfile()}
+
+
+def test_parse_rate():
+    assert parse_rate(None) == 0
+    assert parse_rate('50M/s') == 50 * 1024 ** 2
+    assert parse_rate('1.5KiB') == 1536
+    with pytest.raises(ValueError):
+        parse_rate('fast')
+
+
+def test_local_store_put_get_list_and_delete(tmp_path):
+    store = open_store(f"file://{tmp_path}")
+    store.put('host/2024-01-01-00-00/ks/t.tar.gz.enc', b'0123456789')
+    store.put('host/2024-01-02-00-00/ks/t.tar.gz.enc', b'abc')
+
+    assert store.get('host/2024-01-01-00-00/ks/t.tar.gz.enc', 2, 4) == b'234'
+    assert store.size('host/missing') is None
+    assert list(store.list_prefixes('host/')) == ['2024-01-01-00-00', '2024-01-02-00-00']
+    assert sorted((key, size) for key, size, _ in store.list('host/2024-01-02')) == \
+        [('host/2024-01-02-00-00/ks/t.tar.gz.enc', 3)]
+
+    store.delete('host/2024-01-02-00-00/ks/t.tar.gz.enc')
+    store.delete('host/2024-01-02-00-00/ks/t.tar.gz.enc')
+    assert store.size('host/2024-01-02-00-00/ks/t.tar.gz.enc') is None
+    with pytest.raises(ObjectStoreError):
+        store.get('../outside')
+
+
+def test_local_store_multipart_is_invisible_until_complete(tmp_path):
+    store = LocalObjectStore(str(tmp_path))
+    upload = store.create_multipart('obj')
+    parts = [(2, store.upload_part(upload, 2, b'world')), (1, store.upload_part(upload, 1, b'hello '))]
+    assert store.size('obj') is None
+
+    store.complete_multipart(upload, parts)
+    assert store.get('obj') == b'hello world'
+    assert os.listdir(tmp_path / LocalObjectStore.STAGING_DIR) == []
+
+
+def test_crypto_round_trip_across_chunk_boundaries():
+    data = os.urandom(100000)
+    encrypted = encrypt(data, chunk_size=1000)
+
+    assert encrypted.startswith(b'Salted__')
+    assert decrypt(encrypted, chunk_size=7) == data
+
+
+@pytest.mark.skipif(shutil.which('openssl') is None, reason='openssl is not installed')
+def test_crypto_matches_openssl_enc(tmp_path):
+    key_file = tmp_path / 'key'
+    key_file.write_text(PASSPHRASE)
+    data = b'archive contents' * 1000
+    openssl = ['openssl', 'enc', '-aes-256-cbc', '-pbkdf2', '-md', 'sha256', '-pass', f"file:{key_file}"]
+
+    assert subprocess.run(openssl + ['-d'], input=encrypt(data), capture_output=True, check=True).stdout == data
+    encrypted = subprocess.run(openssl + ['-salt'], input=data, capture_output=True, check=True).stdout
+    assert decrypt(encrypted) == data
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    """A table snapshot directory with a few SSTable components."""
+    snapshot_dir = tmp_path / 'data' / 'ks' / 't-1234' / 'snapshots' / 'tag'
+    snapshot_dir.mkdir(parents=True)
+    (snapshot_dir / 'nb-1-big-Data.db').write_bytes(os.urandom(300000))
+    (snapshot_dir / 'nb-1-big-Index.db').write_bytes(b'index' * 100)
+    (snapshot_dir / 'schema.cql').write_text('CREATE TABLE ks.t (id int PRIMARY KEY);')
+    return snapshot_dir
+
+
+def test_engine_streams_a_table_into_an_openssl_compatible_archive(tmp_path, snapshot):
+    store = LocalObjectStore(str(tmp_path / 'store'))
+    table = TableBackup('ks', 't', 't-1234', str(snapshot), 'host/2024-01-01-00-00/ks/t.tar.gz.enc')
+    results = BackupEngine(store, PASSPHRASE, parallelism=2, upload_threads=2).run([table])
+
+    assert [r.error for r in results] == [None]
+    assert results[0].files == 3
+    assert results[0].stored_bytes == store.size(table.key)
+    members = read_archive(store, table.key)
+    assert sorted(members) == ['./nb-1-big-Data.db', './nb-1-big-Index.db', './schema.cql']
+    assert members['./nb-1-big-Data.db'] == (snapshot / 'nb-1-big-Data.db').read_bytes()
+
+
+def test_engine_reports_failed_tables_and_marks_them(tmp_path, snapshot):
+    store = LocalObjectStore(str(tmp_path / 'store'))
+    error_dir = tmp_path / 'errors'
+    error_dir.mkdir()
+    missing = TableBackup('ks', 'gone', 'gone-1', str(tmp_path / 'missing'), 'host/set/ks/gone.tar.gz.enc')
+    results = BackupEngine(store, PASSPHRASE).run([missing], error_dir=str(error_dir))
+
+    assert results[0].error
+    assert os.listdir(error_dir) == ['ks.gone']
+    assert store.size(missing.key) is None
@@ -0,0 +1,50 @@
+from cassandra_backup_verify import DAY, VerifyObject, coverage, list_chain_objects, select_sample
+from cassandra_object_store import LocalObjectStore
+
+NOW = 100 * DAY
+
+
+def archive(table, written=NOW - DAY, size=10):
+    return VerifyObject(f"host/set/ks/{table}.tar.gz.enc", size, written, ('ks', table))
+
+
+def test_select_sample_takes_the_least_recently_verified_tables_first():
+    manifest = VerifyObject('host/set/backup_manifest.json', 1, NOW - DAY, None)
+    objects = [manifest] + [archive(t) for t in 'abcd']
+    history = {
+        archive('a').key: (10, NOW - 3 * DAY, True),
+        archive('b').key: (10, NOW - 2 * DAY, True),
+        # A failed verification, or one of an object since rewritten, does not count.
+        archive('c').key: (10, NOW - 1, False),
+        archive('d').key: (99, NOW - 1, True),
+    }
+    selected = select_sample(objects, history, 50, cycle_days=30, now=NOW)
+
+    assert selected == [manifest, archive('a'), archive('b')]
+    assert [obj.table[1] for obj in select_sample(objects, history, 1, 30, now=NOW) if obj.table] == ['a']
+
+
+def test_select_sample_always_includes_tables_overdue_for_the_cycle():
+    objects = [archive('a', written=NOW - 10 * DAY), archive('b', written=NOW - 9 * DAY), archive('c')]
+    selected = select_sample(objects, {}, 1, cycle_days=7, now=NOW)
+
+    assert [obj.table[1] for obj in selected] == ['a', 'b']
+
+
+def test_coverage_counts_objects_verified_within_the_cycle():
+    objects = [archive('a'), archive('b', size=20), archive('c')]
+    history = {archive('a').key: (10, NOW - DAY, True), archive('b').key: (20, NOW - 8 * DAY, True)}
+
+    assert coverage(objects, history, 7, now=NOW) == (1, 10)
+    assert coverage(objects, history, 10, now=NOW) == (2, 30)
+
+
+def test_list_chain_objects_keeps_manifests_and_table_archives(tmp_path):
+    store = LocalObjectStore(str(tmp_path))
+    for key in ('host/s1/backup_manifest.json', 'host/s1/ks/t.tar.gz.enc', 'host/s1/ks/t/extra.tar.gz.enc',
+                'host/s1/schema.cql', 'host/s2/ks/u.tar.gz.enc', 'host/s3/ks/v.tar.gz.enc'):
+        store.put(key, b'x')
+
+    assert [(o.key, o.table) for o in list_chain_objects(store, 'host', ['s1', 's2'])] == [
+        ('host/s1/backup_manifest.json', None), ('host/s1/ks/t.tar.gz.enc', ('ks', 't')),
+        ('host/s2/ks/u.tar.gz.enc', ('ks', 'u'))]
@@ -0,0 +1,195 @@
+import json
+import socket
+import subprocess
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import cassandra_client
+from cassandra_client import ClusterClientError, JolokiaClient, NodetoolClient, create_client
+from cassandra_ring import RingEntry
+
+NODETOOL_OUTPUT = {
+    'status': """Datacenter: dc1
+===============
+Status=Up/Down
+|/ State=Normal/Leaving/Joining/Moving
+--  Address   Load       Tokens  Owns   Host ID                               Rack
+UN  10.0.0.1  1.2 GiB    2       ?      11111111-1111-1111-1111-111111111111  rack1
+UN  10.0.0.2  1.1 GiB    2       ?      22222222-2222-2222-2222-222222222222  rack2
+""",
+    'ring': """
+Datacenter: dc1
+==========
+Address    Rack   Status State   Load     Owns   Token
+                                                 2000
+10.0.0.1   rack1  Up     Normal  1.2 GiB  ?      -2000
+10.0.0.2   rack2  Up     Normal  1.1 GiB  ?      0
+10.0.0.1   rack1  Up     Normal  1.2 GiB  ?      2000
+""",
+    'describering': """Schema Version:1c3a4f0e-0000-0000-0000-000000000000
+TokenRange:
+\tTokenRange(start_token:-2000, end_token:0, endpoints:[10.0.0.2, 10.0.0.1], rpc_endpoints:[10.0.0.2, 10.0.0.1], endpoint_details:[])
+\tTokenRange(start_token:0, end_token:2000, endpoints:[10.0.0.1, 10.0.0.2], rpc_endpoints:[10.0.0.1, 10.0.0.2], endpoint_details:[])
+""",
+}
+
+
+@pytest.fixture
+def nodetool(monkeypatch):
+    """Serves canned nodetool output and records every command line."""
+    calls = []
+
+    def check_output(command, text=True):
+        calls.append(command)
+        subcommand = next(arg for arg in command[1:] if arg in NODETOOL_OUTPUT or arg == 'fail')
+        if subcommand == 'fail':
+            raise subprocess.CalledProcessError(2, command)
+        return NODETOOL_OUTPUT[subcommand]
+
+    monkeypatch.setattr(cassandra_client.subprocess, 'check_output', check_output)
+    return calls
+
+
+def test_nodetool_client_parses_status_ring_and_describering(nodetool):
+    client = NodetoolClient('jmx', 'secret')
+
+    assert client.local_address() == '10.0.0.1'
+    assert client.ring() == [RingEntry('10.0.0.1', -2000, 'dc1', 'rack1'), RingEntry('10.0.0.2', 0, 'dc1', 'rack2'),
+                             RingEntry('10.0.0.1', 2000, 'dc1', 'rack1')]
+    assert client.describe_ring('ks1') == {('-2000', '0'): frozenset({'10.0.0.1', '10.0.0.2'}),
+                                           ('0', '2000'): frozenset({'10.0.0.1', '10.0.0.2'})}
+    assert nodetool[-1] == ['nodetool', '-u', 'jmx', '-pw', 'secret', 'describering', 'ks1']
+
+
+def test_nodetool_client_raises_on_command_failure(nodetool):
+    with pytest.raises(ClusterClientError):
+        NodetoolClient()._run(['fail'])
+
+
+class JolokiaStub:
+    """A minimal Jolokia agent answering the StorageService calls JolokiaClient makes."""
+
+    def __init__(self):
+        self.requests = []
+        self.repair_status = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                stub.requests.append(payload)
+                body = json.dumps(stub.answer(payload)).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/jolokia"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def answer(self, payload):
+        name = payload.get('attribute') or payload.get('operation')
+        if name == 'LocalHostId':
+            return {'status': 200, 'value': 'host-1'}
+        if name == 'HostIdToEndpoint':
+            return {'status': 404, 'error': 'javax.management.AttributeNotFoundException'}
+        if name == 'HostIdMap':
+            return {'status': 200, 'value': {'/10.0.0.1': 'host-1', '/10.0.0.2': 'host-2'}}
+        if name.startswith('repairAsync'):
+            return {'status': 200, 'value': 7}
+        if name.startswith('getParentRepairStatus'):
+            return {'status': 200, 'value': self.repair_status.pop(0) if self.repair_status else None}
+        return {'status': 400, 'error': f'unexpected request {name}'}
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def jolokia(monkeypatch):
+    monkeypatch.setattr(cassandra_client, 'REPAIR_POLL_INTERVAL', 0)
+    stub = JolokiaStub()
+    yield stub
+    stub.close()
+
+
+def test_jolokia_local_address_falls_back_to_the_host_id_map(jolokia):
+    client = JolokiaClient(jolokia.url)
+    try:
+        assert client.local_address() == '10.0.0.1'
+    finally:
+        client.close()
+
+
+def test_jolokia_repair_polls_until_completed(jolokia):
+    jolokia.repair_status = [None, ['RUNNING', 'Starting repair'], ['COMPLETED', 'Starting repair', 'Repair finished']]
+    client = JolokiaClient(jolokia.url)
+    try:
+        assert client.repair_range('ks1', -2000, 0) == 0
+    finally:
+        client.close()
+
+    repair_request = jolokia.requests[0]
+    assert repair_request['arguments'] == ['ks1', {'primaryRange': 'true', 'incremental': 'true', 'ranges': '-2000:0'}]
+    assert [r['arguments'] for r in jolokia.requests[1:]] == [[7], [7], [7]]
+
+
+def test_jolokia_repair_fails_on_failed_status(jolokia):
+    jolokia.repair_status = [['FAILED', 'Repair session failed']]
+    client = JolokiaClient(jolokia.url)
+    try:
+        assert client.repair_range('ks1', -2000, 0) == 1
+    finally:
+        client.close()
+
+
+def test_jolokia_repair_gives_up_on_a_forgotten_command(jolokia, monkeypatch):
+    monkeypatch.setattr(cassandra_client, 'REPAIR_MAX_UNKNOWN_POLLS', 3)
+    client = JolokiaClient(jolokia.url)
+    try:
+        assert client.repair_range('ks1', -2000, 0) == 1
+    finally:
+        client.close()
+    assert len(jolokia.requests) == 4
+
+
+def test_jolokia_repair_gives_up_after_the_timeout(jolokia):
+    jolokia.repair_status = [['RUNNING']] * 10
+    client = JolokiaClient(jolokia.url, repair_timeout=0)
+    try:
+        assert client.repair_range('ks1', -2000, 0) == 1
+    finally:
+        client.close()
+    assert len(jolokia.requests) == 2
+
+
+def unused_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def test_create_client_uses_jolokia_when_reachable(jolokia):
+    client = create_client('jolokia', jolokia_url=jolokia.url)
+    try:
+        assert isinstance(client, JolokiaClient)
+    finally:
+        client.close()
+
+
+def test_create_client_falls_back_to_nodetool():
+    client = create_client('jolokia', 'jmx', 'secret', jolokia_url=f"http://127.0.0.1:{unused_port()}/jolokia")
+
+    assert isinstance(client, NodetoolClient)
+    assert client.base_command == ['nodetool', '-u', 'jmx', '-pw', 'secret']
+    assert isinstance(create_client('nodetool'), NodetoolClient)
@@ -0,0 +1,91 @@
+import pytest
+
+from cassandra_client import ClusterClientError
+from cassandra_ring import RingEntry, TokenRing, get_ring, parse_replication
+
+# Two datacenters, three racks in dc1 and one in dc2.
+ENTRIES = [
+    RingEntry('10.0.0.1', -6000, 'dc1', 'r1'),
+    RingEntry('10.0.1.1', -5000, 'dc2', 'r1'),
+    RingEntry('10.0.0.2', -4000, 'dc1', 'r1'),
+    RingEntry('10.0.0.3', -2000, 'dc1', 'r2'),
+    RingEntry('10.0.1.2', 0, 'dc2', 'r1'),
+    RingEntry('10.0.0.4', 2000, 'dc1', 'r3'),
+]
+
+
+def test_owner_and_primary_range_wrap_around_the_ring():
+    ring = TokenRing(ENTRIES)
+
+    assert ring.owner(-4000).address == '10.0.0.2'
+    assert ring.owner(-3999).address == '10.0.0.3'
+    assert ring.owner(2001).address == '10.0.0.1'
+    assert ring.primary_range(-7000) == ('2000', '-6000')
+    assert ring.primary_ranges('10.0.0.3') == [('-4000', '-2000')]
+
+
+def test_simple_strategy_replicas_are_the_next_distinct_nodes():
+    ring = TokenRing(ENTRIES)
+
+    assert ring.replicas(-4500, 3) == ['10.0.0.2', '10.0.0.3', '10.0.1.2']
+    assert ring.replicas(1000, 10) == ['10.0.0.4', '10.0.0.1', '10.0.1.1', '10.0.0.2', '10.0.0.3', '10.0.1.2']
+
+
+def test_network_topology_replicas_prefer_unused_racks():
+    ring = TokenRing(ENTRIES)
+
+    # 10.0.0.2 (r1) is skipped for 10.0.0.3 (r2) and 10.0.0.4 (r3), then used
+    # once no unused rack is left.
+    assert ring.replicas(-6500, {'dc1': 3}) == ['10.0.0.1', '10.0.0.3', '10.0.0.4']
+    assert ring.replicas(-6500, {'dc1': 4}) == ['10.0.0.1', '10.0.0.3', '10.0.0.4', '10.0.0.2']
+    assert ring.replicas(-6500, {'dc1': 2, 'dc2': 5}) == ['10.0.0.1', '10.0.1.1', '10.0.0.3', '10.0.1.2']
+
+
+def test_replica_sets_cover_every_primary_range():
+    ring = TokenRing(ENTRIES)
+    replica_sets = ring.replica_sets({'dc1': 2})
+
+    assert set(replica_sets) == set(ring.addresses)
+    assert replica_sets['10.0.0.1'] == {'10.0.0.1', '10.0.0.3'}
+    assert replica_sets['10.0.1.1'] == {'10.0.0.2', '10.0.0.3'}
+
+
+def test_parse_replication():
+    assert parse_replication('3') == 3
+    assert parse_replication('dc1:3, dc2:2') == {'dc1': 3, 'dc2': 2}
+
+
+class RingClient:
+    def __init__(self, entries=None):
+        self.entries = entries
+        self.calls = 0
+
+    def ring(self):
+        self.calls += 1
+        if self.entries is None:
+            raise ClusterClientError('nodetool ring failed')
+        return self.entries
+
+
+def test_get_ring_uses_a_fresh_cache_and_refreshes_a_stale_one(tmp_path):
+    cache = str(tmp_path / 'ring.json')
+    client = RingClient(ENTRIES)
+
+    assert len(get_ring(client, cache, max_age=300)) == len(ENTRIES)
+    assert len(get_ring(client, cache, max_age=300)) == len(ENTRIES)
+    assert client.calls == 1
+
+    get_ring(client, cache, max_age=0)
+    assert client.calls == 2
+
+
+def test_get_ring_falls_back_to_a_stale_cache(tmp_path):
+    cache = str(tmp_path / 'ring.json')
+    TokenRing(ENTRIES, fetched_at=1).save(cache)
+
+    ring = get_ring(RingClient(), cache, max_age=300)
+    assert ring.tokens == sorted(entry.token for entry in ENTRIES)
+    assert ring.location('10.0.0.4') == ('dc1', 'r3')
+
+    with pytest.raises(ClusterClientError):
+        get_ring(RingClient(), str(tmp_path / 'missing.json'), max_age=300)
@@ -0,0 +1,54 @@
+from cassandra_compaction_planner import CompactionJob, CompactionPlanner, find_jobs, format_duration
+
+
+def job(table, size, need=None):
+    return CompactionJob('ks', table, 1, size, need or size)
+
+
+def test_find_jobs_sums_live_sstables_of_every_table_directory(tmp_path):
+    files = {
+        'ks/t-1/nb-1-big-Data.db': 100,
+        'ks/t-1/nb-1-big-Index.db': 10,
+        'ks/t-1/snapshots/tag/nb-1-big-Data.db': 1000,
+        'ks/t-2/nb-2-big-Data.db': 50,
+        'ks/t-2/.t_idx/nb-3-big-Data.db': 20,
+        'ks/empty-3/backups/nb-4-big-Data.db': 1000,
+        'other/u-4/nb-5-big-Data.db': 5,
+    }
+    for relpath, size in files.items():
+        (tmp_path / relpath).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / relpath).write_bytes(b'x' * size)
+
+    assert find_jobs(str(tmp_path), 'ks', space_factor=2) == [CompactionJob('ks', 't', 3, 180, 360)]
+    assert [(j.keyspace, j.table) for j in find_jobs(str(tmp_path))] == [('ks', 't'), ('other', 'u')]
+    assert find_jobs(str(tmp_path), 'ks', tables=('missing',)) == []
+
+
+def test_next_job_takes_the_largest_job_that_fits():
+    planner = CompactionPlanner([job('small', 100), job('big', 600), job('huge', 2000), job('mid', 450)],
+                                budget=1000, concurrency=3)
+
+    assert [j.table for j in planner.skipped] == ['huge']
+    first = planner.next_job([])
+    second = planner.next_job([first])
+    assert (first.table, second.table) == ('big', 'small')
+    assert planner.next_job([first, second]) is None
+    assert planner.next_job([second]).table == 'mid'
+
+
+def test_next_job_respects_the_concurrency_limit():
+    planner = CompactionPlanner([job('a', 1), job('b', 1)], budget=1000, concurrency=1)
+    running = [planner.next_job([])]
+
+    assert planner.next_job(running) is None
+    assert planner.next_job([]).table == 'b'
+
+
+def test_predict_shares_the_throughput_between_running_compactions():
+    planner = CompactionPlanner([job('a', 500, 550), job('b', 300, 330), job('c', 100, 110)],
+                                budget=1000, concurrency=2)
+    schedule = planner.predict(rate=100)
+
+    # a and b share 100 B/s until b is done at 6s; c then starts next to a.
+    assert [(p.job.table, p.start, p.end) for p in schedule] == [('a', 0, 9), ('b', 0, 6), ('c', 6, 8)]
+    assert format_duration(3725) == '1:02:05'
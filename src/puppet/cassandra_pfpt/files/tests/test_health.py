@@ -0,0 +1,147 @@
+import time
+
+import pytest
+
+import cassandra_health as health
+from cassandra_health import NodetoolResult, NodetoolSnapshot
+
+
+class FakeSnapshot:
+    """Serves canned nodetool output by command."""
+
+    def __init__(self, **outputs):
+        self.outputs = outputs
+
+    def get(self, *args):
+        return NodetoolResult(0, self.outputs.get(args[0], ''), '', time.time(), '')
+
+
+@pytest.fixture(autouse=True)
+def local_node(monkeypatch):
+    monkeypatch.setattr(health, 'local_addresses', lambda: ['10.0.0.1'])
+
+
+def status_of(check, **outputs):
+    return check(FakeSnapshot(**outputs)).status
+
+
+def test_node_status():
+    output = """Datacenter: dc1
+--  Address   Load     Tokens  Owns  Host ID   Rack
+UN  10.0.0.2  1 GiB    16      ?     id-2      r1
+{state}  10.0.0.1  1 GiB    16      ?     id-1      r1
+"""
+    assert status_of(health.check_node_status, status=output.format(state='UN')) == 'OK'
+    assert status_of(health.check_node_status, status=output.format(state='DN')) == 'ERROR'
+    assert status_of(health.check_node_status, status='') == 'ERROR'
+
+
+def test_schema_agreement_ignores_unreachable_nodes():
+    output = """Cluster Information:
+\tName: Test Cluster
+\tSchema versions:
+\t\t{versions}
+
+Stats for all nodes:
+"""
+    agreed = "aaaa-1111: [10.0.0.1, 10.0.0.2]\n\t\tUNREACHABLE: [10.0.0.3]"
+    split = "aaaa-1111: [10.0.0.1]\n\t\tbbbb-2222: [10.0.0.2]"
+    assert status_of(health.check_schema_agreement, describecluster=output.format(versions=agreed)) == 'OK'
+    assert status_of(health.check_schema_agreement, describecluster=output.format(versions=split)) == 'ERROR'
+    assert status_of(health.check_schema_agreement, describecluster='') == 'WARNING'
+
+
+@pytest.mark.parametrize('status_line, expected', [
+    ('STATUS:18:NORMAL,-123', 'OK'),
+    ('STATUS:NORMAL,-123', 'OK'),
+    ('STATUS:18:LEAVING,-123', 'WARNING'),
+])
+def test_gossip_reads_the_local_endpoint_block(status_line, expected):
+    output = f"""/10.0.0.2
+  generation:1
+  STATUS:18:LEAVING,456
+node1.example.com/10.0.0.1
+  generation:1
+  {status_line}
+"""
+    result = health.check_gossip(FakeSnapshot(gossipinfo=output))
+    assert result.status == expected
+
+
+def test_pending_compactions():
+    assert status_of(health.check_pending_compactions, compactionstats='pending tasks: 3\n') == 'OK'
+    assert status_of(health.check_pending_compactions, compactionstats='pending tasks: 51\n') == 'WARNING'
+    assert status_of(health.check_pending_compactions, compactionstats='error') == 'WARNING'
+
+
+def test_dropped_messages_are_summed_over_the_message_table():
+    output = """Pool Name      Active Pending Completed Blocked All time blocked
+ReadStage      0      0       100       0       0
+
+Message type   Dropped   Latency waiting in queue (micros)
+READ           {read}    0.0
+MUTATION       2         0.0
+"""
+    result = health.check_dropped_messages(FakeSnapshot(tpstats=output.format(read=3)))
+    assert (result.status, result.details.count('\n')) == ('WARNING', 1)
+    assert 'Found 5 dropped messages' in result.message
+    assert status_of(health.check_dropped_messages, tpstats=output.replace('2 ', '0 ').format(read=0)) == 'OK'
+    assert status_of(health.check_dropped_messages, tpstats='') == 'WARNING'
+
+
+def test_run_checks_reports_a_crashing_check(monkeypatch):
+    def check_crash(snapshot):
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(health, 'CHECKS', [('1. Crash', check_crash), ('2. Streams', health.check_network_streams)])
+    results = health.run_checks(FakeSnapshot(netstats='Mode: NORMAL\n'))
+    assert [(r.name, r.status) for r in results] == [('crash', 'ERROR'), ('network_streams', 'OK')]
+
+
+@pytest.fixture
+def nodetool(tmp_path, monkeypatch):
+    """A fake nodetool that counts its runs, and fails while a 'fail' file exists."""
+    monkeypatch.setattr(health, 'cassandra_instance', lambda: 'pid-1')
+    script = tmp_path / 'nodetool'
+    script.write_text(f"""#!/bin/sh
+echo run >> {tmp_path}/runs
+[ -e {tmp_path}/fail ] && exit 1
+echo "pending tasks: 0"
+""")
+    script.chmod(0o755)
+
+    def runs():
+        try:
+            return len((tmp_path / 'runs').read_text().splitlines())
+        except FileNotFoundError:
+            return 0
+
+    return str(script), runs
+
+
+def test_snapshot_is_shared_between_instances(tmp_path, nodetool):
+    script, runs = nodetool
+    cache_dir = str(tmp_path / 'cache')
+    first = NodetoolSnapshot(cache_dir, max_age=60, nodetool=[script])
+
+    assert first.get('compactionstats').stdout == 'pending tasks: 0\n'
+    first.get('compactionstats')
+    NodetoolSnapshot(cache_dir, max_age=60, nodetool=[script]).get('compactionstats')
+    assert runs() == 1
+
+    NodetoolSnapshot(cache_dir, max_age=0, nodetool=[script]).get('compactionstats')
+    assert runs() == 2
+
+
+def test_snapshot_does_not_reuse_failures_or_output_of_another_instance(tmp_path, nodetool, monkeypatch):
+    script, runs = nodetool
+    cache_dir = str(tmp_path / 'cache')
+    (tmp_path / 'fail').touch()
+    assert NodetoolSnapshot(cache_dir, max_age=60, nodetool=[script]).get('status').returncode == 1
+    (tmp_path / 'fail').unlink()
+    assert NodetoolSnapshot(cache_dir, max_age=60, nodetool=[script]).get('status').returncode == 0
+    assert runs() == 2
+
+    monkeypatch.setattr(health, 'cassandra_instance', lambda: 'pid-2')
+    NodetoolSnapshot(cache_dir, max_age=60, nodetool=[script]).get('status')
+    assert runs() == 3
@@ -0,0 +1,125 @@
+import json
+import os
+import time
+
+import pytest
+
+import cassandra_incremental_shipper as shipper_module
+from cassandra_backup_engine import BackupEngine
+from cassandra_incremental_shipper import MANIFEST_FILE, Batch, IncrementalShipper, sstable_of
+from cassandra_object_store import LocalObjectStore
+
+from test_backup_engine import PASSPHRASE, read_archive
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    """A data directory with one table's backups/ directory, a local store and a shipper factory."""
+    for name in ('BACKUP_DISABLED_FLAG', 'UPLOAD_DISABLED_FLAG', 'CLEANUP_DISABLED_FLAG', 'BACKUP_LOCK_FILE'):
+        monkeypatch.setattr(shipper_module, name, str(tmp_path / name.lower()))
+    backups = tmp_path / 'data' / 'ks' / 't-1234' / 'backups'
+    backups.mkdir(parents=True)
+    store = LocalObjectStore(str(tmp_path / 'store'))
+
+    def make(**kwargs):
+        kwargs.setdefault('settle_seconds', 0)
+        shipper = IncrementalShipper(BackupEngine(store, PASSPHRASE), store, 'file:///store', None, 'host',
+                                     str(tmp_path / 'data'), 'node1', str(tmp_path / 'state.json'),
+                                     use_inotify=False, **kwargs)
+        shipper._rescan_dirs()
+        return shipper
+
+    return backups, store, make
+
+
+def scan(shipper, now):
+    for path in shipper.backup_dirs:
+        shipper._scan(path, now)
+
+
+def test_sstable_of():
+    assert sstable_of('nb-12-big-Data.db') == 'nb-12-big'
+    assert sstable_of('.ks_idx/nb-3-big-Index.db') == '.ks_idx/nb-3-big'
+
+
+def test_batch_is_cut_when_its_window_or_size_is_reached(env):
+    backups, _, make = env
+    (backups / 'nb-1-big-Data.db').write_bytes(b'x' * 100)
+    shipper = make(batch_seconds=300, batch_size=1000)
+    now = time.time()
+    scan(shipper, now)
+
+    assert shipper._cut_batch(now + 10) is None
+    (backups / 'nb-2-big-Data.db').write_bytes(b'x' * 1000)
+    scan(shipper, now + 20)
+    batch = shipper._cut_batch(now + 20)
+
+    assert batch is not None
+    assert sorted(p.relpath for files in batch.files.values() for p in files) == ['nb-1-big-Data.db', 'nb-2-big-Data.db']
+    assert shipper.pending == {}
+
+
+def test_sstables_still_being_written_wait_for_the_settle_time(env):
+    backups, _, make = env
+    (backups / 'nb-1-big-Data.db').write_bytes(b'x')
+    shipper = make(settle_seconds=30)
+    now = time.time()
+    scan(shipper, now)
+
+    assert shipper._cut_batch(now, force=True) is None
+    assert shipper._cut_batch(now + 31, force=True) is not None
+
+
+def test_batches_pause_while_a_full_backup_holds_the_lock(env):
+    backups, _, make = env
+    (backups / 'nb-1-big-Data.db').write_bytes(b'x')
+    with open(shipper_module.BACKUP_LOCK_FILE, 'w') as f:
+        f.write(str(os.getpid()))
+    shipper = make()
+    scan(shipper, time.time())
+
+    assert shipper._cut_batch(time.time(), force=True) is None
+    os.remove(shipper_module.BACKUP_LOCK_FILE)
+    assert shipper._cut_batch(time.time(), force=True) is not None
+
+
+def test_claim_tag_moves_past_sets_already_in_the_store(env):
+    _, store, make = env
+    store.put('host/2024-01-01-00-00/ks/t.tar.gz.enc', b'x')
+    store.put('host/2024-01-01-00-01/backup_manifest.json', b'{}')
+    shipper = make()
+    shipper.last_tag = '2024-01-01-00-00'
+
+    assert shipper._claim_tag(Batch('2024-01-01-00-00', {})).tag == '2024-01-01-00-02'
+    assert shipper.last_tag == '2024-01-01-00-02'
+    assert shipper._claim_tag(Batch('2024-01-01-00-05', {})).tag == '2024-01-01-00-05'
+
+
+def test_ship_stores_an_incremental_set_and_removes_the_files(env):
+    backups, store, make = env
+    (backups / 'nb-1-big-Data.db').write_bytes(b'data')
+    shipper = make()
+    scan(shipper, time.time())
+    batch = shipper._cut_batch(time.time(), force=True)
+
+    assert shipper.ship(batch) == 1
+    manifest = json.loads(store.get(f"host/{batch.tag}/{MANIFEST_FILE}"))
+    assert (manifest['backup_type'], manifest['tables_backed_up']) == ('incremental', ['ks/t'])
+    assert read_archive(store, f"host/{batch.tag}/ks/t.tar.gz.enc") == {'./nb-1-big-Data.db': b'data'}
+    assert os.listdir(backups) == []
+    assert shipper.in_flight == set()
+
+
+def test_files_kept_after_shipping_are_never_shipped_again(env):
+    backups, _, make = env
+    (backups / 'nb-1-big-Data.db').write_bytes(b'data')
+    open(shipper_module.CLEANUP_DISABLED_FLAG, 'w').close()
+    shipper = make()
+    scan(shipper, time.time())
+    shipper.ship(shipper._cut_batch(time.time(), force=True))
+    assert os.listdir(backups) == ['nb-1-big-Data.db']
+
+    restarted = make()
+    scan(restarted, time.time())
+    assert restarted.pending == {}
+    assert restarted.last_tag == shipper.last_tag
@@ -0,0 +1,39 @@
+import time
+
+import cassandra_range_repair as repair
+from cassandra_range_repair import RepairJournal, RepairScheduler
+
+from conftest import LOCAL_ADDRESS, primary_work
+
+
+def test_journal_resume_repairs_only_failed_ranges(repair_env):
+    client = repair_env(failures={('ks1', '-2000', '0')})
+    journal = RepairJournal(repair.JOURNAL_FILE)
+    journal.load()
+    RepairScheduler(primary_work(client, 'ks1', journal), LOCAL_ADDRESS, journal=journal).run()
+
+    resumed = RepairJournal(repair.JOURNAL_FILE)
+    resumed.load()
+    assert resumed.repaired_ranges('ks1', 3600) == [('4000', '-6000')]
+    assert resumed.repaired_ranges('ks1', 3600, now=time.time() + 7200) == []
+
+    client = repair_env()
+    work = primary_work(client, 'ks1', resumed)
+    assert [(w.start, w.end) for w in work] == [(-2000, 0)]
+    assert RepairScheduler(work, LOCAL_ADDRESS, journal=resumed).run() == {}
+    assert client.repairs == [('ks1', '-2000', '0')]
+
+
+def test_journal_load_skips_a_partial_last_line_and_compacts(repair_env, monkeypatch):
+    monkeypatch.setattr(repair, 'JOURNAL_COMPACT_MIN_LINES', 4)
+    journal = RepairJournal(repair.JOURNAL_FILE)
+    for exit_code in (1, 1, 1, 0):
+        journal.record('ks1', -2000, 0, exit_code, 1.0)
+    with open(repair.JOURNAL_FILE, 'a') as f:
+        f.write('{"keyspace": "ks1", "start_tok')
+
+    loaded = RepairJournal(repair.JOURNAL_FILE)
+    loaded.load()
+    assert loaded.latest[('ks1', '-2000', '0')]['exit_code'] == 0
+    with open(repair.JOURNAL_FILE) as f:
+        assert len(f.readlines()) == 1
@@ -0,0 +1,25 @@
+import cassandra_range_repair as repair
+from cassandra_range_repair import RepairScheduler
+
+from conftest import LOCAL_ADDRESS, primary_work
+
+
+def test_scheduler_repairs_every_range_and_counts_failures(repair_env):
+    client = repair_env(failures={('ks2', '-2000', '0')})
+    scheduler = RepairScheduler(primary_work(client, 'ks1') + primary_work(client, 'ks2'), LOCAL_ADDRESS)
+
+    assert scheduler.run() == {'ks2': 1}
+    assert client.repairs == [('ks1', '4000', '-6000'), ('ks1', '-2000', '0'),
+                              ('ks2', '4000', '-6000'), ('ks2', '-2000', '0')]
+    assert scheduler.steps == 4
+    with open(repair.STATUS_FILE) as f:
+        assert '4 steps complete' in f.read()
+
+
+def test_parallel_scheduler_repairs_each_range_once(repair_env):
+    client = repair_env(repair_latency=0.01)
+    work = [w for ks in ('ks1', 'ks2', 'ks3') for w in primary_work(client, ks)]
+    scheduler = RepairScheduler(work, LOCAL_ADDRESS, max_parallel=3, max_jobs_per_replica=2)
+
+    assert scheduler.run() == {}
+    assert sorted(client.repairs) == sorted((w.keyspace, str(w.start), str(w.end)) for w in work)
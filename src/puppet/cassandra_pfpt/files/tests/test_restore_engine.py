@@ -0,0 +1,154 @@
+import gzip
+import io
+import os
+import tarfile
+
+import pytest
+
+import cassandra_restore_engine as restore_engine
+from cassandra_backup_engine import BackupEngine, TableBackup
+from cassandra_object_store import LocalObjectStore
+from cassandra_restore_engine import (DiskBudget, RestoreArchive, RestoreEngine, RestoreError, list_chain_archives,
+                                      plan_restore, safe_join)
+
+from test_backup_engine import PASSPHRASE, encrypt
+
+CHAIN = ['2024-01-01-00-00', '2024-01-01-06-00']
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalObjectStore(str(tmp_path / 'store'))
+
+
+def back_up(store, snapshot_dir, backup_id, table='t', files=None, dedup=False):
+    engine = BackupEngine(store, PASSPHRASE, dedup_prefix='_sstables/host' if dedup else None, dedup_min_size=1024)
+    key = f"host/{backup_id}/ks/{table}.tar.gz.enc"
+    [result] = engine.run([TableBackup('ks', table, f"{table}-1234", str(snapshot_dir), key, files)])
+    assert result.error is None
+
+
+def test_chain_archives_are_grouped_per_table_in_chain_order(store):
+    for backup_id in CHAIN:
+        store.put(f"host/{backup_id}/ks/t.tar.gz.enc", b'x' * 10)
+    store.put(f"host/{CHAIN[0]}/ks/big.tar.gz.enc", b'x' * 100)
+    store.put(f"host/{CHAIN[0]}/backup_manifest.json", b'{}')
+    store.put(f"host/{CHAIN[0]}/other/ks/t.tar.gz.enc", b'x')
+
+    archives = list_chain_archives(store, 'host', CHAIN)
+    assert [a.backup_id for a in archives[('ks', 't')]] == CHAIN
+    assert set(archives) == {('ks', 't'), ('ks', 'big')}
+    assert set(list_chain_archives(store, 'host', CHAIN, table='big')) == {('ks', 'big')}
+
+    jobs = plan_restore(archives, {'ks.t': 't-1234', 'ks.big': 'big-5678'}, '/restore')
+    assert [(job.table, job.output_dir) for job in jobs] == [('big', '/restore/ks/big-5678'), ('t', '/restore/ks/t-1234')]
+    assert [job.table for job in plan_restore(archives, {'ks.t': 't-1234'}, '/restore')] == ['t']
+
+
+def test_safe_join_refuses_paths_outside_the_table_directory():
+    assert safe_join('/restore/t', 'backups/nb-1-big-Data.db') == '/restore/t/backups/nb-1-big-Data.db'
+    for path in ('/etc/passwd', '../other/nb-1-big-Data.db', 'a/../../b'):
+        with pytest.raises(RestoreError):
+            safe_join('/restore/t', path)
+
+
+def test_restore_applies_the_chain_and_resolves_references(tmp_path, store):
+    snapshot = tmp_path / 'snapshot'
+    snapshot.mkdir()
+    (snapshot / 'nb-1-big-Data.db').write_bytes(os.urandom(50000))
+    (snapshot / 'schema.cql').write_text('CREATE TABLE ks.t (id int PRIMARY KEY);')
+    back_up(store, snapshot, CHAIN[0], dedup=True)
+    (snapshot / 'nb-2-big-Data.db').write_bytes(b'incremental')
+    back_up(store, snapshot, CHAIN[1], files={'nb-2-big-Data.db'})
+
+    jobs = plan_restore(list_chain_archives(store, 'host', CHAIN), {'ks.t': 't-1234'}, str(tmp_path / 'restore'))
+    # Small ranges so every archive is read as several concurrent ranged GETs.
+    results = RestoreEngine(store, PASSPHRASE, download_threads=3, range_size=1000).run(jobs)
+
+    assert [(r.error, r.archives, r.references) for r in results] == [(None, 2, 1)]
+    restored = tmp_path / 'restore' / 'ks' / 't-1234'
+    assert sorted(os.listdir(restored)) == ['nb-1-big-Data.db', 'nb-2-big-Data.db', 'schema.cql']
+    for name in os.listdir(restored):
+        assert (restored / name).read_bytes() == (snapshot / name).read_bytes()
+
+
+def test_restore_fails_cleanly_with_the_wrong_key(tmp_path, store):
+    snapshot = tmp_path / 'snapshot'
+    snapshot.mkdir()
+    (snapshot / 'nb-1-big-Data.db').write_bytes(os.urandom(5000))
+    back_up(store, snapshot, CHAIN[0])
+
+    jobs = plan_restore(list_chain_archives(store, 'host', CHAIN[:1]), {'ks.t': 't-1234'}, str(tmp_path / 'restore'))
+    [result] = RestoreEngine(store, 'not the passphrase').run(jobs)
+    assert result.error
+
+
+def tar_archive(*members):
+    """Builds an encrypted .tar.gz of (TarInfo, data) members."""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w') as tar:
+        for info, data in members:
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return encrypt(gzip.compress(buffer.getvalue()))
+
+
+def member(name, kind=tarfile.REGTYPE, linkname='', mode=0o644):
+    info = tarfile.TarInfo(name)
+    info.type, info.linkname, info.mode = kind, linkname, mode
+    return info
+
+
+@pytest.mark.parametrize('bad', [
+    member('../escape'),
+    member('/tmp/escape'),
+    member('link', tarfile.SYMTYPE, '/etc/passwd'),
+    member('hardlink', tarfile.LNKTYPE, '../escape'),
+    member('fifo', tarfile.FIFOTYPE),
+])
+def test_restore_checks_members_itself_without_the_data_filter(tmp_path, store, monkeypatch, bad):
+    monkeypatch.setattr(restore_engine, 'EXTRACT_ARGS', {})
+    store.put(f"host/{CHAIN[0]}/ks/t.tar.gz.enc", tar_archive((member('./nb-1-big-Data.db', mode=0o4777), b'data')))
+    store.put(f"host/{CHAIN[1]}/ks/t.tar.gz.enc", tar_archive((bad, b'')))
+    jobs = plan_restore(list_chain_archives(store, 'host', CHAIN), {'ks.t': 't-1234'}, str(tmp_path / 'restore'))
+
+    [result] = RestoreEngine(store, PASSPHRASE).run(jobs)
+    assert 'Refusing to restore' in result.error
+    restored = tmp_path / 'restore' / 'ks' / 't-1234'
+    assert os.listdir(restored) == ['nb-1-big-Data.db']
+    assert os.stat(restored / 'nb-1-big-Data.db').st_mode & 0o7777 == 0o755
+    assert not (tmp_path / 'restore' / 'ks' / 'escape').exists()
+
+
+def test_disk_budget_admits_work_only_while_it_fits(tmp_path, monkeypatch):
+    budget = DiskBudget(str(tmp_path), max_percent=90, abort_percent=95)
+    usage = {'used': 500}
+    monkeypatch.setattr(budget, '_usage', lambda: (usage['used'], 1000))
+
+    assert budget.reserve(300) == 300
+    assert budget.grow(200) == 200
+    budget.release(500)
+    with pytest.raises(RestoreError):
+        budget.reserve(401)
+
+    budget.check()
+    usage['used'] = 960
+    with pytest.raises(RestoreError):
+        budget.check()
+
+
+def test_restore_archive_sizes_drive_the_reservation(tmp_path):
+    reservations = []
+
+    class RecordingBudget:
+        def reserve(self, size):
+            reservations.append(size)
+            raise RestoreError('no space')
+
+        def release(self, size):
+            pass
+
+    job = plan_restore({('ks', 't'): [RestoreArchive(CHAIN[0], 'host/k', 1000)]}, {'ks.t': 't-1'}, str(tmp_path))[0]
+    result = RestoreEngine(None, PASSPHRASE, budget=RecordingBudget(), expansion_factor=2.5).restore_table(job)
+    assert result.error == 'no space'
+    assert reservations == [2500]
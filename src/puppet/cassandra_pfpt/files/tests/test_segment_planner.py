@@ -0,0 +1,109 @@
+import cassandra_range_repair as repair
+from cassandra_range_repair import RangeWork, RepairJob, RepairJournal, RepairScheduler, SegmentPlanner, uncovered_offsets
+
+from conftest import LOCAL_ADDRESS, primary_work
+
+
+def test_journal_resume_repairs_remaining_segments(repair_env):
+    client = repair_env(failures={('ks1', '-1500', '-1000')})
+    planner = SegmentPlanner(target_seconds=10, initial_partitions=1000)
+    planner.partition_keyspaces.add('ks1')
+    journal = RepairJournal(repair.JOURNAL_FILE)
+    work = [w for w in primary_work(client, 'ks1', units=4000) if w.start == -2000]
+    RepairScheduler(work, LOCAL_ADDRESS, journal=journal, planner=planner).run()
+    assert len(client.repairs) == 4
+
+    resumed = RepairJournal(repair.JOURNAL_FILE)
+    resumed.load()
+    work = [w for w in primary_work(client, 'ks1', resumed, units=4000) if w.start == -2000]
+    assert [w.gaps for w in work] == [[(500, 1000)]]
+
+
+def test_scheduler_splits_ranges_into_contiguous_segments(repair_env):
+    client = repair_env()
+    planner = SegmentPlanner(target_seconds=10, initial_partitions=1000)
+    planner.partition_keyspaces.add('ks1')
+    work = [w for w in primary_work(client, 'ks1', units=3000) if w.start == -2000]
+
+    assert RepairScheduler(work, LOCAL_ADDRESS, planner=planner).run() == {}
+    assert client.repairs == [('ks1', '-2000', '-1334'), ('ks1', '-1334', '-667'), ('ks1', '-667', '0')]
+
+
+def test_uncovered_offsets_returns_the_gaps_between_repaired_subranges():
+    assert uncovered_offsets(-2000, 0, []) == [(0, 2000)]
+    assert uncovered_offsets(-2000, 0, [('-1500', '-1000'), ('-500', '0')]) == [(0, 500), (1000, 1500)]
+    assert uncovered_offsets(-2000, 0, [('-2000', '0')]) == []
+
+
+def make_work(units, gaps=None, keyspace='ks'):
+    return RangeWork(keyspace, -2000, 0, frozenset(), 0, 1, 1.0, units, gaps or [(0, 2000)])
+
+
+def assert_covers(jobs, start, end):
+    assert jobs[0].start == str(start) and jobs[-1].end == str(end)
+    for previous, job in zip(jobs, jobs[1:]):
+        assert previous.end == job.start
+
+
+def test_split_uses_initial_partitions_before_any_measurement():
+    planner = SegmentPlanner(target_seconds=10, initial_partitions=1000)
+    planner.partition_keyspaces.add('ks')
+    jobs = planner.split(make_work(4500))
+
+    assert len(jobs) == 5
+    assert_covers(jobs, -2000, 0)
+    assert sum(job.units for job in jobs) == 4500
+    assert abs(sum(job.weight for job in jobs) - 1.0) < 1e-9
+
+
+def test_split_leaves_ranges_whole_without_a_target_or_estimates():
+    assert len(SegmentPlanner(target_seconds=0).split(make_work(10 ** 6))) == 1
+    assert len(SegmentPlanner(target_seconds=10).split(make_work(10 ** 6))) == 1
+
+
+def test_split_only_covers_unrepaired_gaps():
+    planner = SegmentPlanner(target_seconds=10, initial_partitions=1000)
+    planner.partition_keyspaces.add('ks')
+    jobs = planner.split(make_work(4000, gaps=[(0, 500), (1500, 2000)]))
+
+    assert [(job.start, job.end) for job in jobs] == [('-2000', '-1500'), ('-500', '0')]
+
+
+def record_samples(planner, samples):
+    for units, seconds in samples:
+        planner.record(RepairJob('ks', '-2000', '0', frozenset(), 0, 1, 1.0, units), seconds, 0)
+
+
+def test_split_sizes_segments_from_measured_rate():
+    planner = SegmentPlanner(target_seconds=2, initial_partitions=1000, min_partitions=10)
+    planner.partition_keyspaces.add('ks')
+    record_samples(planner, [(1000, 1.0), (500, 0.5)])
+
+    # 0.001 s per partition and no overhead: 2000 partitions take the 2 s target.
+    assert len(planner.split(make_work(8000))) == 4
+
+
+def test_split_stops_shrinking_below_the_per_repair_overhead():
+    planner = SegmentPlanner(target_seconds=0.1, initial_partitions=1000, min_partitions=10)
+    planner.partition_keyspaces.add('ks')
+    record_samples(planner, [(1000, 2.0), (200, 1.2), (1000, 2.0), (200, 1.2)])
+
+    # 1 s overhead plus 0.001 s per partition: segments stop at 1000 partitions
+    # instead of being cut into --max-segments pieces chasing the 0.1 s target.
+    assert len(planner.split(make_work(8000))) == 8
+
+
+def test_split_respects_the_minimum_segment_size():
+    planner = SegmentPlanner(target_seconds=0.1, initial_partitions=1000, min_partitions=500)
+    planner.partition_keyspaces.add('ks')
+    record_samples(planner, [(1000, 1.0), (500, 0.5)])
+
+    assert len(planner.split(make_work(8000))) == 16
+
+
+def test_split_leaves_ranges_whole_when_durations_do_not_grow_with_size():
+    planner = SegmentPlanner(target_seconds=0.1, initial_partitions=1000)
+    planner.partition_keyspaces.add('ks')
+    record_samples(planner, [(1000, 1.0), (200, 1.1)])
+
+    assert len(planner.split(make_work(8000))) == 1
@@ -0,0 +1,47 @@
+import json
+import os
+
+import pytest
+
+import cassandra_telemetry as telemetry
+from cassandra_telemetry import TelemetryError, read_history, redact, run_operation
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    monkeypatch.delenv(telemetry.DISABLE_ENV, raising=False)
+    path = tmp_path / 'telemetry.json'
+    path.write_text(json.dumps({'state_dir': str(tmp_path / 'state'), 'textfile_dir': str(tmp_path / 'textfile'),
+                                'history_file': str(tmp_path / 'history.jsonl')}))
+    return str(path)
+
+
+def script(tmp_path, body):
+    path = tmp_path / 'op.sh'
+    path.write_text(f"#!/bin/sh\n{body}\n")
+    path.chmod(0o755)
+    return str(path)
+
+
+def test_run_operation_records_the_exit_code(tmp_path, config):
+    assert run_operation('demo', script(tmp_path, 'exit 3'), ['--password', 'hunter2'], config) == 3
+
+    [record] = read_history(str(tmp_path / 'history.jsonl'))
+    assert (record['command'], record['exit_code']) == ('demo', 3)
+    assert 'hunter2' not in json.dumps(record)
+    assert 'hunter2' not in redact(['--password', 'hunter2'])
+
+
+def test_run_operation_refuses_to_start_without_posix_spawn(tmp_path, config, monkeypatch):
+    monkeypatch.delattr(os, 'posix_spawn')
+
+    with pytest.raises(TelemetryError):
+        run_operation('demo', script(tmp_path, f"touch {tmp_path}/ran"), [], config)
+    assert not (tmp_path / 'ran').exists()
+
+
+def test_run_operation_is_skipped_when_disabled(tmp_path, config, monkeypatch):
+    monkeypatch.setenv(telemetry.DISABLE_ENV, '0')
+
+    with pytest.raises(TelemetryError):
+        run_operation('demo', script(tmp_path, 'exit 0'), [], config)
@@ -0,0 +1,121 @@
+import pytest
+
+from cassandra_tombstones import (MetadataCache, MetadataError, SSTableInfo, TombstoneAnalyzer, aggregate,
+                                  find_data_files, find_table_dirs, parse_metadata)
+
+METADATA = """SSTable: {sstable}
+Partitioner: org.apache.cassandra.dht.Murmur3Partitioner
+Estimated droppable tombstones: {droppable}
+SSTable Level: {level}
+Repaired at: {repaired_at}
+"""
+
+
+def test_parse_metadata():
+    assert parse_metadata(METADATA.format(sstable='x', droppable='2.5E-1', level=2, repaired_at=1700000000000)) == \
+        (0.25, 2, 1700000000000)
+    assert parse_metadata('Estimated droppable tombstones: 0.0\n') == (0.0, 0, 0)
+    with pytest.raises(MetadataError):
+        parse_metadata('SSTable: x\n')
+
+
+def test_data_files_exclude_snapshots_and_backups(tmp_path):
+    table_dir = tmp_path / 'ks' / 't-1234'
+    for relpath in ('nb-1-big-Data.db', 'nb-1-big-Index.db', '.t_idx/nb-2-big-Data.db',
+                    'snapshots/tag/nb-1-big-Data.db', 'backups/nb-3-big-Data.db'):
+        (table_dir / relpath).parent.mkdir(parents=True, exist_ok=True)
+        (table_dir / relpath).touch()
+    (tmp_path / 'ks' / 't_other-5678').mkdir()
+
+    assert find_table_dirs(str(tmp_path), 'ks', 't') == [str(table_dir)]
+    assert find_data_files(str(table_dir)) == [str(table_dir / '.t_idx/nb-2-big-Data.db'),
+                                               str(table_dir / 'nb-1-big-Data.db')]
+
+
+@pytest.fixture
+def sstablemetadata(tmp_path):
+    """A fake sstablemetadata that logs its runs and leaves 'flaky' SSTables out of multi-SSTable output."""
+    script = tmp_path / 'sstablemetadata'
+    script.write_text(f"""#!/bin/sh
+echo "$#" >> {tmp_path}/runs
+for path in "$@"; do
+    case "$path" in *flaky*) [ "$#" -gt 1 ] && continue ;; *broken*) continue ;; esac
+    echo "SSTable: ${{path%-Data.db}}"
+    echo "Estimated droppable tombstones: 0.5"
+    echo "SSTable Level: 1"
+    echo "Repaired at: 0"
+done
+""")
+    script.chmod(0o755)
+
+    def runs():
+        try:
+            return [int(n) for n in (tmp_path / 'runs').read_text().split()]
+        except FileNotFoundError:
+            return []
+
+    return [str(script)], runs
+
+
+def sstables(tmp_path, *names):
+    """(path, size) of SSTables whose Data.db is not there but whose Statistics.db is."""
+    for name in names:
+        (tmp_path / f"{name}-big-Statistics.db").write_bytes(b'stats')
+    return [(str(tmp_path / f"{name}-big-Data.db"), 100) for name in names]
+
+
+def test_analyzer_batches_runs_and_retries_sstables_missing_from_the_output(tmp_path, sstablemetadata):
+    command, runs = sstablemetadata
+    files = sstables(tmp_path, 'nb-1', 'nb-2', 'nb-3-flaky', 'nb-4', 'nb-5-broken')
+    cache = MetadataCache(str(tmp_path / 'cache'), 'ks', 't')
+    infos, hits, errors = TombstoneAnalyzer(parallelism=1, batch_size=10, command=command).analyze(files, cache)
+
+    assert (len(infos), hits) == (4, 0)
+    assert [path for path, _ in errors] == [files[4][0]]
+    assert all((info.droppable_tombstones, info.level) == (0.5, 1) for info in infos)
+    # One run for the batch, then one for each SSTable it left out.
+    assert runs() == [5, 1, 1]
+
+
+def test_cached_sstables_are_not_read_again(tmp_path, sstablemetadata):
+    command, runs = sstablemetadata
+    files = sstables(tmp_path, 'nb-1', 'nb-2')
+    analyzer = TombstoneAnalyzer(parallelism=2, command=command)
+    cache = MetadataCache(str(tmp_path / 'cache'), 'ks', 't')
+    infos, _, _ = analyzer.analyze(files, cache)
+    cache.save(infos)
+
+    cache = MetadataCache(str(tmp_path / 'cache'), 'ks', 't')
+    files = [files[0], (files[1][0], 200)] + sstables(tmp_path, 'nb-3')
+    infos, hits, _ = analyzer.analyze(files, cache)
+    assert hits == 1
+    assert sum(runs()) == 4
+
+    cache.save(infos)
+    assert set(MetadataCache(str(tmp_path / 'cache'), 'ks', 't').entries) == {path for path, _ in files}
+    assert analyzer.analyze(files, cache, refresh=True)[1] == 0
+
+
+def test_cache_entries_are_dropped_when_statistics_db_is_rewritten(tmp_path, sstablemetadata):
+    command, runs = sstablemetadata
+    files = sstables(tmp_path, 'nb-1', 'nb-2')
+    analyzer = TombstoneAnalyzer(command=command)
+    cache = MetadataCache(str(tmp_path / 'cache'), 'ks', 't')
+    cache.save(analyzer.analyze(files, cache)[0])
+
+    # A level reset or repair rewrites Statistics.db in place; Data.db is untouched.
+    (tmp_path / 'nb-2-big-Statistics.db').write_bytes(b'levelled')
+    cache = MetadataCache(str(tmp_path / 'cache'), 'ks', 't')
+    assert cache.get(*files[0]) is not None
+    assert cache.get(*files[1]) is None
+    assert analyzer.analyze(files, cache)[1] == 1
+
+
+def test_aggregate_weights_levels_by_size():
+    infos = [SSTableInfo('a', 300, 0.5, 0, 0, 0), SSTableInfo('b', 100, 0.1, 0, 0, 0),
+             SSTableInfo('c', 100, 1.0, 1, 0, 0)]
+    histogram, levels = aggregate(infos)
+
+    assert [(b['min_ratio'], b['sstables']) for b in histogram if b['sstables']] == [(0.1, 1), (0.5, 1), (0.9, 1)]
+    assert levels['0'] == {'sstables': 2, 'bytes': 400, 'estimated_droppable_bytes': 160, 'droppable_ratio': 0.4}
+    assert levels['1']['droppable_ratio'] == 1.0
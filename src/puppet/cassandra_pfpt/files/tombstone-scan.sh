@@ -20,6 +20,8 @@ NC='\e[0m'
 KEYSPACE=""
 TABLE=""
 SORT_COLUMN=4 # Default to sorting by Average Tombstones
+JSON_OUTPUT=false
+ANALYZER="/usr/local/bin/cassandra_tombstones.py"
 
 # --- Logging (to stderr) ---
 log_error() { echo -e "${RED}ERROR: $1${NC}" >&2; }
@@ -28,7 +30,7 @@ log_warn() { echo -e "${YELLOW}$1${NC}"; }
 
 # --- Usage ---
 usage() {
-    echo "Usage: $0 [-k <keyspace>] [-t <table>]"
+    echo "Usage: $0 [-k <keyspace>] [-t <table>] [-j]"
     echo ""
     echo "A powerful tombstone analysis tool for Cassandra."
     echo ""
@@ -45,17 +47,21 @@ usage() {
     echo "    Use -k and -t together to perform a detailed scan of every SSTable for a specific table."
     echo "    This shows which data files have the most droppable tombstones."
     echo "    Example: $0 -k my_app -t users"
+    echo "    SSTables are read in parallel and their results cached, so repeat scans only read new SSTables."
+    echo "    Per-level totals and a droppable tombstone histogram follow the per-SSTable report."
     echo ""
     echo "Options:"
+    echo "  -j            Deep dive only: print the report and aggregates as JSON."
     echo "  -h, --help    Show this help message."
     exit 1
 }
 
 # --- Argument Parsing ---
-while getopts ":k:t:h" opt; do
+while getopts ":k:t:jh" opt; do
   case ${opt} in
     k) KEYSPACE=$OPTARG ;;
     t) TABLE=$OPTARG ;;
+    j) JSON_OUTPUT=true ;;
     h) usage ;;
     \?) log_error "Invalid option: -$OPTARG"; usage ;;
   esac
@@ -70,6 +76,18 @@ run_deep_dive() {
         exit 1
     fi
 
+    # The analyzer reads SSTables in parallel and caches their metadata.
+    if [ -x "$ANALYZER" ]; then
+        local ANALYZER_ARGS=(--keyspace "$KEYSPACE" --table "$TABLE" --data-dir "$CASSANDRA_DATA_DIR")
+        if [ "$JSON_OUTPUT" = true ]; then
+            exec "$ANALYZER" "${ANALYZER_ARGS[@]}" --json
+        fi
+        "$ANALYZER" "${ANALYZER_ARGS[@]}"
+        log_warn "Report sorted by ${BOLD}DROPPABLE_TOMBSTONES${NC}."
+        log_warn "These are estimates. High values indicate SSTables that would benefit from compaction."
+        return
+    fi
+
     local TABLE_DIR_UUID
     TABLE_DIR_UUID=$(find "${CASSANDRA_DATA_DIR}/${KEYSPACE}" -maxdepth 1 -type d -name "${TABLE}-*" 2>/dev/null | head -n 1)
 
@@ -1,6 +1,7 @@
 #!/bin/bash
 # This file is managed by Puppet.
 # Verifies the integrity of the latest backup set for this node.
+# Options (e.g. --full-chain, --sample 15 --cycle-days 7, --json) are passed to cassandra_backup_verify.py.
 
 set -euo pipefail
 
@@ -19,9 +20,18 @@ NC='\033[0m' # No Color
 # --- Configuration & Logging Initialization ---
 CONFIG_FILE="/etc/backup/config.json"
 LOG_FILE="/var/log/cassandra/backup_verify.log"
+JSON_OUTPUT=false
+for arg in "$@"; do
+    if [ "$arg" == "--json" ]; then JSON_OUTPUT=true; fi
+done
 
 log_message() {
-  echo -e "[$(date +'%Y-%m-%d %H:%M:%S')] $1" | tee -a "$LOG_FILE"
+  if [ "$JSON_OUTPUT" = true ]; then
+    # Keep stdout for the JSON results.
+    echo -e "[$(date +'%Y-%m-%d %H:%M:%S')] $1" | tee -a "$LOG_FILE" >&2
+  else
+    echo -e "[$(date +'%Y-%m-%d %H:%M:%S')] $1" | tee -a "$LOG_FILE"
+  fi
 }
 log_info() { log_message "${BLUE}$1${NC}"; }
 log_success() { log_message "${GREEN}$1${NC}"; }
@@ -42,6 +52,7 @@ BACKUP_BACKEND=$(jq -r '.backup_backend // "s3"' "$CONFIG_FILE")
 HOSTNAME=$(hostname -s)
 TMP_RESTORE_DIR="/tmp/backup_verify_$$"
 TMP_KEY_FILE=""
+VERIFY_ENGINE="/usr/local/bin/cassandra_backup_verify.py"
 
 
 # --- Cleanup Function ---
@@ -63,9 +74,26 @@ if [ "$BACKUP_BACKEND" != "s3" ]; then
     exit 1
 fi
 
+# The verification engine streams every archive of the backup set, checks SSTable
+# checksums and referenced components, and supports whole-chain (--full-chain) and
+# sampled (--sample, --cycle-days) runs.
+# Without it, only one sample archive of the latest backup set is test-read below.
+if [ -x "$VERIFY_ENGINE" ] && "$VERIFY_ENGINE" check >> "$LOG_FILE" 2>&1; then
+    if [ "$JSON_OUTPUT" = true ]; then
+        exec nice -n 19 ionice -c 3 "$VERIFY_ENGINE" verify --host "$HOSTNAME" "$@" 2>>"$LOG_FILE"
+    fi
+    trap - EXIT
+    set +e
+    nice -n 19 ionice -c 3 "$VERIFY_ENGINE" verify --host "$HOSTNAME" "$@" 2>&1 | tee -a "$LOG_FILE"
+    exit "${PIPESTATUS[0]}"
+fi
+if [ $# -gt 0 ]; then
+    log_warn "The verification engine is unavailable; ignoring options '$*' and test-reading one sample archive."
+fi
+
 # 1. Find the latest backup set
 log_info "Searching for the latest backup set in s3://${S3_BUCKET_NAME}/${HOSTNAME}/..."
-LATEST_BACKUP_TS=$(aws s3 ls "s3://${S3_BUCKET_NAME}/${HOSTNAME}/" | grep 'PRE' | awk '{print $2}' | sed 's/\///' | sort -r | head -n 1)
+LATEST_BACKUP_TS=$(aws s3 ls "s3://${S3_BUCKET_NAME}/${HOSTNAME}/" | grep 'PRE' | awk '{print $2}' | sed 's/\///' | grep -E '^[0-9]{4}-[0-9]{2}-[0-9]{2}-[0-9]{2}-[0-9]{2}$' | sort -r | head -n 1)
 
 if [ -z "$LATEST_BACKUP_TS" ]; then
     log_error "No backups found for host '${HOSTNAME}' in bucket '${S3_BUCKET_NAME}'."